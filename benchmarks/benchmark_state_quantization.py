@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+
+import torch
+import torch.nn.functional as F
+
+from fla.models.utils import Cache, QuantizedCache
+from fla.ops.gla import fused_recurrent_gla
+
+
+def sizeof_fmt(num, suffix='B'):
+    for unit in ('', 'Ki', 'Mi', 'Gi', 'Ti', 'Pi', 'Ei', 'Zi'):
+        if abs(num) < 1024.0:
+            return f'{num:3.1f}{unit}{suffix}'
+        num /= 1024.0
+    return f'{num:.1f}Yi{suffix}'
+
+
+def state_bytes(cache: Cache) -> int:
+    num_bytes = 0
+
+    def fn(x: torch.Tensor) -> torch.Tensor:
+        nonlocal num_bytes
+        num_bytes += x.numel() * x.element_size()
+        return x
+    cache._apply(fn)
+    return num_bytes
+
+
+@torch.inference_mode()
+def decode(q, k, v, g, cache: Cache):
+    o = []
+    for t in range(q.shape[1]):
+        h0 = cache[0]['recurrent_state'] if len(cache) > 0 else None
+        o_t, ht = fused_recurrent_gla(
+            q=q[:, t:t+1],
+            k=k[:, t:t+1],
+            v=v[:, t:t+1],
+            gk=g[:, t:t+1],
+            initial_state=h0,
+            output_final_state=True,
+            head_first=False
+        )
+        cache.update(recurrent_state=ht, layer_idx=0, offset=1)
+        o.append(o_t)
+    return torch.cat(o, 1), cache[0]['recurrent_state']
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Errors of quantized recurrent states against the full-precision path")
+    parser.add_argument("--B", type=int, default=8)
+    parser.add_argument("--T", type=int, default=2048)
+    parser.add_argument("--H", type=int, default=16)
+    parser.add_argument("--D", type=int, default=128)
+    args = parser.parse_args()
+
+    from fla.utils import device
+    torch.manual_seed(0)
+    B, T, H, D = args.B, args.T, args.H, args.D
+    dtype = torch.bfloat16
+    q = torch.randn(B, T, H, D, device=device, dtype=dtype)
+    k = torch.randn(B, T, H, D, device=device, dtype=dtype)
+    v = torch.randn(B, T, H, D, device=device, dtype=dtype)
+    g = F.logsigmoid(torch.randn(B, T, H, D, device=device, dtype=dtype)).clamp_min(-5)
+
+    ref_cache = Cache()
+    ref_o, ref_ht = decode(q, k, v, g, ref_cache)
+    print(f"{'storage':>24} {'state size':>12} {'o rel err':>10} {'o max err':>10} {'ht rel err':>10}")
+    print(f"{'float32':>24} {sizeof_fmt(state_bytes(ref_cache)):>12} {0:>10.6f} {0:>10.6f} {0:>10.6f}")
+    for dtype in ['int8', 'float8_e4m3fn', 'float8_e5m2']:
+        for granularity in ['head', 'row']:
+            cache = QuantizedCache(dtype=dtype, granularity=granularity)
+            tri_o, tri_ht = decode(q, k, v, g, cache)
+            o_err = ((tri_o.float() - ref_o.float()).norm() / ref_o.float().norm()).item()
+            o_max = (tri_o.float() - ref_o.float()).abs().max().item()
+            ht_err = ((tri_ht - ref_ht).norm() / ref_ht.norm()).item()
+            print(f"{dtype + '/' + granularity:>24} {sizeof_fmt(state_bytes(cache)):>12} "
+                  f"{o_err:>10.6f} {o_max:>10.6f} {ht_err:>10.6f}")
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import torch
+import triton
+
+from fla.ops.common.utils import prepare_chunk_indices, prepare_lens, prepare_position_ids, prepare_sequence_ids
+
+
+def loop_prepare_position_ids(offsets: torch.LongTensor) -> torch.LongTensor:
+    return torch.cat([torch.arange(n, dtype=offsets.dtype, device=offsets.device) for n in prepare_lens(offsets).unbind()])
+
+
+def loop_prepare_chunk_indices(offsets: torch.LongTensor, chunk_size: int) -> torch.LongTensor:
+    indices = torch.cat([torch.arange(n) for n in triton.cdiv(prepare_lens(offsets), chunk_size).tolist()])
+    return torch.stack([prepare_sequence_ids(indices), indices], 1).to(offsets)
+
+
+@triton.testing.perf_report(
+    triton.testing.Benchmark(
+        # argument names to use as an x-axis for the plot
+        x_names=['N'],
+        # different possible values for `x_name`
+        x_vals=[4 ** i for i in range(1, 7)],
+        # argument name whose value corresponds to a different line in the plot
+        line_arg='provider',
+        line_vals=['position_ids', 'loop_position_ids', 'chunk_indices', 'loop_chunk_indices'],
+        # label name for the lines
+        line_names=['position_ids', 'loop_position_ids', 'chunk_indices', 'loop_chunk_indices'],
+        # line styles
+        styles=[('green', '-'), ('green', 'dotted'), ('blue', '-'), ('blue', 'dotted')],
+        ylabel="Execution Time (ms)",  # label name for the y-axis
+        # name for the plot. Used also as a file name for saving the plot.
+        plot_name="Performance",
+        args={},
+    )
+)
+def benchmark(N, provider):
+    from fla.utils import device
+
+    # N documents of random lengths packed into a single sequence
+    lens = torch.randint(1, 512, (N,), device=device)
+    offsets = torch.cat([lens.new_zeros(1), lens.cumsum(0)])
+
+    # the functions are called with fresh tensors to bypass `tensor_cache`
+    quantiles = [0.5, 0.2, 0.8]
+    results = 0, 0, 0
+    if provider == 'position_ids':
+        results = triton.testing.do_bench(lambda: prepare_position_ids(offsets.clone()), quantiles=quantiles)
+    elif provider == 'loop_position_ids':
+        results = triton.testing.do_bench(lambda: loop_prepare_position_ids(offsets.clone()), quantiles=quantiles)
+    elif provider == 'chunk_indices':
+        results = triton.testing.do_bench(lambda: prepare_chunk_indices(offsets.clone(), 64), quantiles=quantiles)
+    elif provider == 'loop_chunk_indices':
+        results = triton.testing.do_bench(lambda: loop_prepare_chunk_indices(offsets.clone(), 64), quantiles=quantiles)
+    return results
+
+
+if __name__ == '__main__':
+    benchmark.run(print_data=True, show_plots=True)
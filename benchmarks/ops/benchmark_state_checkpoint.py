@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import torch
+import torch.nn.functional as F
+import triton
+
+from fla.ops.gated_delta_rule import chunk_gated_delta_rule
+from fla.ops.gla import chunk_gla
+from fla.ops.simple_gla import chunk_simple_gla
+
+providers = ['gla', 'gla_4', 'gla_16', 'simple_gla', 'simple_gla_4', 'simple_gla_16',
+             'gated_delta_rule', 'gated_delta_rule_4', 'gated_delta_rule_16']
+
+
+def prepare(provider, T):
+    from fla.utils import device
+    dtype = torch.bfloat16
+    B, H, D = 4, 16, 128
+
+    # `<op>_<n>` keeps the states every `n` chunks, while `<op>` recomputes all states in the backward pass
+    op, _, interval = provider.rpartition('_') if provider[-1].isdigit() else (provider, None, None)
+    interval = int(interval) if interval is not None else None
+    q, k, v = (torch.randn(B, T, H, D, device=device, dtype=dtype).requires_grad_() for _ in range(3))
+    if op == 'gla':
+        g = F.logsigmoid(torch.randn(B, T, H, D, device=device, dtype=dtype)).requires_grad_()
+        inputs, fn = (q, k, v, g), chunk_gla
+    elif op == 'simple_gla':
+        g = F.logsigmoid(torch.randn(B, T, H, device=device, dtype=dtype)).requires_grad_()
+        inputs, fn = (q, k, v, g), chunk_simple_gla
+    else:
+        k = F.normalize(k, p=2, dim=-1).detach().requires_grad_()
+        g = F.logsigmoid(torch.randn(B, T, H, device=device, dtype=dtype)).requires_grad_()
+        beta = torch.rand(B, T, H, device=device, dtype=dtype).requires_grad_()
+        inputs, fn = (q, k, v, g, beta), chunk_gated_delta_rule
+    do = torch.randn_like(v)
+    return lambda: fn(*inputs, head_first=False, state_checkpoint_interval=interval)[0].backward(do)
+
+
+@triton.testing.perf_report(
+    triton.testing.Benchmark(
+        # argument names to use as an x-axis for the plot
+        x_names=['T'],
+        # different possible values for `x_name`
+        x_vals=[1024 * 2 ** i for i in range(0, 5)],
+        # argument name whose value corresponds to a different line in the plot
+        line_arg='provider',
+        line_vals=providers,
+        # label name for the lines
+        line_names=providers,
+        # line styles
+        styles=[(c, s) for c in ('green', 'blue', 'red') for s in ('-', '--', 'dotted')],
+        ylabel="Execution Time (ms)",  # label name for the y-axis
+        # name for the plot. Used also as a file name for saving the plot.
+        plot_name="Performance",
+        args={},
+    )
+)
+def benchmark(T, provider):
+    quantiles = [0.5, 0.2, 0.8]
+    return triton.testing.do_bench(prepare(provider, T), quantiles=quantiles)
+
+
+@triton.testing.perf_report(
+    triton.testing.Benchmark(
+        x_names=['T'],
+        x_vals=[1024 * 2 ** i for i in range(0, 5)],
+        line_arg='provider',
+        line_vals=providers,
+        line_names=providers,
+        styles=[(c, s) for c in ('green', 'blue', 'red') for s in ('-', '--', 'dotted')],
+        ylabel="Peak Memory (GB)",
+        plot_name="Memory",
+        args={},
+    )
+)
+def benchmark_memory(T, provider):
+    fn = prepare(provider, T)
+    # warmup to exclude the autotuning workspaces
+    fn()
+    torch.cuda.synchronize()
+    torch.cuda.reset_peak_memory_stats()
+    base = torch.cuda.memory_allocated()
+    fn()
+    torch.cuda.synchronize()
+    return (torch.cuda.max_memory_allocated() - base) / 1024 ** 3
+
+
+if __name__ == '__main__':
+    benchmark.run(print_data=True, show_plots=True)
+    benchmark_memory.run(print_data=True, show_plots=True)
@@ -5,6 +5,7 @@ import torch
 from benchmark import benchmark_backward, benchmark_combined, benchmark_forward
 from torch.nn import functional as F
 
+from fla.ops.titans import chunk_titans_linear, fused_recurrent_titans_linear
 from fla.ops.titans.naive import chunk_titans_linear_ref
 
 # from flash_attn import flash_attn_func
@@ -35,7 +36,7 @@ headdim_vals = [4, 8]
 dim = 16
 dropout_p = 0.0
 
-methods = ["naive_titans", "chunk_titans"]
+methods = ["naive_titans", "chunk_titans", "triton_chunk_titans", "triton_fused_recurrent_titans"]
 time_f = {}
 time_b = {}
 time_f_b = {}
@@ -109,6 +110,27 @@ for causal in causal_vals:
             )
             time_f_b[config, "chunk_titans"] = f_b
 
+            for method, func in (
+                ("triton_chunk_titans", chunk_titans_linear),
+                ("triton_fused_recurrent_titans", fused_recurrent_titans_linear),
+            ):
+                o4, _ = func(q, k, v, w, b, theta, alpha, eta, chunk_size=16)
+                o4.sum().backward(retain_graph=True)
+                f_b = time_fwd_bwd(
+                    func,
+                    q,
+                    k,
+                    v,
+                    w,
+                    b,
+                    theta,
+                    alpha,
+                    eta,
+                    chunk_size=16,
+                    verbose=False,
+                )
+                time_f_b[config, method] = f_b
+
             print(f"### causal={causal}, headdim={headdim}, B={B}, seqlen={seqlen} ###")
             for method in methods:
                 # time_f_b[config, method] = time_f[config, method] + time_b[config, method]
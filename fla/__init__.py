@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import os
+
 from fla.layers import (
     ABCAttention,
     Attention,
@@ -50,6 +52,7 @@ from fla.models import (
     TransformerForCausalLM,
     TransformerModel
 )
+from fla.utils import enable_autotune_cache
 
 __all__ = [
     'ABCAttention',
@@ -102,3 +105,7 @@ __all__ = [
 ]
 
 __version__ = '0.1.1'
+
+if os.environ.get('FLA_AUTOTUNE_CACHE', '0') == '1' or 'FLA_AUTOTUNE_PROFILE' in os.environ:
+    # reload the configs selected by the autotuners in previous runs, or pre-warm them from a shipped profile
+    enable_autotune_cache(persist=os.environ.get('FLA_AUTOTUNE_CACHE', '0') == '1')
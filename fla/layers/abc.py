@@ -12,8 +12,9 @@ from einops import rearrange
 
 from fla.modules import FusedRMSNormGated, RMSNorm, RotaryEmbedding, ShortConvolution
 from fla.modules.activations import swiglu, swish
-from fla.ops.abc.chunk import chunk_abc
+from fla.ops.abc import chunk_abc, fused_recurrent_abc
 from fla.ops.common.utils import prepare_position_ids, prepare_sequence_ids
+from fla.ops.registry import select_mode
 
 if TYPE_CHECKING:
     from fla.models.utils import Cache
@@ -137,8 +138,14 @@ class ABCAttention(nn.Module):
             last_state = past_key_values[self.layer_idx]
 
         cu_seqlens, position_ids, seq_idx = kwargs.get('cu_seqlens', None), kwargs.get('position_ids', None), None
-        if cu_seqlens is not None:
+        # the chunked kernel supports neither variable-length inputs nor carrying the normalizers of the slots across calls,
+        # so they are processed by the recurrent one, which is forward only and thus unavailable for training
+        if cu_seqlens is not None and self.training:
             raise NotImplementedError("Training with cu_seqlens is not supported yet for ABCAttention")
+        if last_state is not None or cu_seqlens is not None:
+            mode = 'fused_recurrent'
+        else:
+            mode = select_mode('abc', 'chunk', hidden_states, self.num_heads, self.head_k_dim, self.head_v_dim, self.training)
         if self.use_short_conv:
             conv_state_q, conv_state_k, conv_state_v = None, None, None
             if last_state is not None:
@@ -146,7 +153,7 @@ class ABCAttention(nn.Module):
             conv_mask = attention_mask[:, -hidden_states.shape[1]:] if attention_mask is not None else None
             if cu_seqlens is not None:
                 if position_ids is None:
-                    position_ids = prepare_position_ids(cu_seqlens)
+                    position_ids = prepare_position_ids(cu_seqlens, hidden_states.shape[1])
                 seq_idx = prepare_sequence_ids(position_ids).to(torch.int32).unsqueeze(0)
             q, conv_state_q = self.q_conv1d(
                 x=self.q_proj(hidden_states),
@@ -192,15 +199,31 @@ class ABCAttention(nn.Module):
         s = s.clamp_(self.clamp_min, self.clamp_max)
 
         recurrent_state = last_state['recurrent_state'] if last_state is not None else None
-        o, recurrent_state = chunk_abc(
-            q=q,
-            k=k,
-            v=v,
-            s=s,
-            initial_state=recurrent_state,
-            output_final_state=use_cache,
-            head_first=False
-        )
+        if mode == 'fused_recurrent':
+            o, recurrent_state = fused_recurrent_abc(
+                q=q,
+                k=k,
+                v=v,
+                s=s,
+                initial_state=recurrent_state,
+                output_final_state=use_cache,
+                cu_seqlens=cu_seqlens,
+                head_first=False
+            )
+        elif mode == 'chunk':
+            o, recurrent_state = chunk_abc(
+                q=q,
+                k=k,
+                v=v,
+                s=s,
+                output_final_state=use_cache,
+                head_first=False
+            )
+            if use_cache:
+                # the slot memories are normalized by the `logsumexp` of `s`, kept for the following decoding steps
+                recurrent_state = (*recurrent_state, s.float().logsumexp(1))
+        else:
+            raise NotImplementedError(f"Not supported mode `{mode}`.")
         if past_key_values is not None:
             past_key_values.update(
                 recurrent_state=recurrent_state,
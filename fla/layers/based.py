@@ -6,14 +6,23 @@ Linear attention in Based.
 https://github.com/HazyResearch/zoology/blob/main/zoology/mixers/based.py
 """
 
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
 import torch
 import torch.nn as nn
 from einops import rearrange
 
 from fla.modules.feature_map import TaylorFeatureMap
-from fla.ops.based import parallel_based
+from fla.ops.based import fused_recurrent_based, parallel_based
 from fla.ops.linear_attn import chunk_linear_attn, fused_chunk_linear_attn
 
+if TYPE_CHECKING:
+    from transformers.processing_utils import Unpack
+
+    from fla.models.utils import Cache
+
 
 class BasedLinearAttention(nn.Module):
 
@@ -27,6 +36,7 @@ class BasedLinearAttention(nn.Module):
         eps: float = 1e-12,
         causal: bool = True,
         mode: str = "parallel",
+        layer_idx: Optional[int] = None
     ):
         super().__init__()
 
@@ -38,6 +48,7 @@ class BasedLinearAttention(nn.Module):
         self.num_heads = num_heads
         self.head_dim = self.hidden_size // self.num_key_value_heads
         self.causal = causal
+        self.layer_idx = layer_idx
 
         self.q_proj = nn.Linear(self.hidden_size, self.feature_dim * self.num_heads, bias=False)
         self.k_proj = nn.Linear(self.hidden_size, self.feature_dim * self.num_heads, bias=False)
@@ -47,10 +58,29 @@ class BasedLinearAttention(nn.Module):
         self.feature_map = TaylorFeatureMap(feature_dim)
         self.eps = eps
 
-    def forward(self, hidden_states: torch.Tensor, **kwargs):
+    def forward(
+        self,
+        hidden_states: torch.Tensor,
+        attention_mask: Optional[torch.Tensor] = None,
+        past_key_values: Optional[Cache] = None,
+        use_cache: Optional[bool] = False,
+        output_attentions: Optional[bool] = False,
+        **kwargs: Unpack[Dict]
+    ) -> Tuple[torch.Tensor, Optional[torch.Tensor], Optional[Cache]]:
         mode = self.mode
+        last_state = None
+        if past_key_values is not None and len(past_key_values) > self.layer_idx:
+            last_state = past_key_values[self.layer_idx]
+        # the states of the taylor expansion are only tracked by the recurrent kernel,
+        # which prefills the prompts token by token and then decodes each new token in O(1)
+        if use_cache and past_key_values is not None:
+            mode = 'fused_recurrent'
+
         q, k, v = self.q_proj(hidden_states), self.k_proj(hidden_states), self.v_proj(hidden_states)
-        q, k, v = map(lambda x: rearrange(x, "... (h d) -> ... h d", d=self.head_dim), [q, k, v])
+        q, k = (rearrange(x, "... (h d) -> ... h d", d=self.feature_dim) for x in (q, k))
+        v = rearrange(v, "... (h d) -> ... h d", d=self.head_dim)
+        # the feature map approximates `exp(q k / sqrt(feature_dim))`
+        scale = self.feature_dim ** -0.5
         if mode == "fused_chunk":
             q, k = self.feature_map(q), self.feature_map(k)
             o, _ = fused_chunk_linear_attn(q, k, v, normalize=True, scale=1, head_first=False)
@@ -59,11 +89,29 @@ class BasedLinearAttention(nn.Module):
             o, _ = chunk_linear_attn(q, k, v, normalize=True, scale=1, head_first=False)
         elif mode == 'parallel':
             assert q.shape[-1] <= 128
-            o = parallel_based(q, k, v, scale=1, use_norm=True, head_first=False)
+            o = parallel_based(q, k, v, scale=scale, use_norm=True, head_first=False)
+        elif mode == 'fused_recurrent':
+            o, recurrent_state = fused_recurrent_based(
+                q=q,
+                k=k,
+                v=v,
+                scale=scale,
+                initial_state=last_state['recurrent_state'] if last_state is not None else None,
+                output_final_state=use_cache,
+                head_first=False
+            )
+            if past_key_values is not None:
+                past_key_values.update(
+                    recurrent_state=recurrent_state,
+                    layer_idx=self.layer_idx,
+                    offset=q.shape[1]
+                )
+        else:
+            raise NotImplementedError(f"Not supported mode `{mode}`.")
         o = rearrange(o, 'b t h d -> b t (h d)')
         o = self.o_proj(o)
         o = self.dropout(o)
-        return o
+        return o, None, past_key_values
 
     # https://github.com/HazyResearch/zoology/blob/main/zoology/mixers/based.py#L119
 
@@ -14,6 +14,7 @@ from torch.nn import functional as F
 from fla.modules import FusedRMSNormGated, RMSNorm, ShortConvolution
 from fla.ops.common.utils import prepare_position_ids, prepare_sequence_ids
 from fla.ops.gated_delta_rule import chunk_gated_delta_rule, fused_recurrent_gated_delta_rule
+from fla.ops.registry import select_mode
 
 if TYPE_CHECKING:
     from transformers.processing_utils import Unpack
@@ -198,11 +199,18 @@ class GatedDeltaNet(nn.Module):
                 "Arbitrary attention masks of shape [batch_size, seq_len, seq_len] are not allowed."
             )
 
-        mode = 'fused_recurrent'
+        # pick the cheapest kernel for the current shape, e.g., the recurrent one for short inputs
+        mode = select_mode(
+            'gated_delta_rule', self.mode, hidden_states, self.num_heads, self.head_k_dim, self.head_v_dim, self.training
+        )
 
         last_state = None
         if past_key_values is not None and len(past_key_values) > self.layer_idx:
             last_state = past_key_values[self.layer_idx]
+        # keep the states after each token to roll back the rejected draft tokens in speculative decoding
+        checkpointing = use_cache and past_key_values is not None and past_key_values.checkpointing
+        if checkpointing:
+            mode = 'fused_recurrent'
 
         cu_seqlens, position_ids, seq_idx = kwargs.get('cu_seqlens', None), kwargs.get('position_ids', None), None
         if self.use_short_conv:
@@ -212,7 +220,7 @@ class GatedDeltaNet(nn.Module):
             conv_mask = attention_mask[:, -hidden_states.shape[1]:] if attention_mask is not None else None
             if cu_seqlens is not None:
                 if position_ids is None:
-                    position_ids = prepare_position_ids(cu_seqlens)
+                    position_ids = prepare_position_ids(cu_seqlens, hidden_states.shape[1])
                 seq_idx = prepare_sequence_ids(position_ids).to(torch.int32).unsqueeze(0)
             q, conv_state_q = self.q_conv1d(
                 x=self.q_proj(hidden_states),
@@ -275,14 +283,16 @@ class GatedDeltaNet(nn.Module):
                 output_final_state=use_cache,
                 cu_seqlens=cu_seqlens,
                 head_first=False,
-                use_qk_l2norm_in_kernel=True
+                use_qk_l2norm_in_kernel=True,
+                output_intermediate_states=checkpointing
             )
         if past_key_values is not None:
             past_key_values.update(
                 recurrent_state=recurrent_state,
                 conv_state=(conv_state_q, conv_state_k, conv_state_v) if self.use_short_conv else None,
                 layer_idx=self.layer_idx,
-                offset=q.shape[1]
+                offset=q.shape[1],
+                cache_kwargs=dict(intermediate_states=checkpointing)
             )
 
         if self.use_gate:
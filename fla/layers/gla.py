@@ -15,6 +15,7 @@ from fla.modules import FusedRMSNormGated, RMSNorm, ShortConvolution
 from fla.modules.activations import ACT2FN
 from fla.ops.common.utils import prepare_position_ids, prepare_sequence_ids
 from fla.ops.gla import chunk_gla, fused_chunk_gla, fused_recurrent_gla
+from fla.ops.registry import select_mode
 
 if TYPE_CHECKING:
     from transformers.processing_utils import Unpack
@@ -171,12 +172,18 @@ class GatedLinearAttention(nn.Module):
                 "Arbitrary attention masks of shape [batch_size, seq_len, seq_len] are not allowed."
             )
 
-        # launching the triton kernel for just one token will actually be slower
-        mode = 'fused_recurrent' if hidden_states.shape[1] <= 64 else self.mode
+        # pick the cheapest kernel for the current shape, e.g., the recurrent one for short inputs
+        mode = select_mode('gla', self.mode, hidden_states, self.num_heads, self.head_k_dim, self.head_v_dim, self.training)
 
         last_state = None
         if past_key_values is not None and len(past_key_values) > self.layer_idx:
             last_state = past_key_values[self.layer_idx]
+        # keep the states after each token to roll back the rejected draft tokens in speculative decoding
+        checkpointing = use_cache and past_key_values is not None and past_key_values.checkpointing
+        # the recurrent states of the requests are read from and written to the slots of a `StatePool` in-place
+        state_indices = past_key_values.state_indices if past_key_values is not None else None
+        if checkpointing or state_indices is not None:
+            mode = 'fused_recurrent'
 
         cu_seqlens, position_ids, seq_idx = kwargs.get('cu_seqlens', None), kwargs.get('position_ids', None), None
         if self.use_short_conv:
@@ -186,7 +193,7 @@ class GatedLinearAttention(nn.Module):
             conv_mask = attention_mask[:, -hidden_states.shape[1]:] if attention_mask is not None else None
             if cu_seqlens is not None:
                 if position_ids is None:
-                    position_ids = prepare_position_ids(cu_seqlens)
+                    position_ids = prepare_position_ids(cu_seqlens, hidden_states.shape[1])
                 seq_idx = prepare_sequence_ids(position_ids).to(torch.int32).unsqueeze(0)
             q, conv_state_q = self.q_conv1d(x=self.q_proj(hidden_states),
                                             mask=conv_mask,
@@ -214,13 +221,11 @@ class GatedLinearAttention(nn.Module):
         # dealing with left-padding
         if attention_mask is not None:
             v = v.mul_(attention_mask[:, -v.shape[-2]:, None])
-        q = rearrange(q, 'b t (h d) -> b t h d', d=self.head_k_dim)
-        if self.num_kv_groups > 1:
-            k, gk = (repeat(x, 'b t (h d) -> b t (h g) d', g=self.num_kv_groups, d=self.head_k_dim) for x in (k, gk))
-            v = repeat(v, 'b t (h d) -> b t (h g) d', g=self.num_kv_groups, d=self.head_v_dim)
-        else:
-            k, gk = (rearrange(x, 'b t (h d) -> b t h d', d=self.head_k_dim) for x in (k, gk))
-            v = rearrange(v, 'b t (h d) -> b t h d', d=self.head_v_dim)
+        q, k, gk = (rearrange(x, 'b t (h d) -> b t h d', d=self.head_k_dim) for x in (q, k, gk))
+        v = rearrange(v, 'b t (h d) -> b t h d', d=self.head_v_dim)
+        # the chunk and recurrent kernels map each group of query heads to the shared key/value head by themselves
+        if self.num_kv_groups > 1 and mode == 'fused_chunk':
+            k, gk, v = (repeat(x, 'b t h d -> b t (h g) d', g=self.num_kv_groups) for x in (k, gk, v))
         gk = F.logsigmoid(gk) / self.gate_logit_normalizer
 
         if self.clamp_min is not None:
@@ -236,9 +241,13 @@ class GatedLinearAttention(nn.Module):
                 initial_state=recurrent_state,
                 output_final_state=use_cache,
                 cu_seqlens=cu_seqlens,
-                head_first=False
+                head_first=False,
+                state_indices=state_indices,
+                output_intermediate_states=checkpointing
             )
         elif mode == 'fused_chunk':
+            if self.num_kv_groups > 1 and recurrent_state is not None:
+                recurrent_state = recurrent_state.repeat_interleave(self.num_kv_groups, 1)
             o, recurrent_state = fused_chunk_gla(
                 q=q,
                 k=k,
@@ -246,8 +255,12 @@ class GatedLinearAttention(nn.Module):
                 g=gk,
                 initial_state=recurrent_state,
                 output_final_state=use_cache,
+                cu_seqlens=cu_seqlens,
                 head_first=False
             )
+            # the states are cached per key/value head, which are identical within each group
+            if self.num_kv_groups > 1 and recurrent_state is not None:
+                recurrent_state = recurrent_state[:, ::self.num_kv_groups].contiguous()
         elif mode == 'chunk':
             o, recurrent_state = chunk_gla(
                 q=q,
@@ -267,7 +280,8 @@ class GatedLinearAttention(nn.Module):
                 recurrent_state=recurrent_state,
                 conv_state=(conv_state_q, conv_state_k, conv_state_v) if self.use_short_conv else None,
                 layer_idx=self.layer_idx,
-                offset=q.shape[1]
+                offset=q.shape[1],
+                cache_kwargs=dict(intermediate_states=checkpointing, supports_state_indices=True)
             )
 
         if self.use_output_gate:
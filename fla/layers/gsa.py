@@ -16,6 +16,7 @@ from fla.modules.feature_map import ReLUFeatureMap, SwishFeatureMap, T2RFeatureM
 from fla.modules.layernorm import rms_norm_linear
 from fla.ops.common.utils import prepare_position_ids, prepare_sequence_ids
 from fla.ops.gsa import chunk_gsa, fused_recurrent_gsa
+from fla.ops.registry import select_mode
 
 if TYPE_CHECKING:
     from transformers.processing_utils import Unpack
@@ -126,8 +127,8 @@ class GatedSlotAttention(nn.Module):
                 "Arbitrary attention masks of shape [batch_size, seq_len, seq_len] are not allowed."
             )
 
-        # launching the triton kernel for just one token will actually be slower
-        mode = 'fused_recurrent' if hidden_states.shape[1] <= 64 else self.mode
+        # pick the cheapest kernel for the current shape, e.g., the recurrent one for short inputs
+        mode = select_mode('gsa', self.mode, hidden_states, self.num_heads, self.head_k_dim, self.head_v_dim, self.training)
 
         last_state = None
         if past_key_values is not None and len(past_key_values) > self.layer_idx:
@@ -141,7 +142,7 @@ class GatedSlotAttention(nn.Module):
             conv_mask = attention_mask[:, -hidden_states.shape[1]:] if attention_mask is not None else None
             if cu_seqlens is not None:
                 if position_ids is None:
-                    position_ids = prepare_position_ids(cu_seqlens)
+                    position_ids = prepare_position_ids(cu_seqlens, hidden_states.shape[1])
                 seq_idx = prepare_sequence_ids(position_ids).to(torch.int32).unsqueeze(0)
             q, conv_state_q = self.q_conv1d(x=self.q_proj(hidden_states),
                                             mask=conv_mask,
@@ -15,6 +15,7 @@ from fla.modules import FusedRMSNormGated, ShortConvolution
 from fla.modules.activations import swiglu
 from fla.ops.common.utils import prepare_position_ids, prepare_sequence_ids
 from fla.ops.hgrn import chunk_hgrn, fused_recurrent_hgrn
+from fla.ops.registry import select_mode
 
 if TYPE_CHECKING:
     from transformers.processing_utils import Unpack
@@ -85,8 +86,8 @@ class HGRNAttention(nn.Module):
                 "Arbitrary attention masks of shape [batch_size, seq_len, seq_len] are not allowed."
             )
 
-        # launching the triton kernel for just one token will actually be slower
-        mode = 'fused_recurrent' if not self.training and hidden_states.shape[1] <= 64 else self.mode
+        # pick the cheapest kernel for the current shape, e.g., the recurrent one for short inputs
+        mode = self.mode if self.training else select_mode('hgrn', self.mode, hidden_states, 1, 1, self.input_dim)
 
         last_state = None
         if past_key_values is not None and len(past_key_values) > self.layer_idx:
@@ -100,7 +101,7 @@ class HGRNAttention(nn.Module):
             conv_mask = attention_mask[:, -hidden_states.shape[1]:] if attention_mask is not None else None
             if cu_seqlens is not None:
                 if position_ids is None:
-                    position_ids = prepare_position_ids(cu_seqlens)
+                    position_ids = prepare_position_ids(cu_seqlens, hidden_states.shape[1])
                 seq_idx = prepare_sequence_ids(position_ids).to(torch.int32).unsqueeze(0)
             i, conv_state_i = self.i_conv1d(x=self.i_proj(hidden_states),
                                             mask=conv_mask,
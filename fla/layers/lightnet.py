@@ -16,6 +16,7 @@ from fla.modules import FusedRMSNormGated, ShortConvolution
 from fla.modules.fused_norm_gate import rms_norm_swish_gate_linear
 from fla.ops.common.utils import prepare_position_ids, prepare_sequence_ids
 from fla.ops.gla import chunk_gla, fused_recurrent_gla
+from fla.ops.registry import select_mode
 
 if TYPE_CHECKING:
     from transformers.processing_utils import Unpack
@@ -106,12 +107,16 @@ class LightNetAttention(nn.Module):
                 "Arbitrary attention masks of shape [batch_size, seq_len, seq_len] are not allowed."
             )
 
-        # launching the triton kernel for just one token will actually be slower
-        mode = 'fused_recurrent' if hidden_states.shape[1] <= 64 else self.mode
+        # pick the cheapest kernel for the current shape, e.g., the recurrent one for short inputs
+        mode = select_mode('gla', self.mode, hidden_states, self.num_heads, self.head_f_dim, self.head_i_dim, self.training)
 
         last_state = None
         if past_key_values is not None and len(past_key_values) > self.layer_idx:
             last_state = past_key_values[self.layer_idx]
+        # keep the states after each token to roll back the rejected draft tokens in speculative decoding
+        checkpointing = use_cache and past_key_values is not None and past_key_values.checkpointing
+        if checkpointing:
+            mode = 'fused_recurrent'
 
         cu_seqlens, position_ids, seq_idx = kwargs.get('cu_seqlens', None), kwargs.get('position_ids', None), None
         if self.use_short_conv:
@@ -123,7 +128,7 @@ class LightNetAttention(nn.Module):
                 if position_ids is not None:
                     seq_idx = prepare_sequence_ids(position_ids)
                 else:
-                    seq_idx = prepare_sequence_ids(prepare_position_ids(cu_seqlens))
+                    seq_idx = prepare_sequence_ids(prepare_position_ids(cu_seqlens, hidden_states.shape[1]))
                 seq_idx = seq_idx.to(torch.int32).unsqueeze(0)
             q, conv_state_q = self.q_conv1d(x=self.q_proj(hidden_states),
                                             mask=conv_mask,
@@ -166,7 +171,8 @@ class LightNetAttention(nn.Module):
                 initial_state=recurrent_state,
                 output_final_state=use_cache,
                 cu_seqlens=cu_seqlens,
-                head_first=False
+                head_first=False,
+                output_intermediate_states=checkpointing
             )
         elif mode == 'chunk':
             o, recurrent_state = chunk_gla(
@@ -187,7 +193,8 @@ class LightNetAttention(nn.Module):
                 recurrent_state=recurrent_state,
                 conv_state=(conv_state_q, conv_state_k, conv_state_v) if self.use_short_conv else None,
                 layer_idx=self.layer_idx,
-                offset=q.shape[1]
+                offset=q.shape[1],
+                cache_kwargs=dict(intermediate_states=checkpointing)
             )
 
         o = rms_norm_swish_gate_linear(
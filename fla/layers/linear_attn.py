@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2023-2025, Songlin Yang, Yu Zhang
 
-from typing import Optional
+from __future__ import annotations
 
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from einops import rearrange, repeat
@@ -10,6 +13,12 @@ from einops import rearrange, repeat
 from fla.modules import RMSNorm
 from fla.modules.feature_map import DPFPFeatureMap, HadamardFeatureMap, HedgehogFeatureMap, T2RFeatureMap
 from fla.ops.linear_attn import chunk_linear_attn, fused_chunk_linear_attn, fused_recurrent_linear_attn
+from fla.ops.registry import select_mode
+
+if TYPE_CHECKING:
+    from transformers.processing_utils import Unpack
+
+    from fla.models.utils import Cache
 
 
 class LinearAttention(nn.Module):
@@ -29,6 +38,7 @@ class LinearAttention(nn.Module):
         do_feature_map_norm: bool = False,
         elementwise_affine: bool = True,
         norm_eps: float = 1e-5,
+        layer_idx: Optional[int] = None,
         **kwargs
     ):
         super().__init__()
@@ -107,12 +117,36 @@ class LinearAttention(nn.Module):
 
         self.norm_q = norm_q
         self.norm_k = norm_k
+        self.layer_idx = layer_idx
+
+    def forward(
+        self,
+        hidden_states: torch.Tensor,
+        attention_mask: Optional[torch.Tensor] = None,
+        past_key_values: Optional[Cache] = None,
+        use_cache: Optional[bool] = False,
+        output_attentions: Optional[bool] = False,
+        **kwargs: Unpack[Dict]
+    ) -> Tuple[torch.Tensor, Optional[torch.Tensor], Optional[Cache]]:
+        if attention_mask is not None:
+            assert len(attention_mask.shape) == 2, (
+                "Expected attention_mask as a 0-1 matrix with shape [batch_size, seq_len] "
+                "for padding purposes (0 indicating padding). "
+                "Arbitrary attention masks of shape [batch_size, seq_len, seq_len] are not allowed."
+            )
+
+        # pick the cheapest kernel for the current shape, e.g., the recurrent one for decoding
+        mode = select_mode(
+            'linear_attn', self.mode, hidden_states, self.num_heads, self.head_k_dim, self.head_v_dim, self.training
+        )
 
-    def forward(self, x):
-        mode = self.mode
-        q = self.q_proj(x)
-        k = self.k_proj(x)
-        v = self.v_proj(x)
+        last_state = None
+        if past_key_values is not None and len(past_key_values) > self.layer_idx:
+            last_state = past_key_values[self.layer_idx]
+
+        q = self.q_proj(hidden_states)
+        k = self.k_proj(hidden_states)
+        v = self.v_proj(hidden_states)
 
         q = rearrange(q, '... (h d) -> ... h d', d=self.head_k_dim)
         if self.num_kv_groups > 1:
@@ -129,32 +163,63 @@ class LinearAttention(nn.Module):
             q = q / (q.sum(-1, True) + 1e-4)
         if self.norm_k:
             k = k / (k.sum(-1, True) + 1e-4)
-
+        # dealing with left-padding, the padded keys contribute to neither the states nor the normalizers
+        if attention_mask is not None:
+            k = k.mul(attention_mask[:, -k.shape[1]:, None, None])
+
+        # the states are cached along with the running sums of the keys if the outputs are normalized
+        recurrent_state, normalizer = None, None
+        if last_state is not None:
+            recurrent_state = last_state['recurrent_state']
+            if self.do_feature_map_norm:
+                recurrent_state, normalizer = recurrent_state
         if mode == 'chunk':
-            o, final_state = chunk_linear_attn(
+            o, recurrent_state = chunk_linear_attn(
                 q=q,
                 k=k,
                 v=v,
-                normalize=self.do_feature_map_norm,
+                initial_state=recurrent_state,
+                output_final_state=use_cache,
+                normalize=False,
                 head_first=False
             )
         elif mode == 'fused_chunk':
-            o, final_state = fused_chunk_linear_attn(
+            o, recurrent_state = fused_chunk_linear_attn(
                 q=q,
                 k=k,
                 v=v,
-                normalize=self.do_feature_map_norm,
+                initial_state=recurrent_state,
+                output_final_state=use_cache,
+                normalize=False,
+                head_first=False
             )
         elif mode == 'fused_recurrent':
-            o, final_state = fused_recurrent_linear_attn(
+            o, recurrent_state = fused_recurrent_linear_attn(
                 q=q,
                 k=k,
                 v=v,
-                normalize=self.do_feature_map_norm,
+                initial_state=recurrent_state,
+                output_final_state=use_cache,
+                normalize=False,
+                head_first=False
             )
         else:
-            raise NotImplementedError
+            raise NotImplementedError(f"Not supported mode `{mode}`.")
+        if self.do_feature_map_norm:
+            z = k.float().cumsum(1)
+            if normalizer is not None:
+                z = z + normalizer[:, None]
+            o = (o / ((q.float() * q.shape[-1] ** -0.5 * z).sum(-1, True) + 1e-10)).to(o.dtype)
+            recurrent_state = (recurrent_state, z[:, -1])
+
+        if past_key_values is not None:
+            past_key_values.update(
+                recurrent_state=recurrent_state,
+                layer_idx=self.layer_idx,
+                offset=q.shape[1]
+            )
+
         o = self.norm(o)
         o = rearrange(o, '... h d -> ... (h d)')
         o = self.o_proj(o)
-        return o
+        return o, None, past_key_values
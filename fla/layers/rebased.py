@@ -7,7 +7,7 @@ https://github.com/corl-team/rebased/blob/main/flash_linear_attention/fla/layers
 
 from __future__ import annotations
 
-from typing import Optional
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
 
 import torch
 import torch.nn as nn
@@ -15,7 +15,12 @@ from einops import rearrange
 
 from fla.modules.feature_map import RebasedFeatureMap
 from fla.ops.linear_attn import chunk_linear_attn, fused_chunk_linear_attn
-from fla.ops.rebased import parallel_rebased
+from fla.ops.rebased import fused_recurrent_rebased, parallel_rebased
+
+if TYPE_CHECKING:
+    from transformers.processing_utils import Unpack
+
+    from fla.models.utils import Cache
 
 
 class ReBasedLinearAttention(nn.Module):
@@ -40,7 +45,7 @@ class ReBasedLinearAttention(nn.Module):
         self.hidden_size = hidden_size
         self.l_max = l_max
         self.mode = mode
-        assert self.mode in ["fused_chunk", "parallel", 'chunk']
+        assert self.mode in ["fused_chunk", "parallel", 'chunk', 'fused_recurrent']
 
         self.feature_dim = feature_dim
         self.num_key_value_heads = num_key_value_heads
@@ -61,13 +66,34 @@ class ReBasedLinearAttention(nn.Module):
         self.o_proj = nn.Linear(self.num_heads * self.head_dim, self.hidden_size, bias=False)
         self.dropout = nn.Identity()
 
-    def forward(self, hidden_states: torch.Tensor, **kwargs):
+    def forward(
+        self,
+        hidden_states: torch.Tensor,
+        attention_mask: Optional[torch.Tensor] = None,
+        past_key_values: Optional[Cache] = None,
+        use_cache: Optional[bool] = False,
+        output_attentions: Optional[bool] = False,
+        **kwargs: Unpack[Dict]
+    ) -> Tuple[torch.Tensor, Optional[torch.Tensor], Optional[Cache]]:
         mode = self.mode
+        last_state = None
+        if past_key_values is not None and len(past_key_values) > self.layer_idx:
+            last_state = past_key_values[self.layer_idx]
+        # the states of the quadratic features are only tracked by the recurrent kernel,
+        # which prefills the prompts token by token and then decodes each new token in O(1)
+        if use_cache and past_key_values is not None:
+            mode = 'fused_recurrent'
+
         q, k, v = self.q_proj(hidden_states), self.k_proj(hidden_states), self.v_proj(hidden_states)
-        q, k, v = map(lambda x: rearrange(x, "... (h d) -> ... h d", d=self.head_dim), [q, k, v])
-        q, k = self.feature_map(q, flatten=(mode != 'parallel')), self.feature_map(k, flatten=(mode != 'parallel'))
+        q, k = (rearrange(x, "... (h d) -> ... h d", d=self.feature_dim) for x in (q, k))
+        v = rearrange(v, "... (h d) -> ... h d", d=self.head_dim)
+        flatten = mode not in ('parallel', 'fused_recurrent')
+        q, k = self.feature_map(q, flatten=flatten), self.feature_map(k, flatten=flatten)
+        # dealing with left-padding, the padded keys contribute to neither the states nor the normalizers
+        if attention_mask is not None:
+            k = k.mul(attention_mask[:, -k.shape[1]:, None, None])
         if mode == "fused_chunk":
-            o = fused_chunk_linear_attn(
+            o, _ = fused_chunk_linear_attn(
                 q=q,
                 k=k,
                 v=v,
@@ -76,7 +102,7 @@ class ReBasedLinearAttention(nn.Module):
                 head_first=False
             )
         elif mode == 'chunk':
-            o = chunk_linear_attn(
+            o, _ = chunk_linear_attn(
                 q=q,
                 k=k,
                 v=v,
@@ -95,9 +121,30 @@ class ReBasedLinearAttention(nn.Module):
                 use_normalize=True,
                 head_first=False
             )
+        elif mode == 'fused_recurrent':
+            o, recurrent_state = fused_recurrent_rebased(
+                q=q,
+                k=k,
+                v=v,
+                eps=self.eps,
+                use_scale=True,
+                use_normalize=True,
+                initial_state=last_state['recurrent_state'] if last_state is not None else None,
+                output_final_state=use_cache,
+                head_first=False
+            )
+            if past_key_values is not None:
+                past_key_values.update(
+                    recurrent_state=recurrent_state,
+                    layer_idx=self.layer_idx,
+                    offset=q.shape[1]
+                )
+        else:
+            raise NotImplementedError(f"Not supported mode `{mode}`.")
+        o = rearrange(o, 'b t h d -> b t (h d)')
         o = self.o_proj(o)
         o = self.dropout(o)
-        return o
+        return o, None, past_key_values
 
     # https://github.com/HazyResearch/zoology/blob/main/zoology/mixers/based.py#L119
     def forward_reference(
@@ -13,6 +13,8 @@ from einops import rearrange
 
 from fla.modules import GroupNorm
 from fla.modules.activations import ACT2FN
+from fla.modules.token_shift import token_shift_lerp
+from fla.ops.registry import select_mode
 from fla.ops.rwkv6 import chunk_rwkv6, fused_recurrent_rwkv6
 
 if TYPE_CHECKING:
@@ -58,7 +60,6 @@ class RWKV6Attention(nn.Module):
         self.head_k_dim = self.key_dim // num_heads
         self.head_v_dim = self.value_dim // num_heads
 
-        self.time_shift = nn.ZeroPad2d((0, 0, 1, -1))
         self.x_proj = nn.Sequential(
             LerpLinear(hidden_size, proj_low_rank_dim * 5),
             nn.Tanh(),
@@ -108,8 +109,8 @@ class RWKV6Attention(nn.Module):
             )
 
         batch_size, seq_len, hidden_size = hidden_states.shape
-        # launching the triton kernel for just one token will actually be slower
-        mode = 'fused_recurrent' if hidden_states.shape[1] <= 64 else self.mode
+        # pick the cheapest kernel for the current shape, e.g., the recurrent one for short inputs
+        mode = select_mode('rwkv6', self.mode, hidden_states, self.num_heads, self.head_k_dim, self.head_v_dim, self.training)
 
         last_state = None
         if past_key_values is not None and len(past_key_values) > self.layer_idx:
@@ -117,23 +118,19 @@ class RWKV6Attention(nn.Module):
 
         if attention_mask is not None:
             hidden_states = hidden_states.mul_(attention_mask[:, -hidden_states.shape[-2]:, None])
-        if hidden_states.shape[1] == 1 and last_state is not None:
-            shifted = last_state['conv_state'].unsqueeze(1)
-        else:
-            shifted = self.time_shift(hidden_states)
-            if last_state is not None:
-                shifted[:, 0] = last_state['conv_state']
-
-        delta = shifted - hidden_states
-        x = self.x_proj[0](hidden_states, delta).view(batch_size, seq_len, -1, self.proj_low_rank_dim)
+        conv_state = last_state['conv_state'] if last_state is not None else None
+        cu_seqlens = kwargs.get('cu_seqlens', None)
+        # the token shift is fused into the lerps, so neither the shifted inputs nor their deltas are materialized
+        x = token_shift_lerp(hidden_states, self.x_proj[0].mu[None], conv_state, cu_seqlens)[0]
+        x = self.x_proj[0].linear(x).view(batch_size, seq_len, -1, self.proj_low_rank_dim)
         x = torch.einsum('b t n r, h n r-> b t n h', self.x_proj[1](x), self.x_proj[2].weight.view(hidden_size, 5, -1))
 
-        r, w, k, v, g = x.add_(self.x_bias).unbind(-2)
-        r = self.r_proj(hidden_states, r, delta)
-        w = self.w_proj(hidden_states, w, delta)
-        k = self.k_proj(hidden_states, k, delta)
-        v = self.v_proj(hidden_states, v, delta)
-        g = self.g_proj(hidden_states, g, delta)
+        r, w, k, v, g = token_shift_lerp(hidden_states, x.add_(self.x_bias), conv_state, cu_seqlens).unbind(0)
+        r = self.r_proj.linear(r)
+        w = self.w_proj.linear(w)
+        k = self.k_proj.linear(k)
+        v = self.v_proj.linear(v)
+        g = self.g_proj.linear(g)
 
         # dealing with left-padding
         if attention_mask is not None:
@@ -144,7 +141,6 @@ class RWKV6Attention(nn.Module):
         u = self.bonus
 
         recurrent_state = last_state['recurrent_state'] if last_state is not None else None
-        cu_seqlens = kwargs.get('cu_seqlens', None)
         if mode == 'fused_recurrent':
             o, recurrent_state = fused_recurrent_rwkv6(
                 r=r,
@@ -177,7 +173,7 @@ class RWKV6Attention(nn.Module):
         if past_key_values is not None:
             past_key_values.update(
                 recurrent_state=recurrent_state,
-                conv_state=hidden_states[:, -1],
+                conv_state=hidden_states[:, -1] if cu_seqlens is None else hidden_states[0, cu_seqlens[1:] - 1],
                 layer_idx=self.layer_idx,
                 offset=r.shape[2]
             )
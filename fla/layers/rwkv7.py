@@ -13,6 +13,8 @@ from torch.nn import functional as F
 from fla.layers.rwkv6 import LoRA
 from fla.modules import GroupNorm
 from fla.modules.l2norm import l2_norm
+from fla.modules.token_shift import token_shift_lerp
+from fla.ops.registry import select_mode
 from fla.ops.rwkv7 import chunk_rwkv7, fused_recurrent_rwkv7
 
 if TYPE_CHECKING:
@@ -63,8 +65,6 @@ class RWKV7Attention(nn.Module):
         self.layer_idx = layer_idx
         self.fuse_norm = fuse_norm
 
-        self.time_shift = nn.ZeroPad2d((0, 0, 1, -1))
-
         self.x_x = nn.Parameter(torch.zeros(6, hidden_size))
 
         self.k_k = nn.Parameter(torch.zeros(self.key_dim))
@@ -134,8 +134,8 @@ class RWKV7Attention(nn.Module):
             # if training, use chunk mode no matter how short the sequence is
             mode = 'chunk'
         else:
-            # launching the triton kernel for just one token will actually be slower
-            mode = 'fused_recurrent' if hidden_states.shape[1] <= 64 else self.mode
+            # pick the cheapest kernel for the current shape, e.g., the recurrent one for short inputs
+            mode = select_mode('rwkv7', self.mode, hidden_states, self.num_heads, self.head_dim, self.head_v_dim)
 
         last_state = None
         if past_key_values is not None and len(past_key_values) > self.layer_idx:
@@ -143,16 +143,10 @@ class RWKV7Attention(nn.Module):
 
         if attention_mask is not None:
             hidden_states = hidden_states.mul(attention_mask[:, -hidden_states.shape[-2]:, None])
-        if hidden_states.shape[1] == 1 and last_state is not None:
-            shifted = last_state['conv_state'].unsqueeze(1)
-        else:
-            shifted = self.time_shift(hidden_states)
-            if last_state is not None:
-                shifted[:, 0] = last_state['conv_state']
-
-        # [batch_size, seq_len, hidden_size]
-        delta = shifted - hidden_states
-        xr, xw, xk, xv, xa, xg = hidden_states.addcmul(delta, self.x_x.view(6, 1, 1, -1)).unbind(0)
+        cu_seqlens = kwargs.get('cu_seqlens', None)
+        conv_state = last_state['conv_state'] if last_state is not None else None
+        # [batch_size, seq_len, hidden_size], the token shift is fused into the lerps
+        xr, xw, xk, xv, xa, xg = token_shift_lerp(hidden_states, self.x_x, conv_state, cu_seqlens).unbind(0)
 
         r = self.r_proj(xr)
         # -math.exp(-0.5) = -0.6065306597126334
@@ -187,7 +181,6 @@ class RWKV7Attention(nn.Module):
         recurrent_state = last_state['recurrent_state'] if last_state is not None else None
 
         rwkv7_fn = chunk_rwkv7 if mode == 'chunk' else fused_recurrent_rwkv7
-        cu_seqlens = kwargs.get('cu_seqlens', None)
         o, recurrent_state = rwkv7_fn(
             r=r,
             w=w,
@@ -205,7 +198,7 @@ class RWKV7Attention(nn.Module):
         if past_key_values is not None:
             past_key_values.update(
                 recurrent_state=recurrent_state,
-                conv_state=hidden_states[:, -1],
+                conv_state=hidden_states[:, -1] if cu_seqlens is None else hidden_states[0, cu_seqlens[1:] - 1],
                 layer_idx=self.layer_idx,
                 offset=r.shape[1]
             )
@@ -13,6 +13,7 @@ from einops import rearrange, repeat
 from fla.modules import FusedRMSNormGated, RMSNorm, ShortConvolution
 from fla.modules.activations import ACT2FN
 from fla.ops.common.utils import prepare_position_ids, prepare_sequence_ids
+from fla.ops.registry import select_mode
 from fla.ops.simple_gla import chunk_simple_gla, fused_recurrent_simple_gla
 
 if TYPE_CHECKING:
@@ -156,12 +157,20 @@ class SimpleGatedLinearAttention(nn.Module):
                 "Arbitrary attention masks of shape [batch_size, seq_len, seq_len] are not allowed."
             )
 
-        # launching the triton kernel for just one token will actually be slower
-        mode = 'fused_recurrent' if hidden_states.shape[1] <= 64 else self.mode
+        # pick the cheapest kernel for the current shape, e.g., the recurrent one for short inputs
+        mode = select_mode(
+            'simple_gla', self.mode, hidden_states, self.num_heads, self.head_k_dim, self.head_v_dim, self.training
+        )
 
         last_state = None
         if past_key_values is not None and len(past_key_values) > self.layer_idx:
             last_state = past_key_values[self.layer_idx]
+        # keep the states after each token to roll back the rejected draft tokens in speculative decoding
+        checkpointing = use_cache and past_key_values is not None and past_key_values.checkpointing
+        # the recurrent states of the requests are read from and written to the slots of a `StatePool` in-place
+        state_indices = past_key_values.state_indices if past_key_values is not None else None
+        if checkpointing or state_indices is not None:
+            mode = 'fused_recurrent'
 
         cu_seqlens, position_ids, seq_idx = kwargs.get('cu_seqlens', None), kwargs.get('position_ids', None), None
         if self.use_short_conv:
@@ -173,7 +182,7 @@ class SimpleGatedLinearAttention(nn.Module):
                 if position_ids is not None:
                     seq_idx = prepare_sequence_ids(position_ids)
                 else:
-                    seq_idx = prepare_sequence_ids(prepare_position_ids(cu_seqlens))
+                    seq_idx = prepare_sequence_ids(prepare_position_ids(cu_seqlens, hidden_states.shape[1]))
                 seq_idx = seq_idx.to(torch.int32).unsqueeze(0)
             q, conv_state_q = self.q_conv1d(x=self.q_proj(hidden_states),
                                             mask=conv_mask,
@@ -229,7 +238,9 @@ class SimpleGatedLinearAttention(nn.Module):
                 initial_state=recurrent_state,
                 output_final_state=use_cache,
                 cu_seqlens=cu_seqlens,
-                head_first=False
+                head_first=False,
+                state_indices=state_indices,
+                output_intermediate_states=checkpointing
             )
         else:
             raise NotImplementedError(f"Not supported mode `{mode}`.")
@@ -239,7 +250,8 @@ class SimpleGatedLinearAttention(nn.Module):
                 recurrent_state=recurrent_state,
                 conv_state=(conv_state_q, conv_state_k, conv_state_v) if self.use_short_conv else None,
                 layer_idx=self.layer_idx,
-                offset=q.shape[1]
+                offset=q.shape[1],
+                cache_kwargs=dict(intermediate_states=checkpointing, supports_state_indices=True)
             )
 
         g = self.g_proj(hidden_states)
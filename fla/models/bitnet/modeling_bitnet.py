@@ -10,7 +10,6 @@ import torch
 import torch.nn as nn
 import torch.utils.checkpoint
 from transformers.activations import ACT2FN
-from transformers.generation import GenerationMixin
 from transformers.modeling_outputs import BaseModelOutputWithPast, CausalLMOutputWithPast
 from transformers.modeling_utils import PreTrainedModel
 from transformers.utils import logging
@@ -18,7 +17,7 @@ from transformers.utils.deprecation import deprecate_kwarg
 
 from fla.layers.bitattn import BitAttention
 from fla.models.bitnet.configuration_bitnet import BitNetConfig
-from fla.models.utils import Cache
+from fla.models.utils import Cache, FLAGenerationMixin, PrefixStateCache
 from fla.modules import FusedCrossEntropyLoss, FusedLinearCrossEntropyLoss, RMSNorm
 from fla.modules.activations import swiglu
 from fla.modules.fused_bitlinear import FusedBitLinear
@@ -303,7 +302,7 @@ class BitNetModel(BitNetPreTrainedModel):
         )
 
 
-class BitNetForCausalLM(BitNetPreTrainedModel, GenerationMixin):
+class BitNetForCausalLM(BitNetPreTrainedModel, FLAGenerationMixin):
 
     _tied_weights_keys = ["lm_head.weight"]
 
@@ -344,11 +343,15 @@ class BitNetForCausalLM(BitNetPreTrainedModel, GenerationMixin):
         inputs_embeds: Optional[torch.Tensor] = None,
         use_cache: bool = True,
         logits_to_keep: Optional[int] = None,
+        prefix_cache: Optional[PrefixStateCache] = None,
         **kwargs
     ):
         # only last token for `inputs_ids` if the `past_key_values` is not empty.
         if past_key_values is not None and len(past_key_values) > 0:
             input_ids = input_ids[:, -1:]
+        elif prefix_cache is not None and inputs_embeds is None:
+            # only prefill the tokens after the longest cached prefix
+            input_ids, past_key_values = prefix_cache.restore(input_ids, past_key_values)
         # if `inputs_embeds` are passed, we only want to use them in the 1st generation step
         if inputs_embeds is not None and len(past_key_values) == 0:
             model_inputs = {'inputs_embeds': inputs_embeds}
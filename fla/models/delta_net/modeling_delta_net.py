@@ -9,7 +9,6 @@ from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
 import torch
 import torch.nn as nn
 import torch.utils.checkpoint
-from transformers.generation import GenerationMixin
 from transformers.modeling_outputs import BaseModelOutputWithPast, CausalLMOutputWithPast
 from transformers.modeling_utils import PreTrainedModel
 from transformers.utils import logging
@@ -18,7 +17,7 @@ from transformers.utils.deprecation import deprecate_kwarg
 from fla.layers.attn import Attention
 from fla.layers.delta_net import DeltaNet
 from fla.models.delta_net.configuration_delta_net import DeltaNetConfig
-from fla.models.utils import Cache
+from fla.models.utils import Cache, FLAGenerationMixin, PrefixStateCache
 from fla.modules import FusedCrossEntropyLoss, FusedLinearCrossEntropyLoss
 from fla.modules import GatedMLP as DeltaNetMLP
 from fla.modules import RMSNorm
@@ -265,7 +264,7 @@ class DeltaNetModel(DeltaNetPreTrainedModel):
         )
 
 
-class DeltaNetForCausalLM(DeltaNetPreTrainedModel, GenerationMixin):
+class DeltaNetForCausalLM(DeltaNetPreTrainedModel, FLAGenerationMixin):
 
     _tied_weights_keys = ["lm_head.weight"]
 
@@ -300,15 +299,15 @@ class DeltaNetForCausalLM(DeltaNetPreTrainedModel, GenerationMixin):
     def generate(self, *args, **kwargs):
         try:
             return super().generate(*args, **kwargs)
-        except AttributeError as exception:
-            if 'past_key_values' in str(exception):
-                raise AttributeError(
-                    f"You tried to call `generate` with a decoding strategy that manipulates `past_key_values`, "
-                    f"which is not supported for {self.__class__.__name__}. "
-                    f"Try another generation strategy instead. "
+        except (AttributeError, ValueError) as exception:
+            if 'past_key_values' in str(exception) or 'contrastive search' in str(exception):
+                raise type(exception)(
+                    f"You tried to call `generate` with a decoding strategy not supported for {self.__class__.__name__}, "
+                    f"e.g., contrastive search, which crops `past_key_values` and cannot be applied to recurrent states. "
+                    f"Greedy search, sampling and beam search are supported. "
                     f"For the available generation strategies, check this doc: "
                     f"https://huggingface.co/docs/transformers/en/generation_strategies#decoding-strategies"
-                )
+                ) from exception
             else:
                 raise exception
 
@@ -321,11 +320,15 @@ class DeltaNetForCausalLM(DeltaNetPreTrainedModel, GenerationMixin):
         inputs_embeds: Optional[torch.Tensor] = None,
         use_cache: bool = True,
         logits_to_keep: Optional[int] = None,
+        prefix_cache: Optional[PrefixStateCache] = None,
         **kwargs
     ):
         # only last token for `inputs_ids` if the `past_key_values` is not empty.
         if past_key_values is not None and len(past_key_values) > 0:
             input_ids = input_ids[:, -1:]
+        elif prefix_cache is not None and inputs_embeds is None:
+            # only prefill the tokens after the longest cached prefix
+            input_ids, past_key_values = prefix_cache.restore(input_ids, past_key_values)
         # if `inputs_embeds` are passed, we only want to use them in the 1st generation step
         if inputs_embeds is not None and len(past_key_values) == 0:
             model_inputs = {'inputs_embeds': inputs_embeds}
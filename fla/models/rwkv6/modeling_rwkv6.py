@@ -9,7 +9,6 @@ from typing import TYPE_CHECKING, Dict, Optional, Tuple, Union
 import torch
 import torch.nn as nn
 import torch.utils.checkpoint
-from transformers.generation import GenerationMixin
 from transformers.modeling_outputs import BaseModelOutputWithPast, CausalLMOutputWithPast
 from transformers.modeling_utils import PreTrainedModel
 from transformers.utils import logging
@@ -18,9 +17,10 @@ from transformers.utils.deprecation import deprecate_kwarg
 from fla.layers.attn import Attention
 from fla.layers.rwkv6 import LerpLinear, RWKV6Attention
 from fla.models.rwkv6.configuration_rwkv6 import RWKV6Config
-from fla.models.utils import Cache
+from fla.models.utils import Cache, FLAGenerationMixin, PrefixStateCache
 from fla.modules import FusedCrossEntropyLoss, FusedLinearCrossEntropyLoss, LayerNorm
 from fla.modules.activations import ACT2FN
+from fla.modules.token_shift import token_shift_lerp
 
 if TYPE_CHECKING:
     from transformers.processing_utils import Unpack
@@ -49,8 +49,6 @@ class RWKV6FeedForward(nn.Module):
         self.hidden_ratio = hidden_ratio
         self.intermediate_size = intermediate_size
 
-        self.time_shift = nn.ZeroPad2d((0, 0, 1, -1))
-
         self.key = LerpLinear(hidden_size, intermediate_size)
         self.value = nn.Linear(intermediate_size, hidden_size, bias=False)
         self.receptance = LerpLinear(hidden_size, hidden_size)
@@ -62,24 +60,23 @@ class RWKV6FeedForward(nn.Module):
         self,
         x: torch.Tensor,
         attention_mask: Optional[torch.Tensor] = None,
-        state: Optional[Cache] = None
+        state: Optional[Cache] = None,
+        **kwargs
     ) -> torch.Tensor:
         if attention_mask is not None:
             x = x.mul_(attention_mask[:, -x.shape[-2]:, None])
-        if x.shape[1] == 1 and state is not None and state[self.layer_idx]['ffn_state'] is not None:
-            shifted = state[self.layer_idx]['ffn_state'].unsqueeze(1)
-        else:
-            shifted = self.time_shift(x)
-            if state is not None and state[self.layer_idx]['ffn_state'] is not None:
-                shifted[:, 0] = state[self.layer_idx]['ffn_state']
-        delta = shifted - x
-        key = self.act_fn(self.key(x, delta))
+        cu_seqlens = kwargs.get('cu_seqlens', None)
+        ffn_state = state[self.layer_idx]['ffn_state'] if state is not None else None
+        mu = torch.stack((self.key.mu, self.receptance.mu))
+        key, receptance = token_shift_lerp(x, mu, ffn_state, cu_seqlens).unbind(0)
+        key = self.act_fn(self.key.linear(key))
         value = self.value(key)
-        receptance = self.receptance(x, delta)
+        receptance = self.receptance.linear(receptance)
 
         if state is not None:
             # no need to update the offset twice
-            state.update(ffn_state=x[:, -1], layer_idx=self.layer_idx, offset=0)
+            ffn_state = x[:, -1] if cu_seqlens is None else x[0, cu_seqlens[1:] - 1]
+            state.update(ffn_state=ffn_state, layer_idx=self.layer_idx, offset=0)
         return receptance.sigmoid() * value, state
 
 
@@ -163,7 +160,7 @@ class RWKV6Block(nn.Module):
             hidden_states = residual + hidden_states
             residual = hidden_states
             hidden_states = self.ffn_norm(hidden_states)
-        hidden_states, past_key_values = self.ffn(hidden_states, attention_mask, past_key_values)
+        hidden_states, past_key_values = self.ffn(hidden_states, attention_mask, past_key_values, **kwargs)
         hidden_states = residual + hidden_states
 
         outputs = (hidden_states, attentions, past_key_values)
@@ -330,7 +327,7 @@ class RWKV6Model(RWKV6PreTrainedModel):
         )
 
 
-class RWKV6ForCausalLM(RWKV6PreTrainedModel, GenerationMixin):
+class RWKV6ForCausalLM(RWKV6PreTrainedModel, FLAGenerationMixin):
 
     _tied_weights_keys = ["lm_head.weight"]
 
@@ -365,15 +362,15 @@ class RWKV6ForCausalLM(RWKV6PreTrainedModel, GenerationMixin):
     def generate(self, *args, **kwargs):
         try:
             return super().generate(*args, **kwargs)
-        except AttributeError as exception:
-            if 'past_key_values' in str(exception):
-                raise AttributeError(
-                    f"You tried to call `generate` with a decoding strategy that manipulates `past_key_values`, "
-                    f"which is not supported for {self.__class__.__name__}. "
-                    f"Try another generation strategy instead. "
+        except (AttributeError, ValueError) as exception:
+            if 'past_key_values' in str(exception) or 'contrastive search' in str(exception):
+                raise type(exception)(
+                    f"You tried to call `generate` with a decoding strategy not supported for {self.__class__.__name__}, "
+                    f"e.g., contrastive search, which crops `past_key_values` and cannot be applied to recurrent states. "
+                    f"Greedy search, sampling and beam search are supported. "
                     f"For the available generation strategies, check this doc: "
                     f"https://huggingface.co/docs/transformers/en/generation_strategies#decoding-strategies"
-                )
+                ) from exception
             else:
                 raise exception
 
@@ -386,11 +383,15 @@ class RWKV6ForCausalLM(RWKV6PreTrainedModel, GenerationMixin):
         inputs_embeds: Optional[torch.Tensor] = None,
         use_cache: bool = True,
         logits_to_keep: Optional[int] = None,
+        prefix_cache: Optional[PrefixStateCache] = None,
         **kwargs
     ):
         # only last token for `inputs_ids` if the `past_key_values` is not empty.
         if past_key_values is not None and len(past_key_values) > 0:
             input_ids = input_ids[:, -1:]
+        elif prefix_cache is not None and inputs_embeds is None:
+            # only prefill the tokens after the longest cached prefix
+            input_ids, past_key_values = prefix_cache.restore(input_ids, past_key_values)
         # if `inputs_embeds` are passed, we only want to use them in the 1st generation step
         if inputs_embeds is not None and len(past_key_values) == 0:
             model_inputs = {'inputs_embeds': inputs_embeds}
@@ -2,10 +2,25 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Tuple
+import copy
+import hashlib
+import json
+import mmap
+import struct
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
 
 import torch
 import transformers
+from safetensors.torch import load_file, save_file
+from transformers.generation import GenerationMixin
+from transformers.modeling_outputs import CausalLMOutputWithPast
+
+SAFETENSORS_DTYPES = {
+    'F64': torch.float64, 'F32': torch.float32, 'F16': torch.float16, 'BF16': torch.bfloat16,
+    'F8_E4M3': torch.float8_e4m3fn, 'F8_E5M2': torch.float8_e5m2,
+    'I64': torch.int64, 'I32': torch.int32, 'I16': torch.int16, 'I8': torch.int8, 'U8': torch.uint8, 'BOOL': torch.bool
+}
 
 
 class Cache(transformers.cache_utils.Cache):
@@ -13,6 +28,8 @@ class Cache(transformers.cache_utils.Cache):
     A cache used for storing hidden states produced by flash linear attention models.
 
     It stores the states of each layer as the tensor of shape `[batch_size, key_dim, value_dim]`.
+    For attention layers with a sliding window, the key/value states are kept in preallocated ring buffers,
+    and `attn_state` is a chronologically ordered view of the last `window_size` tokens.
     """
 
     is_compileable = True
@@ -26,15 +43,25 @@ class Cache(transformers.cache_utils.Cache):
         self.states: List[Dict[str, Any]] = []
 
         self._seen_tokens = seen_tokens  # Used in `generate` to keep tally of how many tokens the cache has seen
+        # events marking the completion of the asynchronous copies of each layer issued by `prefetch`
+        self._prefetch_events: Dict[int, Any] = {}
+        # events marking the completion of the asynchronous copies of each layer to the host issued by `offload`
+        self._offload_events: Dict[int, List[Any]] = {}
+        # the states kept by `checkpoint` to roll back the tokens processed afterwards
+        self._checkpoint: Optional[Dict[str, Any]] = None
+        # slots of the requests in the pooled recurrent states, which are then updated in-place, see `StatePool.gather`
+        self.state_indices: Optional[torch.LongTensor] = None
 
     def __getitem__(self, layer_idx: int) -> Dict[str, Any]:
         if layer_idx < len(self):
+            self._wait(layer_idx)
             return self.states[layer_idx]
         else:
             raise KeyError(f"Cache only has {len(self)} layers, attempted to access layer with index {layer_idx}")
 
     def __iter__(self):
-        for state in self.states:
+        for layer_idx, state in enumerate(self.states):
+            self._wait(layer_idx)
             yield state
 
     def __len__(self):
@@ -66,6 +93,11 @@ class Cache(transformers.cache_utils.Cache):
                 The number of new tokens being processed.
             cache_kwargs (`Dict[str, Any]`, `optional`):
                 Additional arguments for the cache subclass.
+                `window_size` keeps only the key/value states of the last `window_size` tokens.
+                `intermediate_states` indicates that `recurrent_state` holds the states after each new token
+                stacked along dim 1, the last of which is cached. See `checkpoint`.
+                `supports_state_indices` marks layers taking `state_indices` to update the states of a `StatePool`
+                in-place. See `StatePool.gather`.
 
         Return:
             Dictionary of the updated state.
@@ -74,50 +106,117 @@ class Cache(transformers.cache_utils.Cache):
         # Update the number of seen tokens
         if layer_idx == 0:
             self._seen_tokens += offset
+        if layer_idx < len(self.states):
+            self._wait(layer_idx)
 
+        if self._checkpoint is not None:
+            self._keep_checkpoint(recurrent_state, attn_state, layer_idx, cache_kwargs)
+        if recurrent_state is not None and (cache_kwargs or {}).get('intermediate_states', False):
+            recurrent_state = self._index_state(recurrent_state, -1)
+
+        window_size, attn_output = None, None
         if attn_state is not None:
-            input_size = attn_state[0].shape[-2]
-            window_size = cache_kwargs.get('window_size', None)
             if not isinstance(attn_state, Tuple) or len(attn_state) != 2:
                 raise ValueError("`attn_state` must be a tuple of two tensors for key/value states")
+            window_size = (cache_kwargs or {}).get('window_size', None)
         if len(self.states) <= layer_idx:
-            if attn_state is not None:
-                if window_size is not None and input_size > window_size:
-                    attn_state = (attn_state[0][..., -window_size:, :].contiguous(),
-                                  attn_state[1][..., -window_size:, :].contiguous())
             state = dict(
                 recurrent_state=recurrent_state,
-                attn_state=attn_state,
+                attn_state=None if window_size is not None else attn_state,
                 conv_state=conv_state,
                 ffn_state=ffn_state
             )
             self.states.append(state)
+            if window_size is not None:
+                self._update_window(state, attn_state, window_size)
         else:
             state = self.states[layer_idx]
             if recurrent_state is not None:
                 state['recurrent_state'] = recurrent_state
             if attn_state is not None:
-                key_state, value_state = state['attn_state']
-                if window_size is not None and key_state.shape[-2] == window_size:
-                    # DO NOT allocate new memory if the cache is full
-                    # roll the key/value states to the left by `input_size`
-                    key_state = key_state.roll(-input_size, -2)
-                    value_state = value_state.roll(-input_size, -2)
-                    # replace the last `input_size` tokens with the new key/value states
-                    key_state[..., -input_size:, :] = attn_state[0]
-                    value_state[..., -input_size:, :] = attn_state[1]
-                    attn_state = (key_state, value_state)
+                if window_size is not None:
+                    if attn_state[0].shape[-2] > 1 and state['attn_state'] is not None:
+                        # the queries of a multi-token update, e.g., in chunked prefilling,
+                        # still need to attend to the cached tokens that are evicted by the update
+                        attn_output = tuple(torch.cat((x, y), -2) for x, y in zip(state['attn_state'], attn_state))
+                    self._update_window(state, attn_state, window_size)
+                elif state['attn_state'] is None:
+                    state['attn_state'] = attn_state
                 else:
-                    attn_state = (torch.cat([key_state, attn_state[0]], -2),
-                                  torch.cat([value_state, attn_state[1]], -2),)
-                state['attn_state'] = attn_state
+                    key_state, value_state = state['attn_state']
+                    state['attn_state'] = (torch.cat([key_state, attn_state[0]], -2),
+                                           torch.cat([value_state, attn_state[1]], -2))
             if conv_state is not None:
                 state['conv_state'] = conv_state
             if ffn_state is not None:
                 state['ffn_state'] = ffn_state
+        if (cache_kwargs or {}).get('supports_state_indices', False):
+            state['supports_state_indices'] = True
 
+        if attn_output is not None:
+            return dict(state, attn_state=attn_output)
         return state
 
+    def _update_window(
+        self,
+        state: Dict[str, Any],
+        attn_state: Tuple[torch.Tensor, torch.Tensor],
+        window_size: int
+    ) -> None:
+        """
+        Writes new key/value states into the preallocated sliding-window buffers of a layer.
+
+        The buffers of shape `[..., 2 * window_size, dim]` are used as a mirrored ring buffer:
+        each token is written to both slot `i` and slot `i + window_size`,
+        so that the last `window_size` tokens always form a contiguous, chronologically ordered slice.
+        This makes each step cost O(`input_size`) writes instead of rolling or reallocating the whole window,
+        and `state['attn_state']` can be exposed as a zero-copy view with a fixed shape once the window is full.
+        """
+        if state.get('attn_buffer') is None:
+            key_state, value_state = attn_state
+            shape = key_state.shape[:-2] + (2 * window_size, key_state.shape[-1])
+            state['attn_buffer'] = (key_state.new_zeros(shape), value_state.new_zeros(shape))
+            state['attn_offset'] = 0
+            # states converted from legacy caches are not backed by buffers yet
+            if state['attn_state'] is not None:
+                self._write_window(state, state['attn_state'], window_size)
+        self._write_window(state, attn_state, window_size)
+
+    def _write_window(
+        self,
+        state: Dict[str, Any],
+        attn_state: Tuple[torch.Tensor, torch.Tensor],
+        window_size: int
+    ) -> None:
+        if any(x.stride(0) == 0 and x.shape[0] > 1 for x in state['attn_buffer']):
+            # copy the buffers shared by the sequences forked from the same one on write
+            state['attn_buffer'] = tuple(x.contiguous() for x in state['attn_buffer'])
+        input_size = attn_state[0].shape[-2]
+        # only the last `window_size` tokens could be attended to in the future
+        size = min(input_size, window_size)
+        start = (state['attn_offset'] + input_size - size) % window_size
+        end = start + size
+        for buffer, x in zip(state['attn_buffer'], attn_state):
+            x = x[..., -size:, :]
+            buffer[..., start:end, :] = x
+            # mirror the written slots to the other half of the buffer
+            buffer[..., start + window_size:min(end, window_size) + window_size, :] = x[..., :window_size - start, :]
+            if end > window_size:
+                buffer[..., :end - window_size, :] = x[..., window_size - start:, :]
+        state['attn_offset'] += input_size
+        state['attn_state'] = self._window_view(state, window_size)
+
+    @staticmethod
+    def _window_view(state: Dict[str, Any], window_size: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Returns the cached key/value states of the window in chronological order without copying."""
+        offset = state['attn_offset']
+        if offset < window_size:
+            start, end = 0, offset
+        else:
+            start = offset % window_size
+            end = start + window_size
+        return tuple(buffer[..., start:end, :] for buffer in state['attn_buffer'])
+
     def get_seq_length(self, layer_idx: Optional[int] = 0) -> int:
         """Returns the sequence length of the cached states. A layer index can be optionally passed."""
         if len(self.states) <= layer_idx:
@@ -128,6 +227,390 @@ class Cache(transformers.cache_utils.Cache):
         """Returns the maximum sequence length of the cached states. Cache does not have a maximum length."""
         return None
 
+    def reorder_cache(self, beam_idx: torch.LongTensor):
+        """Reorders the cached states of all layers in-place for beam search, given the selected beam indices."""
+        def fn(x: torch.Tensor) -> torch.Tensor:
+            # states shared by all sequences after `fork` are left as is
+            if x.stride(0) == 0:
+                return x
+            return x.copy_(x.index_select(0, beam_idx.to(x.device)))
+        self._apply(fn)
+
+    def batch_repeat_interleave(self, repeats: int):
+        """Repeats the cached states along the batch dimension, following `DynamicCache.batch_repeat_interleave`."""
+        self._apply(lambda x: x.repeat_interleave(repeats, dim=0))
+
+    def batch_select_indices(self, indices: torch.Tensor):
+        """Only keeps the cached states of the selected batch indices, following `DynamicCache.batch_select_indices`."""
+        self._apply(lambda x: x[indices])
+
+    def fork(self, num_copies: int) -> Cache:
+        """
+        Returns a new cache with the states of each sequence replicated `num_copies` times along the batch dimension,
+        e.g., to draw multiple samples from a prompt that is prefilled only once.
+
+        The copies of each sequence are adjacent as in `repeat_interleave`, and the cache itself is left unchanged.
+        When forking a single sequence, the states are shared copy-on-write by expanding them without copying:
+        the layers replace rather than modify the recurrent and key/value states,
+        and the sliding-window buffers are only copied by the first update writing into them.
+        The convolution states, which are updated in-place, are always copied.
+        """
+        if num_copies <= 0:
+            raise ValueError(f"`num_copies` must be positive, but got {num_copies}")
+        self._wait()
+        cache = copy.copy(self)
+        cache.states = [dict(state) for state in self.states]
+        cache._prefetch_events, cache._offload_events = {}, {}
+        cache._checkpoint = None
+
+        def repeat(x: torch.Tensor) -> torch.Tensor:
+            return x.repeat_interleave(num_copies, dim=0)
+
+        def share(x: torch.Tensor) -> torch.Tensor:
+            if x.shape[0] == 1 and num_copies > 1:
+                return x.expand(num_copies, *x.shape[1:])
+            return repeat(x)
+
+        for state in cache.states:
+            conv_state = state['conv_state']
+            self._apply_state(state, share)
+            state['conv_state'] = self._apply_state(dict(conv_state=conv_state), repeat)['conv_state']
+        return cache
+
+    def crop(self, max_length: int):
+        """
+        Crops the cache to the first `max_length` tokens, or removes the last `abs(max_length)` tokens if negative.
+
+        Only key/value states can be cropped, the recurrent/convolution states have already absorbed the cropped tokens.
+        """
+        if max_length < 0:
+            max_length = self._seen_tokens - abs(max_length)
+        if self._seen_tokens <= max_length:
+            return
+        num_tokens = self._seen_tokens - max_length
+        for state in self.states:
+            if any(state[key] is not None for key in ('recurrent_state', 'conv_state', 'ffn_state')):
+                raise ValueError("Recurrent states can not be cropped as the last tokens are no longer separable.")
+            if state['attn_state'] is None:
+                continue
+            if state.get('attn_buffer') is not None:
+                window_size = state['attn_buffer'][0].shape[-2] // 2
+                if state['attn_offset'] > window_size:
+                    raise ValueError("Sliding-window states can not be cropped once the earliest tokens are evicted.")
+                state['attn_offset'] -= num_tokens
+                state['attn_state'] = self._window_view(state, window_size)
+            else:
+                state['attn_state'] = tuple(x[..., :max_length, :] for x in state['attn_state'])
+        self._seen_tokens = max_length
+
+    @property
+    def checkpointing(self) -> bool:
+        """Whether the layers are expected to pass the states after each new token to `update`."""
+        return self._checkpoint is not None
+
+    def checkpoint(self, num_tokens: int) -> None:
+        """
+        Keeps the states needed to roll back up to `num_tokens` tokens processed afterwards,
+        e.g., the draft tokens verified in a single forward pass of speculative decoding.
+
+        While checkpointing, layers with recurrent states pass the states after each new token to `update`,
+        and convolution states are widened by `num_tokens` to keep a longer history of inputs.
+        Each checkpoint is expected to be concluded by `rollback`, or `rollback(0)` if all the tokens are accepted.
+        """
+        if num_tokens <= 0:
+            raise ValueError(f"`num_tokens` must be positive, but got {num_tokens}")
+        self._wait()
+        if self._checkpoint is not None:
+            self.rollback(0)
+        self._checkpoint = dict(num_tokens=num_tokens, seen_tokens=self._seen_tokens, states={})
+        for layer_idx, state in enumerate(self.states):
+            saved = self._checkpoint['states'].setdefault(layer_idx, {})
+            saved['initial_state'] = state['recurrent_state']
+            if state.get('attn_buffer') is not None:
+                saved['window'] = tuple(x.clone() for x in state['attn_state'])
+            if state['conv_state'] is not None:
+                saved['conv_size'] = [x.shape[-1] if isinstance(x, torch.Tensor) else None for x in state['conv_state']]
+                state['conv_state'] = tuple(
+                    torch.cat((x.new_zeros(*x.shape[:-1], num_tokens), x), -1) if isinstance(x, torch.Tensor) else x
+                    for x in state['conv_state']
+                )
+
+    def rollback(self, num_tokens: int) -> None:
+        """
+        Removes the last `num_tokens` tokens processed since `checkpoint`, e.g., the rejected draft tokens,
+        by restoring the states after the last accepted token, and stops checkpointing.
+
+        Only layers passing intermediate recurrent states to `update` can be rolled back,
+        which is the case for the layers running the `fused_recurrent` kernels of GLA, SimpleGLA, RetNet,
+        DeltaNet, Gated DeltaNet, HGRN2 and LightNet.
+        """
+        if self._checkpoint is None:
+            raise ValueError("`checkpoint` must be called before `rollback`.")
+        self._wait()
+        checkpoint = self._checkpoint
+        num_new_tokens = self._seen_tokens - checkpoint['seen_tokens']
+        if not 0 <= num_tokens <= min(num_new_tokens, checkpoint['num_tokens']):
+            raise ValueError(f"Only up to {min(num_new_tokens, checkpoint['num_tokens'])} tokens can be rolled back, "
+                             f"but got {num_tokens}.")
+        if num_tokens > 0:
+            for layer_idx, state in enumerate(self.states):
+                saved = checkpoint['states'].get(layer_idx, {})
+                if state['recurrent_state'] is not None and 'recurrent_state' not in saved:
+                    raise NotImplementedError(f"Layer {layer_idx} did not keep its intermediate recurrent states.")
+                if state['conv_state'] is not None and 'conv_size' not in saved:
+                    raise NotImplementedError(f"The `conv_state` of layer {layer_idx} was created after `checkpoint`.")
+                if state['ffn_state'] is not None:
+                    raise NotImplementedError(f"The `ffn_state` of layer {layer_idx} can not be rolled back.")
+        self._checkpoint = None
+
+        # index of the state after the last accepted token among the new ones, -1 for the state before them
+        last = num_new_tokens - num_tokens - 1
+        for layer_idx, state in enumerate(self.states):
+            saved = checkpoint['states'].get(layer_idx, {})
+            if state['conv_state'] is not None and 'conv_size' in saved:
+                # the widened convolution states hold the inputs of the last `conv_size + num_tokens` tokens
+                state['conv_state'] = tuple(
+                    x[..., x.shape[-1] - size - num_tokens:x.shape[-1] - num_tokens].contiguous() if size is not None else x
+                    for x, size in zip(state['conv_state'], saved['conv_size'])
+                )
+            if num_tokens == 0:
+                continue
+            if state['recurrent_state'] is not None:
+                if last < 0:
+                    state['recurrent_state'] = saved.get('initial_state')
+                else:
+                    state['recurrent_state'] = self._index_state(saved['recurrent_state'], last)
+            if state['attn_state'] is None:
+                continue
+            if state.get('attn_buffer') is not None:
+                window_size = state['attn_buffer'][0].shape[-2] // 2
+                attn_state = [x[..., :x.shape[-2] - num_tokens, :] for x in saved['attn_state']]
+                if saved.get('window') is not None:
+                    attn_state = [torch.cat((x, y), -2) for x, y in zip(saved['window'], attn_state)]
+                attn_state = tuple(x[..., -window_size:, :] for x in attn_state)
+                state['attn_offset'] = state['attn_offset'] - num_tokens - attn_state[0].shape[-2]
+                self._write_window(state, attn_state, window_size)
+            else:
+                state['attn_state'] = tuple(x[..., :x.shape[-2] - num_tokens, :] for x in state['attn_state'])
+        self._seen_tokens -= num_tokens
+
+    def _keep_checkpoint(
+        self,
+        recurrent_state: Any,
+        attn_state: Optional[Tuple[torch.Tensor, torch.Tensor]],
+        layer_idx: int,
+        cache_kwargs: Optional[Dict[str, Any]]
+    ) -> None:
+        cache_kwargs = cache_kwargs or {}
+        saved = self._checkpoint['states'].setdefault(layer_idx, {})
+        if recurrent_state is not None and cache_kwargs.get('intermediate_states', False):
+            if saved.get('recurrent_state') is not None:
+                recurrent_state = self._cat_states(saved['recurrent_state'], recurrent_state)
+            saved['recurrent_state'] = recurrent_state
+        if attn_state is not None and cache_kwargs.get('window_size') is not None:
+            # the key/value states evicted from the window might have to be restored
+            if saved.get('attn_state') is not None:
+                attn_state = tuple(torch.cat((x, y), -2) for x, y in zip(saved['attn_state'], attn_state))
+            saved['attn_state'] = attn_state
+
+    @staticmethod
+    def _index_state(x: Any, i: int) -> Any:
+        """Selects the state after the `i`-th token from intermediate states stacked along dim 1."""
+        if isinstance(x, QuantizedState):
+            return QuantizedState(x.data[:, i], x.scale[:, i])
+        if isinstance(x, (tuple, list)):
+            return type(x)(Cache._index_state(y, i) for y in x)
+        return x[:, i]
+
+    @staticmethod
+    def _cat_states(x: Any, y: Any) -> Any:
+        if isinstance(x, QuantizedState):
+            return QuantizedState(torch.cat((x.data, y.data), 1), torch.cat((x.scale, y.scale), 1))
+        if isinstance(x, (tuple, list)):
+            return type(x)(Cache._cat_states(i, j) for i, j in zip(x, y))
+        return torch.cat((x, y), 1)
+
+    def offload(self) -> Cache:
+        """
+        Moves the states of all layers to pinned host memory, e.g., when the session becomes idle.
+
+        The copies are asynchronous w.r.t. the host, and the device memory is released once they are done.
+        Accessing the states of a layer on the host, e.g., by indexing or `save`, blocks until its copies are done.
+        """
+        self._wait()
+
+        def fn(x: torch.Tensor) -> torch.Tensor:
+            if x.device.type == 'cpu':
+                return x
+            devices.add(x.device)
+            y = torch.empty(x.shape, dtype=x.dtype, device='cpu', pin_memory=True)
+            return y.copy_(x, non_blocking=True)
+
+        for layer_idx, state in enumerate(self.states):
+            devices = set()
+            self._apply_state(state, fn)
+            events = []
+            for device in devices:
+                device_lib = getattr(torch, device.type)
+                event = device_lib.Event()
+                event.record(device_lib.current_stream(device))
+                events.append(event)
+            if events:
+                self._offload_events[layer_idx] = events
+        return self
+
+    def prefetch(self, device: torch.device, stream: Optional[Any] = None) -> Cache:
+        """
+        Copies the offloaded states back to `device` layer by layer on a side stream.
+
+        Accessing the states of a layer makes the current stream wait for its copies only,
+        so that the transfers of later layers overlap with the computation of earlier ones.
+
+        Args:
+            device (torch.device):
+                The device to copy the states to.
+            stream (Optional[torch.cuda.Stream]):
+                The side stream to issue the copies on. A new stream is created if not provided.
+        """
+        device = torch.device(device)
+        if device.type == 'cpu':
+            return self._apply(lambda x: x.to(device))
+        device_lib = getattr(torch, device.type)
+        stream = stream if stream is not None else device_lib.Stream(device)
+        current_stream = device_lib.current_stream(device)
+        # the copies should not start before the pending work, e.g., the offloading copies, is done
+        stream.wait_stream(current_stream)
+        # so the host does not need to wait for the offloading copies
+        self._offload_events.clear()
+
+        def fn(x: torch.Tensor) -> torch.Tensor:
+            y = x.to(device, non_blocking=True)
+            # the memory is allocated on the side stream but consumed on the current stream
+            y.record_stream(current_stream)
+            return y
+
+        with device_lib.stream(stream):
+            for layer_idx, state in enumerate(self.states):
+                self._apply_state(state, fn)
+                event = device_lib.Event()
+                event.record(stream)
+                self._prefetch_events[layer_idx] = event
+        return self
+
+    def _wait(self, layer_idx: Optional[int] = None) -> None:
+        """
+        Makes the current stream wait for the prefetching copies of layer `layer_idx`, or all layers if `None`,
+        and the host for the offloading copies.
+        """
+        layer_ids = [layer_idx] if layer_idx is not None else list({**self._prefetch_events, **self._offload_events})
+        for i in layer_ids:
+            event = self._prefetch_events.pop(i, None)
+            if event is not None:
+                event.wait()
+            for event in self._offload_events.pop(i, []):
+                event.synchronize()
+
+    def _apply(self, fn: Callable[[torch.Tensor], torch.Tensor]) -> Cache:
+        """Applies `fn` to every tensor of the cached states along the batch dimension."""
+        for layer_idx, state in enumerate(self.states):
+            self._wait(layer_idx)
+            self._apply_state(state, fn)
+        return self
+
+    def _apply_state(self, state: Dict[str, Any], fn: Callable[[torch.Tensor], torch.Tensor]) -> Dict[str, Any]:
+        def apply(x: Any) -> Any:
+            if isinstance(x, torch.Tensor):
+                return fn(x)
+            if isinstance(x, QuantizedState):
+                return QuantizedState(*(apply(i) for i in x))
+            if isinstance(x, (tuple, list)):
+                return type(x)(apply(i) for i in x)
+            return x
+
+        for key, value in state.items():
+            # the ordered key/value views are rebuilt from the underlying ring buffers
+            if key == 'attn_state' and state.get('attn_buffer') is not None:
+                continue
+            state[key] = apply(value)
+        if state.get('attn_buffer') is not None:
+            state['attn_state'] = self._window_view(state, state['attn_buffer'][0].shape[-2] // 2)
+        return state
+
+    def save(self, path: str) -> None:
+        """
+        Saves the states to `path` in the safetensors format, with one entry per layer and state kind,
+        e.g., `0.recurrent_state` and `0.conv_state.1`.
+
+        The number of seen tokens and the per-layer structure of the states are recorded in the metadata.
+        """
+        self._wait()
+        tensors, layers = {}, []
+
+        def flatten(name: str, x: Any) -> Any:
+            if isinstance(x, torch.Tensor):
+                tensors[name] = x.detach().to('cpu', copy=True).contiguous()
+                return 'tensor'
+            if isinstance(x, QuantizedState):
+                return {'quantized': [flatten(f'{name}.{i}', j) for i, j in zip(x._fields, x)]}
+            if isinstance(x, (tuple, list)):
+                return [flatten(f'{name}.{i}', j) for i, j in enumerate(x)]
+            return x
+
+        for layer_idx, state in enumerate(self.states):
+            layers.append({
+                key: flatten(f'{layer_idx}.{key}', value)
+                for key, value in state.items()
+                # the ordered key/value views are rebuilt from the underlying ring buffers
+                if not (key == 'attn_state' and state.get('attn_buffer') is not None)
+            })
+        metadata = {
+            'seen_tokens': str(self._seen_tokens),
+            'config': json.dumps(self._config()),
+            'layers': json.dumps(layers)
+        }
+        save_file(tensors, path, metadata=metadata)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, device: Optional[torch.device] = None) -> Cache:
+        """
+        Loads the states saved by `save`.
+
+        Args:
+            path (str):
+                The path of the saved states.
+            mmap (bool, Optional):
+                If `True`, the CPU tensors are memory-mapped from the file and only read when touched,
+                so resuming a session only costs the bytes actually used. Default: `True`.
+            device (Optional[torch.device]):
+                The device to load the states to. Default: `cpu`.
+        """
+        tensors, metadata = _load_safetensors(path, mmap)
+        if device is not None and torch.device(device).type != 'cpu':
+            tensors = {name: tensor.to(device) for name, tensor in tensors.items()}
+
+        def unflatten(name: str, spec: Any) -> Any:
+            if spec == 'tensor':
+                return tensors[name]
+            if isinstance(spec, dict) and 'quantized' in spec:
+                fields = zip(QuantizedState._fields, spec['quantized'])
+                return QuantizedState(*(unflatten(f'{name}.{i}', j) for i, j in fields))
+            if isinstance(spec, list):
+                return tuple(unflatten(f'{name}.{i}', j) for i, j in enumerate(spec))
+            return spec
+
+        cache = cls(int(metadata['seen_tokens']), **json.loads(metadata['config']))
+        for layer_idx, layer in enumerate(json.loads(metadata['layers'])):
+            state = dict(recurrent_state=None, attn_state=None, conv_state=None, ffn_state=None)
+            state.update({key: unflatten(f'{layer_idx}.{key}', spec) for key, spec in layer.items()})
+            if state.get('attn_buffer') is not None:
+                state['attn_state'] = cls._window_view(state, state['attn_buffer'][0].shape[-2] // 2)
+            cache.states.append(state)
+        return cache
+
+    def _config(self) -> Dict[str, Any]:
+        """The arguments to recreate the cache besides `seen_tokens`."""
+        return {}
+
     def to_legacy_cache(self) -> Tuple:
         return tuple(self.states)
 
@@ -145,3 +628,614 @@ class Cache(transformers.cache_utils.Cache):
             for layer_idx in range(len(past_key_values)):
                 cache.states.append(past_key_values[layer_idx])
         return cache
+
+
+def _load_safetensors(path: str, use_mmap: bool = True) -> Tuple[Dict[str, torch.Tensor], Dict[str, str]]:
+    with open(path, 'rb') as f:
+        header_size, = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(header_size))
+    metadata = header.pop('__metadata__', {})
+    if not use_mmap:
+        return load_file(path), metadata
+    if not header:
+        return {}, metadata
+    # copy-on-write mapping, pages are only read from disk when the tensors are touched
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    tensors = {}
+    for name, info in header.items():
+        start, end = info['data_offsets']
+        dtype = SAFETENSORS_DTYPES[info['dtype']]
+        offset = 8 + header_size + start
+        if end == start:
+            tensors[name] = torch.empty(info['shape'], dtype=dtype)
+            continue
+        tensors[name] = torch.frombuffer(buffer, dtype=dtype, count=(end - start) // dtype.itemsize, offset=offset)
+        tensors[name] = tensors[name].view(info['shape'])
+    return tensors, metadata
+
+
+class QuantizedState(NamedTuple):
+    """A quantized state tensor together with the scales to dequantize it."""
+    data: torch.Tensor
+    scale: torch.Tensor
+
+    def dequantize(self) -> torch.Tensor:
+        return self.data.float() * self.scale
+
+
+class QuantizedCache(Cache):
+    """
+    A cache storing the recurrent states of shape `[batch_size, num_heads, key_dim, value_dim]`
+    in int8 or fp8 to fit more concurrent sessions in the same memory.
+
+    The states are quantized with absmax scales when written by `update`, and dequantized to float32 when read,
+    so the layers and kernels are unaware of the storage format.
+    Convolution, attention and lower-dimensional recurrent states are kept as is.
+
+    Args:
+        seen_tokens (int, Optional):
+            The number of tokens already seen. Default: 0.
+        dtype (str, Optional):
+            The storage dtype, one of `int8`, `float8_e4m3fn` and `float8_e5m2`. Default: `int8`.
+        granularity (str, Optional):
+            `head` for one scale per head, or `row` for one scale per row of the `[key_dim, value_dim]` state.
+            Default: `head`.
+    """
+
+    def __init__(
+        self,
+        seen_tokens: int = 0,
+        dtype: str = 'int8',
+        granularity: str = 'head'
+    ) -> QuantizedCache:
+        super().__init__(seen_tokens)
+
+        if dtype not in ('int8', 'float8_e4m3fn', 'float8_e5m2'):
+            raise ValueError(f"Unsupported quantization dtype `{dtype}`.")
+        if granularity not in ('head', 'row'):
+            raise ValueError(f"Unsupported quantization granularity `{granularity}`.")
+        self.dtype = getattr(torch, dtype)
+        self.granularity = granularity
+        self.qmax = 127. if self.dtype == torch.int8 else torch.finfo(self.dtype).max
+
+    def __getitem__(self, layer_idx: int) -> Dict[str, Any]:
+        return self._dequantize(super().__getitem__(layer_idx))
+
+    def __iter__(self):
+        for state in super().__iter__():
+            yield self._dequantize(state)
+
+    def update(
+        self,
+        recurrent_state: torch.Tensor = None,
+        attn_state: Tuple[torch.Tensor, torch.Tensor] = None,
+        conv_state: Tuple[torch.Tensor] = None,
+        ffn_state: torch.Tensor = None,
+        layer_idx: int = 0,
+        offset: Optional[int] = 1,
+        cache_kwargs: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        if recurrent_state is not None:
+            recurrent_state = self._quantize(recurrent_state)
+        state = super().update(
+            recurrent_state=recurrent_state,
+            attn_state=attn_state,
+            conv_state=conv_state,
+            ffn_state=ffn_state,
+            layer_idx=layer_idx,
+            offset=offset,
+            cache_kwargs=cache_kwargs
+        )
+        return self._dequantize(state)
+
+    def _config(self) -> Dict[str, Any]:
+        return dict(dtype=str(self.dtype).split('.')[-1], granularity=self.granularity)
+
+    def _quantize(self, x: Any) -> Any:
+        if isinstance(x, (tuple, list)):
+            return type(x)(self._quantize(i) for i in x)
+        if not isinstance(x, torch.Tensor) or x.dim() < 4:
+            return x
+        x = x.float()
+        dims = (-2, -1) if self.granularity == 'head' else (-1,)
+        scale = x.abs().amax(dims, keepdim=True).clamp_min(1e-8) / self.qmax
+        data = x / scale
+        if self.dtype == torch.int8:
+            data = data.round_().clamp_(-self.qmax, self.qmax)
+        return QuantizedState(data.to(self.dtype), scale)
+
+    def _dequantize(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        def dequantize(x: Any) -> Any:
+            if isinstance(x, QuantizedState):
+                return x.dequantize()
+            if isinstance(x, (tuple, list)):
+                return type(x)(dequantize(i) for i in x)
+            return x
+        return dict(state, recurrent_state=dequantize(state['recurrent_state']))
+
+
+class PrefixStateCache:
+    """
+    A store of cached states for shared prompt prefixes, e.g., system prompts.
+
+    As the states of linear attention models are of constant size,
+    a snapshot of `Cache.states` taken after a prefix is cheap compared with the KV cache of a transformer.
+    The snapshots are keyed by the hash of the prefix tokens, and evicted in LRU order once `max_bytes` is exceeded.
+
+    Examples::
+        >>> prefix_cache = PrefixStateCache(max_bytes=2**30)
+        >>> past_key_values = model(system_ids, use_cache=True).past_key_values
+        >>> prefix_cache.put(system_ids, past_key_values)
+        >>> # only the tokens after `system_ids` will be prefilled
+        >>> model.generate(torch.cat((system_ids, user_ids), -1), prefix_cache=prefix_cache)
+
+    Args:
+        max_bytes (int, Optional):
+            The maximum number of bytes taken by all cached states. Default: `2**30`.
+    """
+
+    def __init__(self, max_bytes: int = 2**30) -> PrefixStateCache:
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: OrderedDict[Tuple[int, str], Tuple[Cache, int]] = OrderedDict()
+        self._lengths: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, input_ids: torch.LongTensor) -> bool:
+        input_ids = self._flatten(input_ids)
+        return (input_ids.shape[0], self._hash(input_ids)) in self._entries
+
+    def put(self, input_ids: torch.LongTensor, past_key_values: Cache) -> None:
+        """
+        Caches a snapshot of `past_key_values`, which should hold the states after processing `input_ids`.
+
+        Args:
+            input_ids (torch.LongTensor):
+                The prefix tokens of shape `[seq_len]` or `[1, seq_len]`.
+            past_key_values (Cache):
+                The cache of batch size 1 produced by the model after processing `input_ids`.
+        """
+        input_ids = self._flatten(input_ids)
+        key = (input_ids.shape[0], self._hash(input_ids))
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+        snapshot = self._clone(past_key_values)
+        num_bytes = self._num_bytes(snapshot)
+        if num_bytes > self.max_bytes:
+            return
+        while self.num_bytes + num_bytes > self.max_bytes:
+            self._evict()
+        self._entries[key] = (snapshot, num_bytes)
+        self._lengths[key[0]] = self._lengths.get(key[0], 0) + 1
+        self.num_bytes += num_bytes
+
+    def get(self, input_ids: torch.LongTensor) -> Tuple[int, Optional[Cache]]:
+        """
+        Looks up the longest cached prefix of `input_ids`.
+
+        Returns:
+            The length of the matched prefix, and a copy of its cached states that can be updated freely,
+            or `(0, None)` if no prefix is cached.
+        """
+        input_ids = self._flatten(input_ids)
+        for length in sorted(self._lengths, reverse=True):
+            if length > input_ids.shape[0]:
+                continue
+            key = (length, self._hash(input_ids[:length]))
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return length, self._clone(self._entries[key][0])
+        self.misses += 1
+        return 0, None
+
+    def restore(
+        self,
+        input_ids: torch.LongTensor,
+        past_key_values: Optional[Cache] = None
+    ) -> Tuple[torch.LongTensor, Optional[Cache]]:
+        """
+        Restores the states of the longest cached prefix of `input_ids` for prefilling.
+
+        At least the last token is always kept, so that the logits of the next token can be computed.
+        Only batches of size 1 are looked up, other inputs are returned as is.
+
+        Returns:
+            The unseen suffix of `input_ids`, and the restored cache to continue from.
+        """
+        if input_ids.shape[0] != 1 or input_ids.shape[1] < 2:
+            return input_ids, past_key_values
+        length, cache = self.get(input_ids[0, :-1])
+        if cache is None:
+            return input_ids, past_key_values
+        return input_ids[:, length:], cache
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._lengths.clear()
+        self.num_bytes = 0
+
+    def _evict(self) -> None:
+        (length, _), (_, num_bytes) = self._entries.popitem(last=False)
+        self._lengths[length] -= 1
+        if self._lengths[length] == 0:
+            del self._lengths[length]
+        self.num_bytes -= num_bytes
+
+    @staticmethod
+    def _flatten(input_ids: torch.LongTensor) -> torch.LongTensor:
+        if input_ids.dim() == 2:
+            if input_ids.shape[0] != 1:
+                raise ValueError(f"Only prefixes of batch size 1 can be cached, got {input_ids.shape[0]}")
+            input_ids = input_ids[0]
+        return input_ids
+
+    @staticmethod
+    def _hash(input_ids: torch.LongTensor) -> str:
+        return hashlib.sha256(input_ids.to(device='cpu', dtype=torch.int64).numpy().tobytes()).hexdigest()
+
+    @staticmethod
+    def _clone(past_key_values: Cache) -> Cache:
+        past_key_values._wait()
+        cache = copy.copy(past_key_values)
+        cache.states = [dict(state) for state in past_key_values.states]
+        cache._prefetch_events, cache._offload_events = {}, {}
+        return cache._apply(torch.clone)
+
+    @staticmethod
+    def _num_bytes(past_key_values: Cache) -> int:
+        num_bytes = 0
+
+        def fn(x: torch.Tensor) -> torch.Tensor:
+            nonlocal num_bytes
+            num_bytes += x.numel() * x.element_size()
+            return x
+        past_key_values._apply(fn)
+        return num_bytes
+
+
+class StatePool:
+    """
+    A preallocated pool of per-layer state slots for continuous batching.
+
+    Each request holds a slot in the pool for its recurrent, convolution and sliding-window attention states,
+    so that requests can join and leave a running decoding batch at any step.
+    The pooled tensors are allocated once with `num_slots` rows on the first `scatter`,
+    and the `Cache` of each step is gathered from/scattered to the slots of the active requests.
+
+    Examples::
+        >>> pool = StatePool(num_slots=256)
+        >>> # prefill a new request and move its states to a free slot
+        >>> pool.allocate('req-0')
+        >>> outputs = model(prompt_ids, use_cache=True)
+        >>> pool.scatter(['req-0'], outputs.past_key_values, num_tokens=prompt_ids.shape[1])
+        >>> # decode one token for all running requests
+        >>> past_key_values, attention_mask = pool.gather(request_ids, num_tokens=1)
+        >>> outputs = model(next_ids, past_key_values=past_key_values, attention_mask=attention_mask, use_cache=True)
+        >>> pool.scatter(request_ids, outputs.past_key_values, num_tokens=1)
+        >>> # or let the recurrent kernels read and write the slots in-place without copying the recurrent states
+        >>> past_key_values, attention_mask = pool.gather(request_ids, num_tokens=1, inplace=True)
+        >>> outputs = model(next_ids, past_key_values=past_key_values, attention_mask=attention_mask, use_cache=True)
+        >>> pool.scatter(request_ids, outputs.past_key_values, num_tokens=1)
+        >>> pool.release('req-0')
+
+    Args:
+        num_slots (int):
+            The maximum number of concurrent requests.
+    """
+
+    def __init__(self, num_slots: int) -> StatePool:
+        self.num_slots = num_slots
+
+        self.states: List[Dict[str, Any]] = []
+        # number of tokens seen by the request in each slot
+        self.lengths = [0] * num_slots
+        self.slot_table: Dict[Any, int] = {}
+        self._free_slots = list(range(num_slots - 1, -1, -1))
+        self._cache: Optional[Cache] = None
+        # whether the layer in each position takes `state_indices` to update its pooled recurrent states in-place
+        self._supports_state_indices: List[bool] = []
+
+    def __len__(self) -> int:
+        return len(self.slot_table)
+
+    def __contains__(self, request_id: Any) -> bool:
+        return request_id in self.slot_table
+
+    @property
+    def num_free_slots(self) -> int:
+        return len(self._free_slots)
+
+    def allocate(self, request_id: Any) -> int:
+        """Assigns a free slot to `request_id` and returns its index."""
+        if request_id in self.slot_table:
+            raise KeyError(f"Request {request_id} already holds slot {self.slot_table[request_id]}")
+        if not self._free_slots:
+            raise RuntimeError(f"All {self.num_slots} slots of the pool are in use")
+        slot = self._free_slots.pop()
+        self.slot_table[request_id] = slot
+        self.lengths[slot] = 0
+        return slot
+
+    def release(self, request_id: Any) -> None:
+        """Returns the slot held by `request_id` to the pool."""
+        self._free_slots.append(self.slot_table.pop(request_id))
+
+    def slots(self, request_ids: List[Any], device: Optional[torch.device] = None) -> torch.LongTensor:
+        return torch.tensor([self.slot_table[i] for i in request_ids], dtype=torch.long, device=device)
+
+    def gather(
+        self,
+        request_ids: List[Any],
+        num_tokens: int = 1,
+        inplace: bool = False
+    ) -> Tuple[Cache, Optional[torch.Tensor]]:
+        """
+        Gathers the states of `request_ids` into a `Cache` for the next forward pass of `num_tokens` tokens per request.
+
+        If `inplace` is `True`, the recurrent states are not copied out of the pool.
+        The cache holds the pooled tensors of shape `[num_slots, ...]` instead,
+        with the slots of `request_ids` in `state_indices`,
+        which the recurrent kernels take to read and update the states of the slots in-place.
+        This requires all recurrent layers of the model to support `state_indices`, e.g., GLA and SimpleGLA,
+        which is checked against the states scattered to the pool.
+
+        Returns:
+            The gathered cache, and the attention mask of shape `[len(request_ids), max_len + num_tokens]`
+            left-padding requests with fewer seen tokens if the pool contains attention states, else `None`.
+        """
+        if inplace and isinstance(self._cache, QuantizedCache):
+            raise ValueError("The quantized recurrent states can not be updated in-place")
+        if inplace:
+            unsupported = [
+                layer_idx for layer_idx, pooled in enumerate(self.states)
+                if 'recurrent_state' in pooled and not self._supports_state_indices[layer_idx]
+            ]
+            if unsupported:
+                raise ValueError(f"The recurrent states of layers {unsupported} can not be updated in-place, "
+                                 f"as these layers do not support `state_indices`")
+        lengths = [self.lengths[self.slot_table[i]] for i in request_ids]
+        max_len = max(lengths)
+        # keep the cache type, e.g., `QuantizedCache`, of the scattered states
+        cache = copy.copy(self._cache) if self._cache is not None else Cache()
+        cache.states, cache._seen_tokens = [], max_len
+        cache._prefetch_events, cache._offload_events = {}, {}
+        cache.state_indices = None
+        attention_mask = None
+        for pooled in self.states:
+            state = dict(recurrent_state=None, attn_state=None, conv_state=None, ffn_state=None)
+            for key, value in pooled.items():
+                if key == 'attn_state':
+                    state[key], attention_mask = self._gather_window(value, request_ids, lengths, num_tokens)
+                elif key == 'recurrent_state' and inplace:
+                    state[key] = value
+                    cache.state_indices = self.slots(request_ids, self._device(value))
+                else:
+                    slots = self.slots(request_ids, self._device(value))
+                    state[key] = self._map(lambda x: x.index_select(0, slots), value)
+            cache.states.append(state)
+        return cache, attention_mask
+
+    def scatter(
+        self,
+        request_ids: List[Any],
+        past_key_values: Cache,
+        num_tokens: int = 1
+    ) -> None:
+        """Writes the states of `past_key_values` after `num_tokens` new tokens per request back to the slots."""
+        if not self.states:
+            self._allocate(past_key_values)
+        lengths = [self.lengths[self.slot_table[i]] for i in request_ids]
+        for pooled, state in zip(self.states, past_key_values.states):
+            for key, value in pooled.items():
+                if key == 'attn_state':
+                    self._scatter_window(value, state['attn_state'], request_ids, lengths, num_tokens)
+                elif key == 'recurrent_state' and past_key_values.state_indices is not None:
+                    # already updated in-place by the recurrent kernels
+                    continue
+                else:
+                    slots = self.slots(request_ids, self._device(value))
+                    self._map(lambda x, y: x.index_copy_(0, slots, y.to(x.dtype)), value, state[key])
+        for request_id in request_ids:
+            self.lengths[self.slot_table[request_id]] += num_tokens
+
+    def _allocate(self, past_key_values: Cache) -> None:
+        self._cache = copy.copy(past_key_values)
+        self._cache.states, self._cache._prefetch_events, self._cache._offload_events = [], {}, {}
+        for state in past_key_values.states:
+            self._supports_state_indices.append(state.get('supports_state_indices', False))
+            pooled = {}
+            for key, value in state.items():
+                if value is None or key not in ('recurrent_state', 'attn_state', 'conv_state', 'ffn_state'):
+                    continue
+                if key == 'attn_state':
+                    if state.get('attn_buffer') is None:
+                        raise ValueError("Only sliding-window attention states can be pooled")
+                    # mirrored ring buffers of shape `[num_slots, 2 * window_size, dim]`
+                    value = state['attn_buffer']
+                pooled[key] = self._map(lambda x: x.new_zeros(self.num_slots, *x.shape[1:]), value)
+            self.states.append(pooled)
+
+    def _gather_window(
+        self,
+        buffers: Tuple[torch.Tensor, torch.Tensor],
+        request_ids: List[Any],
+        lengths: List[int],
+        num_tokens: int
+    ) -> Tuple[Tuple[torch.Tensor, torch.Tensor], torch.Tensor]:
+        device = buffers[0].device
+        window_size = buffers[0].shape[1] // 2
+        max_len = max(lengths)
+        size = min(max_len, window_size)
+        slots = self.slots(request_ids, device)
+        lengths = torch.tensor(lengths, dtype=torch.long, device=device)
+        # right-align the last `size` tokens of each request in chronological order,
+        # the positions before the first token are masked out
+        positions = lengths[:, None] - size + torch.arange(size, device=device)
+        indices = positions.remainder(window_size)
+        attn_state = tuple(buffer[slots[:, None], indices] for buffer in buffers)
+        attention_mask = torch.arange(max_len + num_tokens, device=device) >= (max_len - lengths[:, None])
+        return attn_state, attention_mask.to(torch.long)
+
+    def _scatter_window(
+        self,
+        buffers: Tuple[torch.Tensor, torch.Tensor],
+        attn_state: Tuple[torch.Tensor, torch.Tensor],
+        request_ids: List[Any],
+        lengths: List[int],
+        num_tokens: int
+    ) -> None:
+        device = buffers[0].device
+        window_size = buffers[0].shape[1] // 2
+        size = min(num_tokens, window_size)
+        slots = self.slots(request_ids, device)
+        lengths = torch.tensor(lengths, dtype=torch.long, device=device)
+        # only the new tokens are written to the ring buffer of each slot
+        indices = (lengths[:, None] + num_tokens - size + torch.arange(size, device=device)) % window_size
+        for buffer, x in zip(buffers, attn_state):
+            x = x[:, -size:].to(buffer.dtype)
+            buffer[slots[:, None], indices] = x
+            buffer[slots[:, None], indices + window_size] = x
+
+    @staticmethod
+    def _map(fn: Callable, *values: Any) -> Any:
+        if isinstance(values[0], torch.Tensor):
+            return fn(*values)
+        if isinstance(values[0], QuantizedState):
+            return QuantizedState(*(StatePool._map(fn, *i) for i in zip(*values)))
+        if isinstance(values[0], (tuple, list)):
+            return type(values[0])(StatePool._map(fn, *i) for i in zip(*values))
+        return values[0]
+
+    @staticmethod
+    def _device(value: Any) -> Optional[torch.device]:
+        if isinstance(value, torch.Tensor):
+            return value.device
+        if isinstance(value, (tuple, list)):
+            for i in value:
+                device = StatePool._device(i)
+                if device is not None:
+                    return device
+        return None
+
+
+class FLAGenerationMixin(GenerationMixin):
+    """
+    Generation utilities shared by the `*ForCausalLM` classes built on `Cache`.
+    """
+
+    @torch.no_grad()
+    def prefill(
+        self,
+        input_ids: torch.LongTensor,
+        past_key_values: Optional[Cache] = None,
+        attention_mask: Optional[torch.Tensor] = None,
+        chunk_len: int = 8192,
+        **kwargs
+    ) -> CausalLMOutputWithPast:
+        """
+        Prefills the cache with a (possibly very long) prompt by streaming it through the model in segments.
+
+        The recurrent/convolution states are carried across the segments through `past_key_values`,
+        so the activation memory is bounded by `chunk_len` rather than by the prompt length,
+        and the logits are only computed for the last position.
+        Full attention layers still cache the keys/values of all tokens.
+
+        Args:
+            input_ids (torch.LongTensor):
+                Prompt tokens of shape `[batch_size, seq_len]`.
+            past_key_values (Optional[Cache]):
+                Cache to continue from. A new `Cache` is created if `None`. Default: `None`.
+            attention_mask (Optional[torch.Tensor]):
+                0-1 mask of shape `[batch_size, num_cached_tokens + seq_len]` for left padding. Default: `None`.
+            chunk_len (int):
+                Number of tokens processed per segment.
+                Multiples of 64 keep the segments aligned with the chunks of the kernels. Default: `8192`.
+
+        Returns:
+            A `CausalLMOutputWithPast` with logits of shape `[batch_size, 1, vocab_size]` and the updated cache,
+            from which generation can be continued, e.g., by passing both to `generate`.
+        """
+        if chunk_len <= 0:
+            raise ValueError(f"`chunk_len` must be positive, but got {chunk_len}")
+        if past_key_values is None:
+            past_key_values = Cache()
+        seq_len = input_ids.shape[1]
+        # number of mask entries covering the tokens that were cached before
+        mask_offset = attention_mask.shape[1] - seq_len if attention_mask is not None else 0
+        for start in range(0, seq_len, chunk_len):
+            end = min(start + chunk_len, seq_len)
+            outputs = self(
+                input_ids=input_ids[:, start:end],
+                attention_mask=attention_mask[:, :mask_offset + end] if attention_mask is not None else None,
+                past_key_values=past_key_values,
+                use_cache=True,
+                return_dict=True,
+                logits_to_keep=1,
+                **kwargs
+            )
+            past_key_values = outputs.past_key_values
+        return outputs
+
+    @torch.no_grad()
+    def parallel_generate(
+        self,
+        input_ids: torch.LongTensor,
+        num_samples: int,
+        attention_mask: Optional[torch.Tensor] = None,
+        chunk_len: int = 8192,
+        **kwargs
+    ) -> Any:
+        """
+        Generates `num_samples` continuations of each prompt, e.g., for best-of-n sampling or RL rollouts.
+
+        Each unique prompt is prefilled only once, and the cache is then forked `num_samples` ways,
+        so that only the decoding of the samples is batched by `generate`.
+
+        Args:
+            input_ids (torch.LongTensor):
+                Prompt tokens of shape `[batch_size, seq_len]`.
+            num_samples (int):
+                Number of continuations generated for each prompt.
+            attention_mask (Optional[torch.Tensor]):
+                0-1 mask of shape `[batch_size, seq_len]` for left padding. Default: `None`.
+            chunk_len (int):
+                Number of tokens processed per segment when prefilling the prompts. Default: `8192`.
+            kwargs:
+                Arguments passed to `generate`, e.g., `do_sample=True` and `max_new_tokens`.
+
+        Returns:
+            The outputs of `generate`, where the samples of the `i`-th prompt are at `i * num_samples + j`.
+        """
+        if num_samples <= 0:
+            raise ValueError(f"`num_samples` must be positive, but got {num_samples}")
+        past_key_values = None
+        # the last token of the prompts is left to `generate` to produce the logits of the first new tokens
+        if input_ids.shape[1] > 1:
+            keys = input_ids if attention_mask is None else torch.cat((input_ids, attention_mask.to(input_ids)), -1)
+            # indices of the unique prompts in the order of their first occurrences
+            unique, indices = {}, []
+            for i, key in enumerate(map(tuple, keys.tolist())):
+                indices.append(unique.setdefault(key, (len(unique), i))[0])
+            rows = torch.tensor([i for _, i in unique.values()], device=input_ids.device)
+            past_key_values = self.prefill(
+                input_ids[rows, :-1],
+                attention_mask=attention_mask[rows, :-1] if attention_mask is not None else None,
+                chunk_len=chunk_len
+            ).past_key_values
+            if len(unique) < len(indices):
+                past_key_values.batch_select_indices(torch.tensor(indices, device=input_ids.device))
+            past_key_values = past_key_values.fork(num_samples)
+        return self.generate(
+            input_ids=input_ids.repeat_interleave(num_samples, dim=0),
+            attention_mask=attention_mask.repeat_interleave(num_samples, dim=0) if attention_mask is not None else None,
+            past_key_values=past_key_values,
+            **kwargs
+        )
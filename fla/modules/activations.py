@@ -26,11 +26,17 @@ sigmoid_bwd_jit_fn = torch.cuda.jiterator._create_jit_fn(sigmoid_bwd_codestring)
 
 @torch.compiler.disable
 def sigmoid_fwd(x):
+    # jiterator is only available on GPUs
+    if x.device.type == 'cpu':
+        return x.float().sigmoid().to(x.dtype)
     return sigmoid_fwd_jit_fn(x)
 
 
 @torch.compiler.disable
 def sigmoid_bwd(x, g):
+    if x.device.type == 'cpu':
+        x_sigmoid = x.float().sigmoid()
+        return (g.float() * x_sigmoid * (1 - x_sigmoid)).to(x.dtype)
     return sigmoid_bwd_jit_fn(x, g)
 
 
@@ -174,11 +180,17 @@ swish_bwd_jit_fn = torch.cuda.jiterator._create_jit_fn(swish_bwd_codestring)
 
 @torch.compiler.disable
 def swish_fwd(x):
+    # jiterator is only available on GPUs
+    if x.device.type == 'cpu':
+        return F.silu(x.float()).to(x.dtype)
     return swish_fwd_jit_fn(x)
 
 
 @torch.compiler.disable
 def swish_bwd(x, g):
+    if x.device.type == 'cpu':
+        x, x_sigmoid = x.float(), x.float().sigmoid()
+        return (g.float() * x_sigmoid * (1 - x * x_sigmoid + x)).to(g.dtype)
     return swish_bwd_jit_fn(x, g)
 
 
@@ -346,16 +358,23 @@ swiglu_fwdbwd_jit_fn = torch.cuda.jiterator._create_multi_output_jit_fn(swiglu_f
 
 @torch.compiler.disable
 def swiglu_fwd(x, y):
+    # jiterator is only available on GPUs
+    if x.device.type == 'cpu':
+        return swiglu_fwd_torch(x, y)
     return swiglu_fwd_jit_fn(x, y)
 
 
 @torch.compiler.disable
 def swiglu_bwd(x, y, g):
+    if x.device.type == 'cpu':
+        return swiglu_bwd_torch(x, y, g)
     return swiglu_bwd_jit_fn(x, y, g)
 
 
 @torch.compiler.disable
 def swiglu_fwdbwd(x, y, g):
+    if x.device.type == 'cpu':
+        return swiglu_fwdbwd_torch(x, y, g)
     return swiglu_fwdbwd_jit_fn(x, y, g)
 
 
@@ -3,22 +3,504 @@
 # from https://github.com/HazyResearch/zoology/blob/main/zoology/mixers/convolution.py
 
 import math
-import warnings
 from typing import Optional, Tuple
 
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+import triton
+import triton.language as tl
 from einops import rearrange
 
 from fla.modules.activations import ACT2FN
-from fla.utils import checkpoint
+from fla.ops.common.utils import prepare_token_indices
+from fla.utils import checkpoint, input_guard
+
+
+@triton.jit
+def causal_conv1d_fwd_inner(
+    x,
+    weight,
+    bias,
+    h0,
+    o_t,
+    i_n,
+    i_p,
+    m_t,
+    o_d,
+    m_d,
+    D: tl.constexpr,
+    W: tl.constexpr,
+    WC: tl.constexpr,
+    BT: tl.constexpr,
+    BD: tl.constexpr,
+    USE_BIAS: tl.constexpr,
+    USE_INITIAL_STATE: tl.constexpr
+):
+    # [BT, BD], the convolution outputs before the activation of the given rows
+    m_x = m_t[:, None] & m_d[None, :]
+    b_z = tl.zeros([BT, BD], dtype=tl.float32)
+    for i_w in tl.static_range(W):
+        # the positions of the inputs within their sequences, where the negative ones are taken from the cache
+        i_s = i_p - (W - 1) + i_w
+        b_x = tl.load(x + (o_t + i_w - (W - 1))[:, None] * D + o_d[None, :], mask=m_x & (i_s >= 0)[:, None], other=0)
+        b_x = b_x.to(tl.float32)
+        if USE_INITIAL_STATE:
+            p_h0 = h0 + i_n[:, None] * D*WC + o_d[None, :] * WC + (WC + i_s)[:, None]
+            b_x += tl.load(p_h0, mask=m_x & (i_s < 0)[:, None], other=0).to(tl.float32)
+        b_z += b_x * tl.load(weight + o_d * W + i_w, mask=m_d, other=0).to(tl.float32)[None, :]
+    if USE_BIAS:
+        b_z += tl.load(bias + o_d, mask=m_d, other=0).to(tl.float32)[None, :]
+    return b_z
+
+
+@triton.heuristics({
+    'USE_BIAS': lambda args: args['bias'] is not None,
+    'USE_INITIAL_STATE': lambda args: args['h0'] is not None,
+    'USE_OFFSETS': lambda args: args['indices'] is not None
+})
+@triton.autotune(
+    configs=[
+        triton.Config({}, num_warps=num_warps)
+        for num_warps in [1, 2, 4, 8]
+    ],
+    key=['BD', 'W', 'ACTIVATION'],
+)
+@triton.jit(do_not_specialize=['T'])
+def causal_conv1d_fwd_kernel(
+    x,
+    weight,
+    bias,
+    h0,
+    y,
+    indices,
+    M,
+    T,
+    D: tl.constexpr,
+    W: tl.constexpr,
+    WC: tl.constexpr,
+    BT: tl.constexpr,
+    BD: tl.constexpr,
+    ACTIVATION: tl.constexpr,
+    USE_BIAS: tl.constexpr,
+    USE_INITIAL_STATE: tl.constexpr,
+    USE_OFFSETS: tl.constexpr
+):
+    i_t, i_d = tl.program_id(0), tl.program_id(1)
+    # [BT], the rows of the flattened inputs, along with the sequences and positions they belong to
+    o_t = i_t * BT + tl.arange(0, BT)
+    m_t = o_t < M
+    if USE_OFFSETS:
+        i_n = tl.load(indices + o_t * 2, mask=m_t, other=0).to(tl.int32)
+        i_p = tl.load(indices + o_t * 2 + 1, mask=m_t, other=0).to(tl.int32)
+    else:
+        i_n, i_p = o_t // T, o_t % T
+    o_d = i_d * BD + tl.arange(0, BD)
+    m_d = o_d < D
+
+    b_y = causal_conv1d_fwd_inner(x, weight, bias, h0, o_t, i_n, i_p, m_t, o_d, m_d,
+                                  D, W, WC, BT, BD, USE_BIAS, USE_INITIAL_STATE)
+    if ACTIVATION == 'silu' or ACTIVATION == 'swish':
+        b_y = b_y * tl.sigmoid(b_y)
+    tl.store(y + o_t[:, None] * D + o_d[None, :], b_y.to(y.dtype.element_ty), mask=m_t[:, None] & m_d[None, :])
+
+
+@triton.heuristics({
+    'USE_BIAS': lambda args: args['bias'] is not None,
+    'USE_INITIAL_STATE': lambda args: args['h0'] is not None,
+    'USE_OFFSETS': lambda args: args['indices'] is not None
+})
+@triton.autotune(
+    configs=[
+        triton.Config({}, num_warps=num_warps)
+        for num_warps in [1, 2, 4, 8]
+    ],
+    key=['BD', 'W', 'ACTIVATION'],
+)
+@triton.jit(do_not_specialize=['T'])
+def causal_conv1d_bwd_kernel(
+    x,
+    weight,
+    bias,
+    h0,
+    dy,
+    dx,
+    dw,
+    db,
+    indices,
+    offsets,
+    M,
+    T,
+    D: tl.constexpr,
+    W: tl.constexpr,
+    WC: tl.constexpr,
+    BT: tl.constexpr,
+    BD: tl.constexpr,
+    ACTIVATION: tl.constexpr,
+    USE_BIAS: tl.constexpr,
+    USE_INITIAL_STATE: tl.constexpr,
+    USE_OFFSETS: tl.constexpr
+):
+    i_t, i_d = tl.program_id(0), tl.program_id(1)
+    o_t = i_t * BT + tl.arange(0, BT)
+    m_t = o_t < M
+    if USE_OFFSETS:
+        i_n = tl.load(indices + o_t * 2, mask=m_t, other=0).to(tl.int32)
+        i_p = tl.load(indices + o_t * 2 + 1, mask=m_t, other=0).to(tl.int32)
+        # [BT], the lengths of the sequences the rows belong to
+        i_l = tl.load(offsets + i_n + 1, mask=m_t, other=0).to(tl.int32)
+        i_l = i_l - tl.load(offsets + i_n, mask=m_t, other=0).to(tl.int32)
+    else:
+        i_n, i_p, i_l = o_t // T, o_t % T, T
+    o_d = i_d * BD + tl.arange(0, BD)
+    m_d = o_d < D
+
+    b_dx = tl.zeros([BT, BD], dtype=tl.float32)
+    b_dz = tl.zeros([BT, BD], dtype=tl.float32)
+    # each input contributes to the outputs of the following `W` tokens of the same sequence
+    for i_k in tl.static_range(W):
+        m_k = m_t & (i_p + i_k < i_l)
+        b_dy = tl.load(dy + (o_t + i_k)[:, None] * D + o_d[None, :], mask=m_k[:, None] & m_d[None, :], other=0)
+        b_dy = b_dy.to(tl.float32)
+        if ACTIVATION == 'silu' or ACTIVATION == 'swish':
+            b_z = causal_conv1d_fwd_inner(x, weight, bias, h0, o_t + i_k, i_n, i_p + i_k, m_k, o_d, m_d,
+                                          D, W, WC, BT, BD, USE_BIAS, USE_INITIAL_STATE)
+            b_s = tl.sigmoid(b_z)
+            b_dy = b_dy * b_s * (1 + b_z * (1 - b_s))
+        b_dx += b_dy * tl.load(weight + o_d * W + W - 1 - i_k, mask=m_d, other=0).to(tl.float32)[None, :]
+        if i_k == 0:
+            b_dz = b_dy
+    tl.store(dx + o_t[:, None] * D + o_d[None, :], b_dx.to(dx.dtype.element_ty), mask=m_t[:, None] & m_d[None, :])
+
+    # partial sums over the rows of the block, reduced over all blocks afterwards
+    m_x = m_t[:, None] & m_d[None, :]
+    for i_w in tl.static_range(W):
+        i_s = i_p - (W - 1) + i_w
+        b_x = tl.load(x + (o_t + i_w - (W - 1))[:, None] * D + o_d[None, :], mask=m_x & (i_s >= 0)[:, None], other=0)
+        b_x = b_x.to(tl.float32)
+        if USE_INITIAL_STATE:
+            p_h0 = h0 + i_n[:, None] * D*WC + o_d[None, :] * WC + (WC + i_s)[:, None]
+            b_x += tl.load(p_h0, mask=m_x & (i_s < 0)[:, None], other=0).to(tl.float32)
+        tl.store(dw + i_t * D*W + o_d * W + i_w, tl.sum(b_dz * b_x, 0).to(dw.dtype.element_ty), mask=m_d)
+    if USE_BIAS:
+        tl.store(db + i_t * D + o_d, tl.sum(b_dz, 0).to(db.dtype.element_ty), mask=m_d)
+
+
+@triton.heuristics({
+    'USE_INITIAL_STATE': lambda args: args['h0'] is not None,
+    'USE_OFFSETS': lambda args: args['offsets'] is not None
+})
+@triton.jit(do_not_specialize=['T'])
+def causal_conv1d_states_fwd_kernel(
+    x,
+    h0,
+    ht,
+    offsets,
+    T,
+    D: tl.constexpr,
+    WC: tl.constexpr,
+    BD: tl.constexpr,
+    BW: tl.constexpr,
+    USE_INITIAL_STATE: tl.constexpr,
+    USE_OFFSETS: tl.constexpr
+):
+    i_n, i_d = tl.program_id(0), tl.program_id(1)
+    if USE_OFFSETS:
+        bos, eos = tl.load(offsets + i_n).to(tl.int32), tl.load(offsets + i_n + 1).to(tl.int32)
+        T = eos - bos
+    else:
+        bos, eos = i_n * T, i_n * T + T
+    o_d = i_d * BD + tl.arange(0, BD)
+    o_w = tl.arange(0, BW)
+    m_d = o_d < D
+    m_w = o_w < WC
+    # [BW], the positions of the last `WC` inputs, which are taken from the previous cache if negative
+    i_s = T - WC + o_w
+
+    b_h = tl.load(x + (bos + i_s)[None, :] * D + o_d[:, None], mask=m_d[:, None] & (m_w & (i_s >= 0))[None, :], other=0)
+    if USE_INITIAL_STATE:
+        p_h0 = h0 + i_n * D*WC + o_d[:, None] * WC + (o_w + T)[None, :]
+        b_h += tl.load(p_h0, mask=m_d[:, None] & (m_w & (i_s < 0))[None, :], other=0)
+    tl.store(ht + i_n * D*WC + o_d[:, None] * WC + o_w[None, :], b_h.to(ht.dtype.element_ty), mask=m_d[:, None] & m_w[None, :])
+
+
+@triton.heuristics({
+    'USE_BIAS': lambda args: args['bias'] is not None,
+    'USE_OFFSETS': lambda args: args['offsets'] is not None
+})
+@triton.jit(do_not_specialize=['T'])
+def causal_conv1d_states_bwd_kernel(
+    x,
+    weight,
+    bias,
+    h0,
+    dy,
+    dh0,
+    offsets,
+    T,
+    D: tl.constexpr,
+    W: tl.constexpr,
+    WC: tl.constexpr,
+    BD: tl.constexpr,
+    BW: tl.constexpr,
+    ACTIVATION: tl.constexpr,
+    USE_BIAS: tl.constexpr,
+    USE_OFFSETS: tl.constexpr
+):
+    i_n, i_d = tl.program_id(0), tl.program_id(1)
+    if USE_OFFSETS:
+        bos, eos = tl.load(offsets + i_n).to(tl.int32), tl.load(offsets + i_n + 1).to(tl.int32)
+        T = eos - bos
+    else:
+        bos, eos = i_n * T, i_n * T + T
+    o_d = i_d * BD + tl.arange(0, BD)
+    m_d = o_d < D
+    # [BW], the leading tokens of the sequence, the only ones whose outputs depend on the cache
+    o_p = tl.arange(0, BW)
+    m_p = (o_p < W - 1) & (o_p < T)
+    o_t = bos + o_p
+    i_n_p = tl.zeros([BW], dtype=tl.int32) + i_n
+
+    b_dz = tl.load(dy + o_t[:, None] * D + o_d[None, :], mask=m_p[:, None] & m_d[None, :], other=0).to(tl.float32)
+    if ACTIVATION == 'silu' or ACTIVATION == 'swish':
+        b_z = causal_conv1d_fwd_inner(x, weight, bias, h0, o_t, i_n_p, o_p, m_p, o_d, m_d,
+                                      D, W, WC, BW, BD, USE_BIAS, True)
+        b_s = tl.sigmoid(b_z)
+        b_dz = b_dz * b_s * (1 + b_z * (1 - b_s))
+
+    o_w = tl.arange(0, BW)
+    b_dh = tl.zeros([BD, BW], dtype=tl.float32)
+    for i_w in tl.static_range(W):
+        # [BW], the columns of the cache read by each of the leading tokens
+        i_c = WC + o_p - (W - 1) + i_w
+        b_sel = (m_p & (i_c < WC))[:, None] & (i_c[:, None] == (WC - BW + o_w)[None, :])
+        b_w = tl.load(weight + o_d * W + i_w, mask=m_d, other=0).to(tl.float32)
+        b_dh += tl.sum(b_dz[:, :, None] * b_sel[:, None, :].to(tl.float32), 0) * b_w[:, None]
+    # only the last `BW` columns of the cache are read, and the rest of them receive no gradients
+    p_dh0 = dh0 + i_n * D*WC + o_d[:, None] * WC + (WC - BW + o_w)[None, :]
+    tl.store(p_dh0, b_dh.to(dh0.dtype.element_ty), mask=m_d[:, None] & (WC - BW + o_w >= 0)[None, :])
+
+
+def causal_conv1d_fwd(
+    x: torch.Tensor,
+    weight: torch.Tensor,
+    bias: Optional[torch.Tensor] = None,
+    initial_state: Optional[torch.Tensor] = None,
+    output_final_state: bool = False,
+    activation: Optional[str] = None,
+    offsets: Optional[torch.LongTensor] = None,
+    indices: Optional[torch.LongTensor] = None
+) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+    B, T, D, W = *x.shape, weight.shape[-1]
+    N = B if offsets is None else len(offsets) - 1
+    WC = initial_state.shape[-1] if initial_state is not None else W
+    M, BT, BD = B * T, 16, min(triton.next_power_of_2(D), 256)
+
+    y = torch.empty_like(x)
+    grid = (triton.cdiv(M, BT), triton.cdiv(D, BD))
+    causal_conv1d_fwd_kernel[grid](
+        x=x,
+        weight=weight,
+        bias=bias,
+        h0=initial_state,
+        y=y,
+        indices=indices,
+        M=M,
+        T=T,
+        D=D,
+        W=W,
+        WC=WC,
+        BT=BT,
+        BD=BD,
+        ACTIVATION=activation
+    )
+    final_state = None
+    if output_final_state:
+        final_state = x.new_empty(N, D, WC, dtype=initial_state.dtype if initial_state is not None else x.dtype)
+        BD = min(triton.next_power_of_2(D), 64)
+        causal_conv1d_states_fwd_kernel[(N, triton.cdiv(D, BD))](
+            x=x,
+            h0=initial_state,
+            ht=final_state,
+            offsets=offsets,
+            T=T,
+            D=D,
+            WC=WC,
+            BD=BD,
+            BW=triton.next_power_of_2(WC)
+        )
+    return y, final_state
 
-try:
-    from causal_conv1d import causal_conv1d_fn, causal_conv1d_update
-except ImportError:
-    causal_conv1d_fn = None
-    causal_conv1d_update = None
+
+def causal_conv1d_bwd(
+    x: torch.Tensor,
+    weight: torch.Tensor,
+    dy: torch.Tensor,
+    dht: Optional[torch.Tensor] = None,
+    bias: Optional[torch.Tensor] = None,
+    initial_state: Optional[torch.Tensor] = None,
+    activation: Optional[str] = None,
+    offsets: Optional[torch.LongTensor] = None,
+    indices: Optional[torch.LongTensor] = None
+) -> Tuple[torch.Tensor, ...]:
+    B, T, D, W = *x.shape, weight.shape[-1]
+    N = B if offsets is None else len(offsets) - 1
+    WC = initial_state.shape[-1] if initial_state is not None else W
+    M, BT, BD = B * T, 16, min(triton.next_power_of_2(D), 256)
+    NT = triton.cdiv(M, BT)
+
+    dx = torch.empty_like(x)
+    dw = x.new_empty(NT, D, W, dtype=torch.float)
+    db = x.new_empty(NT, D, dtype=torch.float) if bias is not None else None
+    grid = (NT, triton.cdiv(D, BD))
+    causal_conv1d_bwd_kernel[grid](
+        x=x,
+        weight=weight,
+        bias=bias,
+        h0=initial_state,
+        dy=dy,
+        dx=dx,
+        dw=dw,
+        db=db,
+        indices=indices,
+        offsets=offsets,
+        M=M,
+        T=T,
+        D=D,
+        W=W,
+        WC=WC,
+        BT=BT,
+        BD=BD,
+        ACTIVATION=activation
+    )
+    dw = dw.sum(0).to(weight)
+    db = db.sum(0).to(bias) if bias is not None else None
+    dh0 = None
+    if initial_state is not None:
+        dh0 = torch.zeros_like(initial_state)
+        BD = min(triton.next_power_of_2(D), 64)
+        causal_conv1d_states_bwd_kernel[(N, triton.cdiv(D, BD))](
+            x=x,
+            weight=weight,
+            bias=bias,
+            h0=initial_state,
+            dy=dy,
+            dh0=dh0,
+            offsets=offsets,
+            T=T,
+            D=D,
+            W=W,
+            WC=WC,
+            BD=BD,
+            BW=max(triton.next_power_of_2(W), 2),
+            ACTIVATION=activation
+        )
+    if dht is not None:
+        # the final states are the last `WC` inputs of each sequence, taken from the initial states if out of range
+        WC = dht.shape[-1]
+        if offsets is not None:
+            bos, eos = offsets[:-1], offsets[1:]
+        else:
+            bos = torch.arange(0, M, T, device=x.device)
+            eos = bos + T
+        # [N, WC], the positions of the inputs in the final states
+        i_s = eos[:, None] - WC + torch.arange(WC, device=x.device)
+        m_s = i_s >= bos[:, None]
+        dht = dht.transpose(1, 2)
+        dx.view(M, D).index_add_(0, i_s[m_s], dht[m_s].to(dx.dtype))
+        if dh0 is not None:
+            i_n, i_w = (~m_s).nonzero(as_tuple=True)
+            dh0[i_n, :, (i_s - bos[:, None] + WC)[i_n, i_w]] += dht[i_n, i_w].to(dh0.dtype)
+    return dx, dw, db, dh0
+
+
+class CausalConv1dFunction(torch.autograd.Function):
+
+    @staticmethod
+    @input_guard
+    def forward(ctx, x, weight, bias, initial_state, output_final_state, activation, offsets):
+        indices = prepare_token_indices(offsets, x.shape[1]) if offsets is not None else None
+        y, final_state = causal_conv1d_fwd(
+            x=x,
+            weight=weight,
+            bias=bias,
+            initial_state=initial_state,
+            output_final_state=output_final_state,
+            activation=activation,
+            offsets=offsets,
+            indices=indices
+        )
+        ctx.save_for_backward(x, weight, bias, initial_state)
+        ctx.activation = activation
+        ctx.offsets = offsets
+        ctx.indices = indices
+        return y, final_state
+
+    @staticmethod
+    @input_guard
+    def backward(ctx, dy, dht=None):
+        x, weight, bias, initial_state = ctx.saved_tensors
+        dx, dw, db, dh0 = causal_conv1d_bwd(
+            x=x,
+            weight=weight,
+            dy=dy,
+            dht=dht,
+            bias=bias,
+            initial_state=initial_state,
+            activation=ctx.activation,
+            offsets=ctx.offsets,
+            indices=ctx.indices
+        )
+        return dx, dw, db, dh0, None, None, None
+
+
+def causal_conv1d(
+    x: torch.Tensor,
+    weight: torch.Tensor,
+    bias: Optional[torch.Tensor] = None,
+    initial_state: Optional[torch.Tensor] = None,
+    output_final_state: bool = False,
+    activation: Optional[str] = None,
+    cu_seqlens: Optional[torch.LongTensor] = None
+) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+    r"""
+    Args:
+        x (torch.Tensor):
+            inputs of shape `[B, T, D]`.
+        weight (torch.Tensor):
+            depthwise convolution weights of shape `[D, W]`.
+        bias (Optional[torch.Tensor]):
+            biases of shape `[D]`. Default: `None`.
+        initial_state (Optional[torch.Tensor]):
+            The inputs preceding each sequence of shape `[N, D, WC]` for `N` input sequences,
+            where `WC >= W - 1` and the last column holds the latest input. Zeros are used if not provided.
+            Default: `None`.
+        output_final_state (Optional[bool]):
+            Whether to output the last `WC` inputs of each sequence of shape `[N, D, WC]`, with `WC = W` if no
+            initial state is provided. Default: `False`.
+        activation (Optional[str]):
+            The activation applied to the outputs, either `None`, `'silu'` or `'swish'`. Default: `None`.
+        cu_seqlens (torch.LongTensor):
+            Cumulative sequence lengths of shape `[N+1]` used for variable-length training,
+            consistent with the FlashAttention API. No inputs are convolved across sequence boundaries.
+
+    Returns:
+        y (torch.Tensor):
+            Outputs of shape `[B, T, D]`.
+        final_state (torch.Tensor):
+            Final state of shape `[N, D, WC]` if `output_final_state=True` else `None`.
+    """
+    assert activation in [None, 'silu', 'swish'], f"Activation `{activation}` not supported yet."
+    if cu_seqlens is not None:
+        if x.shape[0] != 1:
+            raise ValueError(f"The batch size is expected to be 1 rather than {x.shape[0]} when using `cu_seqlens`."
+                             f"Please flatten variable-length inputs before processing.")
+        if initial_state is not None and initial_state.shape[0] != len(cu_seqlens) - 1:
+            raise ValueError(f"The number of initial states is expected to be equal to the number of input sequences, "
+                             f"i.e., {len(cu_seqlens) - 1} rather than {initial_state.shape[0]}.")
+    if initial_state is not None:
+        assert initial_state.shape[-1] >= weight.shape[-1] - 1, "The cache must keep at least `W - 1` inputs."
+    return CausalConv1dFunction.apply(x, weight, bias, initial_state, output_final_state, activation, cu_seqlens)
 
 
 def fft_conv(u, k, dropout_mask, gelu=True, k_rev=None):
@@ -52,27 +534,17 @@ def proj_then_conv1d(
     cache: Optional[torch.Tensor] = None
 ) -> torch.Tensor:
     # We do matmul and transpose BLH -> HBL at the same time
-    x = rearrange(proj_weight @ rearrange(x, "b t d -> d (b t)"), "d (b t) -> b d t", t=x.shape[-2])
-
-    if causal_conv1d_fn is None:
-        raise ImportError("`causal_conv1d_fn` is not available. Please install `causal-conv1d` first.")
-    if cache is None:
-        x = causal_conv1d_fn(
-            x=x,
-            weight=rearrange(conv1d_weight, "d 1 w -> d w"),
-            bias=conv1d_bias,
-            activation="silu",
-        ).transpose(1, 2)
-    else:
-        assert x.shape[-1] == 1, "Only support decoding with 1 token at a time for now"
-        x = x.squeeze(-1)
-        x = causal_conv1d_update(
-            x=x,
-            weight=rearrange(conv1d_weight, "d 1 w -> d w"),
-            bias=conv1d_bias,
-            cache=cache,
-            activation="silu",
-        )
+    x = rearrange(proj_weight @ rearrange(x, "b t d -> d (b t)"), "d (b t) -> b t d", t=x.shape[-2])
+    x, final_state = causal_conv1d(
+        x=x,
+        weight=rearrange(conv1d_weight, "d 1 w -> d w"),
+        bias=conv1d_bias,
+        initial_state=cache,
+        output_final_state=cache is not None,
+        activation="silu"
+    )
+    if cache is not None:
+        cache.copy_(final_state)
     return x
 
 
@@ -108,18 +580,7 @@ class ShortConvolution(nn.Conv1d):
             assert activation in ['silu', 'swish'], f"Activation `{activation}` not supported yet."
             self.activation = activation
 
-        if causal_conv1d_fn is None:
-            if use_fast_conv1d:
-                raise RuntimeError(
-                    "Please either install `causal-conv1d>=1.4.0` to enable fast causal short convolution CUDA kernel "
-                    "or set `use_fast_conv1d` to False"
-                )
-            else:
-                warnings.warn(
-                    "The naive Pytorch verison is very slow in practice, "
-                    "please run `pip install causal-conv1d>=1.4.0` to install fast causal short convolution CUDA kernel",
-                    category=ImportWarning
-                )
+        # the Triton kernels are used by default, the naive Pytorch version is kept as a reference
         self.use_fast_conv1d = use_fast_conv1d
 
     def extra_repr(self):
@@ -150,6 +611,7 @@ class ShortConvolution(nn.Conv1d):
         cache: Optional[torch.Tensor] = None,
         output_final_state: bool = False,
         seq_idx: Optional[torch.Tensor] = None,
+        cu_seqlens: Optional[torch.LongTensor] = None
     ) -> Tuple[torch.Tensor, torch.Tensor]:
         """
         Args:
@@ -158,69 +620,111 @@ class ShortConvolution(nn.Conv1d):
             mask (`Optional[torch.Tensor]`):
                 Attention mask dealing with padded positions.
             cache (`Optional[torch.Tensor]`):
-                Previous cache tensor of shape `[batch_size, hidden_size, kernel_size]`.
-                If provided, the cache is updated **inplace**.
+                Previous cache tensor of shape `[N, hidden_size, kernel_size]`,
+                where `N` is the number of input sequences, i.e., `batch_size` or `len(cu_seqlens) - 1`.
+                If provided, the cache is updated **inplace**,
+                and the inputs of previous segments it holds are used as the initial state of the convolution.
+                Caches wider than `kernel_size` keep the inputs of more past tokens, e.g., to roll back draft tokens.
             output_final_state (Optional[bool]):
-                Whether to output the final state of shape `[batch_size, hidden_size, kernel_size]`. Default: `False`.
+                Whether to output the final state of shape `[N, hidden_size, kernel_size]`. Default: `False`.
             seq_idx (Optional[torch.Tensor]):
                 Sequence index for each token. Used for varlen. Default: `None`.
                 Shape: [batch_size, seq_len]
                 Suppose a batch consists of two sequences with lengths 3 and 4, seq_idx=[0, 0, 0, 1, 1, 1, 1] for this batch.
+            cu_seqlens (Optional[torch.LongTensor]):
+                Cumulative sequence lengths of shape `[N+1]` used for varlen, taking precedence over `seq_idx`.
+                Default: `None`.
         Returns:
             Tensor of shape `[batch_size, seq_len, hidden_size]`.
         """
 
-        batch_size, _, hidden_size = x.shape
+        batch_size, seq_len, hidden_size = x.shape
         if mask is not None:
             x = x.mul_(mask.unsqueeze(-1))
+        if cu_seqlens is None and seq_idx is not None:
+            cu_seqlens = F.pad(torch.bincount(seq_idx.flatten()).cumsum(0), (1, 0))
+        # continue from the inputs of previous segments if a cache is given, e.g., in chunked prefilling
+        initial_state = cache
         if output_final_state and cache is None:
-            cache = x.new_zeros(batch_size, hidden_size, self.kernel_size[0])
-        if cache is not None and x.shape[1] == 1:
+            N = batch_size if cu_seqlens is None else len(cu_seqlens) - 1
+            cache = x.new_zeros(N, hidden_size, self.kernel_size[0])
+        if cache is not None and seq_len == 1 and cu_seqlens is None:
             return self.step(x, cache)
-        x = rearrange(x, "b t d -> b d t")
-        # Update state (B D W)
-        if cache is not None:
-            cache.copy_(F.pad(x, (self.kernel_size[0] - x.shape[-1], 0)))
-        if self.use_fast_conv1d:
-            x = causal_conv1d_fn(
+
+        # the Triton kernels are not available for CPU tensors
+        if self.use_fast_conv1d and x.device.type != 'cpu':
+            x, final_state = causal_conv1d(
                 x=x,
                 weight=rearrange(self.weight, "d 1 w -> d w"),
                 bias=self.bias,
+                initial_state=initial_state,
+                output_final_state=cache is not None,
                 activation=self.activation,
-                seq_idx=seq_idx,
+                cu_seqlens=cu_seqlens
             )
-        else:
-            x = self._conv_forward(x, self.weight, self.bias)[..., :x.shape[-1]]
-            if self.activation is not None:
-                x = ACT2FN[self.activation](x)
-        return rearrange(x, "b d t -> b t d"), cache
+            if cache is not None:
+                cache.copy_(final_state)
+            return x, cache
+        if cu_seqlens is not None:
+            # no inputs are convolved across sequence boundaries
+            x = torch.cat([
+                self(x[:, bos:eos], cache=cache[i:i+1] if cache is not None else None)[0]
+                for i, (bos, eos) in enumerate(zip(cu_seqlens[:-1].tolist(), cu_seqlens[1:].tolist()))
+            ], 1)
+            return x, cache
+        x = rearrange(x, "b t d -> b d t")
+        if initial_state is not None:
+            x = torch.cat((initial_state.to(x.dtype), x), -1)
+        # Update state (B D W)
+        if cache is not None:
+            cache.copy_(F.pad(x, (cache.shape[-1] - x.shape[-1], 0)))
+        x = self._conv_forward(x, self.weight, self.bias)[..., :x.shape[-1]]
+        if self.activation is not None:
+            x = ACT2FN[self.activation](x)
+        return rearrange(x[..., -seq_len:], "b d t -> b t d"), cache
 
     def step(
         self,
         x: torch.Tensor,
         cache: torch.Tensor
     ):
-        assert x.shape[1] == 1, "Only support decoding with 1 token at a time for now"
+        """
+        Decodes one or more tokens of each sequence, e.g., draft tokens in speculative decoding,
+        continuing from and updating the cache **inplace**.
 
-        x = x.squeeze(1)
-        if self.use_fast_conv1d:
-            x = causal_conv1d_update(
+        Args:
+            x (`torch.Tensor`):
+                Tensor of shape `[batch_size, seq_len, hidden_size]`
+            cache (`torch.Tensor`):
+                Previous cache tensor of shape `[batch_size, hidden_size, kernel_size]`.
+        Returns:
+            Tensor of shape `[batch_size, seq_len, hidden_size]` and the updated cache.
+        """
+
+        if self.use_fast_conv1d and x.device.type != 'cpu':
+            x, final_state = causal_conv1d(
                 x=x,
-                conv_state=cache,
                 weight=rearrange(self.weight, "d 1 w -> d w"),
                 bias=self.bias,
-                activation=self.activation,
+                initial_state=cache,
+                output_final_state=True,
+                activation=self.activation
             )
-        else:
-            dtype = x.dtype
+            cache.copy_(final_state)
+            return x, cache
+
+        dtype = x.dtype
+        o = []
+        for i in range(x.shape[1]):
             cache.copy_(torch.roll(cache, shifts=-1, dims=-1))
-            cache[:, :, -1] = x
-            x = torch.sum(cache * rearrange(self.weight, "d 1 w -> d w"), dim=-1)
+            cache[:, :, -1] = x[:, i]
+            o_i = torch.sum(cache[..., -self.kernel_size[0]:] * rearrange(self.weight, "d 1 w -> d w"), dim=-1)
             if self.bias is not None:
-                x = x + self.bias
+                o_i = o_i + self.bias
             if self.activation is not None:
-                x = ACT2FN[self.activation](x).to(dtype=dtype)
-        return x.unsqueeze(1), cache
+                o_i = ACT2FN[self.activation](o_i)
+            o.append(o_i.to(dtype=dtype))
+        return torch.stack(o, 1), cache
 
     @property
     def state_size(self) -> int:
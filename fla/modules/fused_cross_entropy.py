@@ -6,6 +6,7 @@ from typing import Any, Tuple
 
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import triton
 import triton.language as tl
 
@@ -328,6 +329,12 @@ def cross_entropy_loss(
         losses: [batch,], float
         z_losses: [batch,], float
     """
+    if logits.device.type == 'cpu' and process_group is None:
+        # the kernels are unavailable without an active driver, so the CPU inputs are handled by autograd
+        logits = logits.float() * logit_scale
+        losses = F.cross_entropy(logits, target, ignore_index=ignore_index, label_smoothing=label_smoothing, reduction='none')
+        z_losses = lse_square_scale * logits.logsumexp(-1).square().masked_fill(target == ignore_index, 0)
+        return losses + z_losses, z_losses
     return CrossEntropyLossFunction.apply(
         logits,
         target,
@@ -387,7 +394,7 @@ class FusedCrossEntropyLoss(nn.Module):
             losses: (batch,) if reduction is 'none', else (1,), dtype float
             z_loss: (batch,) if reduction is 'none', else (1,), dtype float (if self.return_z_loss)
         """
-        assert input.is_cuda and target.is_cuda, "Only support CUDA tensors"
+        assert input.device.type == 'cpu' or (input.is_cuda and target.is_cuda), "Only support CUDA and CPU tensors"
         loss, z_loss = cross_entropy_loss(
             input,
             target,
@@ -431,6 +431,10 @@ def fused_linear_cross_entropy_loss(
     Returns:
         losses: [batch,], float
     """
+    if x.device.type == 'cpu':
+        # the kernels are unavailable without an active driver, so the CPU inputs are handled by autograd
+        logits = F.linear(x, weight, bias).float() * logit_scale
+        return F.cross_entropy(logits, target, ignore_index=ignore_index, label_smoothing=label_smoothing, reduction=reduction)
     return FusedLinearCrossEntropyFunction.apply(
         x,
         target,
@@ -12,9 +12,30 @@ import torch.nn.functional as F
 import triton
 import triton.language as tl
 
+from fla.modules.layernorm import norm_cpu
 from fla.utils import get_multiprocessor_count, input_guard
 
 
+def norm_gated_cpu(
+    x: torch.Tensor,
+    g: torch.Tensor,
+    weight: torch.Tensor,
+    bias: torch.Tensor,
+    activation: str = 'swish',
+    residual: Optional[torch.Tensor] = None,
+    eps: float = 1e-6,
+    prenorm: bool = False,
+    residual_in_fp32: bool = False,
+    is_rms_norm: bool = False
+):
+    # the kernels are unavailable without an active driver, so the CPU inputs are gated by autograd
+    y = norm_cpu(x.float(), weight, bias, residual, eps, prenorm, residual_in_fp32, is_rms_norm)
+    y, residual_out = y if prenorm else (y, None)
+    g = g.float()
+    y = y * (F.silu(g) if activation in ('swish', 'silu') else g.sigmoid())
+    return y.to(x.dtype) if not prenorm else (y.to(x.dtype), residual_out)
+
+
 @triton.autotune(
     configs=[
         triton.Config({}, num_warps=num_warps, num_stages=num_stages)
@@ -571,6 +592,8 @@ def layer_norm_gated(
     residual_in_fp32: bool = False,
     eps: float = 1e-6
 ):
+    if x.device.type == 'cpu':
+        return norm_gated_cpu(x, g, weight, bias, activation, residual, eps, prenorm, residual_in_fp32, False)
     return LayerNormGatedFunction.apply(
         x,
         g,
@@ -596,6 +619,8 @@ def rms_norm_gated(
     residual_in_fp32: bool = False,
     eps: float = 1e-6
 ):
+    if x.device.type == 'cpu':
+        return norm_gated_cpu(x, g, weight, bias, activation, residual, eps, prenorm, residual_in_fp32, True)
     return LayerNormGatedFunction.apply(
         x,
         g,
@@ -622,6 +647,11 @@ def layer_norm_swish_gate_linear(
     residual_in_fp32: bool = False,
     eps: float = 1e-6
 ):
+    if x.device.type == 'cpu':
+        y = norm_gated_cpu(x, g, norm_weight, norm_bias, 'swish', residual, eps, prenorm, residual_in_fp32, False)
+        y, residual_out = y if prenorm else (y, None)
+        y = F.linear(y, linear_weight.to(y.dtype), linear_bias.to(y.dtype) if linear_bias is not None else None)
+        return y if not prenorm else (y, residual_out)
     return LayerNormGatedLinearFunction.apply(
         x,
         g,
@@ -649,6 +679,11 @@ def rms_norm_swish_gate_linear(
     residual_in_fp32: bool = False,
     eps: float = 1e-6
 ):
+    if x.device.type == 'cpu':
+        y = norm_gated_cpu(x, g, norm_weight, norm_bias, 'swish', residual, eps, prenorm, residual_in_fp32, True)
+        y, residual_out = y if prenorm else (y, None)
+        y = F.linear(y, linear_weight.to(y.dtype), linear_bias.to(y.dtype) if linear_bias is not None else None)
+        return y if not prenorm else (y, residual_out)
     return LayerNormGatedLinearFunction.apply(
         x,
         g,
@@ -72,6 +72,28 @@ def rms_norm_ref(
     return out if not prenorm else (out, x)
 
 
+def norm_cpu(
+    x: torch.Tensor,
+    weight: torch.Tensor,
+    bias: torch.Tensor,
+    residual: torch.Tensor = None,
+    eps: float = 1e-5,
+    prenorm: bool = False,
+    residual_in_fp32: bool = False,
+    is_rms_norm: bool = False
+):
+    # the kernels are unavailable without an active driver, so the CPU inputs are normalized in float32 by autograd
+    dtype = x.dtype
+    residual_dtype = torch.float if residual_in_fp32 else (residual.dtype if residual is not None else dtype)
+    x = x.float()
+    if residual is not None:
+        x = x + residual.float()
+    norm_ref = rms_norm_ref if is_rms_norm else layer_norm_ref
+    weight = weight.float() if weight is not None else x.new_ones(x.shape[-1])
+    out = norm_ref(x, weight, bias.float() if bias is not None else None, eps=eps).to(dtype)
+    return out if not prenorm else (out, x.to(residual_dtype))
+
+
 @triton.autotune(
     configs=[
         triton.Config({}, num_warps=num_warps, num_stages=num_stages)
@@ -471,6 +493,8 @@ def layer_norm(
     residual_in_fp32: bool = False,
     is_rms_norm: bool = False
 ):
+    if x.device.type == 'cpu':
+        return norm_cpu(x, weight, bias, residual, eps, prenorm, residual_in_fp32, is_rms_norm)
     return LayerNormFunction.apply(
         x,
         weight,
@@ -516,6 +540,8 @@ def rms_norm(
     prenorm: bool = False,
     residual_in_fp32: bool = False
 ):
+    if x.device.type == 'cpu':
+        return norm_cpu(x, weight, bias, residual, eps, prenorm, residual_in_fp32, True)
     return LayerNormFunction.apply(
         x,
         weight,
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023-2025, Songlin Yang, Yu Zhang
+
+from typing import Optional
+
+import torch
+import triton
+import triton.language as tl
+
+from fla.ops.common.utils import prepare_token_indices
+from fla.utils import input_guard
+
+
+@triton.heuristics({
+    'USE_INITIAL_STATE': lambda args: args['h0'] is not None,
+    'USE_OFFSETS': lambda args: args['indices'] is not None
+})
+@triton.autotune(
+    configs=[
+        triton.Config({}, num_warps=num_warps)
+        for num_warps in [1, 2, 4, 8]
+    ],
+    key=['N', 'BD', 'DATA_DEPENDENT']
+)
+@triton.jit(do_not_specialize=['T'])
+def token_shift_lerp_fwd_kernel(
+    x,
+    mu,
+    h0,
+    y,
+    indices,
+    M,
+    T,
+    D: tl.constexpr,
+    N: tl.constexpr,
+    BT: tl.constexpr,
+    BD: tl.constexpr,
+    DATA_DEPENDENT: tl.constexpr,
+    USE_INITIAL_STATE: tl.constexpr,
+    USE_OFFSETS: tl.constexpr
+):
+    i_t, i_d = tl.program_id(0), tl.program_id(1)
+    # [BT], the rows of the flattened inputs, along with the sequences and positions they belong to
+    o_t = i_t * BT + tl.arange(0, BT)
+    m_t = o_t < M
+    if USE_OFFSETS:
+        i_n = tl.load(indices + o_t * 2, mask=m_t, other=0).to(tl.int32)
+        i_p = tl.load(indices + o_t * 2 + 1, mask=m_t, other=0).to(tl.int32)
+    else:
+        i_n, i_p = o_t // T, o_t % T
+    o_d = i_d * BD + tl.arange(0, BD)
+    m_d = o_d < D
+    m_x = m_t[:, None] & m_d[None, :]
+
+    b_x = tl.load(x + o_t[:, None] * D + o_d[None, :], mask=m_x, other=0).to(tl.float32)
+    # the previous token, which is taken from the cache at the start of each sequence
+    b_xp = tl.load(x + (o_t - 1)[:, None] * D + o_d[None, :], mask=m_x & (i_p > 0)[:, None], other=0).to(tl.float32)
+    if USE_INITIAL_STATE:
+        b_xp += tl.load(h0 + i_n[:, None] * D + o_d[None, :], mask=m_x & (i_p == 0)[:, None], other=0).to(tl.float32)
+    b_delta = b_xp - b_x
+    for i in range(N):
+        if DATA_DEPENDENT:
+            b_mu = tl.load(mu + (o_t[:, None] * N + i) * D + o_d[None, :], mask=m_x, other=0).to(tl.float32)
+        else:
+            b_mu = tl.load(mu + i * D + o_d, mask=m_d, other=0).to(tl.float32)[None, :]
+        b_y = b_x + b_delta * b_mu
+        tl.store(y + (i * M + o_t[:, None]) * D + o_d[None, :], b_y.to(y.dtype.element_ty), mask=m_x)
+
+
+@triton.heuristics({
+    'USE_INITIAL_STATE': lambda args: args['dh0'] is not None,
+    'USE_OFFSETS': lambda args: args['indices'] is not None
+})
+@triton.autotune(
+    configs=[
+        triton.Config({}, num_warps=num_warps)
+        for num_warps in [1, 2, 4, 8]
+    ],
+    key=['N', 'BD', 'DATA_DEPENDENT']
+)
+@triton.jit(do_not_specialize=['T'])
+def token_shift_lerp_bwd_kernel(
+    x,
+    mu,
+    h0,
+    dy,
+    dx,
+    dmu,
+    dh0,
+    indices,
+    M,
+    T,
+    D: tl.constexpr,
+    N: tl.constexpr,
+    BT: tl.constexpr,
+    BD: tl.constexpr,
+    DATA_DEPENDENT: tl.constexpr,
+    USE_INITIAL_STATE: tl.constexpr,
+    USE_OFFSETS: tl.constexpr
+):
+    i_t, i_d = tl.program_id(0), tl.program_id(1)
+    o_t = i_t * BT + tl.arange(0, BT)
+    m_t = o_t < M
+    if USE_OFFSETS:
+        i_n = tl.load(indices + o_t * 2, mask=m_t, other=0).to(tl.int32)
+        i_p = tl.load(indices + o_t * 2 + 1, mask=m_t, other=0).to(tl.int32)
+        # whether the next token belongs to the same sequence, to which the current one is shifted
+        m_n = (o_t + 1 < M) & (tl.load(indices + (o_t + 1) * 2 + 1, mask=o_t + 1 < M, other=0) > 0)
+    else:
+        i_n, i_p = o_t // T, o_t % T
+        m_n = m_t & (i_p + 1 < T)
+    o_d = i_d * BD + tl.arange(0, BD)
+    m_d = o_d < D
+    m_x = m_t[:, None] & m_d[None, :]
+
+    b_x = tl.load(x + o_t[:, None] * D + o_d[None, :], mask=m_x, other=0).to(tl.float32)
+    b_xp = tl.load(x + (o_t - 1)[:, None] * D + o_d[None, :], mask=m_x & (i_p > 0)[:, None], other=0).to(tl.float32)
+    if USE_INITIAL_STATE:
+        b_xp += tl.load(h0 + i_n[:, None] * D + o_d[None, :], mask=m_x & (i_p == 0)[:, None], other=0).to(tl.float32)
+    b_delta = b_xp - b_x
+
+    b_dx = tl.zeros([BT, BD], dtype=tl.float32)
+    # the gradients w.r.t. the previous tokens
+    b_dxp = tl.zeros([BT, BD], dtype=tl.float32)
+    for i in range(N):
+        b_dy = tl.load(dy + (i * M + o_t[:, None]) * D + o_d[None, :], mask=m_x, other=0).to(tl.float32)
+        b_dyn = tl.load(dy + (i * M + o_t[:, None] + 1) * D + o_d[None, :], mask=m_n[:, None] & m_d[None, :], other=0)
+        if DATA_DEPENDENT:
+            b_mu = tl.load(mu + (o_t[:, None] * N + i) * D + o_d[None, :], mask=m_x, other=0).to(tl.float32)
+            b_mun = tl.load(mu + ((o_t[:, None] + 1) * N + i) * D + o_d[None, :], mask=m_n[:, None] & m_d[None, :], other=0)
+            b_mun = b_mun.to(tl.float32)
+        else:
+            b_mu = tl.load(mu + i * D + o_d, mask=m_d, other=0).to(tl.float32)[None, :]
+            b_mun = b_mu
+        b_dx += b_dy * (1 - b_mu) + b_dyn.to(tl.float32) * b_mun
+        b_dxp += b_dy * b_mu
+        if DATA_DEPENDENT:
+            p_dmu = dmu + (o_t[:, None] * N + i) * D + o_d[None, :]
+            tl.store(p_dmu, (b_dy * b_delta).to(p_dmu.dtype.element_ty), mask=m_x)
+        else:
+            # partial sums over the rows of the block, reduced over all blocks afterwards
+            p_dmu = dmu + (i_t * N + i) * D + o_d
+            tl.store(p_dmu, tl.sum(b_dy * b_delta, 0).to(p_dmu.dtype.element_ty), mask=m_d)
+    tl.store(dx + o_t[:, None] * D + o_d[None, :], b_dx.to(dx.dtype.element_ty), mask=m_x)
+    if USE_INITIAL_STATE:
+        p_dh0 = dh0 + i_n[:, None] * D + o_d[None, :]
+        tl.store(p_dh0, b_dxp.to(p_dh0.dtype.element_ty), mask=m_x & (i_p == 0)[:, None])
+
+
+def token_shift_lerp_fwd(
+    x: torch.Tensor,
+    mu: torch.Tensor,
+    initial_state: Optional[torch.Tensor] = None,
+    indices: Optional[torch.LongTensor] = None
+) -> torch.Tensor:
+    B, T, D = x.shape
+    M, N = B * T, mu.shape[-2]
+    BT, BD = 16, min(triton.next_power_of_2(D), 256)
+
+    y = x.new_empty(N, B, T, D)
+    grid = (triton.cdiv(M, BT), triton.cdiv(D, BD))
+    token_shift_lerp_fwd_kernel[grid](
+        x=x,
+        mu=mu,
+        h0=initial_state,
+        y=y,
+        indices=indices,
+        M=M,
+        T=T,
+        D=D,
+        N=N,
+        BT=BT,
+        BD=BD,
+        DATA_DEPENDENT=mu.dim() > 2
+    )
+    return y
+
+
+def token_shift_lerp_bwd(
+    x: torch.Tensor,
+    mu: torch.Tensor,
+    dy: torch.Tensor,
+    initial_state: Optional[torch.Tensor] = None,
+    indices: Optional[torch.LongTensor] = None
+):
+    B, T, D = x.shape
+    M, N = B * T, mu.shape[-2]
+    BT, BD = 16, min(triton.next_power_of_2(D), 256)
+    NT = triton.cdiv(M, BT)
+    data_dependent = mu.dim() > 2
+
+    dx = torch.empty_like(x)
+    dmu = torch.empty_like(mu, dtype=torch.float) if data_dependent else x.new_empty(NT, N, D, dtype=torch.float)
+    dh0 = torch.zeros_like(initial_state) if initial_state is not None else None
+    grid = (NT, triton.cdiv(D, BD))
+    token_shift_lerp_bwd_kernel[grid](
+        x=x,
+        mu=mu,
+        h0=initial_state,
+        dy=dy,
+        dx=dx,
+        dmu=dmu,
+        dh0=dh0,
+        indices=indices,
+        M=M,
+        T=T,
+        D=D,
+        N=N,
+        BT=BT,
+        BD=BD,
+        DATA_DEPENDENT=data_dependent
+    )
+    if not data_dependent:
+        dmu = dmu.sum(0)
+    return dx, dmu.to(mu), dh0
+
+
+class TokenShiftLerpFunction(torch.autograd.Function):
+
+    @staticmethod
+    @input_guard
+    def forward(ctx, x, mu, initial_state, offsets):
+        indices = prepare_token_indices(offsets, x.shape[1]) if offsets is not None else None
+        y = token_shift_lerp_fwd(x, mu, initial_state, indices)
+        ctx.save_for_backward(x, mu, initial_state)
+        ctx.indices = indices
+        return y
+
+    @staticmethod
+    @input_guard
+    def backward(ctx, dy):
+        x, mu, initial_state = ctx.saved_tensors
+        dx, dmu, dh0 = token_shift_lerp_bwd(x, mu, dy, initial_state, ctx.indices)
+        return dx, dmu, dh0, None
+
+
+def token_shift_lerp(
+    x: torch.Tensor,
+    mu: torch.Tensor,
+    initial_state: Optional[torch.Tensor] = None,
+    cu_seqlens: Optional[torch.LongTensor] = None
+) -> torch.Tensor:
+    r"""
+    Interpolates each token with its predecessor, i.e., `x_t + (x_{t-1} - x_t) * mu`, for several mixing weights at once.
+    Neither the shifted inputs nor their differences to the inputs are materialized.
+
+    Args:
+        x (torch.Tensor):
+            inputs of shape `[B, T, D]`.
+        mu (torch.Tensor):
+            mixing weights of shape `[N, D]` shared by all tokens, or data-dependent ones of shape `[B, T, N, D]`.
+        initial_state (Optional[torch.Tensor]):
+            The tokens preceding each sequence, e.g., the last ones of the previous step during decoding,
+            of shape `[N_seq, D]` for `N_seq` input sequences. Zeros are used if not provided. Default: `None`.
+        cu_seqlens (torch.LongTensor):
+            Cumulative sequence lengths of shape `[N_seq+1]` used for variable-length training,
+            consistent with the FlashAttention API. No token is shifted across sequence boundaries.
+
+    Returns:
+        Interpolated inputs of shape `[N, B, T, D]`.
+    """
+    if cu_seqlens is not None:
+        if x.shape[0] != 1:
+            raise ValueError(f"The batch size is expected to be 1 rather than {x.shape[0]} when using `cu_seqlens`."
+                             f"Please flatten variable-length inputs before processing.")
+        if initial_state is not None and initial_state.shape[0] != len(cu_seqlens) - 1:
+            raise ValueError(f"The number of initial states is expected to be equal to the number of input sequences, "
+                             f"i.e., {len(cu_seqlens) - 1} rather than {initial_state.shape[0]}.")
+    return TokenShiftLerpFunction.apply(x, mu, initial_state, cu_seqlens)
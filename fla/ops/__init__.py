@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 
-from .abc import chunk_abc
-from .based import fused_chunk_based, parallel_based
+from .abc import chunk_abc, fused_recurrent_abc
+from .based import fused_chunk_based, fused_recurrent_based, parallel_based
 from .delta_rule import chunk_delta_rule, fused_chunk_delta_rule, fused_recurrent_delta_rule
 from .gated_delta_rule import chunk_gated_delta_rule, fused_recurrent_gated_delta_rule
 from .generalized_delta_rule import (
@@ -22,8 +22,8 @@ from .rwkv7 import chunk_rwkv7, fused_recurrent_rwkv7
 from .simple_gla import chunk_simple_gla, fused_recurrent_simple_gla, parallel_simple_gla
 
 __all__ = [
-    'chunk_abc',
-    'fused_chunk_based', 'parallel_based',
+    'chunk_abc', 'fused_recurrent_abc',
+    'fused_chunk_based', 'fused_recurrent_based', 'parallel_based',
     'chunk_delta_rule', 'fused_chunk_delta_rule', 'fused_recurrent_delta_rule',
     'chunk_gated_delta_rule', 'fused_recurrent_gated_delta_rule',
     'chunk_dplr_delta_rule', 'chunk_iplr_delta_rule',
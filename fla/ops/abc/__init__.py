@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 
 from .chunk import chunk_abc
+from .fused_recurrent import fused_recurrent_abc
 
 __all__ = [
-    'chunk_abc'
+    'chunk_abc',
+    'fused_recurrent_abc'
 ]
@@ -52,7 +52,9 @@ def chunk_abc_fwd_kernel_h(
         # [BT, BV]
         b_v = tl.load(p_v, boundary_check=(0, 1))
         if NORMK:
-            p_zc = tl.make_block_ptr(z + i_bh * T*K, (T * K,), (1,), ((i_t * BT + BT - 1) * K + i_k * BK,), (BK,), (0,))
+            # the last position of the chunk, which may be truncated at the end of the sequence
+            p_zc = tl.make_block_ptr(z + i_bh * T*K, (T * K,), (1,), ((tl.minimum(i_t * BT + BT, T) - 1) * K + i_k * BK,),
+                                     (BK,), (0,))
             # [BK,]
             b_zc = tl.load(p_zc, boundary_check=(0,))
             b_r, b_zp = tl.exp(b_zp - b_zc), b_zc
@@ -60,7 +62,9 @@ def chunk_abc_fwd_kernel_h(
             b_h = b_h * b_r[:, None]
             b_k = tl.exp(b_k - b_zc[:, None]).to(b_k.dtype)
         else:
-            p_zc = tl.make_block_ptr(z + i_bh * T*V, (T * V,), (1,), ((i_t * BT + BT - 1) * V + i_v * BV,), (BV,), (0,))
+            # the last position of the chunk, which may be truncated at the end of the sequence
+            p_zc = tl.make_block_ptr(z + i_bh * T*V, (T * V,), (1,), ((tl.minimum(i_t * BT + BT, T) - 1) * V + i_v * BV,),
+                                     (BV,), (0,))
             # [BV,]
             b_zc = tl.load(p_zc, boundary_check=(0,))
             b_r, b_zp = tl.exp(b_zp - b_zc), b_zc
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023-2025, Songlin Yang, Yu Zhang
+
+from typing import Optional, Tuple
+
+import torch
+import triton
+import triton.language as tl
+
+from fla.utils import input_guard
+
+
+@triton.heuristics({
+    'USE_INITIAL_STATE': lambda args: args['hk0'] is not None,
+    'STORE_FINAL_STATE': lambda args: args['hkt'] is not None,
+    'USE_OFFSETS': lambda args: args['offsets'] is not None
+})
+@triton.autotune(
+    configs=[
+        triton.Config({}, num_warps=num_warps)
+        for num_warps in [1, 2, 4]
+    ],
+    key=['BK', 'BV', 'BM'],
+)
+@triton.jit(do_not_specialize=['T'])
+def fused_recurrent_abc_fwd_kernel(
+    q,
+    k,
+    v,
+    s,
+    o,
+    hk0,
+    hv0,
+    z0,
+    hkt,
+    hvt,
+    zt,
+    offsets,
+    scale,
+    T,
+    B: tl.constexpr,
+    H: tl.constexpr,
+    K: tl.constexpr,
+    V: tl.constexpr,
+    M: tl.constexpr,
+    BK: tl.constexpr,
+    BV: tl.constexpr,
+    BM: tl.constexpr,
+    USE_INITIAL_STATE: tl.constexpr,
+    STORE_FINAL_STATE: tl.constexpr,
+    USE_OFFSETS: tl.constexpr,
+    HEAD_FIRST: tl.constexpr
+):
+    i_v, i_nh = tl.program_id(0).to(tl.int64), tl.program_id(1).to(tl.int64)
+    i_n, i_h = i_nh // H, i_nh % H
+    if USE_OFFSETS:
+        bos, eos = tl.load(offsets + i_n).to(tl.int64), tl.load(offsets + i_n + 1).to(tl.int64)
+        T = eos - bos
+    else:
+        bos, eos = i_n * T, i_n * T + T
+
+    o_k = tl.arange(0, BK)
+    o_v = i_v * BV + tl.arange(0, BV)
+    o_m = tl.arange(0, BM)
+    mask_k, mask_v, mask_m = o_k < K, o_v < V, o_m < M
+    mask_hk = mask_k[:, None] & mask_m[None, :]
+    mask_hv = mask_m[:, None] & mask_v[None, :]
+
+    if HEAD_FIRST:
+        p_q = q + i_nh * T*K + o_k
+        p_k = k + i_nh * T*K + o_k
+        p_v = v + i_nh * T*V + o_v
+        p_s = s + i_nh * T*M + o_m
+        p_o = o + i_nh * T*V + o_v
+    else:
+        p_q = q + (bos * H + i_h) * K + o_k
+        p_k = k + (bos * H + i_h) * K + o_k
+        p_v = v + (bos * H + i_h) * V + o_v
+        p_s = s + (bos * H + i_h) * M + o_m
+        p_o = o + (bos * H + i_h) * V + o_v
+
+    # [BK, BM], the slot keys, the whole of which is needed by the softmax over the slots
+    b_hk = tl.zeros([BK, BM], dtype=tl.float32)
+    # [BM, BV], the slot values
+    b_hv = tl.zeros([BM, BV], dtype=tl.float32)
+    # [BM], the running log-normalizers of the slot writing weights
+    b_z = tl.full([BM], float('-inf'), dtype=tl.float32)
+    if USE_INITIAL_STATE:
+        b_hk += tl.load(hk0 + i_nh * K*M + o_k[:, None] * M + o_m[None, :], mask=mask_hk, other=0).to(tl.float32)
+        b_hv += tl.load(hv0 + i_nh * M*V + o_m[:, None] * V + o_v[None, :], mask=mask_hv, other=0).to(tl.float32)
+        b_z = tl.load(z0 + i_nh * M + o_m, mask=mask_m, other=0).to(tl.float32)
+
+    for _ in range(0, T):
+        b_q = tl.load(p_q, mask=mask_k, other=0).to(tl.float32) * scale
+        b_k = tl.load(p_k, mask=mask_k, other=0).to(tl.float32)
+        b_v = tl.load(p_v, mask=mask_v, other=0).to(tl.float32)
+        b_s = tl.load(p_s, mask=mask_m, other=0).to(tl.float32)
+
+        # [BM], rescale the memories to the updated normalizers and weight the incoming token
+        b_zc = tl.maximum(b_z, b_s)
+        b_zc = b_zc + tl.log(tl.exp(b_z - b_zc) + tl.exp(b_s - b_zc))
+        b_r, b_w, b_z = tl.exp(b_z - b_zc), tl.exp(b_s - b_zc), b_zc
+
+        b_hk = b_hk * b_r[None, :] + b_k[:, None] * b_w[None, :]
+        # [BM]
+        b_ok = tl.sum(b_q[:, None] * b_hk, 0)
+        b_ok = tl.where(mask_m, b_ok, float('-inf'))
+        b_p = tl.exp(b_ok - tl.max(b_ok, 0))
+        b_p = b_p / tl.sum(b_p, 0)
+
+        b_hv = b_hv * b_r[:, None] + b_w[:, None] * b_v[None, :]
+        # [BV]
+        b_o = tl.sum(b_p[:, None] * b_hv, 0)
+        tl.store(p_o, b_o.to(p_o.dtype.element_ty), mask=mask_v)
+
+        p_q += K if HEAD_FIRST else H*K
+        p_k += K if HEAD_FIRST else H*K
+        p_v += V if HEAD_FIRST else H*V
+        p_s += M if HEAD_FIRST else H*M
+        p_o += V if HEAD_FIRST else H*V
+
+    if STORE_FINAL_STATE:
+        tl.store(hvt + i_nh * M*V + o_m[:, None] * V + o_v[None, :], b_hv.to(hvt.dtype.element_ty), mask=mask_hv)
+        # the slot keys and normalizers are identical across the value blocks
+        if i_v == 0:
+            tl.store(hkt + i_nh * K*M + o_k[:, None] * M + o_m[None, :], b_hk.to(hkt.dtype.element_ty), mask=mask_hk)
+            tl.store(zt + i_nh * M + o_m, b_z.to(zt.dtype.element_ty), mask=mask_m)
+
+
+class FusedRecurrentABCFunction(torch.autograd.Function):
+
+    @staticmethod
+    @input_guard
+    def forward(
+        ctx,
+        q: torch.Tensor,
+        k: torch.Tensor,
+        v: torch.Tensor,
+        s: torch.Tensor,
+        scale: float,
+        hk0: Optional[torch.Tensor] = None,
+        hv0: Optional[torch.Tensor] = None,
+        z0: Optional[torch.Tensor] = None,
+        output_final_state: bool = False,
+        offsets: Optional[torch.LongTensor] = None,
+        head_first: bool = True
+    ):
+        if head_first:
+            B, H, T, K, V, M = *k.shape, v.shape[-1], s.shape[-1]
+        else:
+            B, T, H, K, V, M = *k.shape, v.shape[-1], s.shape[-1]
+        N = B if offsets is None else len(offsets) - 1
+        BK, BM = triton.next_power_of_2(K), triton.next_power_of_2(M)
+        BV = min(triton.next_power_of_2(V), 64)
+        NV = triton.cdiv(V, BV)
+        assert BK <= 256, "The recurrent ABC kernel keeps the whole slot keys on chip, which supports up to 256 key dims."
+
+        o = torch.empty_like(v)
+        hkt, hvt, zt = None, None, None
+        if output_final_state:
+            hkt = q.new_empty(N, H, K, M, dtype=torch.float)
+            hvt = q.new_empty(N, H, M, V, dtype=torch.float)
+            zt = q.new_empty(N, H, M, dtype=torch.float)
+
+        grid = (NV, N * H)
+        fused_recurrent_abc_fwd_kernel[grid](
+            q=q,
+            k=k,
+            v=v,
+            s=s,
+            o=o,
+            hk0=hk0,
+            hv0=hv0,
+            z0=z0,
+            hkt=hkt,
+            hvt=hvt,
+            zt=zt,
+            offsets=offsets,
+            scale=scale,
+            T=T,
+            B=B,
+            H=H,
+            K=K,
+            V=V,
+            M=M,
+            BK=BK,
+            BV=BV,
+            BM=BM,
+            HEAD_FIRST=head_first
+        )
+        return o, hkt, hvt, zt
+
+    @staticmethod
+    @input_guard
+    def backward(ctx, do, dhkt=None, dhvt=None, dzt=None):
+        raise NotImplementedError(
+            "Backward pass is not implemented as the recurrent kernel is meant for decoding. "
+            "Please use `chunk_abc` for training."
+        )
+
+
+def fused_recurrent_abc(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    s: torch.Tensor,
+    scale: Optional[float] = None,
+    initial_state: Optional[Tuple[torch.Tensor]] = None,
+    output_final_state: bool = False,
+    cu_seqlens: Optional[torch.LongTensor] = None,
+    head_first: bool = True
+) -> Tuple[torch.Tensor, Tuple[torch.Tensor]]:
+    r"""
+    Args:
+        q (torch.Tensor):
+            queries of shape `[B, H, T, K]` if `head_first=True` else `[B, T, H, K]`.
+        k (torch.Tensor):
+            keys of shape `[B, H, T, K]` if `head_first=True` else `[B, T, H, K]`.
+        v (torch.Tensor):
+            values of shape `[B, H, T, V]` if `head_first=True` else `[B, T, H, V]`.
+        s (torch.Tensor):
+            slot representations of shape `[B, H, T, M]` if `head_first=True` else `[B, T, H, M]`.
+        scale (Optional[int]):
+            Scale factor for the attention scores.
+            If not provided, it will default to `1 / sqrt(K)`. Default: `None`.
+        initial_state (Optional[Tuple[torch.Tensor]]):
+            Initial state tuple having tensors of shape `[N, H, K, M]`, `[N, H, M, V]` and `[N, H, M]`
+            for `N` input sequences, i.e., the slot keys, the slot values and the log-normalizers of the slots.
+            For equal-length input sequences, `N` equals the batch size `B`.
+            Default: `None`.
+        output_final_state (Optional[bool]):
+            Whether to output the final state tuple. Default: `False`.
+        cu_seqlens (torch.LongTensor):
+            Cumulative sequence lengths of shape `[N+1]` used for variable-length inputs,
+            consistent with the FlashAttention API.
+        head_first (Optional[bool]):
+            Whether the inputs are in the head-first format, which is not supported for variable-length inputs.
+            Default: `True`.
+
+    Returns:
+        o (torch.Tensor):
+            Outputs of shape `[B, H, T, V]` if `head_first=True` else `[B, T, H, V]`.
+        final_state (Tuple[torch.Tensor]):
+            Final state tuple having tensors of shape `[N, H, K, M]`, `[N, H, M, V]` and `[N, H, M]`
+            if `output_final_state=True` else `None`.
+
+    The slot memories are kept normalized by the running `logsumexp` of `s`,
+    so that the states after the prefilling by `chunk_abc` can be resumed by appending `s.logsumexp` over time.
+
+    Examples::
+        >>> import torch
+        >>> from einops import rearrange
+        >>> from fla.ops.abc import fused_recurrent_abc
+        # inputs with equal lengths
+        >>> B, T, H, K, V, M = 4, 2048, 4, 128, 128, 64
+        >>> q = torch.randn(B, T, H, K, device='cuda')
+        >>> k = torch.randn(B, T, H, K, device='cuda')
+        >>> v = torch.randn(B, T, H, V, device='cuda')
+        >>> s = torch.randn(B, T, H, M, device='cuda')
+        >>> o, ht = fused_recurrent_abc(q, k, v, s, output_final_state=True, head_first=False)
+        # for variable-length inputs, the batch size `B` is expected to be 1 and `cu_seqlens` is required
+        >>> q, k, v, s = map(lambda x: rearrange(x, 'b t h d -> 1 (b t) h d'), (q, k, v, s))
+        # for a batch with 4 sequences, `cu_seqlens` with 5 start/end positions are expected
+        >>> cu_seqlens = q.new_tensor([0, 2048, 4096, 6144, 8192], dtype=torch.long)
+        >>> o_var, ht_var = fused_recurrent_abc(q, k, v, s, output_final_state=True, cu_seqlens=cu_seqlens, head_first=False)
+        >>> assert o.allclose(o_var.view(o.shape))
+        >>> assert all(i.allclose(j) for i, j in zip(ht, ht_var))
+    """
+    if cu_seqlens is not None:
+        if q.shape[0] != 1:
+            raise ValueError(f"The batch size is expected to be 1 rather than {q.shape[0]} when using `cu_seqlens`."
+                             f"Please flatten variable-length inputs before processing.")
+        if head_first:
+            raise RuntimeError("Sequences with variable lengths are not supported for head-first mode")
+        if initial_state is not None and initial_state[0].shape[0] != len(cu_seqlens) - 1:
+            raise ValueError(f"The number of initial states is expected to be equal to the number of input sequences, "
+                             f"i.e., {len(cu_seqlens) - 1} rather than {initial_state[0].shape[0]}.")
+    if initial_state is not None and len(initial_state) != 3:
+        raise ValueError("The initial state is expected to be a tuple of the slot keys, values and log-normalizers, "
+                         f"rather than {len(initial_state)} tensors.")
+    if scale is None:
+        scale = k.shape[-1] ** -0.5
+    if initial_state is None:
+        initial_state = (None, None, None)
+    o, *final_state = FusedRecurrentABCFunction.apply(
+        q,
+        k,
+        v,
+        s,
+        scale,
+        *initial_state,
+        output_final_state,
+        cu_seqlens,
+        head_first
+    )
+    return o, (tuple(final_state) if output_final_state else None)
@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 
 from .fused_chunk import fused_chunk_based
+from .fused_recurrent import fused_recurrent_based
 from .parallel import parallel_based
 
 __all__ = [
     'fused_chunk_based',
+    'fused_recurrent_based',
     'parallel_based'
 ]
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023-2025, Songlin Yang, Yu Zhang
+
+from typing import Optional, Tuple
+
+import torch
+import triton
+import triton.language as tl
+
+from fla.utils import input_guard
+
+
+@triton.jit(do_not_specialize=['T'])
+def fused_recurrent_based_fwd_kernel(
+    q,
+    k,
+    v,
+    o,
+    h0,
+    ht,
+    scale,
+    T,
+    K: tl.constexpr,
+    V: tl.constexpr,
+    BK: tl.constexpr,
+    BV: tl.constexpr,
+    TAYLOR: tl.constexpr,
+    USE_INITIAL_STATE: tl.constexpr,
+    STORE_FINAL_STATE: tl.constexpr
+):
+    i_v, i_bh = tl.program_id(0), tl.program_id(1)
+    # rows of the state: [1, K, K*K] for the zero-, first- and second-order terms of the taylor expansion,
+    # or [K*K] for the second-order term alone
+    if TAYLOR:
+        D = 1 + K + K * K
+    else:
+        D = K * K
+    # columns of the state: [V + 1], where the last one accumulates the normalizer
+    C = V + 1
+
+    o_k = tl.arange(0, BK)
+    # [BK*BK], the row-major indices of the flattened outer products
+    o_i, o_j = tl.arange(0, BK * BK) // BK, tl.arange(0, BK * BK) % BK
+    o_v = i_v * BV + tl.arange(0, BV)
+    m_k = o_k < K
+    m_kk = (o_i < K) & (o_j < K)
+    m_v = o_v < C
+
+    r_1 = 1 + o_k
+    r_2 = o_i * K + o_j
+    if TAYLOR:
+        r_2 += 1 + K
+
+    # [BV], zero-order taylor expansion
+    b_h_0o = tl.zeros([BV], dtype=tl.float32)
+    # [BK, BV], first-order taylor expansion
+    b_h_1o = tl.zeros([BK, BV], dtype=tl.float32)
+    # [BK*BK, BV], second-order taylor expansion
+    b_h_2o = tl.zeros([BK * BK, BV], dtype=tl.float32)
+    if USE_INITIAL_STATE:
+        p_h0 = h0 + i_bh * D * C
+        b_h_2o += tl.load(p_h0 + r_2[:, None] * C + o_v[None, :], mask=m_kk[:, None] & m_v[None, :], other=0)
+        if TAYLOR:
+            b_h_0o += tl.load(p_h0 + o_v, mask=m_v, other=0)
+            b_h_1o += tl.load(p_h0 + r_1[:, None] * C + o_v[None, :], mask=m_k[:, None] & m_v[None, :], other=0)
+
+    p_q = q + i_bh * T*K
+    p_k = k + i_bh * T*K
+    p_v = v + i_bh * T*V + o_v
+    p_o = o + i_bh * T*C + o_v
+    for _ in range(0, T):
+        # [BV], the values followed by a constant one whose outputs are the normalizers
+        b_v = tl.load(p_v, mask=o_v < V, other=0).to(tl.float32)
+        b_v = tl.where(o_v == V, 1., b_v)
+        # [BK*BK]
+        b_k_2o = tl.load(p_k + o_i, mask=m_kk, other=0).to(tl.float32) * tl.load(p_k + o_j, mask=m_kk, other=0).to(tl.float32)
+        b_q_2o = tl.load(p_q + o_i, mask=m_kk, other=0).to(tl.float32) * tl.load(p_q + o_j, mask=m_kk, other=0).to(tl.float32)
+        b_q_2o = b_q_2o * scale * scale
+
+        b_h_2o += b_k_2o[:, None] * b_v[None, :]
+        b_o = tl.sum(b_q_2o[:, None] * b_h_2o, 0)
+        if TAYLOR:
+            # [BK]
+            b_k = tl.load(p_k + o_k, mask=m_k, other=0).to(tl.float32)
+            b_q = tl.load(p_q + o_k, mask=m_k, other=0).to(tl.float32) * scale
+
+            b_h_0o += b_v
+            b_h_1o += b_k[:, None] * b_v[None, :]
+            b_o = b_h_0o + tl.sum(b_q[:, None] * b_h_1o, 0) + 0.5 * b_o
+        tl.store(p_o, b_o.to(p_o.dtype.element_ty), mask=m_v)
+
+        p_q += K
+        p_k += K
+        p_v += V
+        p_o += C
+
+    if STORE_FINAL_STATE:
+        p_ht = ht + i_bh * D * C
+        tl.store(p_ht + r_2[:, None] * C + o_v[None, :], b_h_2o.to(p_ht.dtype.element_ty), mask=m_kk[:, None] & m_v[None, :])
+        if TAYLOR:
+            tl.store(p_ht + o_v, b_h_0o.to(p_ht.dtype.element_ty), mask=m_v)
+            p_h1 = p_ht + r_1[:, None] * C + o_v[None, :]
+            tl.store(p_h1, b_h_1o.to(p_ht.dtype.element_ty), mask=m_k[:, None] & m_v[None, :])
+
+
+class FusedRecurrentBasedFunction(torch.autograd.Function):
+
+    @staticmethod
+    @input_guard
+    def forward(ctx, q, k, v, scale, initial_state=None, output_final_state=False, taylor=True):
+        B, H, T, K, V = *k.shape, v.shape[-1]
+        D = (1 + K + K * K) if taylor else K * K
+
+        BK, BV = triton.next_power_of_2(K), min(triton.next_power_of_2(V + 1), 32)
+        NV = triton.cdiv(V + 1, BV)
+        num_warps = 4
+
+        # the norm of o might explode, so we need to use float32 here
+        o = q.new_empty(B, H, T, V + 1, dtype=torch.float32)
+        final_state = q.new_empty(B, H, D, V + 1, dtype=torch.float32) if output_final_state else None
+
+        grid = (NV, B * H)
+        fused_recurrent_based_fwd_kernel[grid](
+            q, k, v, o, initial_state, final_state,
+            scale,
+            T=T, K=K, V=V, BK=BK, BV=BV,
+            TAYLOR=taylor,
+            USE_INITIAL_STATE=initial_state is not None,
+            STORE_FINAL_STATE=output_final_state,
+            num_warps=num_warps
+        )
+        return o, final_state
+
+    @staticmethod
+    @input_guard
+    def backward(ctx, do, dht=None):
+        raise NotImplementedError(
+            "Backward pass is not implemented as the recurrent kernel is meant for decoding. "
+            "Please use `parallel_based` or `fused_chunk_based` for training."
+        )
+
+
+def fused_recurrent_based(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    scale: Optional[float] = None,
+    initial_state: Optional[torch.Tensor] = None,
+    output_final_state: bool = False,
+    use_norm: bool = True,
+    head_first: bool = True
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    r"""
+    Args:
+        q (torch.Tensor):
+            queries of shape `[B, H, T, K]` if `head_first=True` else `[B, T, H, K]`
+        k (torch.Tensor):
+            keys of shape `[B, H, T, K]` if `head_first=True` else `[B, T, H, K]`
+        v (torch.Tensor):
+            values of shape `[B, H, T, V]` if `head_first=True` else `[B, T, H, V]`
+        scale (Optional[int]):
+            Scale factor for the attention scores.
+            If not provided, it will default to `1 / sqrt(K)`. Default: `None`.
+        initial_state (Optional[torch.Tensor]):
+            Initial state of shape `[B, H, 1 + K + K*K, V + 1]`. Default: `None`.
+        output_final_state (Optional[bool]):
+            Whether to output the final state of shape `[B, H, 1 + K + K*K, V + 1]`. Default: `False`.
+        use_norm (bool):
+            Whether to normalize the output. Default: `True`.
+        head_first (Optional[bool]):
+            Whether the inputs are in the head-first format. Default: `True`.
+
+    Returns:
+        o (torch.Tensor):
+            Outputs of shape `[B, H, T, V]` if `head_first=True` else `[B, T, H, V]`
+        final_state (torch.Tensor):
+            Final state of shape `[B, H, 1 + K + K*K, V + 1]` if `output_final_state=True` else `None`
+
+    The state keeps the zero-, first- and second-order terms of the taylor expansion along the rows,
+    i.e., the sums of `[1, k, vec(k k^T)]` multiplied by `[v, 1]`, whose last column serves as the normalizer.
+    """
+    assert q.shape[-1] <= 16, 'only support feature dimension up to 16.'
+    if scale is None:
+        scale = q.shape[-1] ** -0.5
+    if not head_first:
+        q, k, v = map(lambda x: x.transpose(1, 2), (q, k, v))
+    o, final_state = FusedRecurrentBasedFunction.apply(q, k, v, scale, initial_state, output_final_state, True)
+    o, z = o[..., :-1], o[..., -1]
+    if use_norm:
+        o = o / (z[..., None] + 1e-6)
+    if not head_first:
+        o = o.transpose(1, 2)
+    return o.to(q.dtype), final_state
@@ -6,7 +6,9 @@ from typing import Optional, Tuple
 import torch
 import triton
 import triton.language as tl
+from einops import rearrange
 
+from fla.ops.common.chunk_h import prepare_checkpoint_offsets
 from fla.ops.common.utils import prepare_chunk_offsets
 from fla.utils import is_triton_shared_mem_enough, use_cuda_graph
 
@@ -317,6 +319,50 @@ def chunk_gated_delta_rule_fwd_h(
     return h, v_new, final_state
 
 
+def chunk_gated_delta_rule_fwd_h_from_checkpoints(
+    k: torch.Tensor,
+    w: torch.Tensor,
+    u: torch.Tensor,
+    g: Optional[torch.Tensor],
+    h: torch.Tensor,
+    offsets: Optional[torch.LongTensor] = None,
+    head_first: bool = True,
+    chunk_size: int = 64,
+    checkpoint_interval: int = 1
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    r"""
+    Recomputes the states of all chunks and the new values from the states kept every `checkpoint_interval` chunks,
+    processing the segments between consecutive checkpoints as independent variable-length sequences.
+    """
+    if head_first:
+        B, H, T, K, V = *k.shape, u.shape[-1]
+        k, w, u, g = (rearrange(x, 'b h t ... -> 1 (b t) h ...').contiguous() if x is not None else None
+                      for x in (k, w, u, g))
+        h = rearrange(h, 'b h n k v -> (b n) h k v')
+    else:
+        B, T, H, K, V = *k.shape, u.shape[-1]
+        k, w, u, g = (rearrange(x, 'b t ... -> 1 (b t) ...') if x is not None else None for x in (k, w, u, g))
+        h = rearrange(h, 'b n h k v -> (b n) h k v')
+    BT = min(chunk_size, max(triton.next_power_of_2(T), 16))
+    h, v_new, _ = chunk_gated_delta_rule_fwd_h(
+        k=k,
+        w=w,
+        u=u,
+        g=g,
+        initial_state=h.contiguous(),
+        output_final_state=False,
+        offsets=prepare_checkpoint_offsets(offsets, B, T, BT * checkpoint_interval, k.device),
+        head_first=False,
+        chunk_size=BT
+    )
+    if head_first:
+        h = rearrange(h, '1 (b n) h k v -> b h n k v', b=B).contiguous()
+        v_new = rearrange(v_new, '1 (b t) h v -> b h t v', b=B).contiguous()
+    else:
+        h, v_new = h.view(B, -1, H, K, V), v_new.view(B, T, H, V)
+    return h, v_new
+
+
 def chunk_gated_delta_rule_bwd_dhu(
     q: torch.Tensor,
     k: torch.Tensor,
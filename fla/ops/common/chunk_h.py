@@ -6,9 +6,10 @@ from typing import Optional, Tuple
 import torch
 import triton
 import triton.language as tl
+from einops import rearrange
 
-from fla.ops.common.utils import prepare_chunk_offsets
-from fla.utils import device_capacity
+from fla.ops.common.utils import prepare_chunk_indices, prepare_chunk_offsets
+from fla.utils import device_capacity, row_stride
 
 BKV_LIST = [32, 64] if device_capacity else [16, 32]
 
@@ -40,6 +41,8 @@ def chunk_fwd_kernel_h(
     ht,
     offsets,
     split_offsets,
+    stride_k,
+    stride_v,
     T,
     H: tl.constexpr,
     K: tl.constexpr,
@@ -79,14 +82,14 @@ def chunk_fwd_kernel_h(
     for i_t in range(NT):
         i_s = i_t // (BS // BT)
         if HEAD_FIRST:
-            p_k = tl.make_block_ptr(k + i_nh * T*K, (K, T), (1, K), (i_k * BK, i_t * BT), (BK, BT), (0, 1))
-            p_v = tl.make_block_ptr(v + i_nh * T*V, (T, V), (V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
+            p_k = tl.make_block_ptr(k + i_nh * stride_k, (K, T), (1, K), (i_k * BK, i_t * BT), (BK, BT), (0, 1))
+            p_v = tl.make_block_ptr(v + i_nh * stride_v, (T, V), (V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
 
             o_h = (i_nh * NS + i_s).to(tl.int64) * K*V
             p_h = tl.make_block_ptr(h + o_h, (K, V), (V, 1), (i_k * BK, i_v * BV), (BK, BV), (1, 0))
         else:
-            p_k = tl.make_block_ptr(k + (bos*H + i_h) * K, (K, T), (1, H*K), (i_k * BK, i_t * BT), (BK, BT), (0, 1))
-            p_v = tl.make_block_ptr(v + (bos*H + i_h) * V, (T, V), (H*V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
+            p_k = tl.make_block_ptr(k + bos*stride_k + i_h*K, (K, T), (1, stride_k), (i_k * BK, i_t * BT), (BK, BT), (0, 1))
+            p_v = tl.make_block_ptr(v + bos*stride_v + i_h*V, (T, V), (stride_v, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
 
             o_h = ((boh + i_s) * H + i_h).to(tl.int64) * K*V
             p_h = tl.make_block_ptr(h + o_h, (K, V), (V, 1), (i_k * BK, i_v * BV), (BK, BV), (1, 0))
@@ -179,6 +182,7 @@ def chunk_bwd_kernel_dh(
     offsets,
     split_offsets,
     scale,
+    stride_q,
     T,
     HQ: tl.constexpr,
     H: tl.constexpr,
@@ -215,9 +219,11 @@ def chunk_bwd_kernel_dh(
 
     # [BK, BV]
     b_dh = tl.zeros([BK, BV], dtype=tl.float32)
+    # the final state is shared by the query heads in a group, so its gradient is only loaded once per group
     if USE_FINAL_STATE_GRADIENT:
-        p_dht = tl.make_block_ptr(dht + i_nh * K*V, (K, V), (V, 1), (i_k * BK, i_v * BV), (BK, BV), (1, 0))
-        b_dh += tl.load(p_dht, boundary_check=(0, 1)).to(tl.float32)
+        if i_hq % NG == 0:
+            p_dht = tl.make_block_ptr(dht + i_bg * K*V, (K, V), (V, 1), (i_k * BK, i_v * BV), (BK, BV), (1, 0))
+            b_dh += tl.load(p_dht, boundary_check=(0, 1)).to(tl.float32)
 
     for i_t in range(NT - 1, -1, -1):
         i_s = i_t // (BS // BT)
@@ -225,7 +231,7 @@ def chunk_bwd_kernel_dh(
             o_dh = (i_nh * NS + i_s).to(tl.int64) * K*V
             p_dh = tl.make_block_ptr(dh + o_dh, (K, V), (V, 1), (i_k * BK, i_v * BV), (BK, BV), (1, 0))
         else:
-            o_dh = ((boh + i_s) * H + i_h).to(tl.int64) * K*V
+            o_dh = ((boh + i_s) * HQ + i_hq).to(tl.int64) * K*V
             p_dh = tl.make_block_ptr(dh + o_dh, (K, V), (V, 1), (i_k * BK, i_v * BV), (BK, BV), (1, 0))
 
         if i_t % (BS // BT) == 0:
@@ -233,10 +239,10 @@ def chunk_bwd_kernel_dh(
         last_idx = min(i_t * BT + BT, T) - 1
         # [BK, BT]
         if HEAD_FIRST:
-            p_q = tl.make_block_ptr(q + i_nh * T*K, (K, T), (1, K), (i_k * BK, i_t * BT), (BK, BT), (0, 1))
+            p_q = tl.make_block_ptr(q + i_nh * stride_q, (K, T), (1, K), (i_k * BK, i_t * BT), (BK, BT), (0, 1))
             p_do = tl.make_block_ptr(do + i_nh * T*V, (T, V), (V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
         else:
-            p_q = tl.make_block_ptr(q + (bos*HQ + i_hq) * K, (K, T), (1, HQ*K), (i_k * BK, i_t * BT), (BK, BT), (0, 1))
+            p_q = tl.make_block_ptr(q + bos*stride_q + i_hq*K, (K, T), (1, stride_q), (i_k * BK, i_t * BT), (BK, BT), (0, 1))
             p_do = tl.make_block_ptr(do + (bos*HQ + i_hq) * V, (T, V), (HQ*V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
         b_q = tl.load(p_q, boundary_check=(0, 1))
         b_q = (b_q * scale).to(b_q.dtype)
@@ -337,6 +343,8 @@ def chunk_fwd_h(
         ht=ht,
         offsets=offsets,
         split_offsets=split_offsets,
+        stride_k=row_stride(k),
+        stride_v=row_stride(v),
         T=T,
         H=H,
         K=K,
@@ -390,9 +398,9 @@ def chunk_bwd_dh(
         dh = k.new_empty(B, HQ, NS, K, V, dtype=k.dtype if not states_in_fp32 else torch.float)
     else:
         dh = k.new_empty(B, NS, HQ, K, V, dtype=k.dtype if not states_in_fp32 else torch.float)
-    dh0 = torch.empty_like(h0, dtype=torch.float) if h0 is not None else None
+    dh0 = h0.new_empty(N, HQ, K, V, dtype=torch.float) if h0 is not None else None
 
-    def grid(meta): return (triton.cdiv(K, meta['BK']), triton.cdiv(V, meta['BV']), N * H)
+    def grid(meta): return (triton.cdiv(K, meta['BK']), triton.cdiv(V, meta['BV']), N * HQ)
     chunk_bwd_kernel_dh[grid](
         q=q,
         g=g,
@@ -405,6 +413,7 @@ def chunk_bwd_dh(
         offsets=offsets,
         split_offsets=split_offsets,
         scale=scale,
+        stride_q=row_stride(q),
         T=T,
         HQ=HQ,
         H=H,
@@ -418,4 +427,86 @@ def chunk_bwd_dh(
         USE_GV=gv is not None,
         HEAD_FIRST=head_first
     )
+    # `dh` is kept per query head, while the gradients of the initial states are reduced over each group
+    if dh0 is not None and NG > 1:
+        dh0 = dh0.view(N, H, NG, K, V).sum(2)
     return dh, dh0
+
+
+def chunk_select_checkpoints(
+    h: torch.Tensor,
+    offsets: Optional[torch.LongTensor] = None,
+    head_first: bool = True,
+    chunk_size: int = 64,
+    checkpoint_interval: int = 1
+) -> torch.Tensor:
+    # keeps the states at the start of every `checkpoint_interval` chunks of each sequence
+    if checkpoint_interval == 1:
+        return h
+    if offsets is None:
+        return (h[:, :, ::checkpoint_interval] if head_first else h[:, ::checkpoint_interval]).contiguous()
+    return h[:, prepare_chunk_indices(offsets, chunk_size)[:, 1] % checkpoint_interval == 0]
+
+
+def prepare_checkpoint_offsets(
+    offsets: Optional[torch.LongTensor],
+    B: int,
+    T: int,
+    split_size: int,
+    device: torch.device
+) -> torch.LongTensor:
+    # the boundaries of the segments starting at each checkpoint,
+    # which can be processed as independent sequences once their initial states are known
+    if offsets is None:
+        offsets = torch.arange(0, (B + 1) * T, T, device=device)
+    indices = prepare_chunk_indices(offsets, split_size)
+    return torch.cat([offsets[indices[:, 0]] + indices[:, 1] * split_size, offsets[-1:]])
+
+
+def chunk_fwd_h_from_checkpoints(
+    k: torch.Tensor,
+    v: torch.Tensor,
+    g: torch.Tensor,
+    gk: torch.Tensor,
+    gv: torch.Tensor,
+    h: torch.Tensor,
+    offsets: Optional[torch.Tensor] = None,
+    head_first: bool = True,
+    chunk_size: int = 64,
+    checkpoint_interval: int = 1,
+    states_in_fp32: bool = False
+) -> torch.Tensor:
+    r"""
+    Recomputes the states of all chunks from the ones kept by `chunk_select_checkpoints`.
+
+    The segments between consecutive checkpoints are processed as independent variable-length sequences,
+    so unlike rerunning `chunk_fwd_h` from the initial states, the recomputation is parallelized over the segments.
+    """
+    if checkpoint_interval == 1:
+        return h
+    if head_first:
+        B, H, T, K, V = *k.shape, v.shape[-1]
+        k, v, g, gk, gv = (rearrange(x, 'b h t ... -> 1 (b t) h ...').contiguous() if x is not None else None
+                           for x in (k, v, g, gk, gv))
+        h = rearrange(h, 'b h n k v -> (b n) h k v')
+    else:
+        B, T, H, K, V = *k.shape, v.shape[-1]
+        k, v, g, gk, gv = (rearrange(x, 'b t ... -> 1 (b t) ...') if x is not None else None for x in (k, v, g, gk, gv))
+        h = rearrange(h, 'b n h k v -> (b n) h k v')
+    BT = min(chunk_size, max(16, triton.next_power_of_2(T)))
+    h, _ = chunk_fwd_h(
+        k=k,
+        v=v,
+        g=g,
+        gk=gk,
+        gv=gv,
+        h0=h.contiguous(),
+        output_final_state=False,
+        offsets=prepare_checkpoint_offsets(offsets, B, T, BT * checkpoint_interval, k.device),
+        head_first=False,
+        chunk_size=BT,
+        states_in_fp32=states_in_fp32
+    )
+    if head_first:
+        return rearrange(h, '1 (b n) h k v -> b h n k v', b=B).contiguous()
+    return h.view(B, -1, H, K, V)
@@ -8,7 +8,7 @@ import triton
 import triton.language as tl
 
 from fla.ops.utils.exp import safe_exp
-from fla.utils import device_capacity, is_triton_shared_mem_enough
+from fla.utils import device_capacity, is_triton_shared_mem_enough, row_stride
 
 BKV_LIST = [64, 128] if device_capacity else [32, 64]
 
@@ -38,6 +38,9 @@ def chunk_fwd_kernel_o(
     offsets,
     indices,
     scale,
+    stride_q,
+    stride_k,
+    stride_v,
     T,
     H: tl.constexpr,
     K: tl.constexpr,
@@ -63,13 +66,16 @@ def chunk_fwd_kernel_o(
         i_tg = i_b * NT + i_t
         bos, eos = i_b * T, i_b * T + T
 
-    s_qk = K if HEAD_FIRST else H*K
+    # q, k and v may be strided views whose rows are `stride_q`, `stride_k` and `stride_v` apart
+    s_q = K if HEAD_FIRST else stride_q
+    s_k = K if HEAD_FIRST else stride_k
+    s_v = V if HEAD_FIRST else stride_v
     s_vo = V if HEAD_FIRST else H*V
     s_g = 1 if HEAD_FIRST else H
     # offset calculation
-    q += (i_bh * T*K) if HEAD_FIRST else ((bos * H + i_h) * K)
-    k += (i_bh * T*K) if HEAD_FIRST else ((bos * H + i_h) * K)
-    v += (i_bh * T*V) if HEAD_FIRST else ((bos * H + i_h) * V)
+    q += (i_bh * stride_q) if HEAD_FIRST else (bos * stride_q + i_h * K)
+    k += (i_bh * stride_k) if HEAD_FIRST else (bos * stride_k + i_h * K)
+    v += (i_bh * stride_v) if HEAD_FIRST else (bos * stride_v + i_h * V)
     o += (i_bh * T*V) if HEAD_FIRST else ((bos * H + i_h) * V)
     h += ((i_bh * NT + i_t).to(tl.int64) * K*V) if HEAD_FIRST else ((i_tg * H + i_h).to(tl.int64) * K*V)
 
@@ -77,8 +83,8 @@ def chunk_fwd_kernel_o(
     b_A = tl.zeros([BT, BT], dtype=tl.float32)
 
     for i_k in range(tl.cdiv(K, BK)):
-        p_q = tl.make_block_ptr(q, (T, K), (s_qk, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
-        p_k = tl.make_block_ptr(k, (K, T), (1, s_qk), (i_k * BK, i_t * BT), (BK, BT), (0, 1))
+        p_q = tl.make_block_ptr(q, (T, K), (s_q, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+        p_k = tl.make_block_ptr(k, (K, T), (1, s_k), (i_k * BK, i_t * BT), (BK, BT), (0, 1))
         p_h = tl.make_block_ptr(h, (K, V), (V, 1), (i_k * BK, i_v * BV), (BK, BV), (1, 0))
         # [BT, BK]
         b_q = tl.load(p_q, boundary_check=(0, 1))
@@ -103,7 +109,7 @@ def chunk_fwd_kernel_o(
     m_A = o_i[:, None] >= o_i[None, :]
     b_A = tl.where(m_A, b_A, 0)
 
-    p_v = tl.make_block_ptr(v, (T, V), (s_vo, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
+    p_v = tl.make_block_ptr(v, (T, V), (s_v, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
     p_o = tl.make_block_ptr(o, (T, V), (s_vo, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
     b_v = tl.load(p_v, boundary_check=(0, 1))
 
@@ -144,6 +150,9 @@ def chunk_bwd_kernel_dqkwg(
     offsets,
     indices,
     scale,
+    stride_q,
+    stride_k,
+    stride_v,
     B: tl.constexpr,
     T,
     H: tl.constexpr,
@@ -173,14 +182,17 @@ def chunk_bwd_kernel_dqkwg(
         bos, eos = i_b * T, i_b * T + T
 
     # offset calculation
-    v += i_bh * T*V if HEAD_FIRST else (bos * H + i_h) * V
+    v += i_bh * stride_v if HEAD_FIRST else bos * stride_v + i_h * V
     do += i_bh * T*V if HEAD_FIRST else (bos * H + i_h) * V
     h += (i_bh * NT + i_t).to(tl.int64) * K*V if HEAD_FIRST else (i_tg * H + i_h).to(tl.int64) * K*V
     dh += (i_bh * NT + i_t).to(tl.int64) * K*V if HEAD_FIRST else (i_tg * H + i_h).to(tl.int64) * K*V
-    q += i_bh * T*K if HEAD_FIRST else (bos * H + i_h) * K
-    k += i_bh * T*K if HEAD_FIRST else (bos * H + i_h) * K
+    q += i_bh * stride_q if HEAD_FIRST else bos * stride_q + i_h * K
+    k += i_bh * stride_k if HEAD_FIRST else bos * stride_k + i_h * K
     dq += i_bh * T*K if HEAD_FIRST else (bos * H + i_h) * K
     dk += i_bh * T*K if HEAD_FIRST else (bos * H + i_h) * K
+    s_q = K if HEAD_FIRST else stride_q
+    s_k = K if HEAD_FIRST else stride_k
+    s_v = V if HEAD_FIRST else stride_v
     s_qk = K if HEAD_FIRST else H*K
     s_vo = V if HEAD_FIRST else H*V
     s_g = 1 if HEAD_FIRST else H
@@ -198,7 +210,7 @@ def chunk_bwd_kernel_dqkwg(
     b_dw = tl.zeros([BT, BK], dtype=tl.float32) if USE_DW else None
 
     for i_v in range(tl.cdiv(V, BV)):
-        p_v = tl.make_block_ptr(v, (T, V), (s_vo, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
+        p_v = tl.make_block_ptr(v, (T, V), (s_v, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
         p_do = tl.make_block_ptr(do, (T, V), (s_vo, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
         p_h = tl.make_block_ptr(h, (V, K), (1, V), (i_v * BV, i_k * BK), (BV, BK), (0, 1))
         p_dh = tl.make_block_ptr(dh, (V, K), (1, V), (i_v * BV, i_k * BK), (BV, BK), (0, 1))
@@ -227,8 +239,8 @@ def chunk_bwd_kernel_dqkwg(
 
     tl.debug_barrier()
     o_i = tl.arange(0, BT)
-    p_q = tl.make_block_ptr(q, (T, K), (s_qk, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
-    p_k = tl.make_block_ptr(k, (T, K), (s_qk, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+    p_q = tl.make_block_ptr(q, (T, K), (s_q, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+    p_k = tl.make_block_ptr(k, (T, K), (s_k, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
     b_q = tl.load(p_q, boundary_check=(0, 1))
     b_k = tl.load(p_k, boundary_check=(0, 1))
 
@@ -308,6 +320,8 @@ def chunk_bwd_kernel_dv(
     offsets,
     indices,
     scale,
+    stride_q,
+    stride_k,
     T,
     H: tl.constexpr,
     K: tl.constexpr,
@@ -335,19 +349,20 @@ def chunk_bwd_kernel_dv(
     b_dv = tl.zeros([BT, BV], dtype=tl.float32)
 
     # offset calculation
-    q += i_bh * T*K if HEAD_FIRST else (bos * H + i_h) * K
-    k += i_bh * T*K if HEAD_FIRST else (bos * H + i_h) * K
+    q += i_bh * stride_q if HEAD_FIRST else bos * stride_q + i_h * K
+    k += i_bh * stride_k if HEAD_FIRST else bos * stride_k + i_h * K
     do += i_bh * T*V if HEAD_FIRST else (bos * H + i_h) * V
     dv += i_bh * T*V if HEAD_FIRST else (bos * H + i_h) * V
-    s_qk = K if HEAD_FIRST else H*K
+    s_q = K if HEAD_FIRST else stride_q
+    s_k = K if HEAD_FIRST else stride_k
     s_vo = V if HEAD_FIRST else H*V
     s_g = 1 if HEAD_FIRST else H
     dh += (i_bh * NT + i_t).to(tl.int64) * K*V if HEAD_FIRST else (i_tg * H + i_h).to(tl.int64) * K*V
 
     b_A = tl.zeros([BT, BT], dtype=tl.float32)
     for i_k in range(tl.cdiv(K, BK)):
-        p_k = tl.make_block_ptr(k, (T, K), (s_qk, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
-        p_q = tl.make_block_ptr(q, (K, T), (1, s_qk), (i_k * BK, i_t * BT), (BK, BT), (0, 1))
+        p_k = tl.make_block_ptr(k, (T, K), (s_k, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+        p_q = tl.make_block_ptr(q, (K, T), (1, s_q), (i_k * BK, i_t * BT), (BK, BT), (0, 1))
         b_q = tl.load(p_q, boundary_check=(0, 1))
         b_k = tl.load(p_k, boundary_check=(0, 1))
         b_A += tl.dot(b_k, b_q)
@@ -396,6 +411,8 @@ def chunk_bwd_kernel_dv_local(
     offsets,
     indices,
     scale,
+    stride_q,
+    stride_k,
     T,
     H: tl.constexpr,
     K: tl.constexpr,
@@ -417,18 +434,19 @@ def chunk_bwd_kernel_dv_local(
         bos, eos = i_b * T, i_b * T + T
 
     # offset calculation
-    q += i_bh * T*K if HEAD_FIRST else (bos * H + i_h) * K
-    k += i_bh * T*K if HEAD_FIRST else (bos * H + i_h) * K
+    q += i_bh * stride_q if HEAD_FIRST else bos * stride_q + i_h * K
+    k += i_bh * stride_k if HEAD_FIRST else bos * stride_k + i_h * K
     do += i_bh * T*V if HEAD_FIRST else (bos * H + i_h) * V
     dv += i_bh * T*V if HEAD_FIRST else (bos * H + i_h) * V
-    s_qk = K if HEAD_FIRST else H*K
+    s_q = K if HEAD_FIRST else stride_q
+    s_k = K if HEAD_FIRST else stride_k
     s_vo = V if HEAD_FIRST else H*V
     s_g = 1 if HEAD_FIRST else H
 
     b_A = tl.zeros([BT, BT], dtype=tl.float32)
     for i_k in range(tl.cdiv(K, BK)):
-        p_k = tl.make_block_ptr(k, (T, K), (s_qk, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
-        p_q = tl.make_block_ptr(q, (K, T), (1, s_qk), (i_k * BK, i_t * BT), (BK, BT), (0, 1))
+        p_k = tl.make_block_ptr(k, (T, K), (s_k, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+        p_q = tl.make_block_ptr(q, (K, T), (1, s_q), (i_k * BK, i_t * BT), (BK, BT), (0, 1))
         b_q = tl.load(p_q, boundary_check=(0, 1))
         b_k = tl.load(p_k, boundary_check=(0, 1))
         b_A += tl.dot(b_k, b_q)
@@ -486,6 +504,9 @@ def chunk_fwd_o(
         offsets,
         indices,
         scale,
+        stride_q=row_stride(q),
+        stride_k=row_stride(k),
+        stride_v=row_stride(v),
         T=T,
         H=H,
         K=K,
@@ -537,6 +558,8 @@ def chunk_bwd_dv(
         offsets,
         indices,
         scale,
+        stride_q=row_stride(q),
+        stride_k=row_stride(k),
         T=T,
         H=H,
         K=K,
@@ -588,6 +611,8 @@ def chunk_bwd_dv_local(
         offsets,
         indices,
         scale,
+        stride_q=row_stride(q),
+        stride_k=row_stride(k),
         T=T,
         H=H,
         K=K,
@@ -651,6 +676,9 @@ def chunk_bwd_dqkwg(
         offsets=offsets,
         indices=indices,
         scale=scale,
+        stride_q=row_stride(q),
+        stride_k=row_stride(k),
+        stride_v=row_stride(v),
         B=B,
         T=T,
         H=H,
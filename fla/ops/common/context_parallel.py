@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023-2025, Songlin Yang, Yu Zhang
+
+from typing import Callable, List, Optional, Tuple
+
+import torch
+import torch.distributed as dist
+
+
+def all_gather(x: torch.Tensor, group: dist.ProcessGroup) -> List[torch.Tensor]:
+    x = x.contiguous()
+    xs = [torch.empty_like(x) for _ in range(dist.get_world_size(group))]
+    dist.all_gather(xs, x, group=group)
+    return xs
+
+
+class ChunkStatePassingFunction(torch.autograd.Function):
+    r"""
+    Passes the boundary states across the ranks holding consecutive slices of the sequences.
+
+    Each rank `r` transforms its initial state `h` into the final state `A_r @ h + S_r`.
+    Given the transitions `(A_r, S_r)` gathered from all ranks,
+    the initial state of rank `r` is obtained by scanning over the ranks before it,
+    and the gradients of the transitions by scanning the gradients of the initial states of the ranks after it.
+    """
+
+    @staticmethod
+    def forward(ctx, A: torch.Tensor, S: torch.Tensor, group: dist.ProcessGroup):
+        rank = dist.get_rank(group)
+        As, Ss = all_gather(A, group), all_gather(S, group)
+        h = torch.zeros_like(S)
+        for i in range(rank):
+            h = As[i] @ h + Ss[i]
+        ctx.save_for_backward(h, *As[rank + 1:])
+        ctx.group = group
+        return h
+
+    @staticmethod
+    def backward(ctx, dh: torch.Tensor):
+        h, *As = ctx.saved_tensors
+        rank = dist.get_rank(ctx.group)
+        dhs = all_gather(dh, ctx.group)
+        # gradient w.r.t. the final state of the current rank, i.e., the initial state of the next rank
+        dS = torch.zeros_like(dh)
+        for i in range(len(dhs) - 1, rank, -1):
+            dS = dhs[i] + As[i - rank - 1].transpose(-1, -2) @ dS
+        dA = dS @ h.transpose(-1, -2)
+        return dA, dS, None
+
+
+def chunk_context_parallel(
+    fn: Callable[..., Tuple[torch.Tensor, torch.Tensor]],
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    *args,
+    group: dist.ProcessGroup,
+    initial_state: Optional[torch.Tensor] = None,
+    output_final_state: bool = False,
+    cu_seqlens: Optional[torch.LongTensor] = None,
+    head_first: bool = True,
+    **kwargs
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    r"""
+    Runs the chunked op `fn` with context parallelism,
+    where each rank of `group` holds a contiguous slice of the sequences, ordered by rank.
+
+    As the outputs and final states of the ops are linear in the values and initial states jointly,
+    `K` identity columns are appended to the values and the initial state, so that a single call of `fn`
+    over the local slice also returns how the slice transforms its initial state:
+    `A` of shape `[B, H, K, K]` for the final state and `P` of shape `[B, T, H, K]` for the outputs.
+    The transitions are then exchanged across the ranks and the outputs are fixed up as `o + P @ h`
+    once the initial state `h` of the slice is known. The backward pass mirrors the exchange for `dh`.
+
+    Args:
+        fn (Callable[..., Tuple[torch.Tensor, torch.Tensor]]):
+            The chunked op, called as `fn(q, k, v, *args, initial_state, output_final_state, head_first, **kwargs)`.
+        group (dist.ProcessGroup):
+            The process group the sequences are sharded over.
+        initial_state (Optional[torch.Tensor]):
+            Initial state of shape `[B, H, K, V]`, only used on the first rank. Default: `None`.
+        output_final_state (Optional[bool]):
+            Whether to output the final state of the local slice,
+            which is the final state of the whole sequences on the last rank. Default: `False`.
+    """
+    if cu_seqlens is not None:
+        raise ValueError("Variable-length inputs are not supported with context parallelism.")
+    B, H, K, V = k.shape[0], k.shape[1 if head_first else 2], k.shape[-1], v.shape[-1]
+    # NG: number of query heads sharing the same key/value head in GQA
+    NG = q.shape[1 if head_first else 2] // H
+
+    h0 = torch.cat((
+        q.new_zeros(B, H, K, V, dtype=torch.float),
+        torch.eye(K, dtype=torch.float, device=q.device).expand(B, H, K, K)
+    ), -1)
+    o, ht = fn(
+        q,
+        k,
+        torch.cat((v, v.new_zeros(*v.shape[:-1], K)), -1),
+        *args,
+        initial_state=h0,
+        output_final_state=True,
+        head_first=head_first,
+        **kwargs
+    )
+    o, P = o.split((V, K), -1)
+    S, A = ht.split((V, K), -1)
+
+    # the initial state of the first rank is folded into the transition passed to the next ranks
+    if dist.get_rank(group) == 0 and initial_state is not None:
+        h0 = initial_state.float()
+        h = ChunkStatePassingFunction.apply(A, S + A @ h0, group) + h0
+    else:
+        h = ChunkStatePassingFunction.apply(A, S, group)
+    o = o + torch.einsum(
+        'bhtk,bhkv->bhtv' if head_first else 'bthk,bhkv->bthv',
+        P.float(),
+        h.repeat_interleave(NG, 1)
+    ).to(o.dtype)
+    ht = A @ h + S if output_final_state else None
+    return o, ht
@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+
+# Pure PyTorch implementations of the chunked and recurrent ops, used in place of the Triton kernels
+# when the inputs live on the CPU.
+# The chunked forms compute all intra-chunk interactions with batched matmuls at once,
+# leaving only the passing of the `[K, V]` states across chunks sequential.
+# All of them are differentiable through autograd, and accumulate in float32 regardless of the input dtype.
+
+from typing import Callable, Optional, Sequence, Tuple
+
+import torch
+import torch.nn.functional as F
+
+
+def l2norm(x: torch.Tensor, eps: float = 1e-6) -> torch.Tensor:
+    return x * torch.rsqrt(x.pow(2).sum(-1, keepdim=True) + eps)
+
+
+def to_chunks(x: torch.Tensor, chunk_size: int) -> torch.Tensor:
+    # [B, H, T, ...] -> [B, H, NT, BT, ...], zero padded to a multiple of the chunk size
+    pad = -x.shape[2] % chunk_size
+    if pad > 0:
+        x = F.pad(x, (0, 0) * (x.ndim - 3) + (0, pad))
+    return x.unflatten(2, (-1, chunk_size))
+
+
+def apply_cpu(
+    fn: Callable,
+    inputs: Sequence[Optional[torch.Tensor]],
+    initial_state: Optional[torch.Tensor],
+    cu_seqlens: Optional[torch.LongTensor] = None,
+    head_first: bool = True,
+    **kwargs
+) -> Tuple[torch.Tensor, ...]:
+    r"""
+    Runs `fn` over head-first float32 copies of `inputs`, one sequence at a time if `cu_seqlens` is given.
+
+    `fn` is expected to take the inputs of shape `[B, H, T, ...]` followed by the initial state,
+    and to return the output, the final state and any per-token tensors of shape `[B, H, T, ...]`.
+    With grouped-query attention, i.e., fewer key heads than query heads,
+    the inputs other than the queries are shared by each group of `NG` consecutive query heads.
+    """
+    dtype = inputs[0].dtype
+    if not head_first:
+        inputs = [x.transpose(1, 2) if x is not None else None for x in inputs]
+    inputs = [x.float() if x is not None else None for x in inputs]
+    if initial_state is not None:
+        initial_state = initial_state.float()
+    NG = inputs[0].shape[1] // inputs[1].shape[1]
+    if NG > 1:
+        inputs = [inputs[0]] + [x.repeat_interleave(NG, 1) if x is not None else None for x in inputs[1:]]
+        if initial_state is not None:
+            initial_state = initial_state.repeat_interleave(NG, 1)
+    if cu_seqlens is None:
+        o, ht, *rest = fn(*inputs, initial_state, **kwargs)
+    else:
+        outputs = []
+        for i, (bos, eos) in enumerate(zip(cu_seqlens[:-1].tolist(), cu_seqlens[1:].tolist())):
+            outputs.append(fn(
+                *[x[:, :, bos:eos] if x is not None else None for x in inputs],
+                initial_state[i:i+1] if initial_state is not None else None,
+                **kwargs
+            ))
+        o, ht, *rest = [torch.cat(x, 0 if j == 1 else 2) if x[0] is not None else None for j, x in enumerate(zip(*outputs))]
+    if NG > 1:
+        # the states are identical within each group
+        ht, *rest = [x[:, ::NG] if x is not None else None for x in (ht, *rest)]
+    if not head_first:
+        o, *rest = [x.transpose(1, 2) if x is not None else None for x in (o, *rest)]
+    return (o.to(dtype), ht, *rest)
+
+
+def chunk_gla_fwd_cpu(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    g: torch.Tensor,
+    h0: Optional[torch.Tensor],
+    scale: float,
+    chunk_size: int = 16
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    T = q.shape[2]
+    q, k, v, g = (to_chunks(x, chunk_size) for x in (q, k, v, g))
+    g = g.cumsum(-2)
+    # the decay between two positions of a chunk is factored through the chunk start,
+    # which keeps `exp(-g)` well within float32 range for chunks as small as the default one
+    qg = q * scale * g.exp()
+    kg = k * (-g).exp()
+    kd = k * (g[..., -1:, :] - g).exp()
+    A = (qg @ kg.transpose(-1, -2)).tril()
+
+    h = q.new_zeros(*q.shape[:2], q.shape[-1], v.shape[-1]) if h0 is None else h0
+    hkv, h = chunk_state_passing(h, kd.transpose(-1, -2) @ v, g[..., -1, :].exp()[..., None])
+    o = A @ v + qg @ hkv
+    return o.flatten(2, 3)[:, :, :T], h
+
+
+def chunk_simple_gla_fwd_cpu(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    g: Optional[torch.Tensor],
+    h0: Optional[torch.Tensor],
+    scale: float,
+    chunk_size: int = 64
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    T = q.shape[2]
+    if g is None:
+        g = q.new_zeros(q.shape[:3])
+    q, k, v = (to_chunks(x, chunk_size) for x in (q, k, v))
+    g = to_chunks(g[..., None], chunk_size)[..., 0].cumsum(-1)
+    A = (q @ k.transpose(-1, -2)) * scale * decay_matrix(g)
+    qg = q * scale * g.exp()[..., None]
+    kd = k * (g[..., -1:] - g).exp()[..., None]
+
+    h = q.new_zeros(*q.shape[:2], q.shape[-1], v.shape[-1]) if h0 is None else h0
+    hkv, h = chunk_state_passing(h, kd.transpose(-1, -2) @ v, g[..., -1].exp()[..., None, None])
+    o = A @ v + qg @ hkv
+    return o.flatten(2, 3)[:, :, :T], h
+
+
+def chunk_gated_delta_rule_fwd_cpu(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    g: Optional[torch.Tensor],
+    beta: torch.Tensor,
+    h0: Optional[torch.Tensor],
+    scale: float,
+    chunk_size: int = 64
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    B, H, T, K, V = *q.shape, v.shape[-1]
+    if g is None:
+        g = q.new_zeros(B, H, T)
+    q, k, v = (to_chunks(x, chunk_size) for x in (q, k, v))
+    g, beta = (to_chunks(x[..., None], chunk_size)[..., 0] for x in (g, beta))
+    g = g.cumsum(-1)
+    D = decay_matrix(g)
+
+    # WY representation: the deltas written by the tokens of a chunk starting from a state `S` are `u - w @ S`
+    # with `u = (I + A)^{-1} diag(beta) V`, `w = (I + A)^{-1} diag(beta * exp(g)) K`
+    # and `A` the strictly lower triangular part of `diag(beta) (K K^T * D)`
+    A = (beta[..., None] * (k @ k.transpose(-1, -2)) * D).tril(-1) + torch.eye(chunk_size, device=q.device)
+    u = torch.linalg.solve_triangular(A, beta[..., None] * v, upper=False, unitriangular=True)
+    w = torch.linalg.solve_triangular(A, (beta * g.exp())[..., None] * k, upper=False, unitriangular=True)
+    Aqk = (q @ k.transpose(-1, -2)) * scale * D
+    qg = q * scale * g.exp()[..., None]
+    kd = k * (g[..., -1:] - g).exp()[..., None]
+    decay = g[..., -1].exp()[..., None, None]
+
+    h = q.new_zeros(B, H, K, V) if h0 is None else h0
+    o = []
+    for i in range(q.shape[2]):
+        d = u[:, :, i] - w[:, :, i] @ h
+        o.append(qg[:, :, i] @ h + Aqk[:, :, i] @ d)
+        h = decay[:, :, i] * h + kd[:, :, i].transpose(-1, -2) @ d
+    return torch.cat(o, 2)[:, :, :T], h
+
+
+def decay_matrix(g: torch.Tensor) -> torch.Tensor:
+    # `exp(g_i - g_j)` for `j <= i` and 0 elsewhere, computed from chunk-local cumulative log decays
+    mask = torch.ones(g.shape[-1], g.shape[-1], dtype=torch.bool, device=g.device).tril()
+    return (g[..., :, None] - g[..., None, :]).masked_fill(~mask, float('-inf')).exp()
+
+
+def chunk_state_passing(
+    h: torch.Tensor,
+    hkv: torch.Tensor,
+    decay: torch.Tensor
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    # the only sequential part of the chunked forms:
+    # returns the states at the start of each chunk, i.e., `[B, H, NT, K, V]`, and the final state
+    hs = []
+    for i in range(hkv.shape[2]):
+        hs.append(h)
+        h = decay[:, :, i] * h + hkv[:, :, i]
+    return torch.stack(hs, 2), h
+
+
+def fused_recurrent_fwd_cpu(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    g: Optional[torch.Tensor],
+    gk: Optional[torch.Tensor],
+    gv: Optional[torch.Tensor],
+    h0: Optional[torch.Tensor],
+    scale: float,
+    reverse: bool = False,
+    output_intermediate_states: bool = False
+) -> Tuple[torch.Tensor, torch.Tensor, Optional[torch.Tensor]]:
+    B, H, T, K, V = *q.shape, v.shape[-1]
+    h = q.new_zeros(B, H, K, V) if h0 is None else h0
+    o, hs = [None] * T, [None] * T
+    for t in (range(T - 1, -1, -1) if reverse else range(T)):
+        if g is not None:
+            h = h * g[:, :, t, None, None].exp()
+        if gk is not None:
+            h = h * gk[:, :, t, :, None].exp()
+        if gv is not None:
+            h = h * gv[:, :, t, None, :].exp()
+        h = h + k[:, :, t, :, None] * v[:, :, t, None, :]
+        o[t] = torch.einsum('b h k, b h k v -> b h v', q[:, :, t] * scale, h)
+        hs[t] = h
+    return torch.stack(o, 2), h, torch.stack(hs, 2) if output_intermediate_states else None
+
+
+def fused_recurrent_gated_delta_rule_fwd_cpu(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    g: Optional[torch.Tensor],
+    beta: torch.Tensor,
+    h0: Optional[torch.Tensor],
+    scale: float,
+    output_intermediate_states: bool = False
+) -> Tuple[torch.Tensor, torch.Tensor, Optional[torch.Tensor]]:
+    B, H, T, K, V = *q.shape, v.shape[-1]
+    # headwise betas are of shape `[B, H, T, V]`
+    if beta.ndim == 3:
+        beta = beta[..., None]
+    h = q.new_zeros(B, H, K, V) if h0 is None else h0
+    o, hs = [], []
+    for t in range(T):
+        if g is not None:
+            h = h * g[:, :, t, None, None].exp()
+        d = (v[:, :, t] - torch.einsum('b h k, b h k v -> b h v', k[:, :, t], h)) * beta[:, :, t]
+        h = h + k[:, :, t, :, None] * d[:, :, None, :]
+        o.append(torch.einsum('b h k, b h k v -> b h v', q[:, :, t] * scale, h))
+        hs.append(h)
+    return torch.stack(o, 2), h, torch.stack(hs, 2) if output_intermediate_states else None
+
+
+def chunk_gla_cpu(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    g: torch.Tensor,
+    scale: float,
+    initial_state: Optional[torch.Tensor] = None,
+    output_final_state: bool = False,
+    cu_seqlens: Optional[torch.LongTensor] = None,
+    head_first: bool = True
+) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+    o, ht = apply_cpu(chunk_gla_fwd_cpu, (q, k, v, g), initial_state, cu_seqlens, head_first, scale=scale)
+    return o, ht if output_final_state else None
+
+
+def chunk_simple_gla_cpu(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    g: Optional[torch.Tensor],
+    scale: float,
+    initial_state: Optional[torch.Tensor] = None,
+    output_final_state: bool = False,
+    cu_seqlens: Optional[torch.LongTensor] = None,
+    head_first: bool = True
+) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+    o, ht = apply_cpu(chunk_simple_gla_fwd_cpu, (q, k, v, g), initial_state, cu_seqlens, head_first, scale=scale)
+    return o, ht if output_final_state else None
+
+
+def chunk_gated_delta_rule_cpu(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    g: Optional[torch.Tensor],
+    beta: torch.Tensor,
+    scale: float,
+    initial_state: Optional[torch.Tensor] = None,
+    output_final_state: bool = False,
+    cu_seqlens: Optional[torch.LongTensor] = None,
+    head_first: bool = False,
+    use_qk_l2norm_in_kernel: bool = False
+) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+    if use_qk_l2norm_in_kernel:
+        q, k = l2norm(q), l2norm(k)
+    o, ht = apply_cpu(chunk_gated_delta_rule_fwd_cpu, (q, k, v, g, beta), initial_state, cu_seqlens, head_first, scale=scale)
+    return o, ht if output_final_state else None
+
+
+def fused_recurrent_cpu(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    g: Optional[torch.Tensor] = None,
+    gk: Optional[torch.Tensor] = None,
+    gv: Optional[torch.Tensor] = None,
+    scale: Optional[float] = None,
+    initial_state: Optional[torch.Tensor] = None,
+    output_final_state: bool = False,
+    reverse: bool = False,
+    cu_seqlens: Optional[torch.LongTensor] = None,
+    head_first: bool = True,
+    state_indices: Optional[torch.LongTensor] = None,
+    output_intermediate_states: bool = False
+) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+    pool = None
+    if state_indices is not None:
+        if initial_state is None:
+            raise ValueError("`initial_state` is required as the state pool when `state_indices` is provided.")
+        pool, initial_state = initial_state, initial_state[state_indices]
+    o, ht, hs = apply_cpu(
+        fused_recurrent_fwd_cpu,
+        (q, k, v, g, gk, gv),
+        initial_state,
+        cu_seqlens,
+        head_first,
+        scale=scale,
+        reverse=reverse,
+        output_intermediate_states=output_intermediate_states
+    )
+    if pool is not None:
+        with torch.no_grad():
+            pool[state_indices] = ht.to(pool.dtype)
+        ht = pool
+    if output_intermediate_states:
+        return o, hs
+    return o, ht if output_final_state else None
+
+
+def fused_recurrent_gated_delta_rule_cpu(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    g: Optional[torch.Tensor],
+    beta: torch.Tensor,
+    scale: float,
+    initial_state: Optional[torch.Tensor] = None,
+    output_final_state: bool = False,
+    cu_seqlens: Optional[torch.LongTensor] = None,
+    head_first: bool = True,
+    use_qk_l2norm_in_kernel: bool = False,
+    output_intermediate_states: bool = False
+) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+    if use_qk_l2norm_in_kernel:
+        q, k = l2norm(q), l2norm(k)
+    o, ht, hs = apply_cpu(
+        fused_recurrent_gated_delta_rule_fwd_cpu,
+        (q, k, v, g, beta),
+        initial_state,
+        cu_seqlens,
+        head_first,
+        scale=scale,
+        output_intermediate_states=output_intermediate_states
+    )
+    if output_intermediate_states:
+        return o, hs
+    return o, ht if output_final_state else None
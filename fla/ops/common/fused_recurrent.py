@@ -7,14 +7,17 @@ import torch
 import triton
 import triton.language as tl
 
+from fla.ops.common.cpu import fused_recurrent_cpu
 from fla.ops.utils import chunk_global_cumsum
-from fla.utils import autocast_custom_bwd, autocast_custom_fwd, input_guard
+from fla.utils import autocast_custom_bwd, autocast_custom_fwd, input_guard, row_stride
 
 
 @triton.heuristics({
     'USE_INITIAL_STATE': lambda args: args['h0'] is not None,
     'STORE_FINAL_STATE': lambda args: args['ht'] is not None,
-    'USE_OFFSETS': lambda args: args['offsets'] is not None
+    'STORE_INTERMEDIATE_STATES': lambda args: args['hs'] is not None,
+    'USE_OFFSETS': lambda args: args['offsets'] is not None,
+    'USE_STATE_INDICES': lambda args: args['state_indices'] is not None
 })
 @triton.autotune(
     configs=[
@@ -34,11 +37,17 @@ def fused_recurrent_fwd_kernel(
     o,
     h0,
     ht,
+    hs,
     offsets,
+    state_indices,
     scale,
+    stride_q,
+    stride_k,
+    stride_v,
     T,
     B: tl.constexpr,
     H: tl.constexpr,
+    NG: tl.constexpr,
     K: tl.constexpr,
     V: tl.constexpr,
     BK: tl.constexpr,
@@ -49,12 +58,19 @@ def fused_recurrent_fwd_kernel(
     USE_GV: tl.constexpr,
     USE_INITIAL_STATE: tl.constexpr,
     STORE_FINAL_STATE: tl.constexpr,
+    STORE_INTERMEDIATE_STATES: tl.constexpr,
     USE_OFFSETS: tl.constexpr,
+    USE_STATE_INDICES: tl.constexpr,
     HEAD_FIRST: tl.constexpr
 ):
     # indices
     i_v, i_k, i_nh = tl.program_id(0).to(tl.int64), tl.program_id(1).to(tl.int64), tl.program_id(2).to(tl.int64)
     i_n, i_h = i_nh // H, i_nh % H
+    # the slot of the initial/final states of the current sequence
+    if USE_STATE_INDICES:
+        i_sh = tl.load(state_indices + i_n).to(tl.int64) * H + i_h
+    else:
+        i_sh = i_nh
     if USE_OFFSETS:
         bos, eos = tl.load(offsets + i_n).to(tl.int64), tl.load(offsets + i_n + 1).to(tl.int64)
         all = T
@@ -64,10 +80,10 @@ def fused_recurrent_fwd_kernel(
         all = B * T
 
     if HEAD_FIRST:
-        p_q = q + i_nh * T*K + ((T-1) * K if REVERSE else 0) + i_k * BK + tl.arange(0, BK)
-        p_k = k + i_nh * T*K + ((T-1) * K if REVERSE else 0) + i_k * BK + tl.arange(0, BK)
-        p_v = v + i_nh * T*V + ((T-1) * V if REVERSE else 0) + i_v * BV + tl.arange(0, BV)
-        p_o = o + (i_k * B*H + i_nh) * T*V + ((T-1) * V if REVERSE else 0) + i_v * BV + tl.arange(0, BV)
+        p_q = q + i_nh * NG*stride_q + ((T-1) * K if REVERSE else 0) + i_k * BK + tl.arange(0, BK)
+        p_k = k + i_nh * stride_k + ((T-1) * K if REVERSE else 0) + i_k * BK + tl.arange(0, BK)
+        p_v = v + i_nh * stride_v + ((T-1) * V if REVERSE else 0) + i_v * BV + tl.arange(0, BV)
+        p_o = o + (i_k * B*H + i_nh) * NG*T*V + ((T-1) * V if REVERSE else 0) + i_v * BV + tl.arange(0, BV)
         if USE_G:
             p_g = g + i_nh * T + ((T-1) if REVERSE else 0)
         if USE_GK:
@@ -75,10 +91,10 @@ def fused_recurrent_fwd_kernel(
         if USE_GV:
             p_gv = gv + i_nh * T*V + ((T-1) * V if REVERSE else 0) + i_v * BV + tl.arange(0, BV)
     else:
-        p_q = q + (bos + ((T-1) if REVERSE else 0)) * H*K + i_h * K + i_k * BK + tl.arange(0, BK)
-        p_k = k + (bos + ((T-1) if REVERSE else 0)) * H*K + i_h * K + i_k * BK + tl.arange(0, BK)
-        p_v = v + (bos + ((T-1) if REVERSE else 0)) * H*V + i_h * V + i_v * BV + tl.arange(0, BV)
-        p_o = o + ((i_k * all + bos) + ((T-1) if REVERSE else 0)) * H*V + i_h * V + i_v * BV + tl.arange(0, BV)
+        p_q = q + (bos + ((T-1) if REVERSE else 0)) * stride_q + i_h * NG*K + i_k * BK + tl.arange(0, BK)
+        p_k = k + (bos + ((T-1) if REVERSE else 0)) * stride_k + i_h * K + i_k * BK + tl.arange(0, BK)
+        p_v = v + (bos + ((T-1) if REVERSE else 0)) * stride_v + i_h * V + i_v * BV + tl.arange(0, BV)
+        p_o = o + ((i_k * all + bos) + ((T-1) if REVERSE else 0)) * H*NG*V + i_h * NG*V + i_v * BV + tl.arange(0, BV)
         if USE_G:
             p_g = g + (bos + ((T-1) if REVERSE else 0)) * H + i_h
         if USE_GK:
@@ -90,13 +106,19 @@ def fused_recurrent_fwd_kernel(
     mask_v = (i_v * BV + tl.arange(0, BV)) < V
     mask_h = mask_k[None, :] & mask_v[:, None]
     b_h = tl.zeros([BV, BK], dtype=tl.float32)
+    if STORE_INTERMEDIATE_STATES:
+        # the states after each token, laid out as `[B, H, T, K, V]` if `HEAD_FIRST` else `[B, T, H, K, V]`
+        if HEAD_FIRST:
+            p_hs = hs + (i_nh * T + ((T-1) if REVERSE else 0)) * K*V
+        else:
+            p_hs = hs + ((bos + ((T-1) if REVERSE else 0)) * H + i_h) * K*V
+        p_hs += (i_k * BK + tl.arange(0, BK)[None, :]) * V + (i_v * BV + tl.arange(0, BV)[:, None])
 
     if USE_INITIAL_STATE:
-        p_h0 = h0 + i_nh * K*V + (i_k * BK + tl.arange(0, BK)[None, :]) * V + (i_v * BV + tl.arange(0, BV)[:, None])
+        p_h0 = h0 + i_sh * K*V + (i_k * BK + tl.arange(0, BK)[None, :]) * V + (i_v * BV + tl.arange(0, BV)[:, None])
         b_h += tl.load(p_h0, mask=mask_h, other=0).to(tl.float32)
 
     for _ in range(0, T):
-        b_q = tl.load(p_q, mask=mask_k, other=0).to(tl.float32) * scale
         b_k = tl.load(p_k, mask=mask_k, other=0).to(tl.float32)
         b_v = tl.load(p_v, mask=mask_v, other=0).to(tl.float32)
         if USE_GK:
@@ -109,13 +131,19 @@ def fused_recurrent_fwd_kernel(
             b_g = tl.load(p_g).to(tl.float32)
             b_h = b_h * tl.exp(b_g)
         b_h += b_k[None, :] * b_v[:, None]
-        b_o = b_h * b_q[None, :]
-        b_o = tl.sum(b_o, axis=1)
-        tl.store(p_o, b_o.to(p_o.dtype.element_ty), mask=mask_v)
-        p_q += (-1 if REVERSE else 1) * (1 if HEAD_FIRST else H) * K
-        p_k += (-1 if REVERSE else 1) * (1 if HEAD_FIRST else H) * K
-        p_v += (-1 if REVERSE else 1) * (1 if HEAD_FIRST else H) * V
-        p_o += (-1 if REVERSE else 1) * (1 if HEAD_FIRST else H) * V
+        # the state is shared by the NG query heads of the group
+        for i_g in tl.static_range(NG):
+            b_q = tl.load(p_q + i_g * (stride_q if HEAD_FIRST else K), mask=mask_k, other=0).to(tl.float32) * scale
+            b_o = b_h * b_q[None, :]
+            b_o = tl.sum(b_o, axis=1)
+            tl.store(p_o + i_g * (T*V if HEAD_FIRST else V), b_o.to(p_o.dtype.element_ty), mask=mask_v)
+        if STORE_INTERMEDIATE_STATES:
+            tl.store(p_hs, b_h.to(p_hs.dtype.element_ty), mask=mask_h)
+            p_hs += (-1 if REVERSE else 1) * (1 if HEAD_FIRST else H) * K*V
+        p_q += (-1 if REVERSE else 1) * (K if HEAD_FIRST else stride_q)
+        p_k += (-1 if REVERSE else 1) * (K if HEAD_FIRST else stride_k)
+        p_v += (-1 if REVERSE else 1) * (V if HEAD_FIRST else stride_v)
+        p_o += (-1 if REVERSE else 1) * (1 if HEAD_FIRST else H*NG) * V
         if USE_GK:
             p_gk += (-1 if REVERSE else 1) * (1 if HEAD_FIRST else H) * K
         if USE_GV:
@@ -124,7 +152,7 @@ def fused_recurrent_fwd_kernel(
             p_g += (-1 if REVERSE else 1) * (1 if HEAD_FIRST else H)
 
     if STORE_FINAL_STATE:
-        p_ht = ht + i_nh * K*V + (i_k * BK + tl.arange(0, BK)[None, :]) * V + (i_v * BV + tl.arange(0, BV)[:, None])
+        p_ht = ht + i_sh * K*V + (i_k * BK + tl.arange(0, BK)[None, :]) * V + (i_v * BV + tl.arange(0, BV)[:, None])
         tl.store(p_ht, b_h.to(p_ht.dtype.element_ty), mask=mask_h)
 
 
@@ -158,9 +186,13 @@ def fused_recurrent_bwd_kernel(
     dh0,
     offsets,
     scale,
+    stride_q,
+    stride_k,
+    stride_v,
     T,
     B: tl.constexpr,
     H: tl.constexpr,
+    NG: tl.constexpr,
     K: tl.constexpr,
     V: tl.constexpr,
     BK: tl.constexpr,
@@ -186,10 +218,10 @@ def fused_recurrent_bwd_kernel(
         all = B * T
 
     if HEAD_FIRST:
-        p_k = k + i_nh * T*K + ((T-1) * K if REVERSE else 0) + i_k * BK + tl.arange(0, BK)
-        p_v = v + i_nh * T*V + ((T-1) * V if REVERSE else 0) + i_v * BV + tl.arange(0, BV)
-        p_do = do + i_nh * T*V + ((T-1) * V if REVERSE else 0) + i_v * BV + tl.arange(0, BV)
-        p_dq = dq + (i_v * B*H + i_nh) * T*K + ((T-1) * K if REVERSE else 0) + i_k * BK + tl.arange(0, BK)
+        p_k = k + i_nh * stride_k + ((T-1) * K if REVERSE else 0) + i_k * BK + tl.arange(0, BK)
+        p_v = v + i_nh * stride_v + ((T-1) * V if REVERSE else 0) + i_v * BV + tl.arange(0, BV)
+        p_do = do + i_nh * NG*T*V + ((T-1) * V if REVERSE else 0) + i_v * BV + tl.arange(0, BV)
+        p_dq = dq + (i_v * B*H + i_nh) * NG*T*K + ((T-1) * K if REVERSE else 0) + i_k * BK + tl.arange(0, BK)
         if USE_G:
             p_g = g + i_nh * T + ((T-1) if REVERSE else 0)
         if USE_GK:
@@ -197,10 +229,10 @@ def fused_recurrent_bwd_kernel(
         if USE_GV:
             p_gv = gv + i_nh * T*V + ((T-1) * V if REVERSE else 0) + i_v * BV + tl.arange(0, BV)
     else:
-        p_k = k + (bos + ((T-1) if REVERSE else 0)) * H*K + i_h * K + i_k * BK + tl.arange(0, BK)
-        p_v = v + (bos + ((T-1) if REVERSE else 0)) * H*V + i_h * V + i_v * BV + tl.arange(0, BV)
-        p_do = do + (bos + ((T-1) if REVERSE else 0)) * H*V + i_h * V + i_v * BV + tl.arange(0, BV)
-        p_dq = dq + ((i_v * all + bos) + ((T-1) if REVERSE else 0)) * H*K + i_h * K + i_k * BK + tl.arange(0, BK)
+        p_k = k + (bos + ((T-1) if REVERSE else 0)) * stride_k + i_h * K + i_k * BK + tl.arange(0, BK)
+        p_v = v + (bos + ((T-1) if REVERSE else 0)) * stride_v + i_h * V + i_v * BV + tl.arange(0, BV)
+        p_do = do + (bos + ((T-1) if REVERSE else 0)) * H*NG*V + i_h * NG*V + i_v * BV + tl.arange(0, BV)
+        p_dq = dq + ((i_v * all + bos) + ((T-1) if REVERSE else 0)) * H*NG*K + i_h * NG*K + i_k * BK + tl.arange(0, BK)
         if USE_G:
             p_g = g + (bos + ((T-1) if REVERSE else 0)) * H + i_h
         if USE_GK:
@@ -220,7 +252,6 @@ def fused_recurrent_bwd_kernel(
     for _ in range(0, T):
         b_k = tl.load(p_k, mask=mask_k, other=0).to(tl.float32)
         b_v = tl.load(p_v, mask=mask_v, other=0).to(tl.float32)
-        b_do = tl.load(p_do, mask=mask_v, other=0).to(tl.float32)
         if USE_G:
             b_g = tl.load(p_g).to(tl.float32)
             b_h = b_h * tl.exp(b_g)
@@ -231,14 +262,16 @@ def fused_recurrent_bwd_kernel(
             b_gv = tl.load(p_gv, mask=mask_v, other=0).to(tl.float32)
             b_h = b_h * tl.exp(b_gv[None, :])
         b_h += b_k[:, None] * b_v[None, :]
-        b_dq = b_h * b_do[None, :]
-        b_dq = tl.sum(b_dq, axis=1) * scale
-        tl.store(p_dq, b_dq.to(p_dq.dtype.element_ty), mask=mask_k)
-
-        p_k += (-1 if REVERSE else 1) * (1 if HEAD_FIRST else H) * K
-        p_v += (-1 if REVERSE else 1) * (1 if HEAD_FIRST else H) * V
-        p_do += (-1 if REVERSE else 1) * (1 if HEAD_FIRST else H) * V
-        p_dq += (-1 if REVERSE else 1) * (1 if HEAD_FIRST else H) * K
+        for i_g in tl.static_range(NG):
+            b_do = tl.load(p_do + i_g * (T*V if HEAD_FIRST else V), mask=mask_v, other=0).to(tl.float32)
+            b_dq = b_h * b_do[None, :]
+            b_dq = tl.sum(b_dq, axis=1) * scale
+            tl.store(p_dq + i_g * (T*K if HEAD_FIRST else K), b_dq.to(p_dq.dtype.element_ty), mask=mask_k)
+
+        p_k += (-1 if REVERSE else 1) * (K if HEAD_FIRST else stride_k)
+        p_v += (-1 if REVERSE else 1) * (V if HEAD_FIRST else stride_v)
+        p_do += (-1 if REVERSE else 1) * (1 if HEAD_FIRST else H*NG) * V
+        p_dq += (-1 if REVERSE else 1) * (1 if HEAD_FIRST else H*NG) * K
         if USE_G:
             p_g += (-1 if REVERSE else 1) * (1 if HEAD_FIRST else H)
         if USE_GK:
@@ -250,10 +283,10 @@ def fused_recurrent_bwd_kernel(
     tl.debug_barrier()
 
     if HEAD_FIRST:
-        p_q = q + i_nh * T*K + ((T - 1) * K if not REVERSE else 0) + i_k * BK + tl.arange(0, BK)
-        p_k = k + i_nh * T*K + ((T - 1) * K if not REVERSE else 0) + i_k * BK + tl.arange(0, BK)
-        p_v = v + i_nh * T*V + ((T - 1) * V if not REVERSE else 0) + i_v * BV + tl.arange(0, BV)
-        p_do = do + i_nh * T*V + ((T - 1) * V if not REVERSE else 0) + i_v * BV + tl.arange(0, BV)
+        p_q = q + i_nh * NG*stride_q + ((T - 1) * K if not REVERSE else 0) + i_k * BK + tl.arange(0, BK)
+        p_k = k + i_nh * stride_k + ((T - 1) * K if not REVERSE else 0) + i_k * BK + tl.arange(0, BK)
+        p_v = v + i_nh * stride_v + ((T - 1) * V if not REVERSE else 0) + i_v * BV + tl.arange(0, BV)
+        p_do = do + i_nh * NG*T*V + ((T - 1) * V if not REVERSE else 0) + i_v * BV + tl.arange(0, BV)
         p_dk = dk + (i_v * B*H + i_nh) * T*K + ((T - 1) * K if not REVERSE else 0) + i_k * BK + tl.arange(0, BK)
         p_dv = dv + (i_k * B*H + i_nh) * T*V + ((T - 1) * V if not REVERSE else 0) + i_v * BV + tl.arange(0, BV)
         if USE_G:
@@ -263,10 +296,10 @@ def fused_recurrent_bwd_kernel(
         if USE_GV:
             p_gv = gv + i_nh * T*V + ((T - 1) * V if not REVERSE else 0) + i_v * BV + tl.arange(0, BV)
     else:
-        p_q = q + (bos + ((T - 1) if not REVERSE else 0)) * H*K + i_h * K + i_k * BK + tl.arange(0, BK)
-        p_k = k + (bos + ((T - 1) if not REVERSE else 0)) * H*K + i_h * K + i_k * BK + tl.arange(0, BK)
-        p_v = v + (bos + ((T - 1) if not REVERSE else 0)) * H*V + i_h * V + i_v * BV + tl.arange(0, BV)
-        p_do = do + (bos + ((T - 1) if not REVERSE else 0)) * H*V + i_h * V + i_v * BV + tl.arange(0, BV)
+        p_q = q + (bos + ((T - 1) if not REVERSE else 0)) * stride_q + i_h * NG*K + i_k * BK + tl.arange(0, BK)
+        p_k = k + (bos + ((T - 1) if not REVERSE else 0)) * stride_k + i_h * K + i_k * BK + tl.arange(0, BK)
+        p_v = v + (bos + ((T - 1) if not REVERSE else 0)) * stride_v + i_h * V + i_v * BV + tl.arange(0, BV)
+        p_do = do + (bos + ((T - 1) if not REVERSE else 0)) * H*NG*V + i_h * NG*V + i_v * BV + tl.arange(0, BV)
         p_dk = dk + ((i_v * all + bos) + ((T - 1) if not REVERSE else 0)) * H*K + i_h * K + i_k * BK + tl.arange(0, BK)
         p_dv = dv + ((i_k * all + bos) + ((T - 1) if not REVERSE else 0)) * H*V + i_h * V + i_v * BV + tl.arange(0, BV)
         if USE_G:
@@ -282,11 +315,13 @@ def fused_recurrent_bwd_kernel(
         b_dh += tl.load(p_dht, mask=mask_h, other=0).to(tl.float32)
 
     for _ in range(T):
-        b_q = tl.load(p_q, mask=mask_k, other=0).to(tl.float32) * scale
         b_k = tl.load(p_k, mask=mask_k, other=0).to(tl.float32)
         b_v = tl.load(p_v, mask=mask_v, other=0).to(tl.float32)
-        b_do = tl.load(p_do, mask=mask_v, other=0).to(tl.float32)
-        b_dh += b_q[:, None] * b_do[None, :]
+        # gradients of the shared state are accumulated over the NG query heads of the group
+        for i_g in tl.static_range(NG):
+            b_q = tl.load(p_q + i_g * (stride_q if HEAD_FIRST else K), mask=mask_k, other=0).to(tl.float32) * scale
+            b_do = tl.load(p_do + i_g * (T*V if HEAD_FIRST else V), mask=mask_v, other=0).to(tl.float32)
+            b_dh += b_q[:, None] * b_do[None, :]
         b_dk = tl.sum(b_dh * b_v[None, :], axis=1)
         b_dv = tl.sum(b_dh * b_k[:, None], axis=0)
         if USE_G:
@@ -301,10 +336,10 @@ def fused_recurrent_bwd_kernel(
         tl.store(p_dk, b_dk.to(p_dk.dtype.element_ty), mask=mask_k)
         tl.store(p_dv, b_dv.to(p_dv.dtype.element_ty), mask=mask_v)
 
-        p_q += (1 if REVERSE else -1) * (1 if HEAD_FIRST else H) * K
-        p_k += (1 if REVERSE else -1) * (1 if HEAD_FIRST else H) * K
-        p_v += (1 if REVERSE else -1) * (1 if HEAD_FIRST else H) * V
-        p_do += (1 if REVERSE else -1) * (1 if HEAD_FIRST else H) * V
+        p_q += (1 if REVERSE else -1) * (K if HEAD_FIRST else stride_q)
+        p_k += (1 if REVERSE else -1) * (K if HEAD_FIRST else stride_k)
+        p_v += (1 if REVERSE else -1) * (V if HEAD_FIRST else stride_v)
+        p_do += (1 if REVERSE else -1) * (1 if HEAD_FIRST else H*NG) * V
         p_dk += (1 if REVERSE else -1) * (1 if HEAD_FIRST else H) * K
         p_dv += (1 if REVERSE else -1) * (1 if HEAD_FIRST else H) * V
         if USE_G:
@@ -319,6 +354,11 @@ def fused_recurrent_bwd_kernel(
         tl.store(p_dh0, b_dh.to(p_dh0.dtype.element_ty), mask=mask_h)
 
 
+def reduce_groups(x: torch.Tensor, NG: int, dim: int) -> torch.Tensor:
+    # sums the NG consecutive query heads attending to the same key/value head
+    return x if NG == 1 else x.unflatten(dim, (-1, NG)).sum(dim + 1)
+
+
 def fused_recurrent_fwd(
     q: torch.Tensor,
     k: torch.Tensor,
@@ -331,22 +371,30 @@ def fused_recurrent_fwd(
     output_final_state: bool = False,
     reverse: bool = False,
     offsets: Optional[torch.LongTensor] = None,
+    state_indices: Optional[torch.LongTensor] = None,
+    output_intermediate_states: bool = False,
     head_first: bool = True
 ):
     if head_first:
         B, H, T, K, V = *k.shape, v.shape[-1]
     else:
         B, T, H, K, V = *k.shape, v.shape[-1]
+    # NG: number of query heads sharing the same key/value head in GQA
+    NG = q.shape[1 if head_first else 2] // H
     N = B if offsets is None else len(offsets) - 1
     BK, BV = min(K, 64), min(V, 64)
     NK, NV = triton.cdiv(K, BK), triton.cdiv(V, BV)
 
     h0 = initial_state
-    if output_final_state:
+    if state_indices is not None:
+        # the final states are written back to the slots of the initial states in-place
+        ht = initial_state if output_final_state else None
+    elif output_final_state:
         ht = q.new_empty(N, H, K, V, dtype=torch.float32)
     else:
         ht = None
-    o = q.new_empty(NK, *v.shape, dtype=torch.float32)
+    hs = q.new_empty(*k.shape[:-1], K, V, dtype=torch.float32) if output_intermediate_states else None
+    o = q.new_empty(NK, *q.shape[:-1], V, dtype=torch.float32)
 
     grid = (NV, NK, N * H)
     fused_recurrent_fwd_kernel[grid](
@@ -359,11 +407,17 @@ def fused_recurrent_fwd(
         o,
         h0,
         ht,
+        hs,
         offsets,
+        state_indices,
         scale,
+        stride_q=row_stride(q),
+        stride_k=row_stride(k),
+        stride_v=row_stride(v),
         T=T,
         B=B,
         H=H,
+        NG=NG,
         K=K,
         V=V,
         BK=BK,
@@ -375,6 +429,8 @@ def fused_recurrent_fwd(
         HEAD_FIRST=head_first
     )
     o = o.sum(0)
+    if output_intermediate_states:
+        return o, ht, hs
     return o, ht
 
 
@@ -398,6 +454,7 @@ def fused_recurrent_bwd(
         B, H, T, K, V = *k.shape, v.shape[-1]
     else:
         B, T, H, K, V = *k.shape, v.shape[-1]
+    NG = q.shape[1 if head_first else 2] // H
     N = B if offsets is None else len(offsets) - 1
 
     BK, BV = min(K, 64), min(V, 64)
@@ -426,9 +483,13 @@ def fused_recurrent_bwd(
         dh0,
         offsets,
         scale,
+        stride_q=row_stride(q),
+        stride_k=row_stride(k),
+        stride_v=row_stride(v),
         B=B,
         T=T,
         H=H,
+        NG=NG,
         K=K,
         V=V,
         BK=BK,
@@ -443,23 +504,25 @@ def fused_recurrent_bwd(
     dk = dk.sum(0)
     dv = dv.sum(0)
     dg, dgk, dgv = None, None, None
+    # the gates live on the key/value heads, so the query-side terms are reduced over each group
+    dqq = reduce_groups(dq * q.float(), NG, 1 if head_first else 2)
     if g is not None:
         dg = chunk_global_cumsum(
-            (dq * q.float() - dk * k.float()).sum(-1),
+            (dqq - dk * k.float()).sum(-1),
             reverse=not reverse,
             offsets=offsets,
             head_first=head_first
         )
     if gk is not None:
         dgk = chunk_global_cumsum(
-            dq * q.float() - dk * k.float(),
+            dqq - dk * k.float(),
             reverse=not reverse,
             offsets=offsets,
             head_first=head_first
         )
     if gv is not None:
         dgv = chunk_global_cumsum(
-            do.float() * o.float() - dv * v.float(),
+            reduce_groups(do.float() * o.float(), NG, 1 if head_first else 2) - dv * v.float(),
             reverse=not reverse,
             offsets=offsets,
             head_first=head_first
@@ -471,7 +534,7 @@ def fused_recurrent_bwd(
 class FusedRecurrentFunction(torch.autograd.Function):
 
     @staticmethod
-    @input_guard
+    @input_guard(strided=('q', 'k', 'v'))
     @autocast_custom_fwd
     def forward(
         ctx,
@@ -542,6 +605,52 @@ class FusedRecurrentFunction(torch.autograd.Function):
         return dq.to(q.dtype), dk.to(k.dtype), dv.to(v.dtype), dg, dgk, dgv, None, dh0, None, None, None, None
 
 
+@input_guard(strided=('q', 'k', 'v'))
+@torch.no_grad()
+def fused_recurrent_inference(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    g: Optional[torch.Tensor] = None,
+    gk: Optional[torch.Tensor] = None,
+    gv: Optional[torch.Tensor] = None,
+    scale: Optional[float] = None,
+    initial_state: Optional[torch.Tensor] = None,
+    output_final_state: bool = False,
+    reverse: bool = False,
+    offsets: Optional[torch.LongTensor] = None,
+    state_indices: Optional[torch.LongTensor] = None,
+    output_intermediate_states: bool = False,
+    head_first: bool = True
+):
+    # neither the states gathered from and scattered to the slots of a preallocated pool,
+    # nor the intermediate states kept for rolling back speculative tokens are differentiable
+    if state_indices is not None:
+        if initial_state is None:
+            raise ValueError("`initial_state` is required as the state pool when `state_indices` is provided.")
+        if initial_state.dtype != torch.float32:
+            raise ValueError(f"The state pool is expected to be of dtype float32 rather than {initial_state.dtype}.")
+    o, ht, *hs = fused_recurrent_fwd(
+        q=q,
+        k=k,
+        v=v,
+        g=g,
+        gk=gk,
+        gv=gv,
+        scale=scale,
+        initial_state=initial_state,
+        output_final_state=output_final_state,
+        reverse=reverse,
+        offsets=offsets,
+        state_indices=state_indices,
+        output_intermediate_states=output_intermediate_states,
+        head_first=head_first
+    )
+    if output_intermediate_states:
+        return o.to(q.dtype), hs[0]
+    return o.to(q.dtype), ht
+
+
 def fused_recurrent(
     q: torch.Tensor,
     k: torch.Tensor,
@@ -554,10 +663,46 @@ def fused_recurrent(
     output_final_state: bool = False,
     reverse: bool = False,
     cu_seqlens: Optional[torch.LongTensor] = None,
-    head_first: bool = True
+    head_first: bool = True,
+    state_indices: Optional[torch.LongTensor] = None,
+    output_intermediate_states: bool = False
 ):
     if scale is None:
         scale = k.shape[-1] ** -0.5
+    if q.device.type == 'cpu':
+        return fused_recurrent_cpu(
+            q=q,
+            k=k,
+            v=v,
+            g=g,
+            gk=gk,
+            gv=gv,
+            scale=scale,
+            initial_state=initial_state,
+            output_final_state=output_final_state,
+            reverse=reverse,
+            cu_seqlens=cu_seqlens,
+            head_first=head_first,
+            state_indices=state_indices,
+            output_intermediate_states=output_intermediate_states
+        )
+    if state_indices is not None or output_intermediate_states:
+        return fused_recurrent_inference(
+            q=q,
+            k=k,
+            v=v,
+            g=g,
+            gk=gk,
+            gv=gv,
+            scale=scale,
+            initial_state=initial_state,
+            output_final_state=output_final_state,
+            reverse=reverse,
+            offsets=cu_seqlens,
+            state_indices=state_indices,
+            output_intermediate_states=output_intermediate_states,
+            head_first=head_first
+        )
     return FusedRecurrentFunction.apply(
         q,
         k,
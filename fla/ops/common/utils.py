@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2023-2025, Songlin Yang, Yu Zhang
 
+from typing import Optional
+
 import torch
 import triton
 import triton.language as tl
@@ -36,9 +38,17 @@ def prepare_lens(offsets: torch.LongTensor) -> torch.LongTensor:
     return offsets[1:] - offsets[:-1]
 
 
+def prepare_segment_positions(offsets: torch.LongTensor, lens: torch.LongTensor, T: int) -> torch.LongTensor:
+    # the total length `T` is given by the caller, so that no value is read back to the host
+    return torch.arange(T, dtype=offsets.dtype, device=offsets.device) - offsets[:-1].repeat_interleave(lens, output_size=T)
+
+
 @tensor_cache
-def prepare_position_ids(offsets: torch.LongTensor) -> torch.LongTensor:
-    return torch.cat([torch.arange(n, dtype=offsets.dtype, device=offsets.device) for n in prepare_lens(offsets).unbind()])
+def prepare_position_ids(offsets: torch.LongTensor, T: Optional[int] = None) -> torch.LongTensor:
+    # the total length is read back from `offsets` only if it is not given, e.g., as the length of the packed inputs
+    if T is None:
+        T = offsets[-1].item()
+    return prepare_segment_positions(offsets, prepare_lens(offsets), T)
 
 
 @tensor_cache
@@ -47,8 +57,8 @@ def prepare_sequence_ids(position_ids: torch.LongTensor) -> torch.LongTensor:
 
 
 @tensor_cache
-def prepare_token_indices(offsets: torch.LongTensor) -> torch.LongTensor:
-    position_ids = prepare_position_ids(offsets)
+def prepare_token_indices(offsets: torch.LongTensor, T: Optional[int] = None) -> torch.LongTensor:
+    position_ids = prepare_position_ids(offsets, T)
     return torch.stack([prepare_sequence_ids(position_ids), position_ids], 1).to(offsets)
 
 
@@ -57,7 +67,13 @@ def prepare_chunk_indices(
     offsets: torch.LongTensor,
     chunk_size: int
 ) -> torch.LongTensor:
-    indices = torch.cat([torch.arange(n) for n in triton.cdiv(prepare_lens(offsets), chunk_size).tolist()])
+    chunk_offsets = prepare_chunk_offsets(offsets, chunk_size)
+    # the number of chunks depends on the lengths of all sequences, and is read back as it sizes the kernel grids anyway
+    indices = prepare_segment_positions(
+        chunk_offsets,
+        triton.cdiv(prepare_lens(offsets), chunk_size),
+        chunk_offsets[-1].item()
+    )
     return torch.stack([prepare_sequence_ids(indices), indices], 1).to(offsets)
 
 
@@ -8,8 +8,14 @@ import triton
 from einops import rearrange
 
 from fla.modules.l2norm import l2norm_bwd, l2norm_fwd
-from fla.ops.common.chunk_delta_h import chunk_gated_delta_rule_bwd_dhu, chunk_gated_delta_rule_fwd_h
+from fla.ops.common.chunk_delta_h import (
+    chunk_gated_delta_rule_bwd_dhu,
+    chunk_gated_delta_rule_fwd_h,
+    chunk_gated_delta_rule_fwd_h_from_checkpoints
+)
+from fla.ops.common.chunk_h import chunk_select_checkpoints
 from fla.ops.common.chunk_o import chunk_bwd_dqkwg, chunk_bwd_dv_local, chunk_fwd_o
+from fla.ops.common.cpu import chunk_gated_delta_rule_cpu
 from fla.ops.common.utils import prepare_chunk_indices
 from fla.ops.delta_rule.wy_fast import bwd_prepare_wy_repr, fwd_prepare_wy_repr, fwd_recompute_w_u
 from fla.utils import autocast_custom_bwd, autocast_custom_fwd, input_guard
@@ -64,7 +70,7 @@ def chunk_delta_rule_fwd(
         head_first=head_first,
         chunk_size=BT
     )
-    return o, A, final_state
+    return o, A, h, final_state
 
 
 def chunk_delta_rule_bwd(
@@ -80,7 +86,9 @@ def chunk_delta_rule_bwd(
     offsets: Optional[torch.LongTensor] = None,
     indices: Optional[torch.LongTensor] = None,
     head_first: bool = True,
-    chunk_size: int = 64
+    chunk_size: int = 64,
+    h: Optional[torch.Tensor] = None,
+    checkpoint_interval: Optional[int] = None
 ):
     T = q.shape[2] if head_first else q.shape[1]
     BT = min(chunk_size, max(triton.next_power_of_2(T), 16))
@@ -94,17 +102,30 @@ def chunk_delta_rule_bwd(
         head_first=head_first,
         chunk_size=BT
     )
-    h, v_new, _ = chunk_gated_delta_rule_fwd_h(
-        k=k,
-        w=w,
-        u=u,
-        g=None,
-        initial_state=initial_state,
-        output_final_state=False,
-        offsets=offsets,
-        head_first=head_first,
-        chunk_size=BT
-    )
+    if checkpoint_interval is None:
+        h, v_new, _ = chunk_gated_delta_rule_fwd_h(
+            k=k,
+            w=w,
+            u=u,
+            g=None,
+            initial_state=initial_state,
+            output_final_state=False,
+            offsets=offsets,
+            head_first=head_first,
+            chunk_size=BT
+        )
+    else:
+        h, v_new = chunk_gated_delta_rule_fwd_h_from_checkpoints(
+            k=k,
+            w=w,
+            u=u,
+            g=None,
+            h=h,
+            offsets=offsets,
+            head_first=head_first,
+            chunk_size=BT,
+            checkpoint_interval=checkpoint_interval
+        )
     dv = chunk_bwd_dv_local(
         q=q,
         k=k,
@@ -179,7 +200,8 @@ class ChunkDeltaRuleFunction(torch.autograd.Function):
         output_final_state: bool,
         offsets: Optional[torch.LongTensor] = None,
         head_first: bool = True,
-        use_qk_l2norm_in_kernel: bool = True
+        use_qk_l2norm_in_kernel: bool = True,
+        checkpoint_interval: Optional[int] = None
     ):
         T = q.shape[2] if head_first else q.shape[1]
         chunk_size = min(64, max(triton.next_power_of_2(T), 16))
@@ -197,7 +219,7 @@ class ChunkDeltaRuleFunction(torch.autograd.Function):
         # [[0, 0], [0, 1], [1, 0], [1, 1], [1, 2], [1, 3]]
         indices = prepare_chunk_indices(offsets, chunk_size) if offsets is not None else None
 
-        o, A, final_state = chunk_delta_rule_fwd(
+        o, A, h, final_state = chunk_delta_rule_fwd(
             q=q,
             k=k,
             v=v,
@@ -210,7 +232,13 @@ class ChunkDeltaRuleFunction(torch.autograd.Function):
             head_first=head_first,
             chunk_size=chunk_size
         )
-        ctx.save_for_backward(q_orig, k_orig, v, beta, A, initial_state)
+        # the states are either recomputed from scratch or from the checkpoints in the backward pass
+        if checkpoint_interval is not None:
+            h = chunk_select_checkpoints(h, offsets, head_first, chunk_size, checkpoint_interval)
+        else:
+            h = None
+        ctx.save_for_backward(q_orig, k_orig, v, beta, A, initial_state, h)
+        ctx.checkpoint_interval = checkpoint_interval
         ctx.chunk_size = chunk_size
         ctx.scale = scale
         ctx.offsets = offsets
@@ -227,7 +255,7 @@ class ChunkDeltaRuleFunction(torch.autograd.Function):
         do: torch.Tensor,
         dht: torch.Tensor
     ):
-        q, k, v, beta, A, initial_state = ctx.saved_tensors
+        q, k, v, beta, A, initial_state, h = ctx.saved_tensors
         use_qk_l2norm_in_kernel = ctx.use_qk_l2norm_in_kernel
         if use_qk_l2norm_in_kernel:
             q, q_orig = l2norm_fwd(q), q
@@ -246,7 +274,9 @@ class ChunkDeltaRuleFunction(torch.autograd.Function):
             offsets=ctx.offsets,
             indices=ctx.indices,
             head_first=ctx.head_first,
-            chunk_size=ctx.chunk_size
+            chunk_size=ctx.chunk_size,
+            h=h,
+            checkpoint_interval=ctx.checkpoint_interval
         )
         if use_qk_l2norm_in_kernel:
             dq = l2norm_bwd(q_orig, dq)
@@ -265,7 +295,8 @@ def chunk_delta_rule(
     output_final_state: bool = False,
     cu_seqlens: Optional[torch.LongTensor] = None,
     head_first: bool = False,
-    use_qk_l2norm_in_kernel: bool = False
+    use_qk_l2norm_in_kernel: bool = False,
+    state_checkpoint_interval: Optional[int] = None
 ):
     r"""
     Args:
@@ -295,6 +326,12 @@ def chunk_delta_rule(
         use_qk_l2norm_in_kernel (Optional[bool]):
             Whether to use qk l2norm within the kernel for saving GPU memory.
             Default: `False`.
+        state_checkpoint_interval (Optional[int]):
+            If provided, the chunk states are kept every `state_checkpoint_interval` chunks for the backward pass,
+            and the ones in between are recomputed from them in parallel.
+            Larger intervals save more memory at the cost of longer recomputation, and `1` keeps all states.
+            By default, no states are kept and they are all recomputed sequentially from the initial states.
+            Default: `None`.
 
     Returns:
         o (torch.Tensor):
@@ -331,7 +368,6 @@ def chunk_delta_rule(
         )
     """
     assert q.dtype == k.dtype == v.dtype
-    assert q.dtype != torch.float32, "ChunkDeltaRuleFunction does not support float32. Please use bfloat16."
     assert len(beta.shape) == 3, "beta must be of shape (batch size, num of head, seq len)."
 
     if cu_seqlens is not None:
@@ -349,22 +385,31 @@ def chunk_delta_rule(
                 f"The number of initial states is expected to be equal to the number of input sequences, "
                 f"i.e., {len(cu_seqlens) - 1} rather than {initial_state.shape[0]}."
             )
+    if state_checkpoint_interval is not None and state_checkpoint_interval < 1:
+        raise ValueError(f"`state_checkpoint_interval` is expected to be positive, got {state_checkpoint_interval}.")
     if head_first:
         q, k, v = map(lambda x: rearrange(x, 'b h t d -> b t h d'), (q, k, v))
         beta = rearrange(beta, 'b h t -> b t h')
     scale = k.shape[-1] ** -0.5 if scale is None else scale
-    o, final_state = ChunkDeltaRuleFunction.apply(
-        q,
-        k,
-        v,
-        beta,
-        scale,
-        initial_state,
-        output_final_state,
-        cu_seqlens,
-        False,
-        use_qk_l2norm_in_kernel
-    )
+    if q.device.type == 'cpu':
+        o, final_state = chunk_gated_delta_rule_cpu(
+            q, k, v, None, beta, scale, initial_state, output_final_state, cu_seqlens, False, use_qk_l2norm_in_kernel
+        )
+    else:
+        assert q.dtype != torch.float32, "ChunkDeltaRuleFunction does not support float32. Please use bfloat16."
+        o, final_state = ChunkDeltaRuleFunction.apply(
+            q,
+            k,
+            v,
+            beta,
+            scale,
+            initial_state,
+            output_final_state,
+            cu_seqlens,
+            False,
+            use_qk_l2norm_in_kernel,
+            state_checkpoint_interval
+        )
     if head_first:
         o = rearrange(o, 'b t h v -> b h t v')
     return o, final_state
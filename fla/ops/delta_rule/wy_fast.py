@@ -283,7 +283,7 @@ def bwd_prepare_wy_repr_kernel(
     HEAD_FIRST: tl.constexpr,
     USE_OFFSETS: tl.constexpr
 ):
-    i_t, i_bh = tl.program_id(0), tl.program_id(1), tl.program_id(2)
+    i_t, i_bh = tl.program_id(0), tl.program_id(1)
     i_b, i_h = i_bh // H, i_bh % H
     if USE_OFFSETS:
         i_n, i_t = tl.load(indices + i_t * 2).to(tl.int32), tl.load(indices + i_t * 2 + 1).to(tl.int32)
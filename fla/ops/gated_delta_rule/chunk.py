@@ -4,12 +4,20 @@
 from typing import Optional
 
 import torch
+import torch.distributed as dist
 import triton
 from einops import rearrange
 
 from fla.modules.l2norm import l2norm_bwd, l2norm_fwd
-from fla.ops.common.chunk_delta_h import chunk_gated_delta_rule_bwd_dhu, chunk_gated_delta_rule_fwd_h
+from fla.ops.common.chunk_delta_h import (
+    chunk_gated_delta_rule_bwd_dhu,
+    chunk_gated_delta_rule_fwd_h,
+    chunk_gated_delta_rule_fwd_h_from_checkpoints
+)
+from fla.ops.common.chunk_h import chunk_select_checkpoints
 from fla.ops.common.chunk_o import chunk_bwd_dqkwg, chunk_bwd_dv_local, chunk_fwd_o
+from fla.ops.common.context_parallel import chunk_context_parallel
+from fla.ops.common.cpu import chunk_gated_delta_rule_cpu
 from fla.ops.gated_delta_rule.wy_fast import bwd_prepare_wy_repr, fwd_prepare_wy_repr, fwd_recompute_w_u
 from fla.ops.utils import chunk_local_cumsum
 from fla.utils import autocast_custom_bwd, autocast_custom_fwd, input_guard
@@ -67,7 +75,7 @@ def chunk_gated_delta_rule_fwd(
         head_first=head_first,
         chunk_size=chunk_size
     )
-    return g, o, Aw, Au, final_state
+    return g, o, Aw, Au, h, final_state
 
 
 def chunk_gated_delta_rule_bwd(
@@ -85,7 +93,9 @@ def chunk_gated_delta_rule_bwd(
     offsets: Optional[torch.LongTensor] = None,
     indices: Optional[torch.LongTensor] = None,
     head_first: bool = True,
-    chunk_size: int = 64
+    chunk_size: int = 64,
+    h: Optional[torch.Tensor] = None,
+    checkpoint_interval: Optional[int] = None
 ):
     T = q.shape[2] if head_first else q.shape[1]
     BT = min(chunk_size, max(triton.next_power_of_2(T), 16))
@@ -100,17 +110,30 @@ def chunk_gated_delta_rule_bwd(
         head_first=head_first,
         chunk_size=BT
     )
-    h, v_new, _ = chunk_gated_delta_rule_fwd_h(
-        k=k,
-        w=w,
-        u=u,
-        g=g,
-        initial_state=initial_state,
-        output_final_state=False,
-        offsets=offsets,
-        head_first=head_first,
-        chunk_size=BT
-    )
+    if checkpoint_interval is None:
+        h, v_new, _ = chunk_gated_delta_rule_fwd_h(
+            k=k,
+            w=w,
+            u=u,
+            g=g,
+            initial_state=initial_state,
+            output_final_state=False,
+            offsets=offsets,
+            head_first=head_first,
+            chunk_size=BT
+        )
+    else:
+        h, v_new = chunk_gated_delta_rule_fwd_h_from_checkpoints(
+            k=k,
+            w=w,
+            u=u,
+            g=g,
+            h=h,
+            offsets=offsets,
+            head_first=head_first,
+            chunk_size=BT,
+            checkpoint_interval=checkpoint_interval
+        )
     dv = chunk_bwd_dv_local(
         q=q,
         k=k,
@@ -191,7 +214,8 @@ class ChunkGatedDeltaRuleFunction(torch.autograd.Function):
         output_final_state: bool,
         offsets: Optional[torch.LongTensor] = None,
         head_first: bool = True,
-        use_qk_l2norm_in_kernel: bool = False
+        use_qk_l2norm_in_kernel: bool = False,
+        checkpoint_interval: Optional[int] = None
     ):
         chunk_size = 64
         q_orig = q
@@ -210,7 +234,7 @@ class ChunkGatedDeltaRuleFunction(torch.autograd.Function):
             indices = torch.cat([torch.arange(n) for n in triton.cdiv(offsets[1:] - offsets[:-1], chunk_size).tolist()])
             indices = torch.stack([indices.eq(0).cumsum(0) - 1, indices], 1).to(offsets)
 
-        g, o, Aw, Au, final_state = chunk_gated_delta_rule_fwd(
+        g, o, Aw, Au, h, final_state = chunk_gated_delta_rule_fwd(
             q=q,
             k=k,
             v=v,
@@ -224,7 +248,13 @@ class ChunkGatedDeltaRuleFunction(torch.autograd.Function):
             head_first=head_first,
             chunk_size=chunk_size,
         )
-        ctx.save_for_backward(q_orig, k_orig, v, g, beta, Aw, Au, initial_state, offsets, indices)
+        # the states are either recomputed from scratch or from the checkpoints in the backward pass
+        if checkpoint_interval is not None:
+            h = chunk_select_checkpoints(h, offsets, head_first, chunk_size, checkpoint_interval)
+        else:
+            h = None
+        ctx.save_for_backward(q_orig, k_orig, v, g, beta, Aw, Au, initial_state, offsets, indices, h)
+        ctx.checkpoint_interval = checkpoint_interval
         ctx.chunk_size = chunk_size
         ctx.scale = scale
         ctx.head_first = head_first
@@ -239,7 +269,7 @@ class ChunkGatedDeltaRuleFunction(torch.autograd.Function):
         do: torch.Tensor,
         dht: torch.Tensor
     ):
-        q, k, v, g, beta, Aw, Au, initial_state, offsets, indices = ctx.saved_tensors
+        q, k, v, g, beta, Aw, Au, initial_state, offsets, indices, h = ctx.saved_tensors
         if ctx.use_qk_l2norm_in_kernel:
             q, q_orig = l2norm_fwd(q), q
             k, k_orig = l2norm_fwd(k), k
@@ -258,12 +288,14 @@ class ChunkGatedDeltaRuleFunction(torch.autograd.Function):
             offsets=offsets,
             indices=indices,
             head_first=ctx.head_first,
-            chunk_size=ctx.chunk_size
+            chunk_size=ctx.chunk_size,
+            h=h,
+            checkpoint_interval=ctx.checkpoint_interval
         )
         if ctx.use_qk_l2norm_in_kernel:
             dq = l2norm_bwd(q_orig, dq)
             dk = l2norm_bwd(k_orig, dk)
-        return dq.to(q), dk.to(k), dv.to(v), dg.to(g), db.to(beta), None, dh0, None, None, None, None
+        return dq.to(q), dk.to(k), dv.to(v), dg.to(g), db.to(beta), None, dh0, None, None, None, None, None
 
 
 @torch.compiler.disable
@@ -278,7 +310,9 @@ def chunk_gated_delta_rule(
     output_final_state: bool = False,
     cu_seqlens: Optional[torch.LongTensor] = None,
     head_first: bool = False,
-    use_qk_l2norm_in_kernel: bool = False
+    use_qk_l2norm_in_kernel: bool = False,
+    cp_group: Optional[dist.ProcessGroup] = None,
+    state_checkpoint_interval: Optional[int] = None
 ):
     r"""
     Args:
@@ -307,6 +341,17 @@ def chunk_gated_delta_rule(
         head_first (Optional[bool]):
             Whether the inputs are in the head-first format, which is not supported for variable-length inputs.
             Default: `False`.
+        cp_group (Optional[dist.ProcessGroup]):
+            Process group for context parallelism, whose ranks hold consecutive slices of the sequences in order.
+            `initial_state` is only used on the first rank,
+            and the final state returned by the last rank is that of the whole sequences.
+            Default: `None`.
+        state_checkpoint_interval (Optional[int]):
+            If provided, the chunk states are kept every `state_checkpoint_interval` chunks for the backward pass,
+            and the ones in between are recomputed from them in parallel.
+            Larger intervals save more memory at the cost of longer recomputation, and `1` keeps all states.
+            By default, no states are kept and they are all recomputed sequentially from the initial states.
+            Default: `None`.
 
     Returns:
         o (torch.Tensor):
@@ -346,7 +391,6 @@ def chunk_gated_delta_rule(
         )
     """
     assert q.dtype == k.dtype == v.dtype
-    assert q.dtype != torch.float32, "ChunkGatedDeltaRuleFunction does not support float32. Please use bfloat16."
     assert len(beta.shape) == 3, "beta must be of shape [B, H, T] if head_first=True, or [B, T, H] if head_first=False."
 
     if cu_seqlens is not None:
@@ -364,6 +408,21 @@ def chunk_gated_delta_rule(
                 f"The number of initial states is expected to be equal to the number of input sequences, "
                 f"i.e., {len(cu_seqlens) - 1} rather than {initial_state.shape[0]}."
             )
+    if cp_group is not None:
+        return chunk_context_parallel(
+            chunk_gated_delta_rule,
+            q, k, v, g, beta,
+            group=cp_group,
+            scale=scale,
+            initial_state=initial_state,
+            output_final_state=output_final_state,
+            cu_seqlens=cu_seqlens,
+            head_first=head_first,
+            use_qk_l2norm_in_kernel=use_qk_l2norm_in_kernel,
+            state_checkpoint_interval=state_checkpoint_interval
+        )
+    if state_checkpoint_interval is not None and state_checkpoint_interval < 1:
+        raise ValueError(f"`state_checkpoint_interval` is expected to be positive, got {state_checkpoint_interval}.")
     if head_first:
         q, k, v = map(lambda x: rearrange(x, 'b h t d -> b t h d'), (q, k, v))
         beta, g = map(lambda x: rearrange(x, 'b h t -> b t h'), (beta, g))
@@ -371,19 +430,26 @@ def chunk_gated_delta_rule(
         scale = k.shape[-1] ** -0.5
     else:
         assert scale > 0, "Scale must be positive."
-    o, final_state = ChunkGatedDeltaRuleFunction.apply(
-        q,
-        k,
-        v,
-        g,
-        beta,
-        scale,
-        initial_state,
-        output_final_state,
-        cu_seqlens,
-        False,
-        use_qk_l2norm_in_kernel
-    )
+    if q.device.type == 'cpu':
+        o, final_state = chunk_gated_delta_rule_cpu(
+            q, k, v, g, beta, scale, initial_state, output_final_state, cu_seqlens, False, use_qk_l2norm_in_kernel
+        )
+    else:
+        assert q.dtype != torch.float32, "ChunkGatedDeltaRuleFunction does not support float32. Please use bfloat16."
+        o, final_state = ChunkGatedDeltaRuleFunction.apply(
+            q,
+            k,
+            v,
+            g,
+            beta,
+            scale,
+            initial_state,
+            output_final_state,
+            cu_seqlens,
+            False,
+            use_qk_l2norm_in_kernel,
+            state_checkpoint_interval
+        )
     if head_first:
         o = rearrange(o, 'b t h v -> b h t v')
     return o, final_state
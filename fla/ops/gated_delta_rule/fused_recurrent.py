@@ -9,12 +9,14 @@ import triton.language as tl
 from einops import rearrange
 
 from fla.modules.l2norm import l2norm_fwd
+from fla.ops.common.cpu import fused_recurrent_gated_delta_rule_cpu
 from fla.utils import input_guard
 
 
 @triton.heuristics({
     'USE_INITIAL_STATE': lambda args: args['h0'] is not None,
     'STORE_FINAL_STATE': lambda args: args['ht'] is not None,
+    'STORE_INTERMEDIATE_STATES': lambda args: args['hs'] is not None,
     'USE_OFFSETS': lambda args: args['offsets'] is not None
 })
 @triton.jit(do_not_specialize=['T'])
@@ -27,6 +29,7 @@ def fused_recurrent_gated_delta_rule_fwd_kernel(
     o,
     h0,
     ht,
+    hs,
     offsets,
     scale,
     T,
@@ -38,6 +41,7 @@ def fused_recurrent_gated_delta_rule_fwd_kernel(
     BV: tl.constexpr,
     USE_INITIAL_STATE: tl.constexpr,  # whether to use initial state
     STORE_FINAL_STATE: tl.constexpr,  # whether to store final state
+    STORE_INTERMEDIATE_STATES: tl.constexpr,  # whether to store the states after each token
     IS_BETA_HEADWISE: tl.constexpr,  # whether beta is headwise vector or scalar,
     USE_OFFSETS: tl.constexpr,
     HEAD_FIRST: tl.constexpr
@@ -78,6 +82,12 @@ def fused_recurrent_gated_delta_rule_fwd_kernel(
     mask_h = mask_k[None, :] & mask_v[:, None]
 
     b_h = tl.zeros([BV, BK], dtype=tl.float32)
+    if STORE_INTERMEDIATE_STATES:
+        if HEAD_FIRST:
+            p_hs = hs + i_nh * T*K*V
+        else:
+            p_hs = hs + (bos * H + i_h) * K*V
+        p_hs += (i_k * BK + tl.arange(0, BK)[None, :]) * V + (i_v * BV + tl.arange(0, BV)[:, None])
     if USE_INITIAL_STATE:
         p_h0 = h0 + i_nh * K * V + (i_k * BK + tl.arange(0, BK)[None, :]) * V + (i_v * BV + tl.arange(0, BV)[:, None])
         b_h += tl.load(p_h0, mask=mask_h, other=0).to(tl.float32)
@@ -99,6 +109,9 @@ def fused_recurrent_gated_delta_rule_fwd_kernel(
         b_o = b_h * b_q[None, :]
         b_o = tl.sum(b_o, axis=1)
         tl.store(p_o, b_o.to(p_o.dtype.element_ty), mask=mask_v)
+        if STORE_INTERMEDIATE_STATES:
+            tl.store(p_hs, b_h.to(p_hs.dtype.element_ty), mask=mask_h)
+            p_hs += K*V if HEAD_FIRST else H*K*V
 
         p_q += K if HEAD_FIRST else H*K
         p_k += K if HEAD_FIRST else H*K
@@ -122,7 +135,8 @@ def fused_recurrent_gated_delta_rule_fwd(
     initial_state: torch.Tensor,
     output_final_state: bool,
     offsets: Optional[torch.LongTensor] = None,
-    head_first: bool = True
+    head_first: bool = True,
+    output_intermediate_states: bool = False
 ) -> Tuple[torch.Tensor, torch.Tensor]:
     if head_first:
         B, H, T, K, V = *k.shape, v.shape[-1]
@@ -140,6 +154,7 @@ def fused_recurrent_gated_delta_rule_fwd(
         final_state = q.new_empty(N, H, K, V, dtype=torch.float32)
     else:
         final_state = None
+    intermediate_states = q.new_empty(*k.shape, V, dtype=torch.float32) if output_intermediate_states else None
 
     grid = (NV, NK, N * H)
     fused_recurrent_gated_delta_rule_fwd_kernel[grid](
@@ -151,6 +166,7 @@ def fused_recurrent_gated_delta_rule_fwd(
         o=o,
         h0=initial_state,
         ht=final_state,
+        hs=intermediate_states,
         offsets=offsets,
         scale=scale,
         T=T,
@@ -166,6 +182,8 @@ def fused_recurrent_gated_delta_rule_fwd(
         num_stages=num_stages,
     )
     o = o.squeeze(0)
+    if output_intermediate_states:
+        return o, intermediate_states
     return o, final_state
 
 
@@ -185,7 +203,8 @@ class FusedRecurrentFunction(torch.autograd.Function):
         output_final_state: bool,
         offsets: Optional[torch.LongTensor] = None,
         head_first: bool = True,
-        use_qk_l2norm_in_kernel: bool = False
+        use_qk_l2norm_in_kernel: bool = False,
+        output_intermediate_states: bool = False
     ):
         if use_qk_l2norm_in_kernel:
             q = l2norm_fwd(q)
@@ -200,7 +219,8 @@ class FusedRecurrentFunction(torch.autograd.Function):
             initial_state=initial_state,
             output_final_state=output_final_state,
             offsets=offsets,
-            head_first=head_first
+            head_first=head_first,
+            output_intermediate_states=output_intermediate_states
         )
 
         return o, final_state
@@ -226,7 +246,8 @@ def fused_recurrent_gated_delta_rule(
     output_final_state: bool = False,
     cu_seqlens: Optional[torch.LongTensor] = None,
     head_first: bool = True,
-    use_qk_l2norm_in_kernel: bool = False
+    use_qk_l2norm_in_kernel: bool = False,
+    output_intermediate_states: bool = False
 ) -> Tuple[torch.Tensor, torch.Tensor]:
     r"""
     Args:
@@ -255,6 +276,11 @@ def fused_recurrent_gated_delta_rule(
         head_first (Optional[bool]):
             Whether the inputs are in the head-first format, which is not supported for variable-length inputs.
             Default: `False`.
+        output_intermediate_states (Optional[bool]):
+            Whether to return the states after each token of shape `[B, T, H, K, V]` if `head_first=False`
+            else `[B, H, T, K, V]` instead of the final state,
+            e.g., to roll back rejected draft tokens in speculative decoding.
+            Default: `False`.
 
     Returns:
         o (torch.Tensor):
@@ -316,20 +342,29 @@ def fused_recurrent_gated_delta_rule(
         beta = torch.ones_like(q[..., 0])
     if head_first:
         q, k, v = map(lambda x: rearrange(x, 'b h t d -> b t h d'), (q, k, v))
-        beta = rearrange(beta, 'b h t -> b t h')
-    o, final_state = FusedRecurrentFunction.apply(
-        q,
-        k,
-        v,
-        g,
-        beta,
-        scale,
-        initial_state,
-        output_final_state,
-        cu_seqlens,
-        False,
-        use_qk_l2norm_in_kernel
-    )
+        beta, g = map(lambda x: rearrange(x, 'b h t -> b t h'), (beta, g))
+    if q.device.type == 'cpu':
+        o, final_state = fused_recurrent_gated_delta_rule_cpu(
+            q, k, v, g, beta, scale, initial_state, output_final_state, cu_seqlens, False,
+            use_qk_l2norm_in_kernel, output_intermediate_states
+        )
+    else:
+        o, final_state = FusedRecurrentFunction.apply(
+            q,
+            k,
+            v,
+            g,
+            beta,
+            scale,
+            initial_state,
+            output_final_state,
+            cu_seqlens,
+            False,
+            use_qk_l2norm_in_kernel,
+            output_intermediate_states
+        )
     if head_first:
         o = rearrange(o, 'b t h v -> b h t v')
+        if output_intermediate_states:
+            final_state = rearrange(final_state, 'b t h k v -> b h t k v')
     return o, final_state
@@ -4,14 +4,18 @@
 from typing import Optional, Tuple
 
 import torch
+import torch.distributed as dist
 import triton
 import triton.language as tl
+from einops import reduce
 
-from fla.ops.common.chunk_h import chunk_bwd_dh, chunk_fwd_h
+from fla.ops.common.chunk_h import chunk_bwd_dh, chunk_fwd_h, chunk_fwd_h_from_checkpoints, chunk_select_checkpoints
+from fla.ops.common.context_parallel import chunk_context_parallel
+from fla.ops.common.cpu import chunk_gla_cpu
 from fla.ops.common.utils import prepare_chunk_indices
 from fla.ops.utils import chunk_local_cumsum
 from fla.ops.utils.exp import safe_exp
-from fla.utils import input_guard
+from fla.utils import input_guard, row_stride
 
 
 @triton.heuristics({
@@ -35,18 +39,24 @@ def chunk_gla_fwd_A_kernel_intra_sub_inter(
     offsets,
     indices,
     scale,
+    stride_q,
+    stride_k,
     T,
+    HQ: tl.constexpr,
     H: tl.constexpr,
     K: tl.constexpr,
     BT: tl.constexpr,
     BC: tl.constexpr,
     BK: tl.constexpr,
     NC: tl.constexpr,
+    NG: tl.constexpr,
     USE_OFFSETS: tl.constexpr,
     HEAD_FIRST: tl.constexpr
 ):
     i_t, i_c, i_bh = tl.program_id(0), tl.program_id(1), tl.program_id(2)
-    i_b, i_h = i_bh // H, i_bh % H
+    i_bg = i_bh // NG
+    i_b, i_hq = i_bh // HQ, i_bh % HQ
+    i_h = i_hq // NG
     i_i, i_j = i_c // NC, i_c % NC
     if USE_OFFSETS:
         i_n, i_t = tl.load(indices + i_t * 2).to(tl.int32), tl.load(indices + i_t * 2 + 1).to(tl.int32)
@@ -66,15 +76,15 @@ def chunk_gla_fwd_A_kernel_intra_sub_inter(
         m_k = o_k < K
 
         if HEAD_FIRST:
-            p_q = tl.make_block_ptr(q + i_bh * T*K, (T, K), (K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
-            p_g = tl.make_block_ptr(g + i_bh * T*K, (T, K), (K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
-            p_k = tl.make_block_ptr(k + i_bh * T*K, (K, T), (1, K), (i_k * BK, i_t * BT + i_j * BC), (BK, BC), (0, 1))
-            p_gk = tl.make_block_ptr(g + i_bh * T*K, (K, T), (1, K), (i_k * BK, i_t * BT + i_j * BC), (BK, BC), (0, 1))
-            p_gn = tl.max_contiguous(tl.multiple_of(g + (i_bh * T + i_t * BT + i_i * BC) * K + o_k, BK), BK)
+            p_q = tl.make_block_ptr(q + i_bh * stride_q, (T, K), (K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
+            p_g = tl.make_block_ptr(g + i_bg * T*K, (T, K), (K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
+            p_k = tl.make_block_ptr(k + i_bg * stride_k, (K, T), (1, K), (i_k * BK, i_t * BT + i_j * BC), (BK, BC), (0, 1))
+            p_gk = tl.make_block_ptr(g + i_bg * T*K, (K, T), (1, K), (i_k * BK, i_t * BT + i_j * BC), (BK, BC), (0, 1))
+            p_gn = tl.max_contiguous(tl.multiple_of(g + (i_bg * T + i_t * BT + i_i * BC) * K + o_k, BK), BK)
         else:
-            p_q = tl.make_block_ptr(q + (bos*H+i_h)*K, (T, K), (H*K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
+            p_q = tl.make_block_ptr(q+bos*stride_q+i_hq*K, (T, K), (stride_q, 1), (i_t*BT + i_i*BC, i_k*BK), (BC, BK), (1, 0))
             p_g = tl.make_block_ptr(g + (bos*H+i_h)*K, (T, K), (H*K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
-            p_k = tl.make_block_ptr(k + (bos*H+i_h)*K, (K, T), (1, H*K), (i_k * BK, i_t * BT + i_j * BC), (BK, BC), (0, 1))
+            p_k = tl.make_block_ptr(k+bos*stride_k+i_h*K, (K, T), (1, stride_k), (i_k*BK, i_t*BT + i_j*BC), (BK, BC), (0, 1))
             p_gk = tl.make_block_ptr(g + (bos*H+i_h)*K, (K, T), (1, H*K), (i_k * BK, i_t * BT + i_j * BC), (BK, BC), (0, 1))
             p_gn = g + (bos + i_t * BT + i_i * BC) * H*K + i_h * K + o_k
 
@@ -94,7 +104,7 @@ def chunk_gla_fwd_A_kernel_intra_sub_inter(
     if HEAD_FIRST:
         p_A = tl.make_block_ptr(A + i_bh*T*BT, (T, BT), (BT, 1), (i_t * BT + i_i * BC, i_j * BC), (BC, BC), (1, 0))
     else:
-        p_A = tl.make_block_ptr(A + (bos*H + i_h)*BT, (T, BT), (H*BT, 1), (i_t * BT + i_i * BC, i_j * BC), (BC, BC), (1, 0))
+        p_A = tl.make_block_ptr(A + (bos*HQ + i_hq)*BT, (T, BT), (HQ*BT, 1), (i_t * BT + i_i * BC, i_j * BC), (BC, BC), (1, 0))
     tl.store(p_A, b_A.to(A.dtype.element_ty), boundary_check=(0, 1))
 
 
@@ -119,17 +129,23 @@ def chunk_gla_fwd_A_kernel_intra_sub_intra(
     offsets,
     indices,
     scale,
+    stride_q,
+    stride_k,
     T,
+    HQ: tl.constexpr,
     H: tl.constexpr,
     K: tl.constexpr,
     BT: tl.constexpr,
     BC: tl.constexpr,
     BK: tl.constexpr,
+    NG: tl.constexpr,
     USE_OFFSETS: tl.constexpr,
     HEAD_FIRST: tl.constexpr
 ):
     i_t, i_i, i_bh = tl.program_id(0), tl.program_id(1), tl.program_id(2)
-    i_b, i_h = i_bh // H, i_bh % H
+    i_bg = i_bh // NG
+    i_b, i_hq = i_bh // HQ, i_bh % HQ
+    i_h = i_hq // NG
     i_j = i_i
     if USE_OFFSETS:
         i_n, i_t = tl.load(indices + i_t * 2).to(tl.int32), tl.load(indices + i_t * 2 + 1).to(tl.int32)
@@ -147,15 +163,15 @@ def chunk_gla_fwd_A_kernel_intra_sub_intra(
     m_A = (i_t * BT + i_i * BC + tl.arange(0, BC)) < T
     if HEAD_FIRST:
         o_A = i_bh * T*BT + (i_t * BT + i_i * BC + tl.arange(0, BC)) * BT + i_j * BC
-        p_q = tl.make_block_ptr(q + i_bh * T*K, (T, K), (K, 1), (i_t * BT + i_i * BC, 0), (BC, BK), (1, 0))
-        p_g = tl.make_block_ptr(g + i_bh * T*K, (T, K), (K, 1), (i_t * BT + i_i * BC, 0), (BC, BK), (1, 0))
-        p_k = tl.max_contiguous(tl.multiple_of(k + (i_bh * T + i_t * BT + i_j * BC) * K + o_k, BK), BK)
-        p_gk = tl.max_contiguous(tl.multiple_of(g + (i_bh * T + i_t * BT + i_j * BC) * K + o_k, BK), BK)
+        p_q = tl.make_block_ptr(q + i_bh * stride_q, (T, K), (K, 1), (i_t * BT + i_i * BC, 0), (BC, BK), (1, 0))
+        p_g = tl.make_block_ptr(g + i_bg * T*K, (T, K), (K, 1), (i_t * BT + i_i * BC, 0), (BC, BK), (1, 0))
+        p_k = k + i_bg * stride_k + (i_t * BT + i_j * BC) * K + o_k
+        p_gk = tl.max_contiguous(tl.multiple_of(g + (i_bg * T + i_t * BT + i_j * BC) * K + o_k, BK), BK)
     else:
-        o_A = (bos + i_t * BT + i_i * BC + tl.arange(0, BC)) * H*BT + i_h * BT + i_j * BC
-        p_q = tl.make_block_ptr(q + (bos * H + i_h) * K, (T, K), (H*K, 1), (i_t * BT + i_i * BC, 0), (BC, BK), (1, 0))
+        o_A = (bos + i_t * BT + i_i * BC + tl.arange(0, BC)) * HQ*BT + i_hq * BT + i_j * BC
+        p_q = tl.make_block_ptr(q + bos*stride_q + i_hq*K, (T, K), (stride_q, 1), (i_t * BT + i_i * BC, 0), (BC, BK), (1, 0))
         p_g = tl.make_block_ptr(g + (bos * H + i_h) * K, (T, K), (H*K, 1), (i_t * BT + i_i * BC, 0), (BC, BK), (1, 0))
-        p_k = k + (bos + i_t * BT + i_j * BC) * H*K + i_h * K + o_k
+        p_k = k + (bos + i_t * BT + i_j * BC) * stride_k + i_h * K + o_k
         p_gk = g + (bos + i_t * BT + i_j * BC) * H*K + i_h * K + o_k
 
     b_q = tl.load(p_q, boundary_check=(0, 1))
@@ -167,7 +183,7 @@ def chunk_gla_fwd_A_kernel_intra_sub_intra(
         b_A = tl.where(o_i >= j, b_A * scale, 0.)
 
         tl.store(A + o_A + j, b_A, mask=m_A)
-        p_k += K if HEAD_FIRST else H*K
+        p_k += K if HEAD_FIRST else stride_k
         p_gk += K if HEAD_FIRST else H*K
 
 
@@ -192,19 +208,25 @@ def chunk_gla_fwd_A_kernel_intra_sub_intra_split(
     offsets,
     indices,
     scale,
+    stride_q,
+    stride_k,
     T,
     B: tl.constexpr,
+    HQ: tl.constexpr,
     H: tl.constexpr,
     K: tl.constexpr,
     BT: tl.constexpr,
     BC: tl.constexpr,
     BK: tl.constexpr,
     NC: tl.constexpr,
+    NG: tl.constexpr,
     USE_OFFSETS: tl.constexpr,
     HEAD_FIRST: tl.constexpr
 ):
     i_k, i_tc, i_bh = tl.program_id(0), tl.program_id(1), tl.program_id(2)
-    i_b, i_h = i_bh // H, i_bh % H
+    i_bg = i_bh // NG
+    i_b, i_hq = i_bh // HQ, i_bh % HQ
+    i_h = i_hq // NG
     i_t, i_i = i_tc // NC, i_tc % NC
     i_j = i_i
     if USE_OFFSETS:
@@ -225,16 +247,16 @@ def chunk_gla_fwd_A_kernel_intra_sub_intra_split(
     m_A = (i_t * BT + i_i * BC + tl.arange(0, BC)) < T
 
     if HEAD_FIRST:
-        o_A = (i_k * B*H + i_bh) * T * BC + (i_t * BT + i_i * BC + tl.arange(0, BC)) * BC
-        p_q = tl.make_block_ptr(q + i_bh * T*K, (T, K), (K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
-        p_g = tl.make_block_ptr(g + i_bh * T*K, (T, K), (K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
-        p_k = tl.max_contiguous(tl.multiple_of(k + (i_bh * T + i_t * BT + i_j * BC) * K + o_k, BK), BK)
-        p_gk = tl.max_contiguous(tl.multiple_of(g + (i_bh * T + i_t * BT + i_j * BC) * K + o_k, BK), BK)
+        o_A = (i_k * B*HQ + i_bh) * T * BC + (i_t * BT + i_i * BC + tl.arange(0, BC)) * BC
+        p_q = tl.make_block_ptr(q + i_bh * stride_q, (T, K), (K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
+        p_g = tl.make_block_ptr(g + i_bg * T*K, (T, K), (K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
+        p_k = k + i_bg * stride_k + (i_t * BT + i_j * BC) * K + o_k
+        p_gk = tl.max_contiguous(tl.multiple_of(g + (i_bg * T + i_t * BT + i_j * BC) * K + o_k, BK), BK)
     else:
-        o_A = (i_k * all + bos + i_t * BT + i_i * BC + tl.arange(0, BC)) * H*BC + i_h * BC
-        p_q = tl.make_block_ptr(q + (bos * H + i_h) * K, (T, K), (H*K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
+        o_A = (i_k * all + bos + i_t * BT + i_i * BC + tl.arange(0, BC)) * HQ*BC + i_hq * BC
+        p_q = tl.make_block_ptr(q + bos*stride_q + i_hq*K, (T, K), (stride_q, 1), (i_t*BT + i_i*BC, i_k*BK), (BC, BK), (1, 0))
         p_g = tl.make_block_ptr(g + (bos * H + i_h) * K, (T, K), (H*K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
-        p_k = k + (bos + i_t * BT + i_j * BC) * H*K + i_h * K + o_k
+        p_k = k + (bos + i_t * BT + i_j * BC) * stride_k + i_h * K + o_k
         p_gk = g + (bos + i_t * BT + i_j * BC) * H*K + i_h * K + o_k
 
     b_q = tl.load(p_q, boundary_check=(0, 1))
@@ -246,7 +268,7 @@ def chunk_gla_fwd_A_kernel_intra_sub_intra_split(
         b_A += tl.sum(b_q * b_k[None, :] * tl.exp(b_g - b_gk[None, :]), 1)
         b_A = tl.where(o_i >= j, b_A * scale, 0.)
         tl.store(A + o_A + j, b_A, mask=m_A)
-        p_k += K if HEAD_FIRST else H*K
+        p_k += K if HEAD_FIRST else stride_k
         p_gk += K if HEAD_FIRST else H*K
 
 
@@ -328,18 +350,24 @@ def chunk_gla_fwd_kernel_o(
     offsets,
     indices,
     scale,
+    stride_q,
+    stride_v,
     T,
+    HQ: tl.constexpr,
     H: tl.constexpr,
     K: tl.constexpr,
     V: tl.constexpr,
     BT: tl.constexpr,
     BK: tl.constexpr,
     BV: tl.constexpr,
+    NG: tl.constexpr,
     USE_OFFSETS: tl.constexpr,
     HEAD_FIRST: tl.constexpr
 ):
     i_v, i_t, i_bh = tl.program_id(0), tl.program_id(1), tl.program_id(2)
-    i_b, i_h = i_bh // H, i_bh % H
+    i_bg = i_bh // NG
+    i_b, i_hq = i_bh // HQ, i_bh % HQ
+    i_h = i_hq // NG
     if USE_OFFSETS:
         i_tg = i_t
         i_n, i_t = tl.load(indices + i_t * 2).to(tl.int32), tl.load(indices + i_t * 2 + 1).to(tl.int32)
@@ -356,11 +384,11 @@ def chunk_gla_fwd_kernel_o(
     b_o = tl.zeros([BT, BV], dtype=tl.float32)
     for i_k in range(tl.cdiv(K, BK)):
         if HEAD_FIRST:
-            p_q = tl.make_block_ptr(q + i_bh * T*K, (T, K), (K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
-            p_g = tl.make_block_ptr(g + i_bh * T*K, (T, K), (K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
-            p_h = tl.make_block_ptr(h + (i_bh * NT + i_t) * K*V, (K, V), (V, 1), (i_k * BK, i_v * BV), (BK, BV), (1, 0))
+            p_q = tl.make_block_ptr(q + i_bh * stride_q, (T, K), (K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+            p_g = tl.make_block_ptr(g + i_bg * T*K, (T, K), (K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+            p_h = tl.make_block_ptr(h + (i_bg * NT + i_t) * K*V, (K, V), (V, 1), (i_k * BK, i_v * BV), (BK, BV), (1, 0))
         else:
-            p_q = tl.make_block_ptr(q + (bos * H + i_h) * K, (T, K), (H*K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+            p_q = tl.make_block_ptr(q + bos*stride_q + i_hq*K, (T, K), (stride_q, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
             p_g = tl.make_block_ptr(g + (bos * H + i_h) * K, (T, K), (H*K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
             p_h = tl.make_block_ptr(h + (i_tg * H + i_h) * K*V, (K, V), (V, 1), (i_k * BK, i_v * BV), (BK, BV), (1, 0))
 
@@ -378,13 +406,13 @@ def chunk_gla_fwd_kernel_o(
         if i_k >= 0:
             b_o += tl.dot(b_qg, b_h.to(b_qg.dtype))
     if HEAD_FIRST:
-        p_v = tl.make_block_ptr(v + i_bh * T*V, (T, V), (V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
+        p_v = tl.make_block_ptr(v + i_bg * stride_v, (T, V), (V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
         p_o = tl.make_block_ptr(o + i_bh * T*V, (T, V), (V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
         p_A = tl.make_block_ptr(A + i_bh * T*BT, (T, BT), (BT, 1), (i_t * BT, 0), (BT, BT), (1, 0))
     else:
-        p_v = tl.make_block_ptr(v + (bos * H + i_h) * V, (T, V), (H*V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
-        p_o = tl.make_block_ptr(o + (bos * H + i_h) * V, (T, V), (H*V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
-        p_A = tl.make_block_ptr(A + (bos * H + i_h) * BT, (T, BT), (H*BT, 1), (i_t * BT, 0), (BT, BT), (1, 0))
+        p_v = tl.make_block_ptr(v + bos*stride_v + i_h*V, (T, V), (stride_v, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
+        p_o = tl.make_block_ptr(o + (bos * HQ + i_hq) * V, (T, V), (HQ*V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
+        p_A = tl.make_block_ptr(A + (bos * HQ + i_hq) * BT, (T, BT), (HQ*BT, 1), (i_t * BT, 0), (BT, BT), (1, 0))
     # [BT, BV]
     b_v = tl.load(p_v, boundary_check=(0, 1))
     # [BT, BT]
@@ -416,18 +444,24 @@ def chunk_gla_bwd_kernel_intra(
     dk,
     offsets,
     indices,
+    stride_q,
+    stride_k,
     T,
+    HQ: tl.constexpr,
     H: tl.constexpr,
     K: tl.constexpr,
     BT: tl.constexpr,
     BC: tl.constexpr,
     BK: tl.constexpr,
     NC: tl.constexpr,
+    NG: tl.constexpr,
     USE_OFFSETS: tl.constexpr,
     HEAD_FIRST: tl.constexpr
 ):
     i_k, i_c, i_bh = tl.program_id(0), tl.program_id(1), tl.program_id(2)
-    i_b, i_h = i_bh // H, i_bh % H
+    i_bg = i_bh // NG
+    i_b, i_hq = i_bh // HQ, i_bh % HQ
+    i_h = i_hq // NG
     i_t, i_i = i_c // NC, i_c % NC
     if USE_OFFSETS:
         i_n, i_t = tl.load(indices + i_t * 2).to(tl.int32), tl.load(indices + i_t * 2 + 1).to(tl.int32)
@@ -442,7 +476,7 @@ def chunk_gla_bwd_kernel_intra(
     m_k = o_k < K
 
     if HEAD_FIRST:
-        p_g = tl.make_block_ptr(g + i_bh * T*K, (T, K), (K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
+        p_g = tl.make_block_ptr(g + i_bg * T*K, (T, K), (K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
     else:
         p_g = tl.make_block_ptr(g + (bos*H + i_h) * K, (T, K), (H*K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
     # [BC, BK]
@@ -450,7 +484,7 @@ def chunk_gla_bwd_kernel_intra(
     b_dq = tl.zeros([BC, BK], dtype=tl.float32)
     if i_i > 0:
         if HEAD_FIRST:
-            p_gn = g + (i_bh * T + i_t * BT + i_i * BC) * K + o_k
+            p_gn = g + (i_bg * T + i_t * BT + i_i * BC) * K + o_k
             p_gn = tl.max_contiguous(tl.multiple_of(p_gn, BK), BK)
         else:
             p_gn = g + (bos + i_t * BT + i_i * BC) * H*K + i_h*K + o_k
@@ -459,13 +493,13 @@ def chunk_gla_bwd_kernel_intra(
         b_gn = tl.load(p_gn, mask=m_k, other=0)
         for i_j in range(0, i_i):
             if HEAD_FIRST:
-                p_k = tl.make_block_ptr(k + i_bh * T*K, (T, K), (K, 1), (i_t * BT + i_j * BC, i_k * BK), (BC, BK), (1, 0))
-                p_gk = tl.make_block_ptr(g + i_bh * T*K, (T, K), (K, 1), (i_t * BT + i_j * BC, i_k * BK), (BC, BK), (1, 0))
+                p_k = tl.make_block_ptr(k + i_bg * stride_k, (T, K), (K, 1), (i_t * BT + i_j * BC, i_k * BK), (BC, BK), (1, 0))
+                p_gk = tl.make_block_ptr(g + i_bg * T*K, (T, K), (K, 1), (i_t * BT + i_j * BC, i_k * BK), (BC, BK), (1, 0))
                 p_dA = tl.make_block_ptr(dA + i_bh * T*BT, (T, BT), (BT, 1), (i_t * BT + i_i * BC, i_j * BC), (BC, BC), (1, 0))
             else:
-                p_k = tl.make_block_ptr(k+(bos*H+i_h)*K, (T, K), (H*K, 1), (i_t*BT+i_j*BC, i_k * BK), (BC, BK), (1, 0))
+                p_k = tl.make_block_ptr(k+bos*stride_k+i_h*K, (T, K), (stride_k, 1), (i_t*BT+i_j*BC, i_k*BK), (BC, BK), (1, 0))
                 p_gk = tl.make_block_ptr(g+(bos*H+i_h)*K, (T, K), (H*K, 1), (i_t*BT+i_j*BC, i_k * BK), (BC, BK), (1, 0))
-                p_dA = tl.make_block_ptr(dA+(bos*H+i_h)*BT, (T, BT), (H*BT, 1), (i_t*BT+i_i*BC, i_j * BC), (BC, BC), (1, 0))
+                p_dA = tl.make_block_ptr(dA+(bos*HQ+i_hq)*BT, (T, BT), (HQ*BT, 1), (i_t*BT+i_i*BC, i_j * BC), (BC, BC), (1, 0))
             # [BC, BK]
             b_k = tl.load(p_k, boundary_check=(0, 1))
             b_gk = tl.load(p_gk, boundary_check=(0, 1))
@@ -480,14 +514,14 @@ def chunk_gla_bwd_kernel_intra(
     m_dA = (i_t * BT + i_i * BC + tl.arange(0, BC)) < T
     if HEAD_FIRST:
         o_dA = i_bh * T*BT + (i_t * BT + i_i * BC + tl.arange(0, BC)) * BT + i_i * BC
-        p_kj = tl.max_contiguous(tl.multiple_of(k + (i_bh * T + i_t * BT + i_i * BC) * K + o_k, BK), BK)
-        p_gkj = tl.max_contiguous(tl.multiple_of(g + (i_bh * T + i_t * BT + i_i * BC) * K + o_k, BK), BK)
+        p_kj = k + i_bg * stride_k + (i_t * BT + i_i * BC) * K + o_k
+        p_gkj = tl.max_contiguous(tl.multiple_of(g + (i_bg * T + i_t * BT + i_i * BC) * K + o_k, BK), BK)
         p_dq = tl.make_block_ptr(dq + i_bh * T*K, (T, K), (K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
     else:
-        o_dA = bos*H*BT + (i_t * BT + i_i * BC + tl.arange(0, BC)) * H*BT + i_h * BT + i_i * BC
-        p_kj = k + (bos + i_t * BT + i_i * BC) * H*K + i_h * K + o_k
+        o_dA = bos*HQ*BT + (i_t * BT + i_i * BC + tl.arange(0, BC)) * HQ*BT + i_hq * BT + i_i * BC
+        p_kj = k + (bos + i_t * BT + i_i * BC) * stride_k + i_h * K + o_k
         p_gkj = g + (bos + i_t * BT + i_i * BC) * H*K + i_h * K + o_k
-        p_dq = tl.make_block_ptr(dq + (bos*H + i_h) * K, (T, K), (H*K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
+        p_dq = tl.make_block_ptr(dq + (bos*HQ + i_hq) * K, (T, K), (HQ*K, 1), (i_t*BT + i_i*BC, i_k*BK), (BC, BK), (1, 0))
 
     for j in range(0, min(BC, T - i_t * BT - i_i * BC)):
         # [BC,]
@@ -500,16 +534,16 @@ def chunk_gla_bwd_kernel_intra(
         # [BC, BK]
         # (SY 09/17) important to not use bf16 here to have a good precision.
         b_dq += tl.where(m_i, b_dA[:, None] * b_kj[None, :] * tl.exp(b_g - b_gkj[None, :]), 0.)
-        p_kj += K if HEAD_FIRST else H*K
+        p_kj += K if HEAD_FIRST else stride_k
         p_gkj += K if HEAD_FIRST else H*K
     tl.store(p_dq, b_dq.to(p_dq.dtype.element_ty), boundary_check=(0, 1))
 
     tl.debug_barrier()
     if HEAD_FIRST:
-        p_k = tl.make_block_ptr(k + i_bh * T*K, (T, K), (K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
-        p_gk = tl.make_block_ptr(g + i_bh * T*K, (T, K), (K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
+        p_k = tl.make_block_ptr(k + i_bg * stride_k, (T, K), (K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
+        p_gk = tl.make_block_ptr(g + i_bg * T*K, (T, K), (K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
     else:
-        p_k = tl.make_block_ptr(k + (bos*H + i_h) * K, (T, K), (H*K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
+        p_k = tl.make_block_ptr(k + bos*stride_k + i_h*K, (T, K), (stride_k, 1), (i_t*BT + i_i*BC, i_k*BK), (BC, BK), (1, 0))
         p_gk = tl.make_block_ptr(g + (bos*H + i_h) * K, (T, K), (H*K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
 
     # [BC, BK]
@@ -520,7 +554,7 @@ def chunk_gla_bwd_kernel_intra(
     NC = min(NC, tl.cdiv(T - i_t * BT, BC))
     if i_i < NC - 1:
         if HEAD_FIRST:
-            p_gn = g + (i_bh * T + min(i_t * BT + i_i * BC + BC, T) - 1) * K + o_k
+            p_gn = g + (i_bg * T + min(i_t * BT + i_i * BC + BC, T) - 1) * K + o_k
             p_gn = tl.max_contiguous(tl.multiple_of(p_gn, BK), BK)
         else:
             p_gn = g + (bos + min(i_t * BT + i_i * BC + BC, T) - 1) * H*K + i_h * K + o_k
@@ -529,13 +563,14 @@ def chunk_gla_bwd_kernel_intra(
         b_gn = tl.load(p_gn, mask=m_k, other=0)
         for i_j in range(i_i + 1, NC):
             if HEAD_FIRST:
-                p_q = tl.make_block_ptr(q + i_bh * T*K, (T, K), (K, 1), (i_t*BT + i_j*BC, i_k*BK), (BC, BK), (1, 0))
-                p_gq = tl.make_block_ptr(g + i_bh * T*K, (T, K), (K, 1), (i_t*BT + i_j*BC, i_k*BK), (BC, BK), (1, 0))
+                p_q = tl.make_block_ptr(q + i_bh * stride_q, (T, K), (K, 1), (i_t*BT + i_j*BC, i_k*BK), (BC, BK), (1, 0))
+                p_gq = tl.make_block_ptr(g + i_bg * T*K, (T, K), (K, 1), (i_t*BT + i_j*BC, i_k*BK), (BC, BK), (1, 0))
                 p_dA = tl.make_block_ptr(dA + i_bh * T * BT, (BT, T), (1, BT), (i_i*BC, i_t*BT + i_j*BC), (BC, BC), (0, 1))
             else:
-                p_q = tl.make_block_ptr(q + (bos*H+i_h)*K, (T, K), (H*K, 1), (i_t*BT+i_j*BC, i_k*BK), (BC, BK), (1, 0))
+                p_q = tl.make_block_ptr(q+bos*stride_q+i_hq*K, (T, K), (stride_q, 1),
+                                        (i_t*BT+i_j*BC, i_k*BK), (BC, BK), (1, 0))
                 p_gq = tl.make_block_ptr(g + (bos*H+i_h)*K, (T, K), (H*K, 1), (i_t*BT+i_j*BC, i_k*BK), (BC, BK), (1, 0))
-                p_dA = tl.make_block_ptr(dA + (bos*H+i_h)*BT, (BT, T), (1, H*BT), (i_i*BC, i_t*BT + i_j*BC), (BC, BC), (0, 1))
+                p_dA = tl.make_block_ptr(dA + (bos*HQ+i_hq)*BT, (BT, T), (1, HQ*BT), (i_i*BC, i_t*BT+i_j*BC), (BC, BC), (0, 1))
             # [BC, BK]
             b_q = tl.load(p_q, boundary_check=(0, 1))
             b_gq = tl.load(p_gq, boundary_check=(0, 1))
@@ -548,24 +583,24 @@ def chunk_gla_bwd_kernel_intra(
         b_dk *= tl.exp(b_gn[None, :] - b_gk)
     if HEAD_FIRST:
         o_dA = i_bh * T * BT + (i_t * BT + i_i * BC) * BT + i_i * BC + tl.arange(0, BC)
-        p_qj = tl.max_contiguous(tl.multiple_of(q + (i_bh * T + i_t * BT + i_i * BC) * K + o_k, BK), BK)
-        p_gqj = tl.max_contiguous(tl.multiple_of(g + (i_bh * T + i_t * BT + i_i * BC) * K + o_k, BK), BK)
+        p_qj = q + i_bh * stride_q + (i_t * BT + i_i * BC) * K + o_k
+        p_gqj = tl.max_contiguous(tl.multiple_of(g + (i_bg * T + i_t * BT + i_i * BC) * K + o_k, BK), BK)
         p_dk = tl.make_block_ptr(dk + i_bh*T*K, (T, K), (K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
     else:
-        o_dA = bos*H*BT + (i_t * BT + i_i * BC) * H*BT + i_h * BT + i_i * BC + tl.arange(0, BC)
-        p_qj = q + (bos + i_t * BT + i_i * BC) * H*K + i_h * K + o_k
+        o_dA = bos*HQ*BT + (i_t * BT + i_i * BC) * HQ*BT + i_hq * BT + i_i * BC + tl.arange(0, BC)
+        p_qj = q + (bos + i_t * BT + i_i * BC) * stride_q + i_hq * K + o_k
         p_gqj = g + (bos + i_t * BT + i_i * BC) * H*K + i_h * K + o_k
-        p_dk = tl.make_block_ptr(dk + (bos*H+i_h)*K, (T, K), (H*K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
+        p_dk = tl.make_block_ptr(dk + (bos*HQ+i_hq)*K, (T, K), (HQ*K, 1), (i_t * BT + i_i * BC, i_k * BK), (BC, BK), (1, 0))
     for j in range(0, min(BC, T - i_t * BT - i_i * BC)):
         # [BC,]
-        b_dA = tl.load(dA + o_dA + j * (1 if HEAD_FIRST else H) * BT)
+        b_dA = tl.load(dA + o_dA + j * (1 if HEAD_FIRST else HQ) * BT)
         # [BK,]
         b_qj = tl.load(p_qj, mask=m_k, other=0).to(tl.float32)
         b_gqj = tl.load(p_gqj, mask=m_k, other=0).to(tl.float32)
         # [BC, BK]
         m_i = o_i[:, None] <= j
         b_dk += tl.where(m_i, b_dA[:, None] * b_qj[None, :] * tl.exp(b_gqj[None, :] - b_gk), 0.)
-        p_qj += K if HEAD_FIRST else H*K
+        p_qj += K if HEAD_FIRST else stride_q
         p_gqj += K if HEAD_FIRST else H*K
     tl.store(p_dk, b_dk.to(p_dk.dtype.element_ty), boundary_check=(0, 1))
 
@@ -590,16 +625,21 @@ def chunk_gla_bwd_kernel_dA(
     offsets,
     indices,
     scale,
+    stride_v,
     T,
+    HQ: tl.constexpr,
     H: tl.constexpr,
     V: tl.constexpr,
     BT: tl.constexpr,
     BV: tl.constexpr,
+    NG: tl.constexpr,
     USE_OFFSETS: tl.constexpr,
     HEAD_FIRST: tl.constexpr
 ):
     i_t, i_bh = tl.program_id(0), tl.program_id(1)
-    i_b, i_h = i_bh // H, i_bh % H
+    i_bg = i_bh // NG
+    i_b, i_hq = i_bh // HQ, i_bh % HQ
+    i_h = i_hq // NG
     if USE_OFFSETS:
         i_n, i_t = tl.load(indices + i_t * 2).to(tl.int32), tl.load(indices + i_t * 2 + 1).to(tl.int32)
         bos, eos = tl.load(offsets + i_n).to(tl.int32), tl.load(offsets + i_n + 1).to(tl.int32)
@@ -611,17 +651,17 @@ def chunk_gla_bwd_kernel_dA(
     for i_v in range(tl.cdiv(V, BV)):
         if HEAD_FIRST:
             p_do = tl.make_block_ptr(do + i_bh * T*V, (T, V), (V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
-            p_v = tl.make_block_ptr(v + i_bh * T*V, (V, T), (1, V), (i_v * BV, i_t * BT), (BV, BT), (0, 1))
+            p_v = tl.make_block_ptr(v + i_bg * stride_v, (V, T), (1, V), (i_v * BV, i_t * BT), (BV, BT), (0, 1))
         else:
-            p_do = tl.make_block_ptr(do + (bos*H + i_h) * V, (T, V), (H*V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
-            p_v = tl.make_block_ptr(v + (bos*H + i_h) * V, (V, T), (1, H*V), (i_v * BV, i_t * BT), (BV, BT), (0, 1))
+            p_do = tl.make_block_ptr(do + (bos*HQ + i_hq) * V, (T, V), (HQ*V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
+            p_v = tl.make_block_ptr(v + bos*stride_v + i_h*V, (V, T), (1, stride_v), (i_v * BV, i_t * BT), (BV, BT), (0, 1))
         b_v = tl.load(p_v, boundary_check=(0, 1))
         b_do = tl.load(p_do, boundary_check=(0, 1))
         b_dA += tl.dot(b_do, b_v)
     if HEAD_FIRST:
         p_dA = tl.make_block_ptr(dA + i_bh * T*BT, (T, BT), (BT, 1), (i_t * BT, 0), (BT, BT), (1, 0))
     else:
-        p_dA = tl.make_block_ptr(dA + (bos * H + i_h) * BT, (T, BT), (H*BT, 1), (i_t * BT, 0), (BT, BT), (1, 0))
+        p_dA = tl.make_block_ptr(dA + (bos * HQ + i_hq) * BT, (T, BT), (HQ*BT, 1), (i_t * BT, 0), (BT, BT), (1, 0))
     m_s = tl.arange(0, BT)[:, None] >= tl.arange(0, BT)[None, :]
     b_dA = tl.where(m_s, b_dA * scale, 0.)
     tl.store(p_dA, b_dA.to(p_dA.dtype.element_ty), boundary_check=(0, 1))
@@ -649,18 +689,23 @@ def chunk_gla_bwd_kernel_dv(
     dv,
     offsets,
     indices,
+    stride_k,
     T,
+    HQ: tl.constexpr,
     H: tl.constexpr,
     K: tl.constexpr,
     V: tl.constexpr,
     BT: tl.constexpr,
     BK: tl.constexpr,
     BV: tl.constexpr,
+    NG: tl.constexpr,
     USE_OFFSETS: tl.constexpr,
     HEAD_FIRST: tl.constexpr
 ):
     i_v, i_t, i_bh = tl.program_id(0), tl.program_id(1), tl.program_id(2)
-    i_b, i_h = i_bh // H, i_bh % H
+    i_bg = i_bh // NG
+    i_b, i_hq = i_bh // HQ, i_bh % HQ
+    i_h = i_hq // NG
     if USE_OFFSETS:
         i_tg = i_t
         i_n, i_t = tl.load(indices + i_t * 2).to(tl.int32), tl.load(indices + i_t * 2 + 1).to(tl.int32)
@@ -677,9 +722,9 @@ def chunk_gla_bwd_kernel_dv(
         p_do = tl.make_block_ptr(do + i_bh * T*V, (T, V), (V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
         p_dv = tl.make_block_ptr(dv + i_bh * T*V, (T, V), (V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
     else:
-        p_A = tl.make_block_ptr(A + (bos * H + i_h) * BT, (BT, T), (1, H*BT), (0, i_t * BT), (BT, BT), (0, 1))
-        p_do = tl.make_block_ptr(do + (bos * H + i_h) * V, (T, V), (H*V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
-        p_dv = tl.make_block_ptr(dv + (bos * H + i_h) * V, (T, V), (H*V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
+        p_A = tl.make_block_ptr(A + (bos * HQ + i_hq) * BT, (BT, T), (1, HQ*BT), (0, i_t * BT), (BT, BT), (0, 1))
+        p_do = tl.make_block_ptr(do + (bos * HQ + i_hq) * V, (T, V), (HQ*V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
+        p_dv = tl.make_block_ptr(dv + (bos * HQ + i_hq) * V, (T, V), (HQ*V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
 
     b_A = tl.load(p_A, boundary_check=(0, 1))
     b_A = tl.where(tl.arange(0, BT)[:, None] <= tl.arange(0, BT)[None, :], b_A, 0.)
@@ -692,15 +737,15 @@ def chunk_gla_bwd_kernel_dv(
         m_k = o_k < K
 
         if HEAD_FIRST:
-            p_k = tl.make_block_ptr(k + i_bh * T*K, (T, K), (K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
-            p_gk = tl.make_block_ptr(g + i_bh * T*K, (T, K), (K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
-            p_gn = tl.max_contiguous(tl.multiple_of(g + i_bh * T*K + min(i_t * BT + BT, T) * K - K + o_k, BK), BK)
+            p_k = tl.make_block_ptr(k + i_bg * stride_k, (T, K), (K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+            p_gk = tl.make_block_ptr(g + i_bg * T*K, (T, K), (K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+            p_gn = tl.max_contiguous(tl.multiple_of(g + i_bg * T*K + min(i_t * BT + BT, T) * K - K + o_k, BK), BK)
             p_dh = tl.make_block_ptr(dh + (i_bh * NT + i_t) * K*V, (K, V), (V, 1), (i_k * BK, i_v * BV), (BK, BV), (1, 0))
         else:
-            p_k = tl.make_block_ptr(k + (bos * H + i_h) * K, (T, K), (H*K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+            p_k = tl.make_block_ptr(k + bos*stride_k + i_h*K, (T, K), (stride_k, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
             p_gk = tl.make_block_ptr(g + (bos * H + i_h) * K, (T, K), (H*K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
             p_gn = g + (bos + min(i_t * BT + BT, T) - 1)*H*K + i_h * K + o_k
-            p_dh = tl.make_block_ptr(dh + (i_tg * H + i_h) * K*V, (K, V), (V, 1), (i_k * BK, i_v * BV), (BK, BV), (1, 0))
+            p_dh = tl.make_block_ptr(dh + (i_tg * HQ + i_hq) * K*V, (K, V), (V, 1), (i_k * BK, i_v * BV), (BK, BV), (1, 0))
 
         b_k = tl.load(p_k, boundary_check=(0, 1))
         b_gk = tl.load(p_gk, boundary_check=(0, 1))
@@ -742,18 +787,25 @@ def chunk_gla_bwd_kernel_inter(
     offsets,
     indices,
     scale,
+    stride_q,
+    stride_k,
+    stride_v,
     T,
+    HQ: tl.constexpr,
     H: tl.constexpr,
     K: tl.constexpr,
     V: tl.constexpr,
     BT: tl.constexpr,
     BK: tl.constexpr,
     BV: tl.constexpr,
+    NG: tl.constexpr,
     USE_OFFSETS: tl.constexpr,
     HEAD_FIRST: tl.constexpr
 ):
     i_k, i_t, i_bh = tl.program_id(0), tl.program_id(1), tl.program_id(2)
-    i_b, i_h = i_bh // H, i_bh % H
+    i_bg = i_bh // NG
+    i_b, i_hq = i_bh // HQ, i_bh % HQ
+    i_h = i_hq // NG
     if USE_OFFSETS:
         i_tg = i_t
         i_n, i_t = tl.load(indices + i_t * 2).to(tl.int32), tl.load(indices + i_t * 2 + 1).to(tl.int32)
@@ -768,8 +820,8 @@ def chunk_gla_bwd_kernel_inter(
     m_k = o_k < K
 
     if HEAD_FIRST:
-        p_gk = tl.make_block_ptr(g + i_bh * T*K, (T, K), (K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
-        p_gn = tl.max_contiguous(tl.multiple_of(g + i_bh * T*K + (min(T, i_t * BT + BT)-1) * K + o_k, BK), BK)
+        p_gk = tl.make_block_ptr(g + i_bg * T*K, (T, K), (K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+        p_gn = tl.max_contiguous(tl.multiple_of(g + i_bg * T*K + (min(T, i_t * BT + BT)-1) * K + o_k, BK), BK)
     else:
         p_gk = tl.make_block_ptr(g + (bos*H+i_h)*K, (T, K), (H*K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
         p_gn = g + (bos + min(T, i_t * BT + BT)-1) * H*K + i_h * K + o_k
@@ -780,15 +832,15 @@ def chunk_gla_bwd_kernel_inter(
 
     for i_v in range(tl.cdiv(V, BV)):
         if HEAD_FIRST:
-            p_v = tl.make_block_ptr(v + i_bh * T*V, (T, V), (V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
+            p_v = tl.make_block_ptr(v + i_bg * stride_v, (T, V), (V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
             p_do = tl.make_block_ptr(do + i_bh * T*V, (T, V), (V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
-            p_h = tl.make_block_ptr(h + i_bh * NT*K*V + i_t * K*V, (V, K), (1, V), (i_v * BV, i_k * BK), (BV, BK), (0, 1))
+            p_h = tl.make_block_ptr(h + i_bg * NT*K*V + i_t * K*V, (V, K), (1, V), (i_v * BV, i_k * BK), (BV, BK), (0, 1))
             p_dh = tl.make_block_ptr(dh + i_bh * NT*K*V + i_t * K*V, (V, K), (1, V), (i_v * BV, i_k * BK), (BV, BK), (0, 1))
         else:
-            p_v = tl.make_block_ptr(v + (bos*H + i_h) * V, (T, V), (H*V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
-            p_do = tl.make_block_ptr(do + (bos*H + i_h) * V, (T, V), (H*V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
+            p_v = tl.make_block_ptr(v + bos*stride_v + i_h*V, (T, V), (stride_v, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
+            p_do = tl.make_block_ptr(do + (bos*HQ + i_hq) * V, (T, V), (HQ*V, 1), (i_t * BT, i_v * BV), (BT, BV), (1, 0))
             p_h = tl.make_block_ptr(h + (i_tg * H + i_h) * K*V, (V, K), (1, V), (i_v * BV, i_k * BK), (BV, BK), (0, 1))
-            p_dh = tl.make_block_ptr(dh + (i_tg * H + i_h) * K*V, (V, K), (1, V), (i_v * BV, i_k * BK), (BV, BK), (0, 1))
+            p_dh = tl.make_block_ptr(dh + (i_tg * HQ + i_hq) * K*V, (V, K), (1, V), (i_v * BV, i_k * BK), (BV, BK), (0, 1))
         # [BT, BV]
         b_v = tl.load(p_v, boundary_check=(0, 1))
         b_do = tl.load(p_do, boundary_check=(0, 1))
@@ -807,15 +859,15 @@ def chunk_gla_bwd_kernel_inter(
     b_dk = b_dk * tl.exp(b_gn[None, :] - b_gk)
 
     if HEAD_FIRST:
-        p_q = tl.make_block_ptr(q + i_bh * T*K, (T, K), (K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
-        p_k = tl.make_block_ptr(k + i_bh * T*K, (T, K), (K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+        p_q = tl.make_block_ptr(q + i_bh * stride_q, (T, K), (K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+        p_k = tl.make_block_ptr(k + i_bg * stride_k, (T, K), (K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
         p_dq = tl.make_block_ptr(dq + i_bh * T*K, (T, K), (K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
         p_dk = tl.make_block_ptr(dk + i_bh * T*K, (T, K), (K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
     else:
-        p_q = tl.make_block_ptr(q + (bos*H+i_h)*K, (T, K), (H*K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
-        p_k = tl.make_block_ptr(k + (bos*H+i_h)*K, (T, K), (H*K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
-        p_dq = tl.make_block_ptr(dq + (bos*H+i_h)*K, (T, K), (H*K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
-        p_dk = tl.make_block_ptr(dk + (bos*H+i_h)*K, (T, K), (H*K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+        p_q = tl.make_block_ptr(q + bos*stride_q + i_hq*K, (T, K), (stride_q, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+        p_k = tl.make_block_ptr(k + bos*stride_k + i_h*K, (T, K), (stride_k, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+        p_dq = tl.make_block_ptr(dq + (bos*HQ+i_hq)*K, (T, K), (HQ*K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+        p_dk = tl.make_block_ptr(dk + (bos*HQ+i_hq)*K, (T, K), (HQ*K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
     b_q = tl.load(p_q, boundary_check=(0, 1))
     b_k = tl.load(p_k, boundary_check=(0, 1))
     b_dgk += tl.sum(b_dk * b_k, axis=0)
@@ -832,9 +884,9 @@ def chunk_gla_bwd_kernel_inter(
         p_dk = tl.make_block_ptr(dk2 + i_bh * T*K, (T, K), (K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
         p_dg = tl.make_block_ptr(dg + i_bh * T*K, (T, K), (K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
     else:
-        p_dq = tl.make_block_ptr(dq2 + (bos * H + i_h) * K, (T, K), (H*K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
-        p_dk = tl.make_block_ptr(dk2 + (bos * H + i_h) * K, (T, K), (H*K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
-        p_dg = tl.make_block_ptr(dg + (bos * H + i_h) * K, (T, K), (H*K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+        p_dq = tl.make_block_ptr(dq2 + (bos * HQ + i_hq) * K, (T, K), (HQ*K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+        p_dk = tl.make_block_ptr(dk2 + (bos * HQ + i_hq) * K, (T, K), (HQ*K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
+        p_dg = tl.make_block_ptr(dg + (bos * HQ + i_hq) * K, (T, K), (HQ*K, 1), (i_t * BT, i_k * BK), (BT, BK), (1, 0))
     tl.store(p_dq, b_dq.to(p_dq.dtype.element_ty), boundary_check=(0, 1))
     tl.store(p_dk, b_dk.to(p_dk.dtype.element_ty), boundary_check=(0, 1))
     tl.store(p_dg, b_dg.to(p_dg.dtype.element_ty), boundary_check=(0, 1))
@@ -855,12 +907,14 @@ def chunk_gla_fwd_intra_gk(
     else:
         B, T, H, K = k.shape
     BT = min(chunk_size, max(16, triton.next_power_of_2(T)))
+    HQ = q.shape[1] if head_first else q.shape[2]
     NT = triton.cdiv(T, BT) if offsets is None else len(indices)
     BC = min(16, BT)
     NC = triton.cdiv(BT, BC)
+    NG = HQ // H
 
-    A = q.new_empty(B, *((H, T) if head_first else (T, H)), BT, dtype=torch.float)
-    grid = (NT, NC * NC, B * H)
+    A = q.new_empty(B, *((HQ, T) if head_first else (T, HQ)), BT, dtype=torch.float)
+    grid = (NT, NC * NC, B * HQ)
     chunk_gla_fwd_A_kernel_intra_sub_inter[grid](
         q,
         k,
@@ -869,16 +923,20 @@ def chunk_gla_fwd_intra_gk(
         offsets,
         indices,
         scale,
+        stride_q=row_stride(q),
+        stride_k=row_stride(k),
         T=T,
+        HQ=HQ,
         H=H,
         K=K,
         BT=BT,
         BC=BC,
         NC=NC,
+        NG=NG,
         HEAD_FIRST=head_first
     )
 
-    grid = (NT, NC, B * H)
+    grid = (NT, NC, B * HQ)
     # load the entire [BC, K] blocks into SRAM at once
     if K <= 256:
         BK = triton.next_power_of_2(K)
@@ -890,21 +948,25 @@ def chunk_gla_fwd_intra_gk(
             offsets,
             indices,
             scale,
+            stride_q=row_stride(q),
+            stride_k=row_stride(k),
             T=T,
+            HQ=HQ,
             H=H,
             K=K,
             BT=BT,
             BC=BC,
             BK=BK,
+            NG=NG,
             HEAD_FIRST=head_first
         )
     # split then merge
     else:
         BK = min(128, triton.next_power_of_2(K))
         NK = triton.cdiv(K, BK)
-        A_intra = q.new_empty(NK, B, *((H, T) if head_first else (T, H)), BC, dtype=torch.float)
+        A_intra = q.new_empty(NK, B, *((HQ, T) if head_first else (T, HQ)), BC, dtype=torch.float)
 
-        grid = (NK, NT * NC, B * H)
+        grid = (NK, NT * NC, B * HQ)
         chunk_gla_fwd_A_kernel_intra_sub_intra_split[grid](
             q,
             k,
@@ -913,18 +975,22 @@ def chunk_gla_fwd_intra_gk(
             offsets,
             indices,
             scale,
+            stride_q=row_stride(q),
+            stride_k=row_stride(k),
             T=T,
             B=B,
+            HQ=HQ,
             H=H,
             K=K,
             BT=BT,
             BC=BC,
             BK=BK,
             NC=NC,
+            NG=NG,
             HEAD_FIRST=head_first
         )
 
-        grid = (NT, NC, B * H)
+        grid = (NT, NC, B * HQ)
         chunk_gla_fwd_A_kernel_intra_sub_intra_merge[grid](
             A_intra,
             A,
@@ -932,7 +998,7 @@ def chunk_gla_fwd_intra_gk(
             indices,
             T=T,
             B=B,
-            H=H,
+            H=HQ,
             BT=BT,
             BC=BC,
             NK=NK,
@@ -954,14 +1020,17 @@ def chunk_gla_fwd_o_gk(
     chunk_size: int = 64
 ):
     if head_first:
-        B, H, T, K, V = *q.shape, v.shape[-1]
+        B, H, T, K, V = *v.shape[:-1], q.shape[-1], v.shape[-1]
+        HQ = q.shape[1]
     else:
-        B, T, H, K, V = *q.shape, v.shape[-1]
+        B, T, H, K, V = *v.shape[:-1], q.shape[-1], v.shape[-1]
+        HQ = q.shape[2]
     BT = min(chunk_size, max(16, triton.next_power_of_2(T)))
     NT = triton.cdiv(T, BT) if offsets is None else len(indices)
+    NG = HQ // H
 
-    o = torch.empty_like(v)
-    def grid(meta): return (triton.cdiv(V, meta['BV']), NT, B * H)
+    o = v.new_empty(*q.shape[:-1], V)
+    def grid(meta): return (triton.cdiv(V, meta['BV']), NT, B * HQ)
     chunk_gla_fwd_kernel_o[grid](
         q,
         v,
@@ -972,11 +1041,15 @@ def chunk_gla_fwd_o_gk(
         offsets,
         indices,
         scale,
+        stride_q=row_stride(q),
+        stride_v=row_stride(v),
         T=T,
+        HQ=HQ,
         H=H,
         K=K,
         V=V,
         BT=BT,
+        NG=NG,
         HEAD_FIRST=head_first
     )
     return o
@@ -993,14 +1066,17 @@ def chunk_gla_bwd_dA(
 ):
     if head_first:
         B, H, T, V = v.shape
+        HQ = do.shape[1]
     else:
         B, T, H, V = v.shape
+        HQ = do.shape[2]
     BT = min(chunk_size, max(16, triton.next_power_of_2(T)))
     NT = triton.cdiv(T, BT) if offsets is None else len(indices)
     BV = min(64, triton.next_power_of_2(V))
+    NG = HQ // H
 
-    dA = v.new_empty(B, *((H, T) if head_first else (T, H)), BT, dtype=torch.float)
-    grid = (NT, B * H)
+    dA = v.new_empty(B, *((HQ, T) if head_first else (T, HQ)), BT, dtype=torch.float)
+    grid = (NT, B * HQ)
     chunk_gla_bwd_kernel_dA[grid](
         v,
         do,
@@ -1008,11 +1084,14 @@ def chunk_gla_bwd_dA(
         offsets,
         indices,
         scale,
+        stride_v=row_stride(v),
         T=T,
+        HQ=HQ,
         H=H,
         V=V,
         BT=BT,
         BV=BV,
+        NG=NG,
         HEAD_FIRST=head_first
     )
     return dA
@@ -1031,13 +1110,17 @@ def chunk_gla_bwd_dv(
 ):
     if head_first:
         B, H, T, K, V = *k.shape, do.shape[-1]
+        HQ = do.shape[1]
     else:
         B, T, H, K, V = *k.shape, do.shape[-1]
+        HQ = do.shape[2]
     BT = min(chunk_size, max(16, triton.next_power_of_2(T)))
     NT = triton.cdiv(T, BT) if offsets is None else len(indices)
+    NG = HQ // H
 
+    # the gradients of values are computed per query head and then reduced over each group
     dv = torch.empty_like(do)
-    def grid(meta): return (triton.cdiv(V, meta['BV']), NT, B * H)
+    def grid(meta): return (triton.cdiv(V, meta['BV']), NT, B * HQ)
     chunk_gla_bwd_kernel_dv[grid](
         k,
         g,
@@ -1047,11 +1130,14 @@ def chunk_gla_bwd_dv(
         dv,
         offsets,
         indices,
+        stride_k=row_stride(k),
         T=T,
+        HQ=HQ,
         H=H,
         K=K,
         V=V,
         BT=BT,
+        NG=NG,
         HEAD_FIRST=head_first
     )
     return dv
@@ -1068,19 +1154,22 @@ def chunk_gla_bwd_dqk_intra(
     chunk_size: int = 64
 ):
     if head_first:
-        B, H, T, K = q.shape
+        B, H, T, K = k.shape
+        HQ = q.shape[1]
     else:
-        B, T, H, K = q.shape
+        B, T, H, K = k.shape
+        HQ = q.shape[2]
     BT = min(chunk_size, max(16, triton.next_power_of_2(T)))
     BC = min(16, BT)
     BK = min(64, triton.next_power_of_2(K))
     NT = triton.cdiv(T, BT) if offsets is None else len(indices)
     NC = triton.cdiv(BT, BC)
     NK = triton.cdiv(K, BK)
+    NG = HQ // H
 
     dq = torch.empty_like(q, dtype=torch.float)
-    dk = torch.empty_like(k, dtype=torch.float)
-    grid = (NK, NT * NC, B * H)
+    dk = torch.empty_like(q, dtype=torch.float)
+    grid = (NK, NT * NC, B * HQ)
     chunk_gla_bwd_kernel_intra[grid](
         q,
         k,
@@ -1090,13 +1179,17 @@ def chunk_gla_bwd_dqk_intra(
         dk,
         offsets,
         indices,
+        stride_q=row_stride(q),
+        stride_k=row_stride(k),
         T=T,
+        HQ=HQ,
         H=H,
         K=K,
         BT=BT,
         BC=BC,
         BK=BK,
         NC=NC,
+        NG=NG,
         HEAD_FIRST=head_first
     )
     return dq, dk
@@ -1120,16 +1213,19 @@ def chunk_gla_bwd_dqkg(
 ):
     if head_first:
         B, H, T, K, V = *k.shape, v.shape[-1]
+        HQ = q.shape[1]
     else:
         B, T, H, K, V = *k.shape, v.shape[-1]
+        HQ = q.shape[2]
     BT = min(chunk_size, max(16, triton.next_power_of_2(T)))
     NT = triton.cdiv(T, BT) if offsets is None else len(indices)
+    NG = HQ // H
 
-    dg = torch.empty_like(g)
+    dg = g.new_empty(*q.shape)
     # work around triton compiler bugs.
     dq2 = torch.empty_like(dq)
     dk2 = torch.empty_like(dk)
-    def grid(meta): return (triton.cdiv(K, meta['BK']), NT, B * H)
+    def grid(meta): return (triton.cdiv(K, meta['BK']), NT, B * HQ)
     chunk_gla_bwd_kernel_inter[grid](
         q,
         k,
@@ -1146,11 +1242,16 @@ def chunk_gla_bwd_dqkg(
         offsets,
         indices,
         scale,
+        stride_q=row_stride(q),
+        stride_k=row_stride(k),
+        stride_v=row_stride(v),
         T=T,
+        HQ=HQ,
         H=H,
         K=K,
         V=V,
         BT=BT,
+        NG=NG,
         HEAD_FIRST=head_first
     )
     return dq2, dk2, dg
@@ -1231,14 +1332,29 @@ def chunk_gla_bwd(
     offsets: Optional[torch.LongTensor] = None,
     indices: Optional[torch.LongTensor] = None,
     head_first: bool = True,
-    chunk_size: int = 64
+    chunk_size: int = 64,
+    checkpoint_interval: Optional[int] = None
 ):
     T = q.shape[2] if head_first else q.shape[1]
     BT = min(chunk_size, max(16, triton.next_power_of_2(T)))
     if g_cumsum is None:
         g_cumsum = chunk_local_cumsum(g, BT, offsets=offsets, indices=indices, head_first=head_first)
 
-    if h is None:
+    if h is not None and checkpoint_interval is not None:
+        h = chunk_fwd_h_from_checkpoints(
+            k=k,
+            v=v,
+            g=None,
+            gk=g_cumsum,
+            gv=None,
+            h=h,
+            offsets=offsets,
+            head_first=head_first,
+            chunk_size=BT,
+            checkpoint_interval=checkpoint_interval,
+            states_in_fp32=True
+        )
+    elif h is None:
         h, _ = chunk_fwd_h(
             k=k,
             v=v,
@@ -1323,7 +1439,7 @@ def chunk_gla_bwd(
 class ChunkGLAFunction(torch.autograd.Function):
 
     @staticmethod
-    @input_guard
+    @input_guard(strided=('q', 'k', 'v'))
     def forward(
         ctx,
         q,
@@ -1334,7 +1450,8 @@ class ChunkGLAFunction(torch.autograd.Function):
         initial_state,
         output_final_state,
         offsets,
-        head_first
+        head_first,
+        checkpoint_interval
     ):
         T = q.shape[2] if head_first else q.shape[1]
         chunk_size = min(64, max(16, triton.next_power_of_2(T)))
@@ -1363,7 +1480,13 @@ class ChunkGLAFunction(torch.autograd.Function):
             g_cumsum = None
         else:
             g = None
-        ctx.save_for_backward(q, k, v, g, g_cumsum, initial_state, A)
+        # the states are either recomputed from scratch or from the checkpoints in the backward pass
+        if checkpoint_interval is not None:
+            h = chunk_select_checkpoints(h, offsets, head_first, chunk_size, checkpoint_interval)
+        else:
+            h = None
+        ctx.save_for_backward(q, k, v, g, g_cumsum, initial_state, A, h)
+        ctx.checkpoint_interval = checkpoint_interval
         ctx.chunk_size = chunk_size
         ctx.scale = scale
         ctx.offsets = offsets
@@ -1374,7 +1497,7 @@ class ChunkGLAFunction(torch.autograd.Function):
     @staticmethod
     @input_guard
     def backward(ctx, do, dht):
-        q, k, v, g, g_cumsum, initial_state, A = ctx.saved_tensors
+        q, k, v, g, g_cumsum, initial_state, A, h = ctx.saved_tensors
         chunk_size, scale, offsets, indices, head_first = ctx.chunk_size, ctx.scale, ctx.offsets, ctx.indices, ctx.head_first
         dq, dk, dv, dg, dh0 = chunk_gla_bwd(
             q=q,
@@ -1383,7 +1506,7 @@ class ChunkGLAFunction(torch.autograd.Function):
             g=g,
             g_cumsum=g_cumsum,
             scale=scale,
-            h=None,
+            h=h,
             A=A,
             initial_state=initial_state,
             do=do,
@@ -1391,9 +1514,15 @@ class ChunkGLAFunction(torch.autograd.Function):
             offsets=offsets,
             indices=indices,
             head_first=head_first,
-            chunk_size=chunk_size
+            chunk_size=chunk_size,
+            checkpoint_interval=ctx.checkpoint_interval
         )
-        return dq.to(q), dk.to(k), dv.to(v), dg, None, dh0, None, None, None
+        # with grouped-query attention, the gradients of the keys/values/gates shared by a group of query heads
+        # are computed per query head, and then reduced over each group
+        if q.shape[1 if head_first else 2] != k.shape[1 if head_first else 2]:
+            pattern = 'b (h g) ... -> b h ...' if head_first else 'b t (h g) ... -> b t h ...'
+            dk, dv, dg = map(lambda x: reduce(x, pattern, 'sum', h=k.shape[1 if head_first else 2]), (dk, dv, dg))
+        return dq.to(q), dk.to(k), dv.to(v), dg, None, dh0, None, None, None, None
 
 
 @torch.compiler.disable
@@ -1406,39 +1535,54 @@ def chunk_gla(
     initial_state: torch.Tensor = None,
     output_final_state: bool = False,
     cu_seqlens: Optional[torch.LongTensor] = None,
-    head_first: bool = True
+    head_first: bool = True,
+    cp_group: Optional[dist.ProcessGroup] = None,
+    state_checkpoint_interval: Optional[int] = None
 ) -> Tuple[torch.Tensor, torch.Tensor]:
     r"""
     Args:
         q (torch.Tensor):
             queries of shape `[B, H, T, K]` if `head_first=True` else `[B, T, H, K]`.
         k (torch.Tensor):
-            keys of shape `[B, H, T, K]` if `head_first=True` else `[B, T, H, K]`.
+            keys of shape `[B, HK, T, K]` if `head_first=True` else `[B, T, HK, K]`.
+            For grouped-query attention, `HK` can be a divisor of `H`,
+            with each group of `H // HK` consecutive query heads sharing the same key/value head.
         v (torch.Tensor):
-            values of shape `[B, H, T, V]` if `head_first=True` else `[B, T, H, V]`.
+            values of shape `[B, HK, T, V]` if `head_first=True` else `[B, T, HK, V]`.
         g (torch.Tensor):
-            Forget gates of shape `[B, H, T, K]` if `head_first=True` else `[B, T, H, K]` applied to keys.
+            Forget gates of shape `[B, HK, T, K]` if `head_first=True` else `[B, T, HK, K]` applied to keys.
         scale (Optional[int]):
             Scale factor for the attention scores.
             If not provided, it will default to `1 / sqrt(K)`. Default: `None`.
         initial_state (Optional[torch.Tensor]):
-            Initial state of shape `[N, H, K, V]` for `N` input sequences.
+            Initial state of shape `[N, HK, K, V]` for `N` input sequences.
             For equal-length input sequences, `N` equals the batch size `B`.
             Default: `None`.
         output_final_state (Optional[bool]):
-            Whether to output the final state of shape `[N, H, K, V]`. Default: `False`.
+            Whether to output the final state of shape `[N, HK, K, V]`. Default: `False`.
         cu_seqlens (torch.LongTensor):
             Cumulative sequence lengths of shape `[N+1]` used for variable-length training,
             consistent with the FlashAttention API.
         head_first (Optional[bool]):
             Whether the inputs are in the head-first format, which is not supported for variable-length inputs.
             Default: `True`.
+        cp_group (Optional[dist.ProcessGroup]):
+            Process group for context parallelism, whose ranks hold consecutive slices of the sequences in order.
+            `initial_state` is only used on the first rank,
+            and the final state returned by the last rank is that of the whole sequences.
+            Default: `None`.
+        state_checkpoint_interval (Optional[int]):
+            If provided, the chunk states are kept every `state_checkpoint_interval` chunks for the backward pass,
+            and the ones in between are recomputed from them in parallel.
+            Larger intervals save more memory at the cost of longer recomputation, and `1` keeps all states.
+            By default, no states are kept and they are all recomputed sequentially from the initial states.
+            Default: `None`.
 
     Returns:
         o (torch.Tensor):
             Outputs of shape `[B, H, T, V]` if `head_first=True` else `[B, T, H, V]`.
         final_state (torch.Tensor):
-            Final state of shape `[N, H, K, V]` if `output_final_state=True` else `None`.
+            Final state of shape `[N, HK, K, V]` if `output_final_state=True` else `None`.
 
     Examples::
         >>> import torch
@@ -1477,7 +1621,37 @@ def chunk_gla(
         if initial_state is not None and initial_state.shape[0] != len(cu_seqlens) - 1:
             raise ValueError(f"The number of initial states is expected to be equal to the number of input sequences, "
                              f"i.e., {len(cu_seqlens) - 1} rather than {initial_state.shape[0]}.")
+    if q.shape[1 if head_first else 2] % k.shape[1 if head_first else 2] != 0:
+        raise ValueError(f"The number of query heads ({q.shape[1 if head_first else 2]}) is expected to be "
+                         f"a multiple of the number of key/value heads ({k.shape[1 if head_first else 2]}).")
+    if cp_group is not None:
+        return chunk_context_parallel(
+            chunk_gla,
+            q, k, v, g,
+            group=cp_group,
+            scale=scale,
+            initial_state=initial_state,
+            output_final_state=output_final_state,
+            cu_seqlens=cu_seqlens,
+            head_first=head_first,
+            state_checkpoint_interval=state_checkpoint_interval
+        )
+    if state_checkpoint_interval is not None and state_checkpoint_interval < 1:
+        raise ValueError(f"`state_checkpoint_interval` is expected to be positive, got {state_checkpoint_interval}.")
     if scale is None:
         scale = q.shape[-1] ** -0.5
-    o, final_state = ChunkGLAFunction.apply(q, k, v, g, scale, initial_state, output_final_state, cu_seqlens, head_first)
+    if q.device.type == 'cpu':
+        return chunk_gla_cpu(q, k, v, g, scale, initial_state, output_final_state, cu_seqlens, head_first)
+    o, final_state = ChunkGLAFunction.apply(
+        q,
+        k,
+        v,
+        g,
+        scale,
+        initial_state,
+        output_final_state,
+        cu_seqlens,
+        head_first,
+        state_checkpoint_interval
+    )
     return o, final_state
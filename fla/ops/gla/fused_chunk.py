@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2023-2025, Songlin Yang, Yu Zhang
 
-from typing import Tuple
+from typing import Optional, Tuple
 
 import torch
 import torch.nn.functional as F
@@ -10,6 +10,7 @@ import triton.language as tl
 from einops import rearrange
 from packaging import version
 
+from fla.ops.common.utils import prepare_chunk_offsets, prepare_lens, prepare_token_indices
 from fla.ops.utils import chunk_local_cumsum
 from fla.ops.utils.exp import safe_exp
 from fla.utils import autocast_custom_bwd, autocast_custom_fwd, input_guard
@@ -119,6 +120,7 @@ def fused_chunk_gla_fwd_kernel(
     o,
     h0,
     ht,
+    offsets,
     T,
     B: tl.constexpr,
     H: tl.constexpr,
@@ -129,19 +131,30 @@ def fused_chunk_gla_fwd_kernel(
     BV: tl.constexpr,
     USE_INITIAL_STATE: tl.constexpr,
     STORE_FINAL_STATE: tl.constexpr,
+    USE_OFFSETS: tl.constexpr,
     CHECK: tl.constexpr
 ):
     # indices
     i_v, i_k, i_bh = tl.program_id(0), tl.program_id(1), tl.program_id(2)
+    i_n, i_h = i_bh // H, i_bh % H
+    if USE_OFFSETS:
+        bos, eos = tl.load(offsets + i_n).to(tl.int32), tl.load(offsets + i_n + 1).to(tl.int32)
+        all = T
+        T = eos - bos
+        # the start of the current sequence and head in the packed inputs of shape `[1, H, all, ...]`
+        i_s = i_h * all + bos
+    else:
+        all = T
+        i_s = i_bh * T
 
     b_h = tl.zeros([BK, BV], dtype=tl.float32)
 
     # make block pointers
-    p_q = tl.make_block_ptr(q + i_bh * T*K, (T, K), (K, 1), (0, i_k * BK), (BT, BK), (1, 0))
-    p_gn = g + i_bh * T*K + (BT - 1) * K + i_k * BK + tl.arange(0, BK)
-    p_k = tl.make_block_ptr(k + i_bh * T*K, (K, T), (1, K), (i_k * BK, 0), (BK, BT), (0, 1))
-    p_v = tl.make_block_ptr(v + i_bh * T*V, (T, V), (V, 1), (0, i_v * BV), (BT, BV), (1, 0))
-    p_o = tl.make_block_ptr(o + (i_bh + i_k * B * H) * T*V, (T, V), (V, 1), (0, i_v * BV), (BT, BV), (1, 0))
+    p_q = tl.make_block_ptr(q + i_s*K, (T, K), (K, 1), (0, i_k * BK), (BT, BK), (1, 0))
+    p_gn = g + i_s*K + (BT - 1) * K + i_k * BK + tl.arange(0, BK)
+    p_k = tl.make_block_ptr(k + i_s*K, (K, T), (1, K), (i_k * BK, 0), (BK, BT), (0, 1))
+    p_v = tl.make_block_ptr(v + i_s*V, (T, V), (V, 1), (0, i_v * BV), (BT, BV), (1, 0))
+    p_o = tl.make_block_ptr(o + (i_k*B*H*all + i_s)*V, (T, V), (V, 1), (0, i_v * BV), (BT, BV), (1, 0))
 
     if USE_INITIAL_STATE:
         p_h = tl.make_block_ptr(h0 + i_bh * K * V, (K, V), (V, 1), (i_k * BK, i_v * BV), (BK, BV), (1, 0))
@@ -185,6 +198,7 @@ def fused_chunk_gla_bwd_kernel(
     dk,
     dv,
     h0,
+    offsets,
     scale,
     T,
     B: tl.constexpr,
@@ -196,9 +210,20 @@ def fused_chunk_gla_bwd_kernel(
     BK: tl.constexpr,
     BV: tl.constexpr,
     USE_INITIAL_STATE: tl.constexpr,
+    USE_OFFSETS: tl.constexpr,
     CHECK: tl.constexpr
 ):
     i_v, i_k, i_bh = tl.program_id(0), tl.program_id(1), tl.program_id(2)
+    i_n, i_h = i_bh // H, i_bh % H
+    if USE_OFFSETS:
+        bos, eos = tl.load(offsets + i_n).to(tl.int32), tl.load(offsets + i_n + 1).to(tl.int32)
+        all = T
+        T = eos - bos
+        # the start of the current sequence and head in the packed inputs of shape `[1, H, all, ...]`
+        i_s = i_h * all + bos
+    else:
+        all = T
+        i_s = i_bh * T
     # [BV, BK]
     b_h = tl.zeros([BV, BK], dtype=tl.float32)
 
@@ -208,11 +233,11 @@ def fused_chunk_gla_bwd_kernel(
 
     mask = (i_k * BK + tl.arange(0, BK)) < K
     for i in range(0, tl.cdiv(T, BT)):
-        p_k = tl.make_block_ptr(k + i_bh * T*K, (T, K), (K, 1), (i * BT, i_k * BK), (BT, BK), (1, 0))
-        p_gn = g + i_bh * T*K + ((i+1) * BT - 1) * K + i_k * BK + tl.arange(0, BK)
-        p_v = tl.make_block_ptr(v + i_bh * T*V, (V, T), (1, V), (i_v * BV, i * BT), (BV, BT), (0, 1))
-        p_do = tl.make_block_ptr(do + i_bh * T*V, (T, V), (V, 1), (i * BT, i_v * BV), (BT, BV), (1, 0))
-        p_dq = tl.make_block_ptr(dq + (i_bh+i_v*B*H)*T*K, (T, K), (K, 1), (i * BT, i_k * BK), (BT, BK), (1, 0))
+        p_k = tl.make_block_ptr(k + i_s*K, (T, K), (K, 1), (i * BT, i_k * BK), (BT, BK), (1, 0))
+        p_gn = g + i_s*K + ((i+1) * BT - 1) * K + i_k * BK + tl.arange(0, BK)
+        p_v = tl.make_block_ptr(v + i_s*V, (V, T), (1, V), (i_v * BV, i * BT), (BV, BT), (0, 1))
+        p_do = tl.make_block_ptr(do + i_s*V, (T, V), (V, 1), (i * BT, i_v * BV), (BT, BV), (1, 0))
+        p_dq = tl.make_block_ptr(dq + (i_v*B*H*all + i_s)*K, (T, K), (K, 1), (i * BT, i_k * BK), (BT, BK), (1, 0))
         b_dq = tl.zeros([BT, BK], dtype=tl.float32)
         # [BT, K]
         b_k = tl.load(p_k, boundary_check=(0, 1))
@@ -240,14 +265,14 @@ def fused_chunk_gla_bwd_kernel(
 
     # cum = tl.zeros([BK], dtype=tl.float32)
     for i in range(1, tl.cdiv(T, BT) + 1):
-        p_q = tl.make_block_ptr(q + i_bh * T*K, (K, T), (1, K), (i_k * BK, T - i * BT), (BK, BT), (0, 1))
-        p_k = tl.make_block_ptr(k + i_bh * T*K, (T, K), (K, 1), (T - i * BT, i_k * BK), (BT, BK), (1, 0))
-        p_gn = g + i_bh * T*K + (T - (i-1) * BT - 1) * K + i_k * BK + tl.arange(0, BK)
-        p_v = tl.make_block_ptr(v + i_bh * T*V, (T, V), (V, 1), (T - i * BT, i_v * BV), (BT, BV), (1, 0))
-        p_do = tl.make_block_ptr(do + i_bh * T*V, (T, V), (V, 1), (T - i * BT, i_v * BV), (BT, BV), (1, 0))
-        p_dk = tl.make_block_ptr(dk + (i_bh + i_v * B * H) * T*K, (T, K),
+        p_q = tl.make_block_ptr(q + i_s*K, (K, T), (1, K), (i_k * BK, T - i * BT), (BK, BT), (0, 1))
+        p_k = tl.make_block_ptr(k + i_s*K, (T, K), (K, 1), (T - i * BT, i_k * BK), (BT, BK), (1, 0))
+        p_gn = g + i_s*K + (T - (i-1) * BT - 1) * K + i_k * BK + tl.arange(0, BK)
+        p_v = tl.make_block_ptr(v + i_s*V, (T, V), (V, 1), (T - i * BT, i_v * BV), (BT, BV), (1, 0))
+        p_do = tl.make_block_ptr(do + i_s*V, (T, V), (V, 1), (T - i * BT, i_v * BV), (BT, BV), (1, 0))
+        p_dk = tl.make_block_ptr(dk + (i_v*B*H*all + i_s)*K, (T, K),
                                  (K, 1), (T - i * BT, i_k * BK), (BT, BK), (1, 0))
-        p_dv = tl.make_block_ptr(dv + (i_bh + i_k * B * H) * T*V, (T, V),
+        p_dv = tl.make_block_ptr(dv + (i_k*B*H*all + i_s)*V, (T, V),
                                  (V, 1), (T - i * BT, i_v * BV), (BT, BV), (1, 0))
         # [K, BT]
         b_q = tl.load(p_q, boundary_check=(0, 1))
@@ -366,10 +391,11 @@ class FusedChunkGLAFunction(torch.autograd.Function):
     @staticmethod
     @input_guard
     @autocast_custom_fwd
-    def forward(ctx, q, k, v, g, scale, initial_state, output_final_state):
+    def forward(ctx, q, k, v, g, scale, initial_state, output_final_state, offsets):
         ctx.g_dtype = g.dtype
         ctx.scale = scale
         B, H, T, K, V = *k.shape, v.shape[-1]
+        N = B if offsets is None else len(offsets) - 1
         BT = 16  # chunk_size
         BK, BV = min(K, 64), min(V, 64)
         NK, NV = triton.cdiv(K, BK), triton.cdiv(V, BV)
@@ -399,7 +425,7 @@ class FusedChunkGLAFunction(torch.autograd.Function):
         )
 
         if output_final_state:
-            final_state = q.new_empty(B, H, K, V, dtype=torch.float, requires_grad=False)
+            final_state = q.new_empty(N, H, K, V, dtype=torch.float, requires_grad=False)
         else:
             final_state = None
         # the bug still exists even for Triton 2.2 on H100 GPUs
@@ -416,9 +442,9 @@ class FusedChunkGLAFunction(torch.autograd.Function):
             )
             CHECK = True
 
-        grid = (NV, NK, B * H)
+        grid = (NV, NK, N * H)
         fused_chunk_gla_fwd_kernel[grid](
-            q_g, k_g, v, g, o, initial_state, final_state,
+            q_g, k_g, v, g, o, initial_state, final_state, offsets,
             T=T,
             B=B,
             H=H,
@@ -429,6 +455,7 @@ class FusedChunkGLAFunction(torch.autograd.Function):
             BV=BV,
             USE_INITIAL_STATE=initial_state is not None,
             STORE_FINAL_STATE=output_final_state,
+            USE_OFFSETS=offsets is not None,
             CHECK=CHECK,
             num_warps=num_warps,
             num_stages=num_stages
@@ -462,6 +489,7 @@ class FusedChunkGLAFunction(torch.autograd.Function):
         # combine inner and inter
         o.add_(o2)
         ctx.save_for_backward(q, k, v, g_org, A, initial_state)
+        ctx.offsets = offsets
         ctx.CHECK = CHECK
         return o.to(v), final_state
 
@@ -470,7 +498,9 @@ class FusedChunkGLAFunction(torch.autograd.Function):
     @autocast_custom_bwd
     def backward(ctx, do, dht=None):
         q, k, v, g_org, A, initial_state = ctx.saved_tensors
+        offsets = ctx.offsets
         B, H, T, K, V = *k.shape, v.shape[-1]
+        N = B if offsets is None else len(offsets) - 1
         scale = ctx.scale
 
         # recomputation
@@ -504,7 +534,7 @@ class FusedChunkGLAFunction(torch.autograd.Function):
         dk = q.new_empty(NV, B, H, T, K)
         dv = q.new_empty(NK, B, H, T, V)
 
-        grid = (NV, NK, B * H)
+        grid = (NV, NK, N * H)
 
         fused_chunk_gla_bwd_kernel[grid](
             q_g,
@@ -516,6 +546,7 @@ class FusedChunkGLAFunction(torch.autograd.Function):
             dk,
             dv,
             initial_state,
+            offsets,
             scale,
             T=T,
             B=B,
@@ -526,6 +557,7 @@ class FusedChunkGLAFunction(torch.autograd.Function):
             BK=BK,
             BV=BV,
             USE_INITIAL_STATE=initial_state is not None,
+            USE_OFFSETS=offsets is not None,
             CHECK=ctx.CHECK,
             num_warps=num_warps,
             num_stages=num_stages,
@@ -585,7 +617,14 @@ class FusedChunkGLAFunction(torch.autograd.Function):
 
         def rev_cumsum_exclusive(x):
             cumsum_x = x.cumsum(-2)
-            rev_cumsum_x = cumsum_x[..., -1, None, :] - cumsum_x
+            if offsets is None:
+                rev_cumsum_x = cumsum_x[..., -1, None, :] - cumsum_x
+            else:
+                # the sums are restarted at the chunk boundaries of each sequence
+                chunk_offsets = offsets // BT
+                rev_cumsum_x = cumsum_x[..., chunk_offsets[1:] - 1, :].repeat_interleave(
+                    prepare_lens(chunk_offsets), -2
+                ) - cumsum_x
             return rev_cumsum_x
 
         rev_cumsum_dg = rev_cumsum_exclusive(dg[..., 0, :])
@@ -593,7 +632,7 @@ class FusedChunkGLAFunction(torch.autograd.Function):
         dv.add_(dv2)
         dg = rearrange(dg, 'b h n c d -> b h (n c) d')
 
-        return dq.to(q), dk.to(k), dv.to(v), dg.to(ctx.g_dtype), None, None, None
+        return dq.to(q), dk.to(k), dv.to(v), dg.to(ctx.g_dtype), None, None, None, None
 
 
 def ceildiv(a, b):
@@ -616,16 +655,38 @@ def fused_chunk_gla(
     scale: int = -1,
     initial_state: torch.Tensor = None,
     output_final_state: bool = False,
+    cu_seqlens: Optional[torch.LongTensor] = None,
     head_first: bool = True
 ) -> Tuple[torch.Tensor, torch.Tensor]:
+    if cu_seqlens is not None:
+        if q.shape[0] != 1:
+            raise ValueError(f"The batch size is expected to be 1 rather than {q.shape[0]} when using `cu_seqlens`."
+                             f"Please flatten variable-length inputs before processing.")
+        if head_first:
+            raise RuntimeError("Sequences with variable lengths are not supported for head-first mode")
+        if initial_state is not None and initial_state.shape[0] != len(cu_seqlens) - 1:
+            raise ValueError(f"The number of initial states is expected to be equal to the number of input sequences, "
+                             f"i.e., {len(cu_seqlens) - 1} rather than {initial_state.shape[0]}.")
     if scale == -1:
         scale = q.shape[-1] ** -0.5
     if not head_first:
         q, k, v, g = map(lambda x: x.transpose(1, 2), (q, k, v, g))
     seq_len = q.shape[-2]
-    q, k, v, g = map(lambda x: pad(x), [q, k, v, g])
-    o, final_state = FusedChunkGLAFunction.apply(q, k, v, g, scale, initial_state, output_final_state)
-    o = o[..., :seq_len, :].contiguous()
+    offsets = None
+    if cu_seqlens is None:
+        q, k, v, g = map(lambda x: pad(x), [q, k, v, g])
+    else:
+        # each sequence is padded to a multiple of the chunk size, so that no chunk spans two sequences
+        offsets = prepare_chunk_offsets(cu_seqlens, 16) * 16
+        indices = prepare_token_indices(cu_seqlens, seq_len)
+        indices = offsets[indices[:, 0]] + indices[:, 1]
+        q, k, v, g = map(lambda x: x.new_zeros(*x.shape[:-2], offsets[-1].item(), x.shape[-1]).index_copy(-2, indices, x),
+                         [q, k, v, g])
+    o, final_state = FusedChunkGLAFunction.apply(q, k, v, g, scale, initial_state, output_final_state, offsets)
+    if cu_seqlens is None:
+        o = o[..., :seq_len, :].contiguous()
+    else:
+        o = o.index_select(-2, indices)
     if not head_first:
         o = o.transpose(1, 2)
     return o, final_state
@@ -19,29 +19,33 @@ def fused_recurrent_gla(
     output_final_state: bool = False,
     reverse: bool = False,
     cu_seqlens: Optional[torch.LongTensor] = None,
-    head_first: bool = True
+    head_first: bool = True,
+    state_indices: Optional[torch.LongTensor] = None,
+    output_intermediate_states: bool = False
 ) -> Tuple[torch.Tensor, torch.Tensor]:
     r"""
     Args:
         q (torch.Tensor):
             queries of shape `[B, H, T, K]` if `head_first=True` else `[B, T, H, K]`.
         k (torch.Tensor):
-            keys of shape `[B, H, T, K]` if `head_first=True` else `[B, T, H, K]`.
+            keys of shape `[B, HK, T, K]` if `head_first=True` else `[B, T, HK, K]`.
+            For grouped-query attention, `HK` can be a divisor of `H`,
+            with each group of `H // HK` consecutive query heads sharing the same key/value head.
         v (torch.Tensor):
-            values of shape `[B, H, T, V]` if `head_first=True` else `[B, T, H, V]`.
+            values of shape `[B, HK, T, V]` if `head_first=True` else `[B, T, HK, V]`.
         gk (torch.Tensor):
-            Forget gates of shape `[B, H, T, K]` if `head_first=True` else `[B, T, H, K]` applied to keys.
+            Forget gates of shape `[B, HK, T, K]` if `head_first=True` else `[B, T, HK, K]` applied to keys.
         gv (torch.Tensor):
-            Forget gates of shape `[B, H, T, V]` if `head_first=True` else `[B, T, H, V]` applied to values.
+            Forget gates of shape `[B, HK, T, V]` if `head_first=True` else `[B, T, HK, V]` applied to values.
         scale (Optional[int]):
             Scale factor for the attention scores.
             If not provided, it will default to `1 / sqrt(K)`. Default: `None`.
         initial_state (Optional[torch.Tensor]):
-            Initial state of shape `[N, H, K, V]` for `N` input sequences.
+            Initial state of shape `[N, HK, K, V]` for `N` input sequences.
             For equal-length input sequences, `N` equals the batch size `B`.
             Default: `None`.
         output_final_state (Optional[bool]):
-            Whether to output the final state of shape `[N, H, K, V]`. Default: `False`.
+            Whether to output the final state of shape `[N, HK, K, V]`. Default: `False`.
         reverse (Optional[bool]):
             If `True`, process the state passing in reverse order. Default: `False`.
         cu_seqlens (torch.LongTensor):
@@ -50,12 +54,22 @@ def fused_recurrent_gla(
         head_first (Optional[bool]):
             Whether the inputs are in the head-first format, which is not supported for variable-length inputs.
             Default: `True`.
+        state_indices (Optional[torch.LongTensor]):
+            Indices of shape `[N]` mapping each input sequence to a slot of `initial_state`,
+            which is then a float32 state pool of shape `[S, HK, K, V]` for `S` slots.
+            The final states are written back to the same slots in-place, and the pool is returned as `final_state`.
+            Only supported for inference. Default: `None`.
+        output_intermediate_states (Optional[bool]):
+            Whether to return the states after each token of shape `[B, HK, T, K, V]` if `head_first=True`
+            else `[B, T, HK, K, V]` instead of the final state,
+            e.g., to roll back rejected draft tokens in speculative decoding.
+            Only supported for inference. Default: `False`.
 
     Returns:
         o (torch.Tensor):
             Outputs of shape `[B, H, T, V]` if `head_first=True` else `[B, T, H, V]`.
         final_state (torch.Tensor):
-            Final state of shape `[N, H, K, V]` if `output_final_state=True` else `None`.
+            Final state of shape `[N, HK, K, V]` if `output_final_state=True` else `None`.
 
     Examples::
         >>> import torch
@@ -91,9 +105,12 @@ def fused_recurrent_gla(
                              f"Please flatten variable-length inputs before processing.")
         if head_first:
             raise RuntimeError("Sequences with variable lengths are not supported for head-first mode")
-        if initial_state is not None and initial_state.shape[0] != len(cu_seqlens) - 1:
+        if state_indices is None and initial_state is not None and initial_state.shape[0] != len(cu_seqlens) - 1:
             raise ValueError(f"The number of initial states is expected to be equal to the number of input sequences, "
                              f"i.e., {len(cu_seqlens) - 1} rather than {initial_state.shape[0]}.")
+    if q.shape[1 if head_first else 2] % k.shape[1 if head_first else 2] != 0:
+        raise ValueError(f"The number of query heads ({q.shape[1 if head_first else 2]}) is expected to be "
+                         f"a multiple of the number of key/value heads ({k.shape[1 if head_first else 2]}).")
     if scale is None:
         scale = k.shape[-1] ** -0.5
     o, final_state = fused_recurrent(
@@ -108,6 +125,8 @@ def fused_recurrent_gla(
         output_final_state=output_final_state,
         reverse=reverse,
         cu_seqlens=cu_seqlens,
-        head_first=head_first
+        head_first=head_first,
+        state_indices=state_indices,
+        output_intermediate_states=output_intermediate_states
     )
     return o, final_state
@@ -1033,8 +1033,9 @@ def chunk_gsa_bwd(
     )
 
     ds = dsv.add_(dsk)
-    if q.shape[1] != k.shape[1]:
-        dk, dv, ds, dg = map(lambda x: reduce(x, 'b (h g) ... -> b h ...', 'sum', h=k.shape[1]), (dk, dv, ds, dg))
+    if q.shape[1 if head_first else 2] != k.shape[1 if head_first else 2]:
+        pattern = 'b (h g) ... -> b h ...' if head_first else 'b t (h g) ... -> b t h ...'
+        dk, dv, ds, dg = map(lambda x: reduce(x, pattern, 'sum', h=k.shape[1 if head_first else 2]), (dk, dv, ds, dg))
     dg = dg.to(s.dtype)
     return dq, dk, dv, ds, dg, dhk0, dhv0
 
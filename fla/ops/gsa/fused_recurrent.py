@@ -9,7 +9,7 @@ import triton.language as tl
 
 from fla.ops.common.fused_recurrent import fused_recurrent_bwd_kernel, fused_recurrent_fwd_kernel
 from fla.ops.utils import chunk_global_cumsum
-from fla.utils import autocast_custom_bwd, autocast_custom_fwd, input_guard
+from fla.utils import autocast_custom_bwd, autocast_custom_fwd, input_guard, row_stride
 
 
 @triton.jit
@@ -183,11 +183,17 @@ def fused_recurrent_gsa_fwd(
         o=ok,
         h0=hk0,
         ht=hkt,
+        hs=None,
         offsets=offsets,
+        state_indices=None,
         scale=scale,
+        stride_q=row_stride(q),
+        stride_k=row_stride(k),
+        stride_v=row_stride(s),
         B=B,
         T=T,
         H=H,
+        NG=1,
         K=K,
         V=M,
         BK=BK,
@@ -214,11 +220,17 @@ def fused_recurrent_gsa_fwd(
         o=ov,
         h0=hv0,
         ht=hvt,
+        hs=None,
         offsets=offsets,
+        state_indices=None,
         scale=1.,
+        stride_q=row_stride(qv),
+        stride_k=row_stride(s),
+        stride_v=row_stride(v),
         B=B,
         T=T,
         H=H,
+        NG=1,
         K=M,
         V=V,
         BK=BM,
@@ -289,9 +301,13 @@ def fused_recurrent_gsa_bwd(
         dh0=dhv0,
         offsets=offsets,
         scale=1.,
+        stride_q=row_stride(qv),
+        stride_k=row_stride(s),
+        stride_v=row_stride(v),
         B=B,
         T=T,
         H=H,
+        NG=1,
         K=M,
         V=V,
         BK=BM,
@@ -337,9 +353,13 @@ def fused_recurrent_gsa_bwd(
         dh0=dhk0,
         offsets=offsets,
         scale=scale,
+        stride_q=row_stride(q),
+        stride_k=row_stride(k),
+        stride_v=row_stride(s),
         B=B,
         T=T,
         H=H,
+        NG=1,
         K=K,
         V=M,
         BK=BK,
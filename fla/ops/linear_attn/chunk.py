@@ -61,5 +61,8 @@ def chunk_linear_attn(
         head_first=head_first
     )
     if normalize:
-        o = normalize_output(q * scale, k, o)
+        if head_first:
+            o = normalize_output(q * scale, k, o)
+        else:
+            o = normalize_output(q.transpose(1, 2) * scale, k.transpose(1, 2), o.transpose(1, 2)).transpose(1, 2)
     return o, final_state
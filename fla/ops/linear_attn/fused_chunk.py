@@ -8,7 +8,7 @@ import triton
 import triton.language as tl
 from packaging import version
 
-from fla.ops.linear_attn.utils import normalize_output
+from fla.ops.linear_attn.utils import normalize_output, normalize_output_varlen
 from fla.utils import autocast_custom_bwd, autocast_custom_fwd, input_guard
 
 
@@ -20,6 +20,7 @@ def fused_chunk_linear_attn_fwd_kernel(
     o,  # output [B, H, T, V]
     h0,
     ht,
+    offsets,
     scale,
     B,  # batch size
     H,  # H
@@ -31,10 +32,21 @@ def fused_chunk_linear_attn_fwd_kernel(
     BV: tl.constexpr,  # BLOCK SIZE along the V dimension
     USE_INITIAL_STATE: tl.constexpr,
     STORE_FINAL_STATE: tl.constexpr,
+    USE_OFFSETS: tl.constexpr,
     CHECK: tl.constexpr
 ):
     # indices
     i_v, i_k, i_bh = tl.program_id(0), tl.program_id(1), tl.program_id(2)
+    i_n, i_h = i_bh // H, i_bh % H
+    if USE_OFFSETS:
+        bos, eos = tl.load(offsets + i_n).to(tl.int32), tl.load(offsets + i_n + 1).to(tl.int32)
+        all = T
+        T = eos - bos
+        # the start of the current sequence and head in the packed inputs of shape `[1, H, all, ...]`
+        i_s = i_h * all + bos
+    else:
+        all = T
+        i_s = i_bh * T
 
     o_i = tl.arange(0, BT)
 
@@ -44,10 +56,10 @@ def fused_chunk_linear_attn_fwd_kernel(
     b_h = tl.zeros([BK, BV], dtype=tl.float32)
 
     # make block pointers
-    p_q = tl.make_block_ptr(q + i_bh * T*K, (T, K), (K, 1), (0, i_k * BK), (BT, BK), (1, 0))
-    p_k = tl.make_block_ptr(k + i_bh * T*K, (K, T), (1, K), (i_k * BK, 0), (BK, BT), (0, 1))
-    p_v = tl.make_block_ptr(v + i_bh * T*V, (T, V), (V, 1), (0, i_v * BV), (BT, BV), (1, 0))
-    p_o = tl.make_block_ptr(o + (i_bh+i_k*B*H) * T*V, (T, V), (V, 1), (0, i_v * BV), (BT, BV), (1, 0))
+    p_q = tl.make_block_ptr(q + i_s*K, (T, K), (K, 1), (0, i_k * BK), (BT, BK), (1, 0))
+    p_k = tl.make_block_ptr(k + i_s*K, (K, T), (1, K), (i_k * BK, 0), (BK, BT), (0, 1))
+    p_v = tl.make_block_ptr(v + i_s*V, (T, V), (V, 1), (0, i_v * BV), (BT, BV), (1, 0))
+    p_o = tl.make_block_ptr(o + (i_k*B*H*all + i_s)*V, (T, V), (V, 1), (0, i_v * BV), (BT, BV), (1, 0))
 
     if USE_INITIAL_STATE:
         p_h0 = tl.make_block_ptr(h0 + i_bh * K * V, (K, V), (V, 1), (i_k * BK, i_v * BV), (BK, BV), (1, 0))
@@ -94,6 +106,7 @@ def fused_chunk_linear_attn_bwd_kernel(
     dk,  # gradient of key [NV, B, H, T, K]
     dv,  # gradient of value [NK, B, H, T, V]
     h0,  # initial state of the chunk [B, H, K, V]
+    offsets,
     scale,  # K ** -0.5
     B,  # B
     H,  # H
@@ -104,9 +117,20 @@ def fused_chunk_linear_attn_bwd_kernel(
     BK: tl.constexpr,  # BLOCK SIZE along the K dimension
     BV: tl.constexpr,  # BLOCK SIZE along the V dimension
     USE_INITIAL_STATE: tl.constexpr,
+    USE_OFFSETS: tl.constexpr,
     CHECK: tl.constexpr
 ):
     i_v, i_k, i_bh = tl.program_id(0), tl.program_id(1), tl.program_id(2)
+    i_n, i_h = i_bh // H, i_bh % H
+    if USE_OFFSETS:
+        bos, eos = tl.load(offsets + i_n).to(tl.int32), tl.load(offsets + i_n + 1).to(tl.int32)
+        all = T
+        T = eos - bos
+        # the start of the current sequence and head in the packed inputs of shape `[1, H, all, ...]`
+        i_s = i_h * all + bos
+    else:
+        all = T
+        i_s = i_bh * T
     o_i = tl.arange(0, BT)
 
     m_s = o_i[:, None] >= o_i[None, :]
@@ -117,10 +141,10 @@ def fused_chunk_linear_attn_bwd_kernel(
         b_h = tl.load(p_h, boundary_check=(0, 1)).to(tl.float32)
 
     for i in range(0, tl.cdiv(T, BT)):
-        p_k = tl.make_block_ptr(k + i_bh * T*K, (T, K), (K, 1), (i * BT, i_k * BK), (BT, BK), (1, 0))
-        p_v = tl.make_block_ptr(v + i_bh * T*V, (V, T), (1, V), (i_v * BV, i * BT), (BV, BT), (0, 1))
-        p_do = tl.make_block_ptr(do + i_bh * T*V, (T, V), (V, 1), (i * BT, i_v * BV), (BT, BV), (1, 0))
-        p_dq = tl.make_block_ptr(dq + (i_bh + i_v*B*H) * T*K, (T, K), (K, 1), (i*BT, i_k*BK), (BT, BK), (1, 0))
+        p_k = tl.make_block_ptr(k + i_s*K, (T, K), (K, 1), (i * BT, i_k * BK), (BT, BK), (1, 0))
+        p_v = tl.make_block_ptr(v + i_s*V, (V, T), (1, V), (i_v * BV, i * BT), (BV, BT), (0, 1))
+        p_do = tl.make_block_ptr(do + i_s*V, (T, V), (V, 1), (i * BT, i_v * BV), (BT, BV), (1, 0))
+        p_dq = tl.make_block_ptr(dq + (i_v*B*H*all + i_s)*K, (T, K), (K, 1), (i*BT, i_k*BK), (BT, BK), (1, 0))
 
         # [BT, BK]
         b_k = tl.load(p_k, boundary_check=(0, 1))
@@ -151,12 +175,12 @@ def fused_chunk_linear_attn_bwd_kernel(
     b_dh = tl.zeros([BK, BV], dtype=tl.float32)
     m_s = o_i[:, None] <= o_i[None, :]
     for i in range(1, tl.cdiv(T, BT) + 1):
-        p_q = tl.make_block_ptr(q + i_bh * T*K, (K, T), (1, K), (i_k * BK, T - i * BT), (BK, BT), (0, 1))
-        p_k = tl.make_block_ptr(k + i_bh * T*K, (T, K), (K, 1), (T - i * BT, i_k * BK), (BT, BK), (1, 0))
-        p_v = tl.make_block_ptr(v + i_bh * T*V, (T, V), (V, 1), (T - i * BT, i_v * BV), (BT, BV), (1, 0))
-        p_do = tl.make_block_ptr(do + i_bh * T*V, (T, V), (V, 1), (T - i * BT, i_v * BV), (BT, BV), (1, 0))
-        p_dk = tl.make_block_ptr(dk + (i_bh+i_v*B*H) * T*K, (T, K), (K, 1), (T - i*BT, i_k*BK), (BT, BK), (1, 0))
-        p_dv = tl.make_block_ptr(dv + (i_bh+i_k*B*H) * T*V, (T, V), (V, 1), (T - i*BT, i_v*BV), (BT, BV), (1, 0))
+        p_q = tl.make_block_ptr(q + i_s*K, (K, T), (1, K), (i_k * BK, T - i * BT), (BK, BT), (0, 1))
+        p_k = tl.make_block_ptr(k + i_s*K, (T, K), (K, 1), (T - i * BT, i_k * BK), (BT, BK), (1, 0))
+        p_v = tl.make_block_ptr(v + i_s*V, (T, V), (V, 1), (T - i * BT, i_v * BV), (BT, BV), (1, 0))
+        p_do = tl.make_block_ptr(do + i_s*V, (T, V), (V, 1), (T - i * BT, i_v * BV), (BT, BV), (1, 0))
+        p_dk = tl.make_block_ptr(dk + (i_v*B*H*all + i_s)*K, (T, K), (K, 1), (T - i*BT, i_k*BK), (BT, BK), (1, 0))
+        p_dv = tl.make_block_ptr(dv + (i_k*B*H*all + i_s)*V, (T, V), (V, 1), (T - i*BT, i_v*BV), (BT, BV), (1, 0))
         # [BK, BT]
         b_q = tl.load(p_q, boundary_check=(0, 1))
         b_q = (b_q * scale).to(b_q.dtype)
@@ -194,8 +218,9 @@ class FusedChunkLinearAttentionFunction(torch.autograd.Function):
     @staticmethod
     @input_guard
     @autocast_custom_fwd
-    def forward(ctx, q, k, v, scale, initial_state, output_final_state):
+    def forward(ctx, q, k, v, scale, initial_state, output_final_state, offsets):
         B, H, T, K, V = *k.shape, v.shape[-1]
+        N = B if offsets is None else len(offsets) - 1
         BT = 64
         BK, BV = min(triton.next_power_of_2(K), 64), min(triton.next_power_of_2(V), 64)
         NK, NV = triton.cdiv(K, BK), triton.cdiv(V, BV)
@@ -203,7 +228,7 @@ class FusedChunkLinearAttentionFunction(torch.autograd.Function):
         num_stages = 1
 
         o = q.new_empty(NK, B, H, T, V)
-        final_state = q.new_empty(B, H, K, V, dtype=torch.float) if output_final_state else None
+        final_state = q.new_empty(N, H, K, V, dtype=torch.float) if output_final_state else None
         # the bug still exists even for Triton 2.2 on H100 GPUs
         # so we always enable initial checks
         CHECK = True
@@ -218,13 +243,14 @@ class FusedChunkLinearAttentionFunction(torch.autograd.Function):
             )
             CHECK = True
 
-        grid = (NV, NK, B * H)
+        grid = (NV, NK, N * H)
         fused_chunk_linear_attn_fwd_kernel[grid](
-            q, k, v, o, initial_state, final_state,
+            q, k, v, o, initial_state, final_state, offsets,
             scale,
             B=B, H=H, T=T, K=K, V=V, BT=BT, BK=BK, BV=BV,
             USE_INITIAL_STATE=initial_state is not None,
             STORE_FINAL_STATE=output_final_state,
+            USE_OFFSETS=offsets is not None,
             CHECK=CHECK,
             num_warps=num_warps,
             num_stages=num_stages
@@ -233,6 +259,7 @@ class FusedChunkLinearAttentionFunction(torch.autograd.Function):
 
         ctx.save_for_backward(q, k, v, initial_state)
         ctx.scale = scale
+        ctx.offsets = offsets
         ctx.CHECK = CHECK
         return o.to(q.dtype), final_state
 
@@ -241,7 +268,9 @@ class FusedChunkLinearAttentionFunction(torch.autograd.Function):
     @autocast_custom_bwd
     def backward(ctx, do, dht=None):
         q, k, v, initial_state = ctx.saved_tensors
+        offsets = ctx.offsets
         B, H, T, K, V = *k.shape, v.shape[-1]
+        N = B if offsets is None else len(offsets) - 1
         scale = ctx.scale
 
         BT = 64
@@ -253,13 +282,14 @@ class FusedChunkLinearAttentionFunction(torch.autograd.Function):
         dq = q.new_empty(NV, B, H, T, K)
         dk = q.new_empty(NV, B, H, T, K)
         dv = q.new_empty(NK, B, H, T, V)
-        grid = (NV, NK, B * H)
+        grid = (NV, NK, N * H)
 
         fused_chunk_linear_attn_bwd_kernel[grid](
-            q, k, v, do, dq, dk, dv, initial_state,
+            q, k, v, do, dq, dk, dv, initial_state, offsets,
             scale,
             B=B, H=H, T=T, K=K, V=V, BT=BT, BK=BK, BV=BV,
             USE_INITIAL_STATE=initial_state is not None,
+            USE_OFFSETS=offsets is not None,
             CHECK=ctx.CHECK,
             num_warps=num_warps,
             num_stages=num_stages
@@ -267,7 +297,7 @@ class FusedChunkLinearAttentionFunction(torch.autograd.Function):
         dq = dq.sum(0)
         dk = dk.sum(0)
         dv = dv.sum(0)
-        return dq.to(q.dtype), dk.to(k.dtype), dv.to(v.dtype), None, None, None
+        return dq.to(q.dtype), dk.to(k.dtype), dv.to(v.dtype), None, None, None, None
 
 
 def fused_chunk_linear_attn(
@@ -278,6 +308,7 @@ def fused_chunk_linear_attn(
     initial_state: torch.Tensor = None,
     output_final_state: bool = False,
     normalize: bool = True,
+    cu_seqlens: Optional[torch.LongTensor] = None,
     head_first: bool = True
 ) -> Tuple[torch.Tensor, torch.Tensor]:
     r"""
@@ -292,27 +323,53 @@ def fused_chunk_linear_attn(
             Scale factor for linear attention scores.
             If not provided, it will default to `1 / sqrt(K)`. Default: `None`.
         initial_state (Optional[torch.Tensor]):
-            Initial state of shape `[B, H, K, V]`. Default: `None`.
+            Initial state of shape `[N, H, K, V]` for `N` input sequences.
+            For equal-length input sequences, `N` equals the batch size `B`.
+            Default: `None`.
         output_final_state (Optional[bool]):
-            Whether to output the final state of shape `[B, H, K, V]`. Default: `False`.
+            Whether to output the final state of shape `[N, H, K, V]`. Default: `False`.
         normalize (bool):
             Whether to normalize the output. Default: `True`.
+        cu_seqlens (torch.LongTensor):
+            Cumulative sequence lengths of shape `[N+1]` used for variable-length training,
+            consistent with the FlashAttention API.
         head_first (Optional[bool]):
-            Whether the inputs are in the head-first format. Default: `True`.
+            Whether the inputs are in the head-first format, which is not supported for variable-length inputs.
+            Default: `True`.
 
     Returns:
         o (torch.Tensor):
             Outputs of shape `[B, H, T, V]` if `head_first=True` else `[B, T, H, V]`
         final_state (torch.Tensor):
-            Final state of shape `[B, H, K, V]` if `output_final_state=True` else `None`
+            Final state of shape `[N, H, K, V]` if `output_final_state=True` else `None`
     """
+    if cu_seqlens is not None:
+        if q.shape[0] != 1:
+            raise ValueError(f"The batch size is expected to be 1 rather than {q.shape[0]} when using `cu_seqlens`."
+                             f"Please flatten variable-length inputs before processing.")
+        if head_first:
+            raise RuntimeError("Sequences with variable lengths are not supported for head-first mode")
+        if initial_state is not None and initial_state.shape[0] != len(cu_seqlens) - 1:
+            raise ValueError(f"The number of initial states is expected to be equal to the number of input sequences, "
+                             f"i.e., {len(cu_seqlens) - 1} rather than {initial_state.shape[0]}.")
     if scale is None:
         scale = q.shape[-1] ** -0.5
     if not head_first:
         q, k, v = map(lambda x: x.transpose(1, 2), (q, k, v))
-    o, final_state = FusedChunkLinearAttentionFunction.apply(q, k, v, scale, initial_state, output_final_state)
+    o, final_state = FusedChunkLinearAttentionFunction.apply(
+        q,
+        k,
+        v,
+        scale,
+        initial_state,
+        output_final_state,
+        cu_seqlens
+    )
     if normalize:
-        o = normalize_output(q * scale, k, o)
+        if cu_seqlens is None:
+            o = normalize_output(q * scale, k, o)
+        else:
+            o = normalize_output_varlen(q * scale, k, o, cu_seqlens)
     if not head_first:
         o = o.transpose(1, 2)
     return o, final_state
@@ -2,9 +2,18 @@
 
 import torch
 
+from fla.ops.common.utils import prepare_lens
+
 
 @torch.jit.script
 def normalize_output(q, k, o):
     k = k.cumsum(-2)
     z = (q * k).sum(-1, keepdim=True)
     return o / (z + 1e-10)
+
+
+def normalize_output_varlen(q, k, o, offsets):
+    # the cumulative sums of keys are restarted at the beginning of each sequence
+    k = torch.cat([i.cumsum(-2) for i in k.split(prepare_lens(offsets).tolist(), -2)], -2)
+    z = (q * k).sum(-1, keepdim=True)
+    return o / (z + 1e-10)
@@ -967,7 +967,7 @@ class ParallelNSACompressionFunction(torch.autograd.Function):
         # for example, if the passed `offsets` is [0, 2, 6],
         # then there are 2 and 4 tokens in the 1st and 2nd sequences respectively, and `token_indices` will be
         # [[0, 0], [0, 1], [1, 0], [1, 1], [1, 2], [1, 3]]
-        token_indices = prepare_token_indices(offsets) if offsets is not None else None
+        token_indices = prepare_token_indices(offsets, q.shape[1]) if offsets is not None else None
 
         o, lse = parallel_nsa_compression_fwd(
             q=q,
@@ -1024,7 +1024,7 @@ def parallel_nsa_topk(
     BK = triton.next_power_of_2(K)
 
     block_indices = torch.zeros(B, T, H, S, dtype=torch.int32, device=q.device)
-    token_indices = prepare_token_indices(offsets) if offsets is not None else None
+    token_indices = prepare_token_indices(offsets, q.shape[1]) if offsets is not None else None
     chunk_offsets = prepare_chunk_offsets(offsets, BS) if offsets is not None else None
     grid = (T, B * H)
     parallel_nsa_kernel_topk[grid](
@@ -1254,7 +1254,7 @@ class ParallelNSAFunction(torch.autograd.Function):
         # for example, if the passed `offsets` is [0, 2, 6],
         # then there are 2 and 4 tokens in the 1st and 2nd sequences respectively, and `token_indices` will be
         # [[0, 0], [0, 1], [1, 0], [1, 1], [1, 2], [1, 3]]
-        token_indices = prepare_token_indices(offsets) if offsets is not None else None
+        token_indices = prepare_token_indices(offsets, q.shape[1]) if offsets is not None else None
 
         o, lse = parallel_nsa_fwd(
             q=q,
@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 
+from .fused_recurrent import fused_recurrent_rebased
 from .parallel import parallel_rebased
 
 __all__ = [
+    'fused_recurrent_rebased',
     'parallel_rebased'
 ]
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023-2025, Songlin Yang, Yu Zhang
+
+from typing import Optional, Tuple
+
+import torch
+
+from fla.ops.based.fused_recurrent import FusedRecurrentBasedFunction
+
+
+def fused_recurrent_rebased(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    eps: float = 1e-5,
+    use_scale: bool = True,
+    use_normalize: bool = True,
+    initial_state: Optional[torch.Tensor] = None,
+    output_final_state: bool = False,
+    head_first: bool = True
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    r"""
+    Args:
+        q (torch.Tensor):
+            queries of shape `[B, H, T, K]` if `head_first=True` else `[B, T, H, K]`
+        k (torch.Tensor):
+            keys of shape `[B, H, T, K]` if `head_first=True` else `[B, T, H, K]`
+        v (torch.Tensor):
+            values of shape `[B, H, T, V]` if `head_first=True` else `[B, T, H, V]`
+        eps (float):
+            The epsilon added to the normalizer. Default: `1e-5`.
+        use_scale (bool):
+            Whether to scale the attention scores by `1 / sqrt(K)`. Default: `True`.
+        use_normalize (bool):
+            Whether to normalize the output. Default: `True`.
+        initial_state (Optional[torch.Tensor]):
+            Initial state of shape `[B, H, K*K, V + 1]`. Default: `None`.
+        output_final_state (Optional[bool]):
+            Whether to output the final state of shape `[B, H, K*K, V + 1]`. Default: `False`.
+        head_first (Optional[bool]):
+            Whether the inputs are in the head-first format. Default: `True`.
+
+    Returns:
+        o (torch.Tensor):
+            Outputs of shape `[B, H, T, V]` if `head_first=True` else `[B, T, H, V]`
+        final_state (torch.Tensor):
+            Final state of shape `[B, H, K*K, V + 1]` if `output_final_state=True` else `None`
+
+    The state keeps the sums of `vec(k k^T)` multiplied by `[v, 1]`, whose last column serves as the normalizer.
+    """
+    assert q.shape[-1] <= 16, 'only support feature dimension up to 16.'
+    scale = q.shape[-1] ** -0.5 if use_scale else 1
+    if not head_first:
+        q, k, v = map(lambda x: x.transpose(1, 2), (q, k, v))
+    o, final_state = FusedRecurrentBasedFunction.apply(q, k, v, scale, initial_state, output_final_state, False)
+    o, z = o[..., :-1], o[..., -1]
+    if use_normalize:
+        o = o / (z[..., None] + eps)
+    if not head_first:
+        o = o.transpose(1, 2)
+    return o.to(q.dtype), final_state
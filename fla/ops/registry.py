@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+
+# A registry mapping each op family to its implementations, one per kernel mode,
+# along with a cost model picking the cheapest mode for the shape and device of each call.
+# It replaces the fixed `fused_recurrent` threshold the layers used to switch on for short sequences:
+# the crossover between recurrent and chunked kernels moves with the batch size, head dims and hardware,
+# so instead each mode is priced as a fixed launch overhead, a cost per sequential step
+# and a cost per FLOP, with coefficients that can be calibrated on the running device.
+
+import importlib
+import json
+import math
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import torch
+import torch.nn.functional as F
+
+
+class OpSpec:
+    r"""
+    An implementation of an op family in one kernel mode.
+
+    Args:
+        fn (Union[str, Callable]):
+            The op, or its import path in the form of `module:name`, imported on first use.
+        backward (bool):
+            Whether the op supports backpropagation. Default: `True`.
+    """
+
+    def __init__(self, fn: Union[str, Callable], backward: bool = True):
+        self._fn = fn
+        self.backward = backward
+
+    @property
+    def fn(self) -> Callable:
+        if isinstance(self._fn, str):
+            module, name = self._fn.split(':')
+            self._fn = getattr(importlib.import_module(module), name)
+        return self._fn
+
+
+# the inputs of each family besides `q`, `k` and `v`, used to generate random inputs when calibrating
+FAMILY_INPUTS: Dict[str, Tuple[str, ...]] = {}
+OP_REGISTRY: Dict[str, Dict[str, OpSpec]] = {}
+
+
+def register_op(
+    family: str,
+    mode: str,
+    fn: Union[str, Callable],
+    backward: bool = True,
+    inputs: Optional[Tuple[str, ...]] = None
+) -> None:
+    r"""
+    Registers `fn` as the `mode` implementation of `family`.
+
+    Args:
+        family (str):
+            The op family, e.g., `gla`.
+        mode (str):
+            The kernel mode, e.g., `chunk`, `fused_chunk`, `fused_recurrent` or `parallel`.
+        fn (Union[str, Callable]):
+            The op, or its import path in the form of `module:name`.
+        backward (bool):
+            Whether the op supports backpropagation. Default: `True`.
+        inputs (Optional[Tuple[str, ...]]):
+            Names of the inputs following `q`, `k` and `v`, among
+            `g` (`[B, T, H]` log decays), `gk` (`[B, T, H, K]` log decays) and `beta` (`[B, T, H]`).
+            Families registered without inputs are not calibrated. Default: `None`.
+    """
+    OP_REGISTRY.setdefault(family, {})[mode] = OpSpec(fn, backward)
+    if inputs is not None:
+        FAMILY_INPUTS[family] = inputs
+
+
+def get_op(family: str, mode: str) -> Callable:
+    try:
+        return OP_REGISTRY[family][mode].fn
+    except KeyError:
+        raise KeyError(f"No `{mode}` implementation registered for `{family}`, "
+                       f"available: {list(OP_REGISTRY.get(family, {}))}.")
+
+
+for family, modes, inputs in [
+    ('gla', ('chunk', 'fused_chunk', 'fused_recurrent'), ('gk',)),
+    ('simple_gla', ('chunk', 'fused_recurrent', 'parallel'), ('g',)),
+    ('retention', ('chunk', 'fused_chunk', 'fused_recurrent', 'parallel'), ()),
+    ('delta_rule', ('chunk', 'fused_recurrent'), ('beta',)),
+    ('gated_delta_rule', ('chunk', 'fused_recurrent'), ('g', 'beta')),
+    ('linear_attn', ('chunk', 'fused_chunk', 'fused_recurrent'), ()),
+    ('abc', ('chunk', 'fused_recurrent'), None),
+    ('gsa', ('chunk', 'fused_recurrent'), None),
+    ('hgrn', ('chunk', 'fused_recurrent'), None),
+    ('rwkv6', ('chunk', 'fused_recurrent'), None),
+    ('rwkv7', ('chunk', 'fused_recurrent'), None),
+    ('based', ('fused_chunk', 'fused_recurrent', 'parallel'), None),
+    ('rebased', ('fused_recurrent', 'parallel'), None),
+]:
+    for mode in modes:
+        # the recurrent gated delta rule, abc and based kernels are forward only
+        backward = not (family in ('gated_delta_rule', 'abc', 'based', 'rebased') and mode == 'fused_recurrent')
+        register_op(family, mode, f'fla.ops.{family}:{mode}_{family}', backward, inputs)
+
+
+# coefficients of the cost of each mode in microseconds, keyed by `device/family/mode`,
+# with `*` in place of the family for the defaults shared by all families:
+# a fixed overhead, a cost per sequential step and a cost per GFLOP
+DEFAULT_COSTS: Dict[str, Tuple[float, float, float]] = {
+    # on GPUs, the recurrent kernels are a single launch but walk through the tokens one by one
+    # on CUDA cores, while the chunked ones pay for several launches and run on tensor cores
+    'cuda/*/fused_recurrent': (10., 0.5, 80.),
+    'cuda/*/fused_chunk': (15., 2., 30.),
+    'cuda/*/chunk': (40., 1., 20.),
+    'cuda/*/parallel': (20., 0., 20.),
+    # the PyTorch implementations in `fla.ops.common.cpu`, where each step is a handful of small ops
+    'cpu/*/fused_recurrent': (50., 150., 20000.),
+    'cpu/*/chunk': (500., 300., 5000.),
+}
+# chunk size of the chunked kernels
+CHUNK_SIZE = 64
+
+
+def estimate_flops(mode: str, B: int, T: int, H: int, K: int, V: int) -> float:
+    if mode == 'fused_recurrent':
+        return 4. * B * H * T * K * V
+    if mode == 'parallel':
+        return 1. * B * H * T * T * (K + V)
+    return B * H * T * (4. * K * V + 2. * CHUNK_SIZE * (K + V))
+
+
+def estimate_steps(mode: str, T: int) -> int:
+    if mode == 'fused_recurrent':
+        return T
+    if mode == 'parallel':
+        return 1
+    return math.ceil(T / CHUNK_SIZE)
+
+
+class ModeSelector:
+    r"""
+    Picks the cheapest kernel mode for each call of an op family from a table of cost coefficients.
+
+    The cost of a mode is estimated as `overhead + step * num_steps + gflop * num_gflops`,
+    where the steps are the tokens processed sequentially by the recurrent kernels,
+    or the chunks whose states are passed sequentially by the chunked ones.
+    The default coefficients put the crossover on GPUs at around 64 tokens, as the fixed threshold used to,
+    and can be fitted on the running device with :meth:`calibrate`.
+
+    Args:
+        costs (Optional[Dict[str, Tuple[float, float, float]]]):
+            Coefficients keyed by `device/family/mode`, `*` standing for any family.
+            Defaults to the ones of `DEFAULT_COSTS`.
+        path (Optional[str]):
+            A JSON file of calibrated coefficients to load. Defaults to `$FLA_MODE_COSTS` if set.
+    """
+
+    def __init__(
+        self,
+        costs: Optional[Dict[str, Tuple[float, float, float]]] = None,
+        path: Optional[str] = None
+    ):
+        self.costs = dict(DEFAULT_COSTS if costs is None else costs)
+        path = path or os.environ.get('FLA_MODE_COSTS', None)
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def coefficients(self, device: str, family: str, mode: str) -> Optional[Tuple[float, float, float]]:
+        # devices without coefficients of their own, e.g., XPUs, are priced like GPUs
+        if not any(key.startswith(f'{device}/') for key in self.costs):
+            device = 'cuda'
+        return self.costs.get(f'{device}/{family}/{mode}', self.costs.get(f'{device}/*/{mode}', None))
+
+    def cost(
+        self,
+        family: str,
+        mode: str,
+        batch_size: int,
+        seq_len: int,
+        num_heads: int,
+        head_k_dim: int,
+        head_v_dim: int,
+        device: str = 'cuda'
+    ) -> float:
+        coefficients = self.coefficients(device, family, mode)
+        if coefficients is None:
+            return math.inf
+        overhead, step, gflop = coefficients
+        steps = estimate_steps(mode, seq_len)
+        flops = estimate_flops(mode, batch_size, seq_len, num_heads, head_k_dim, head_v_dim)
+        return overhead + step * steps + gflop * flops / 1e9
+
+    def select(
+        self,
+        family: str,
+        modes: Iterable[str],
+        batch_size: int,
+        seq_len: int,
+        num_heads: int,
+        head_k_dim: int,
+        head_v_dim: int,
+        device: str = 'cuda',
+        requires_grad: bool = False
+    ) -> str:
+        r"""
+        Returns the cheapest of `modes` registered for `family`, or the first one if none of them is priced.
+        Modes without backward support are skipped if `requires_grad`.
+        """
+        modes = list(dict.fromkeys(modes))
+        registered = OP_REGISTRY.get(family, {})
+        candidates = [m for m in modes if m in registered and (registered[m].backward or not requires_grad)]
+        if not candidates:
+            return modes[0]
+        costs = [self.cost(family, m, batch_size, seq_len, num_heads, head_k_dim, head_v_dim, device) for m in candidates]
+        best = min(range(len(candidates)), key=costs.__getitem__)
+        return candidates[best] if costs[best] < math.inf else modes[0]
+
+    @torch.no_grad()
+    def calibrate(
+        self,
+        family: str,
+        shapes: Iterable[Tuple[int, int, int, int, int]],
+        modes: Optional[Iterable[str]] = None,
+        device: Optional[str] = None,
+        dtype: torch.dtype = torch.bfloat16,
+        warmup: int = 3,
+        rep: int = 10
+    ) -> Dict[str, Tuple[float, float, float]]:
+        r"""
+        Times the `modes` of `family` on `shapes` of `(B, T, H, K, V)`
+        and fits their coefficients by non-negative least squares.
+
+        Returns:
+            The fitted coefficients, which are also stored in the table.
+        """
+        if family not in FAMILY_INPUTS:
+            raise ValueError(f"`{family}` is not registered with inputs to calibrate on.")
+        if device is None:
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        if device == 'cpu':
+            dtype = torch.float
+        shapes = list(shapes)
+        fitted = {}
+        for mode in (modes or OP_REGISTRY[family]):
+            fn = get_op(family, mode)
+            times, features = [], []
+            for B, T, H, K, V in shapes:
+                inputs = make_inputs(FAMILY_INPUTS[family], B, T, H, K, V, device, dtype)
+                times.append(benchmark(lambda: fn(**inputs, head_first=False), device, warmup, rep))
+                features.append([1., estimate_steps(mode, T), estimate_flops(mode, B, T, H, K, V) / 1e9])
+            fitted[f'{device}/{family}/{mode}'] = tuple(nnls(torch.tensor(features), torch.tensor(times)).tolist())
+        self.costs.update(fitted)
+        return fitted
+
+    def save(self, path: str) -> None:
+        with open(path, 'w') as f:
+            json.dump(self.costs, f, indent=2)
+
+    def load(self, path: str) -> None:
+        with open(path) as f:
+            self.costs.update({key: tuple(value) for key, value in json.load(f).items()})
+
+
+def make_inputs(
+    names: Tuple[str, ...],
+    B: int,
+    T: int,
+    H: int,
+    K: int,
+    V: int,
+    device: str,
+    dtype: torch.dtype
+) -> Dict[str, torch.Tensor]:
+    inputs = dict(
+        q=torch.randn(B, T, H, K, device=device, dtype=dtype),
+        k=F.normalize(torch.randn(B, T, H, K, device=device, dtype=dtype), p=2, dim=-1),
+        v=torch.randn(B, T, H, V, device=device, dtype=dtype)
+    )
+    for name in names:
+        if name == 'g':
+            inputs[name] = F.logsigmoid(torch.randn(B, T, H, device=device, dtype=dtype))
+        elif name == 'gk':
+            inputs[name] = F.logsigmoid(torch.randn(B, T, H, K, device=device, dtype=dtype))
+        elif name == 'beta':
+            inputs[name] = torch.rand(B, T, H, device=device, dtype=dtype).sigmoid()
+        else:
+            raise ValueError(f"Unknown input `{name}`.")
+    return inputs
+
+
+def benchmark(fn: Callable, device: str, warmup: int, rep: int) -> float:
+    # mean time of `fn` in microseconds
+    for _ in range(warmup):
+        fn()
+    if device != 'cpu':
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(rep):
+        fn()
+    if device != 'cpu':
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / rep * 1e6
+
+
+def nnls(A: torch.Tensor, b: torch.Tensor, num_iters: int = 1000) -> torch.Tensor:
+    # projected gradient descent on `||Ax - b||^2` subject to `x >= 0`, on column-normalized features
+    A, b = A.double(), b.double()
+    norm = A.norm(dim=0).clamp_min(1e-12)
+    A = A / norm
+    x = torch.linalg.lstsq(A, b[:, None]).solution[:, 0].clamp_min(0)
+    lr = 1 / torch.linalg.matrix_norm(A, ord=2).pow(2).clamp_min(1e-12)
+    for _ in range(num_iters):
+        x = (x - lr * A.t() @ (A @ x - b)).clamp_min(0)
+    return (x / norm).float()
+
+
+_selector: Optional[ModeSelector] = None
+
+
+def get_mode_selector() -> ModeSelector:
+    global _selector
+    if _selector is None:
+        _selector = ModeSelector()
+    return _selector
+
+
+def select_mode(
+    family: str,
+    modes: Union[str, List[str], Tuple[str, ...]],
+    x: torch.Tensor,
+    num_heads: int,
+    head_k_dim: int,
+    head_v_dim: int,
+    training: bool = False
+) -> str:
+    r"""
+    Picks the mode to run `family` in for inputs `x` of shape `[B, T, ...]`, see :class:`ModeSelector`.
+
+    Args:
+        family (str):
+            The op family.
+        modes (Union[str, List[str], Tuple[str, ...]]):
+            The candidate modes. A single mode is considered along with `fused_recurrent`.
+        x (torch.Tensor):
+            The hidden states of shape `[B, T, ...]`.
+        num_heads (int):
+            The number of heads.
+        head_k_dim (int):
+            The head dimension of queries and keys.
+        head_v_dim (int):
+            The head dimension of values.
+        training (bool):
+            Whether gradients are required, excluding the modes without backward support. Default: `False`.
+    """
+    if isinstance(modes, str):
+        modes = (modes, 'fused_recurrent')
+    return get_mode_selector().select(
+        family=family,
+        modes=modes,
+        batch_size=x.shape[0],
+        seq_len=x.shape[1],
+        num_heads=num_heads,
+        head_k_dim=head_k_dim,
+        head_v_dim=head_v_dim,
+        device=x.device.type,
+        requires_grad=training and torch.is_grad_enabled()
+    )
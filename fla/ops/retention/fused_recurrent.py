@@ -17,7 +17,8 @@ def fused_recurrent_retention(
     output_final_state: bool = False,
     reverse: bool = False,
     cu_seqlens: Optional[torch.LongTensor] = None,
-    head_first: bool = True
+    head_first: bool = True,
+    output_intermediate_states: bool = False
 ) -> Tuple[torch.Tensor, torch.Tensor]:
     if head_first:
         n_heads = q.shape[1]
@@ -38,5 +39,6 @@ def fused_recurrent_retention(
         output_final_state=output_final_state,
         reverse=reverse,
         cu_seqlens=cu_seqlens,
-        head_first=head_first
+        head_first=head_first,
+        output_intermediate_states=output_intermediate_states
     )
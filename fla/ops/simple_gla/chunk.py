@@ -4,10 +4,13 @@
 from typing import Optional, Tuple
 
 import torch
+import torch.distributed as dist
 import triton
 
-from fla.ops.common.chunk_h import chunk_bwd_dh, chunk_fwd_h
+from fla.ops.common.chunk_h import chunk_bwd_dh, chunk_fwd_h, chunk_fwd_h_from_checkpoints, chunk_select_checkpoints
 from fla.ops.common.chunk_o import chunk_bwd_dqkwg, chunk_bwd_dv, chunk_fwd_o
+from fla.ops.common.context_parallel import chunk_context_parallel
+from fla.ops.common.cpu import chunk_simple_gla_cpu
 from fla.ops.utils import chunk_local_cumsum
 from fla.utils import autocast_custom_bwd, autocast_custom_fwd, input_guard
 
@@ -51,7 +54,7 @@ def chunk_simple_gla_fwd(
         head_first=head_first,
         chunk_size=chunk_size
     )
-    return g, o, ht
+    return g, h, o, ht
 
 
 def chunk_simple_gla_bwd(
@@ -66,22 +69,39 @@ def chunk_simple_gla_bwd(
     offsets: Optional[torch.LongTensor] = None,
     indices: Optional[torch.LongTensor] = None,
     head_first: bool = True,
-    chunk_size: int = 64
+    chunk_size: int = 64,
+    h: Optional[torch.Tensor] = None,
+    checkpoint_interval: Optional[int] = None
 ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
     # (SY 09/22) states_in_fp32 seems not affecting the error of dg but for safety, set to True
-    h, _ = chunk_fwd_h(
-        k=k,
-        v=v,
-        g=g,
-        gk=None,
-        gv=None,
-        h0=initial_state,
-        output_final_state=False,
-        states_in_fp32=True,
-        offsets=offsets,
-        head_first=head_first,
-        chunk_size=chunk_size
-    )
+    if checkpoint_interval is None:
+        h, _ = chunk_fwd_h(
+            k=k,
+            v=v,
+            g=g,
+            gk=None,
+            gv=None,
+            h0=initial_state,
+            output_final_state=False,
+            states_in_fp32=True,
+            offsets=offsets,
+            head_first=head_first,
+            chunk_size=chunk_size
+        )
+    else:
+        h = chunk_fwd_h_from_checkpoints(
+            k=k,
+            v=v,
+            g=g,
+            gk=None,
+            gv=None,
+            h=h,
+            offsets=offsets,
+            head_first=head_first,
+            chunk_size=chunk_size,
+            checkpoint_interval=checkpoint_interval,
+            states_in_fp32=True
+        )
     dh, dh0 = chunk_bwd_dh(
         q=q,
         k=k,
@@ -130,7 +150,7 @@ def chunk_simple_gla_bwd(
 class ChunkSimpleGLAFunction(torch.autograd.Function):
 
     @staticmethod
-    @input_guard
+    @input_guard(strided=('q', 'k', 'v'))
     @autocast_custom_fwd
     def forward(
         ctx,
@@ -142,7 +162,8 @@ class ChunkSimpleGLAFunction(torch.autograd.Function):
         initial_state,
         output_final_state,
         offsets,
-        head_first
+        head_first,
+        checkpoint_interval
     ):
         T = q.shape[2] if head_first else q.shape[1]
         chunk_size = min(64, max(16, triton.next_power_of_2(T)))
@@ -156,7 +177,7 @@ class ChunkSimpleGLAFunction(torch.autograd.Function):
             indices = torch.cat([torch.arange(n) for n in triton.cdiv(offsets[1:] - offsets[:-1], chunk_size).tolist()])
             indices = torch.stack([indices.eq(0).cumsum(0) - 1, indices], 1).to(offsets)
 
-        g, o, ht = chunk_simple_gla_fwd(
+        g, h, o, ht = chunk_simple_gla_fwd(
             q=q,
             k=k,
             v=v,
@@ -169,7 +190,13 @@ class ChunkSimpleGLAFunction(torch.autograd.Function):
             head_first=head_first,
             chunk_size=chunk_size
         )
-        ctx.save_for_backward(q, k, v, g, initial_state)
+        # the states are either recomputed from scratch or from the checkpoints in the backward pass
+        if checkpoint_interval is not None:
+            h = chunk_select_checkpoints(h, offsets, head_first, chunk_size, checkpoint_interval)
+        else:
+            h = None
+        ctx.save_for_backward(q, k, v, g, initial_state, h)
+        ctx.checkpoint_interval = checkpoint_interval
         ctx.chunk_size = chunk_size
         ctx.scale = scale
         ctx.offsets = offsets
@@ -182,7 +209,7 @@ class ChunkSimpleGLAFunction(torch.autograd.Function):
     @autocast_custom_bwd
     def backward(ctx, do, dht):
         chunk_size, scale, offsets, indices, head_first = ctx.chunk_size, ctx.scale, ctx.offsets, ctx.indices, ctx.head_first
-        q, k, v, g, initial_state = ctx.saved_tensors
+        q, k, v, g, initial_state, h = ctx.saved_tensors
         dq, dk, dv, dg, dh0 = chunk_simple_gla_bwd(
             q=q,
             k=k,
@@ -195,14 +222,16 @@ class ChunkSimpleGLAFunction(torch.autograd.Function):
             offsets=offsets,
             indices=indices,
             head_first=head_first,
-            chunk_size=chunk_size
+            chunk_size=chunk_size,
+            h=h,
+            checkpoint_interval=ctx.checkpoint_interval
         )
         if g is not None:
             dg = chunk_local_cumsum(dg, chunk_size, reverse=True, offsets=offsets,
                                     indices=indices, head_first=head_first).to(g.dtype)
         else:
             dg = None
-        return dq.to(q.dtype), dk.to(k.dtype), dv.to(v.dtype), dg, None, dh0, None, None, None
+        return dq.to(q.dtype), dk.to(k.dtype), dv.to(v.dtype), dg, None, dh0, None, None, None, None
 
 
 @torch.compiler.disable
@@ -215,7 +244,9 @@ def chunk_simple_gla(
     initial_state: Optional[torch.Tensor] = None,
     output_final_state: bool = False,
     cu_seqlens: Optional[torch.LongTensor] = None,
-    head_first: bool = True
+    head_first: bool = True,
+    cp_group: Optional[dist.ProcessGroup] = None,
+    state_checkpoint_interval: Optional[int] = None
 ) -> Tuple[torch.Tensor, torch.Tensor]:
     r"""
     Args:
@@ -243,6 +274,17 @@ def chunk_simple_gla(
         head_first (Optional[bool]):
             Whether the inputs are in the head-first format, which is not supported for variable-length inputs.
             Default: `True`.
+        cp_group (Optional[dist.ProcessGroup]):
+            Process group for context parallelism, whose ranks hold consecutive slices of the sequences in order.
+            `initial_state` is only used on the first rank,
+            and the final state returned by the last rank is that of the whole sequences.
+            Default: `None`.
+        state_checkpoint_interval (Optional[int]):
+            If provided, the chunk states are kept every `state_checkpoint_interval` chunks for the backward pass,
+            and the ones in between are recomputed from them in parallel.
+            Larger intervals save more memory at the cost of longer recomputation, and `1` keeps all states.
+            By default, no states are kept and they are all recomputed sequentially from the initial states.
+            Default: `None`.
 
     Returns:
         o (torch.Tensor):
@@ -286,8 +328,24 @@ def chunk_simple_gla(
         if initial_state is not None and initial_state.shape[0] != len(cu_seqlens) - 1:
             raise ValueError(f"The number of initial states is expected to be equal to the number of input sequences, "
                              f"i.e., {len(cu_seqlens) - 1} rather than {initial_state.shape[0]}.")
+    if cp_group is not None:
+        return chunk_context_parallel(
+            chunk_simple_gla,
+            q, k, v, g,
+            group=cp_group,
+            scale=scale,
+            initial_state=initial_state,
+            output_final_state=output_final_state,
+            cu_seqlens=cu_seqlens,
+            head_first=head_first,
+            state_checkpoint_interval=state_checkpoint_interval
+        )
+    if state_checkpoint_interval is not None and state_checkpoint_interval < 1:
+        raise ValueError(f"`state_checkpoint_interval` is expected to be positive, got {state_checkpoint_interval}.")
     if scale is None:
         scale = k.shape[-1] ** -0.5
+    if q.device.type == 'cpu':
+        return chunk_simple_gla_cpu(q, k, v, g, scale, initial_state, output_final_state, cu_seqlens, head_first)
     o, final_state = ChunkSimpleGLAFunction.apply(
         q,
         k,
@@ -297,6 +355,7 @@ def chunk_simple_gla(
         initial_state,
         output_final_state,
         cu_seqlens,
-        head_first
+        head_first,
+        state_checkpoint_interval
     )
     return o, final_state
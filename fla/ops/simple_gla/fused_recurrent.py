@@ -18,7 +18,9 @@ def fused_recurrent_simple_gla(
     output_final_state: bool = False,
     reverse: bool = False,
     cu_seqlens: Optional[torch.LongTensor] = None,
-    head_first: bool = True
+    head_first: bool = True,
+    state_indices: Optional[torch.LongTensor] = None,
+    output_intermediate_states: bool = False
 ) -> Tuple[torch.Tensor, torch.Tensor]:
     r"""
     Args:
@@ -48,6 +50,16 @@ def fused_recurrent_simple_gla(
         head_first (Optional[bool]):
             Whether the inputs are in the head-first format, which is not supported for variable-length inputs.
             Default: `True`.
+        state_indices (Optional[torch.LongTensor]):
+            Indices of shape `[N]` mapping each input sequence to a slot of `initial_state`,
+            which is then a float32 state pool of shape `[S, H, K, V]` for `S` slots.
+            The final states are written back to the same slots in-place, and the pool is returned as `final_state`.
+            Only supported for inference. Default: `None`.
+        output_intermediate_states (Optional[bool]):
+            Whether to return the states after each token of shape `[B, H, T, K, V]` if `head_first=True`
+            else `[B, T, H, K, V]` instead of the final state,
+            e.g., to roll back rejected draft tokens in speculative decoding.
+            Only supported for inference. Default: `False`.
 
     Returns:
         o (torch.Tensor):
@@ -89,7 +101,7 @@ def fused_recurrent_simple_gla(
                              f"Please flatten variable-length inputs before processing.")
         if head_first:
             raise RuntimeError("Sequences with variable lengths are not supported for head-first mode")
-        if initial_state is not None and initial_state.shape[0] != len(cu_seqlens) - 1:
+        if state_indices is None and initial_state is not None and initial_state.shape[0] != len(cu_seqlens) - 1:
             raise ValueError(f"The number of initial states is expected to be equal to the number of input sequences, "
                              f"i.e., {len(cu_seqlens) - 1} rather than {initial_state.shape[0]}.")
     if scale is None:
@@ -104,6 +116,8 @@ def fused_recurrent_simple_gla(
         output_final_state=output_final_state,
         reverse=reverse,
         cu_seqlens=cu_seqlens,
-        head_first=head_first
+        head_first=head_first,
+        state_indices=state_indices,
+        output_intermediate_states=output_intermediate_states
     )
     return o, final_state
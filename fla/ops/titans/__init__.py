@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 
-from .naive import chunk_titans_linear
+from .chunk import chunk_titans_linear
+from .fused_recurrent import fused_recurrent_titans_linear
 
 __all__ = [
-    'chunk_titans_linear'
+    'chunk_titans_linear',
+    'fused_recurrent_titans_linear'
 ]
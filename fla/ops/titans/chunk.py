@@ -0,0 +1,741 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023-2025, Songlin Yang, Yu Zhang
+
+from typing import Optional, Tuple, Union
+
+import torch
+import triton
+import triton.language as tl
+
+from fla.ops.common.utils import prepare_chunk_indices, prepare_chunk_offsets
+from fla.ops.ttt.chunk import norm_residual
+from fla.ops.utils import chunk_local_cumsum
+from fla.utils import autocast_custom_bwd, autocast_custom_fwd, input_guard
+
+
+@triton.jit
+def chunk_titans_linear_coefficients(
+    b_theta,
+    b_lb,
+    b_lm,
+    i_last,
+    BT: tl.constexpr
+):
+    # the coefficients of the memory and momentum recurrences unrolled over a chunk, where
+    # `b_lb` and `b_lm` are the chunk-local cumulative sums of `log(1 - alpha)` and `log(eta)`
+    o_t = tl.arange(0, BT)
+    m_t = o_t <= i_last
+    m_A = (o_t[:, None] >= o_t[None, :]) & m_t[:, None] & m_t[None, :]
+    # [BT, BT], the decays of the memory and the momentum from position j to i
+    b_A = tl.where(m_A, tl.exp(b_lb[:, None] - b_lb[None, :]), 0)
+    b_E = tl.where(m_A, tl.exp(b_lm[:, None] - b_lm[None, :]), 0)
+    # [BT, BT], the contributions of the momentum written at position j to the memory at position i
+    b_AE = tl.dot(b_A, b_E, allow_tf32=False)
+    # [BT]
+    b_beta = tl.where(m_t, tl.exp(b_lb), 0)
+    b_m = tl.where(m_t, tl.exp(b_lm), 0)
+    b_f = tl.sum(b_A * b_m[None, :], 1)
+    # [BT], the decays of the momentum from position j to the end of the chunk
+    b_lm_last = tl.sum(tl.where(o_t == i_last, b_lm, 0))
+    b_en = tl.where(m_t, tl.exp(b_lm_last - b_lm), 0)
+    return b_A, b_E, b_AE, b_beta, b_m, b_f, b_en
+
+
+@triton.jit
+def chunk_titans_linear_inner_grad(
+    b_k,
+    b_v,
+    b_h,
+    b_w,
+    b_b,
+    eps,
+    D: tl.constexpr,
+    BD: tl.constexpr
+):
+    # the gradients of the inner reconstruction loss w.r.t. the memory at the start of the chunk
+    m_d = tl.arange(0, BD) < D
+    b_z = tl.dot(b_k, b_h, allow_tf32=False)
+    b_mu = tl.sum(b_z, 1) / D
+    b_zc = tl.where(m_d[None, :], b_z - b_mu[:, None], 0.)
+    b_sigma = tl.sqrt(tl.sum(b_zc * b_zc, 1) / D + eps)
+    b_zh = b_zc / b_sigma[:, None]
+    b_r = tl.where(m_d[None, :], b_w[None, :] * b_zh + b_b[None, :] - b_v + b_k, 0.)
+    b_g = b_r * b_w[None, :]
+    b_u = D * b_g - (tl.sum(b_g, 1) / (b_sigma * D))[:, None] - b_zh * (tl.sum(b_g * b_zh, 1) / (b_sigma * D))[:, None]
+    b_u = tl.where(m_d[None, :], b_u, 0.)
+    return b_zh, b_sigma, b_r, b_g, b_u
+
+
+@triton.heuristics({
+    'USE_INITIAL_STATE': lambda args: args['h0'] is not None,
+    'USE_INITIAL_MOMENTUM': lambda args: args['s0'] is not None,
+    'STORE_FINAL_STATE': lambda args: args['ht'] is not None,
+    'STORE_STATES': lambda args: args['h'] is not None,
+    'USE_OFFSETS': lambda args: args['offsets'] is not None
+})
+@triton.autotune(
+    configs=[
+        triton.Config({}, num_warps=num_warps)
+        for num_warps in [1, 2, 4]
+    ],
+    key=['BT', 'BD'],
+)
+@triton.jit(do_not_specialize=['T'])
+def chunk_titans_linear_fwd_kernel(
+    q,
+    k,
+    v,
+    w,
+    b,
+    theta,
+    lb,
+    lm,
+    o,
+    h0,
+    s0,
+    ht,
+    st,
+    h,
+    hs,
+    offsets,
+    chunk_offsets,
+    eps,
+    T,
+    H: tl.constexpr,
+    D: tl.constexpr,
+    BT: tl.constexpr,
+    BD: tl.constexpr,
+    USE_INITIAL_STATE: tl.constexpr,
+    USE_INITIAL_MOMENTUM: tl.constexpr,
+    STORE_FINAL_STATE: tl.constexpr,
+    STORE_STATES: tl.constexpr,
+    USE_OFFSETS: tl.constexpr,
+    HEAD_FIRST: tl.constexpr
+):
+    i_nh = tl.program_id(0)
+    i_n, i_h = i_nh // H, i_nh % H
+    if USE_OFFSETS:
+        bos, eos = tl.load(offsets + i_n).to(tl.int32), tl.load(offsets + i_n + 1).to(tl.int32)
+        T = eos - bos
+        NT = tl.cdiv(T, BT)
+        boh = tl.load(chunk_offsets + i_n).to(tl.int32)
+    else:
+        bos, eos = i_n * T, i_n * T + T
+        NT = tl.cdiv(T, BT)
+        boh = i_n * NT
+    if HEAD_FIRST:
+        o_x, s_x, o_g, s_g = i_nh * T*D, D, i_nh * T, 1
+    else:
+        o_x, s_x, o_g, s_g = (bos * H + i_h) * D, H*D, bos * H + i_h, H
+
+    o_t = tl.arange(0, BT)
+    o_d = tl.arange(0, BD)
+    m_A = o_t[:, None] >= o_t[None, :]
+    b_w = tl.load(w + i_h * D + o_d, mask=o_d < D, other=0.).to(tl.float32)
+    b_b = tl.load(b + i_h * D + o_d, mask=o_d < D, other=0.).to(tl.float32)
+
+    # [BD, BD], the memory and its momentum
+    b_h = tl.zeros([BD, BD], dtype=tl.float32)
+    b_s = tl.zeros([BD, BD], dtype=tl.float32)
+    if USE_INITIAL_STATE:
+        p_h0 = tl.make_block_ptr(h0 + i_nh * D*D, (D, D), (D, 1), (0, 0), (BD, BD), (1, 0))
+        b_h += tl.load(p_h0, boundary_check=(0, 1)).to(tl.float32)
+    if USE_INITIAL_MOMENTUM:
+        p_s0 = tl.make_block_ptr(s0 + i_nh * D*D, (D, D), (D, 1), (0, 0), (BD, BD), (1, 0))
+        b_s += tl.load(p_s0, boundary_check=(0, 1)).to(tl.float32)
+
+    for i_t in range(NT):
+        if STORE_STATES:
+            p_h = tl.make_block_ptr(h + ((boh + i_t) * H + i_h) * D*D, (D, D), (D, 1), (0, 0), (BD, BD), (1, 0))
+            p_hs = tl.make_block_ptr(hs + ((boh + i_t) * H + i_h) * D*D, (D, D), (D, 1), (0, 0), (BD, BD), (1, 0))
+            tl.store(p_h, b_h.to(p_h.dtype.element_ty), boundary_check=(0, 1))
+            tl.store(p_hs, b_s.to(p_hs.dtype.element_ty), boundary_check=(0, 1))
+        p_q = tl.make_block_ptr(q + o_x, (T, D), (s_x, 1), (i_t * BT, 0), (BT, BD), (1, 0))
+        p_k = tl.make_block_ptr(k + o_x, (T, D), (s_x, 1), (i_t * BT, 0), (BT, BD), (1, 0))
+        p_v = tl.make_block_ptr(v + o_x, (T, D), (s_x, 1), (i_t * BT, 0), (BT, BD), (1, 0))
+        p_o = tl.make_block_ptr(o + o_x, (T, D), (s_x, 1), (i_t * BT, 0), (BT, BD), (1, 0))
+        p_theta = tl.make_block_ptr(theta + o_g, (T,), (s_g,), (i_t * BT,), (BT,), (0,))
+        p_lb = tl.make_block_ptr(lb + o_g, (T,), (s_g,), (i_t * BT,), (BT,), (0,))
+        p_lm = tl.make_block_ptr(lm + o_g, (T,), (s_g,), (i_t * BT,), (BT,), (0,))
+        # [BT, BD]
+        b_q = tl.load(p_q, boundary_check=(0, 1)).to(tl.float32)
+        b_k = tl.load(p_k, boundary_check=(0, 1)).to(tl.float32)
+        b_v = tl.load(p_v, boundary_check=(0, 1)).to(tl.float32)
+        # [BT]
+        b_theta = tl.load(p_theta, boundary_check=(0,)).to(tl.float32)
+        b_lb = tl.load(p_lb, boundary_check=(0,)).to(tl.float32)
+        b_lm = tl.load(p_lm, boundary_check=(0,)).to(tl.float32)
+
+        i_last = tl.minimum(BT, T - i_t * BT) - 1
+        b_A, b_E, b_AE, b_beta, b_m, b_f, b_en = chunk_titans_linear_coefficients(b_theta, b_lb, b_lm, i_last, BT)
+        b_G = b_AE * b_theta[None, :]
+        b_gt = tl.sum(tl.where((o_t == i_last)[:, None], b_G, 0), 0)
+        b_nt = b_theta * b_en
+        b_beta_last = tl.sum(tl.where(o_t == i_last, b_beta, 0))
+        b_f_last = tl.sum(tl.where(o_t == i_last, b_f, 0))
+        b_m_last = tl.sum(tl.where(o_t == i_last, b_m, 0))
+
+        _, _, _, _, b_u = chunk_titans_linear_inner_grad(b_k, b_v, b_h, b_w, b_b, eps, D, BD)
+        b_x = -2 * b_u
+        # [BT, BT]
+        b_qk = tl.where(m_A, tl.dot(b_q, tl.trans(b_k), allow_tf32=False), 0)
+        # [BT, BD]
+        b_o = b_beta[:, None] * tl.dot(b_q, b_h, allow_tf32=False) + b_f[:, None] * tl.dot(b_q, b_s, allow_tf32=False)
+        b_o += tl.dot(b_qk * b_G, b_x, allow_tf32=False)
+        tl.store(p_o, b_o.to(p_o.dtype.element_ty), boundary_check=(0, 1))
+
+        b_h = b_beta_last * b_h + b_f_last * b_s + tl.dot(tl.trans(b_k * b_gt[:, None]), b_x, allow_tf32=False)
+        b_s = b_m_last * b_s + tl.dot(tl.trans(b_k * b_nt[:, None]), b_x, allow_tf32=False)
+
+    if STORE_FINAL_STATE:
+        p_ht = tl.make_block_ptr(ht + i_nh * D*D, (D, D), (D, 1), (0, 0), (BD, BD), (1, 0))
+        p_st = tl.make_block_ptr(st + i_nh * D*D, (D, D), (D, 1), (0, 0), (BD, BD), (1, 0))
+        tl.store(p_ht, b_h.to(p_ht.dtype.element_ty), boundary_check=(0, 1))
+        tl.store(p_st, b_s.to(p_st.dtype.element_ty), boundary_check=(0, 1))
+
+
+@triton.heuristics({
+    'STORE_INITIAL_STATE_GRADIENT': lambda args: args['dh0'] is not None,
+    'STORE_INITIAL_MOMENTUM_GRADIENT': lambda args: args['ds0'] is not None,
+    'USE_FINAL_STATE_GRADIENT': lambda args: args['dht'] is not None,
+    'USE_FINAL_MOMENTUM_GRADIENT': lambda args: args['dst'] is not None,
+    'USE_OFFSETS': lambda args: args['offsets'] is not None
+})
+@triton.autotune(
+    configs=[
+        triton.Config({}, num_warps=num_warps)
+        for num_warps in [1, 2, 4]
+    ],
+    key=['BT', 'BD'],
+)
+@triton.jit(do_not_specialize=['T'])
+def chunk_titans_linear_bwd_kernel(
+    q,
+    k,
+    v,
+    w,
+    b,
+    theta,
+    lb,
+    lm,
+    h,
+    hs,
+    do,
+    dht,
+    dst,
+    dq,
+    dk,
+    dv,
+    dw,
+    db,
+    dtheta,
+    dlb,
+    dlm,
+    dh0,
+    ds0,
+    offsets,
+    chunk_offsets,
+    eps,
+    T,
+    H: tl.constexpr,
+    D: tl.constexpr,
+    BT: tl.constexpr,
+    BD: tl.constexpr,
+    STORE_INITIAL_STATE_GRADIENT: tl.constexpr,
+    STORE_INITIAL_MOMENTUM_GRADIENT: tl.constexpr,
+    USE_FINAL_STATE_GRADIENT: tl.constexpr,
+    USE_FINAL_MOMENTUM_GRADIENT: tl.constexpr,
+    USE_OFFSETS: tl.constexpr,
+    HEAD_FIRST: tl.constexpr
+):
+    i_nh = tl.program_id(0)
+    i_n, i_h = i_nh // H, i_nh % H
+    if USE_OFFSETS:
+        bos, eos = tl.load(offsets + i_n).to(tl.int32), tl.load(offsets + i_n + 1).to(tl.int32)
+        T = eos - bos
+        NT = tl.cdiv(T, BT)
+        boh = tl.load(chunk_offsets + i_n).to(tl.int32)
+    else:
+        bos, eos = i_n * T, i_n * T + T
+        NT = tl.cdiv(T, BT)
+        boh = i_n * NT
+    if HEAD_FIRST:
+        o_x, s_x, o_g, s_g = i_nh * T*D, D, i_nh * T, 1
+    else:
+        o_x, s_x, o_g, s_g = (bos * H + i_h) * D, H*D, bos * H + i_h, H
+
+    o_t = tl.arange(0, BT)
+    o_d = tl.arange(0, BD)
+    m_d = o_d < D
+    m_A = o_t[:, None] >= o_t[None, :]
+    b_w = tl.load(w + i_h * D + o_d, mask=m_d, other=0.).to(tl.float32)
+    b_b = tl.load(b + i_h * D + o_d, mask=m_d, other=0.).to(tl.float32)
+
+    # [BD, BD], the gradients of the memory and its momentum at the end of the current chunk
+    b_dh = tl.zeros([BD, BD], dtype=tl.float32)
+    b_ds = tl.zeros([BD, BD], dtype=tl.float32)
+    if USE_FINAL_STATE_GRADIENT:
+        p_dht = tl.make_block_ptr(dht + i_nh * D*D, (D, D), (D, 1), (0, 0), (BD, BD), (1, 0))
+        b_dh += tl.load(p_dht, boundary_check=(0, 1)).to(tl.float32)
+    if USE_FINAL_MOMENTUM_GRADIENT:
+        p_dst = tl.make_block_ptr(dst + i_nh * D*D, (D, D), (D, 1), (0, 0), (BD, BD), (1, 0))
+        b_ds += tl.load(p_dst, boundary_check=(0, 1)).to(tl.float32)
+    # [BD]
+    b_dw = tl.zeros([BD], dtype=tl.float32)
+    b_db = tl.zeros([BD], dtype=tl.float32)
+
+    for i_t in range(NT - 1, -1, -1):
+        p_h = tl.make_block_ptr(h + ((boh + i_t) * H + i_h) * D*D, (D, D), (D, 1), (0, 0), (BD, BD), (1, 0))
+        p_hs = tl.make_block_ptr(hs + ((boh + i_t) * H + i_h) * D*D, (D, D), (D, 1), (0, 0), (BD, BD), (1, 0))
+        p_q = tl.make_block_ptr(q + o_x, (T, D), (s_x, 1), (i_t * BT, 0), (BT, BD), (1, 0))
+        p_k = tl.make_block_ptr(k + o_x, (T, D), (s_x, 1), (i_t * BT, 0), (BT, BD), (1, 0))
+        p_v = tl.make_block_ptr(v + o_x, (T, D), (s_x, 1), (i_t * BT, 0), (BT, BD), (1, 0))
+        p_do = tl.make_block_ptr(do + o_x, (T, D), (s_x, 1), (i_t * BT, 0), (BT, BD), (1, 0))
+        p_theta = tl.make_block_ptr(theta + o_g, (T,), (s_g,), (i_t * BT,), (BT,), (0,))
+        p_lb = tl.make_block_ptr(lb + o_g, (T,), (s_g,), (i_t * BT,), (BT,), (0,))
+        p_lm = tl.make_block_ptr(lm + o_g, (T,), (s_g,), (i_t * BT,), (BT,), (0,))
+        # [BD, BD]
+        b_h = tl.load(p_h, boundary_check=(0, 1)).to(tl.float32)
+        b_s = tl.load(p_hs, boundary_check=(0, 1)).to(tl.float32)
+        # [BT, BD]
+        b_q = tl.load(p_q, boundary_check=(0, 1)).to(tl.float32)
+        b_k = tl.load(p_k, boundary_check=(0, 1)).to(tl.float32)
+        b_v = tl.load(p_v, boundary_check=(0, 1)).to(tl.float32)
+        b_do = tl.load(p_do, boundary_check=(0, 1)).to(tl.float32)
+        # [BT]
+        b_theta = tl.load(p_theta, boundary_check=(0,)).to(tl.float32)
+        b_lb = tl.load(p_lb, boundary_check=(0,)).to(tl.float32)
+        b_lm = tl.load(p_lm, boundary_check=(0,)).to(tl.float32)
+
+        # recompute the forward pass of the chunk
+        i_last = tl.minimum(BT, T - i_t * BT) - 1
+        b_A, b_E, b_AE, b_beta, b_m, b_f, b_en = chunk_titans_linear_coefficients(b_theta, b_lb, b_lm, i_last, BT)
+        b_G = b_AE * b_theta[None, :]
+        b_gt = tl.sum(tl.where((o_t == i_last)[:, None], b_G, 0), 0)
+        b_nt = b_theta * b_en
+        b_beta_last = tl.sum(tl.where(o_t == i_last, b_beta, 0))
+        b_f_last = tl.sum(tl.where(o_t == i_last, b_f, 0))
+        b_m_last = tl.sum(tl.where(o_t == i_last, b_m, 0))
+
+        b_zh, b_sigma, b_r, b_g, b_u = chunk_titans_linear_inner_grad(b_k, b_v, b_h, b_w, b_b, eps, D, BD)
+        b_x = -2 * b_u
+        b_qk = tl.where(m_A, tl.dot(b_q, tl.trans(b_k), allow_tf32=False), 0)
+
+        # [BT, BD]
+        b_xdh = tl.dot(b_x, tl.trans(b_dh), allow_tf32=False)
+        b_xds = tl.dot(b_x, tl.trans(b_ds), allow_tf32=False)
+        b_dx = tl.dot(tl.trans(b_qk * b_G), b_do, allow_tf32=False)
+        b_dx += tl.dot(b_k * b_gt[:, None], b_dh, allow_tf32=False) + tl.dot(b_k * b_nt[:, None], b_ds, allow_tf32=False)
+        # [BT, BT]
+        b_dP = tl.where(m_A, tl.dot(b_do, tl.trans(b_x), allow_tf32=False), 0)
+        b_dG = b_dP * b_qk
+        b_dqk = b_dP * b_G
+
+        b_dq = b_beta[:, None] * tl.dot(b_do, tl.trans(b_h), allow_tf32=False)
+        b_dq += b_f[:, None] * tl.dot(b_do, tl.trans(b_s), allow_tf32=False) + tl.dot(b_dqk, b_k, allow_tf32=False)
+        b_dk = tl.dot(tl.trans(b_dqk), b_q, allow_tf32=False) + b_gt[:, None] * b_xdh + b_nt[:, None] * b_xds
+        # [BT]
+        b_dgt = tl.sum(b_k * b_xdh, 1)
+        b_dnt = tl.sum(b_k * b_xds, 1)
+        b_dbeta = tl.sum(b_do * tl.dot(b_q, b_h, allow_tf32=False), 1)
+        b_df = tl.sum(b_do * tl.dot(b_q, b_s, allow_tf32=False), 1)
+        b_dbeta += tl.where(o_t == i_last, tl.sum(b_h * b_dh), 0)
+        b_df += tl.where(o_t == i_last, tl.sum(b_s * b_dh), 0)
+        b_dm_last = tl.sum(b_s * b_ds)
+
+        # [BD, BD], the gradients of the states at the start of the chunk
+        b_dh_new = tl.dot(tl.trans(b_q * b_beta[:, None]), b_do, allow_tf32=False) + b_beta_last * b_dh
+        b_ds = tl.dot(tl.trans(b_q * b_f[:, None]), b_do, allow_tf32=False) + b_f_last * b_dh + b_m_last * b_ds
+
+        # backpropagate through the inner gradients
+        b_du = tl.where(m_d[None, :], -2 * b_dx, 0.)
+        b_sd = b_sigma * D
+        b_sg, b_sgz = tl.sum(b_g, 1), tl.sum(b_g * b_zh, 1)
+        b_sdu, b_sduz = tl.sum(b_du, 1), tl.sum(b_du * b_zh, 1)
+        b_dg = tl.where(m_d[None, :], D * b_du - (b_sdu / b_sd)[:, None] - b_zh * (b_sduz / b_sd)[:, None], 0.)
+        b_dzh = -b_du * (b_sgz / b_sd)[:, None] - b_g * (b_sduz / b_sd)[:, None]
+        b_dsigma = tl.sum(b_du * (b_sg[:, None] + b_zh * b_sgz[:, None]), 1) / (b_sigma * b_sd)
+        b_dr = b_dg * b_w[None, :]
+        b_dzh += b_dr * b_w[None, :]
+        b_dv = -b_dr
+        b_dk += b_dr
+        b_dw += tl.sum(b_dg * b_r + b_dr * b_zh, 0)
+        b_db += tl.sum(b_dr, 0)
+        # backpropagate through the normalization of `k @ h`
+        b_dz = b_dzh - (tl.sum(b_dzh, 1) / D)[:, None] - b_zh * (tl.sum(b_dzh * b_zh, 1) / D)[:, None]
+        b_dz = tl.where(m_d[None, :], b_dz / b_sigma[:, None] + b_dsigma[:, None] * b_zh / D, 0.)
+        b_dk += tl.dot(b_dz, tl.trans(b_h), allow_tf32=False)
+        b_dh_new += tl.dot(tl.trans(b_k), b_dz, allow_tf32=False)
+        b_dh = b_dh_new
+
+        # backpropagate through the coefficients
+        b_dG += tl.where((o_t == i_last)[:, None], b_dgt[None, :], 0)
+        b_dtheta = tl.sum(b_dG * b_AE, 0) + b_dnt * b_en
+        b_dAE = b_dG * b_theta[None, :]
+        b_dA = (tl.dot(b_dAE, tl.trans(b_E), allow_tf32=False) + b_df[:, None] * b_m[None, :]) * b_A
+        b_dE = tl.dot(tl.trans(b_A), b_dAE, allow_tf32=False) * b_E
+        b_dm = tl.sum(b_A * b_df[:, None], 0) + tl.where(o_t == i_last, b_dm_last, 0)
+        b_dlb = b_dbeta * b_beta + tl.sum(b_dA, 1) - tl.sum(b_dA, 0)
+        b_dlm = b_dm * b_m + tl.sum(b_dE, 1) - tl.sum(b_dE, 0)
+        b_dnt = b_dnt * b_nt
+        b_dlm += tl.where(o_t == i_last, tl.sum(b_dnt), 0) - b_dnt
+
+        p_dq = tl.make_block_ptr(dq + o_x, (T, D), (s_x, 1), (i_t * BT, 0), (BT, BD), (1, 0))
+        p_dk = tl.make_block_ptr(dk + o_x, (T, D), (s_x, 1), (i_t * BT, 0), (BT, BD), (1, 0))
+        p_dv = tl.make_block_ptr(dv + o_x, (T, D), (s_x, 1), (i_t * BT, 0), (BT, BD), (1, 0))
+        p_dtheta = tl.make_block_ptr(dtheta + o_g, (T,), (s_g,), (i_t * BT,), (BT,), (0,))
+        p_dlb = tl.make_block_ptr(dlb + o_g, (T,), (s_g,), (i_t * BT,), (BT,), (0,))
+        p_dlm = tl.make_block_ptr(dlm + o_g, (T,), (s_g,), (i_t * BT,), (BT,), (0,))
+        tl.store(p_dq, b_dq.to(p_dq.dtype.element_ty), boundary_check=(0, 1))
+        tl.store(p_dk, b_dk.to(p_dk.dtype.element_ty), boundary_check=(0, 1))
+        tl.store(p_dv, b_dv.to(p_dv.dtype.element_ty), boundary_check=(0, 1))
+        tl.store(p_dtheta, b_dtheta.to(p_dtheta.dtype.element_ty), boundary_check=(0,))
+        tl.store(p_dlb, b_dlb.to(p_dlb.dtype.element_ty), boundary_check=(0,))
+        tl.store(p_dlm, b_dlm.to(p_dlm.dtype.element_ty), boundary_check=(0,))
+
+    tl.store(dw + i_nh * D + o_d, b_dw.to(dw.dtype.element_ty), mask=m_d)
+    tl.store(db + i_nh * D + o_d, b_db.to(db.dtype.element_ty), mask=m_d)
+    if STORE_INITIAL_STATE_GRADIENT:
+        p_dh0 = tl.make_block_ptr(dh0 + i_nh * D*D, (D, D), (D, 1), (0, 0), (BD, BD), (1, 0))
+        tl.store(p_dh0, b_dh.to(p_dh0.dtype.element_ty), boundary_check=(0, 1))
+    if STORE_INITIAL_MOMENTUM_GRADIENT:
+        p_ds0 = tl.make_block_ptr(ds0 + i_nh * D*D, (D, D), (D, 1), (0, 0), (BD, BD), (1, 0))
+        tl.store(p_ds0, b_ds.to(p_ds0.dtype.element_ty), boundary_check=(0, 1))
+
+
+def chunk_titans_linear_fwd(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    w: torch.Tensor,
+    b: torch.Tensor,
+    theta: torch.Tensor,
+    lb: torch.Tensor,
+    lm: torch.Tensor,
+    eps: float,
+    initial_state: Optional[torch.Tensor] = None,
+    initial_momentum: Optional[torch.Tensor] = None,
+    output_final_state: bool = False,
+    store_states: bool = False,
+    offsets: Optional[torch.LongTensor] = None,
+    head_first: bool = True,
+    BT: int = 16
+) -> Tuple[torch.Tensor, ...]:
+    if head_first:
+        B, H, T, D = k.shape
+    else:
+        B, T, H, D = k.shape
+    # N: the actual number of sequences in the batch with either equal or variable lengths
+    N = B if offsets is None else len(offsets) - 1
+    chunk_offsets = prepare_chunk_offsets(offsets, BT) if offsets is not None else None
+    NT = N * triton.cdiv(T, BT) if offsets is None else chunk_offsets[-1].item()
+    BD = max(16, triton.next_power_of_2(D))
+    assert BD <= 128, "current kernel does not support head dimension larger than 128."
+
+    o = torch.empty_like(v, dtype=torch.float)
+    ht, st = None, None
+    if output_final_state:
+        ht, st = k.new_empty(N, H, D, D, dtype=torch.float), k.new_empty(N, H, D, D, dtype=torch.float)
+    h, hs = None, None
+    if store_states:
+        h, hs = k.new_empty(NT, H, D, D, dtype=torch.float), k.new_empty(NT, H, D, D, dtype=torch.float)
+
+    grid = (N * H,)
+    chunk_titans_linear_fwd_kernel[grid](
+        q=q,
+        k=k,
+        v=v,
+        w=w,
+        b=b,
+        theta=theta,
+        lb=lb,
+        lm=lm,
+        o=o,
+        h0=initial_state,
+        s0=initial_momentum,
+        ht=ht,
+        st=st,
+        h=h,
+        hs=hs,
+        offsets=offsets,
+        chunk_offsets=chunk_offsets,
+        eps=eps,
+        T=T,
+        H=H,
+        D=D,
+        BT=BT,
+        BD=BD,
+        HEAD_FIRST=head_first
+    )
+    return o, ht, st, h, hs
+
+
+def chunk_titans_linear_bwd(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    w: torch.Tensor,
+    b: torch.Tensor,
+    theta: torch.Tensor,
+    lb: torch.Tensor,
+    lm: torch.Tensor,
+    eps: float,
+    do: torch.Tensor,
+    dht: Optional[torch.Tensor] = None,
+    dst: Optional[torch.Tensor] = None,
+    initial_state: Optional[torch.Tensor] = None,
+    initial_momentum: Optional[torch.Tensor] = None,
+    offsets: Optional[torch.LongTensor] = None,
+    indices: Optional[torch.LongTensor] = None,
+    head_first: bool = True,
+    BT: int = 16
+) -> Tuple[torch.Tensor, ...]:
+    if head_first:
+        B, H, T, D = k.shape
+    else:
+        B, T, H, D = k.shape
+    N = B if offsets is None else len(offsets) - 1
+    chunk_offsets = prepare_chunk_offsets(offsets, BT) if offsets is not None else None
+    BD = max(16, triton.next_power_of_2(D))
+
+    # the states at the start of each chunk are recomputed rather than kept since the forward pass
+    _, _, _, h, hs = chunk_titans_linear_fwd(
+        q=q,
+        k=k,
+        v=v,
+        w=w,
+        b=b,
+        theta=theta,
+        lb=lb,
+        lm=lm,
+        eps=eps,
+        initial_state=initial_state,
+        initial_momentum=initial_momentum,
+        store_states=True,
+        offsets=offsets,
+        head_first=head_first,
+        BT=BT
+    )
+    dq, dk, dv = (torch.empty_like(x, dtype=torch.float) for x in (q, k, v))
+    dtheta, dlb, dlm = (torch.empty_like(x, dtype=torch.float) for x in (theta, lb, lm))
+    dw, db = (q.new_empty(N, H, D, dtype=torch.float) for _ in range(2))
+    dh0 = torch.empty_like(initial_state, dtype=torch.float) if initial_state is not None else None
+    ds0 = torch.empty_like(initial_momentum, dtype=torch.float) if initial_momentum is not None else None
+
+    grid = (N * H,)
+    chunk_titans_linear_bwd_kernel[grid](
+        q=q,
+        k=k,
+        v=v,
+        w=w,
+        b=b,
+        theta=theta,
+        lb=lb,
+        lm=lm,
+        h=h,
+        hs=hs,
+        do=do,
+        dht=dht,
+        dst=dst,
+        dq=dq,
+        dk=dk,
+        dv=dv,
+        dw=dw,
+        db=db,
+        dtheta=dtheta,
+        dlb=dlb,
+        dlm=dlm,
+        dh0=dh0,
+        ds0=ds0,
+        offsets=offsets,
+        chunk_offsets=chunk_offsets,
+        eps=eps,
+        T=T,
+        H=H,
+        D=D,
+        BT=BT,
+        BD=BD,
+        HEAD_FIRST=head_first
+    )
+    # the gradients of the chunk-local cumulative sums are accumulated back to the log decays
+    dla = chunk_local_cumsum(dlb, BT, reverse=True, offsets=offsets, indices=indices, head_first=head_first)
+    dle = chunk_local_cumsum(dlm, BT, reverse=True, offsets=offsets, indices=indices, head_first=head_first)
+    return dq, dk, dv, dw.sum(0), db.sum(0), dtheta, dla, dle, dh0, ds0
+
+
+class ChunkTitansLinearFunction(torch.autograd.Function):
+
+    @staticmethod
+    @input_guard
+    @autocast_custom_fwd
+    def forward(ctx, q, k, v, w, b, theta, la, le, eps, BT, initial_state, initial_momentum,
+                output_final_state, offsets, head_first):
+        indices = prepare_chunk_indices(offsets, BT) if offsets is not None else None
+        lb = chunk_local_cumsum(la, BT, offsets=offsets, indices=indices, head_first=head_first)
+        lm = chunk_local_cumsum(le, BT, offsets=offsets, indices=indices, head_first=head_first)
+        o, final_state, final_momentum, _, _ = chunk_titans_linear_fwd(
+            q=q,
+            k=k,
+            v=v,
+            w=w,
+            b=b,
+            theta=theta,
+            lb=lb,
+            lm=lm,
+            eps=eps,
+            initial_state=initial_state,
+            initial_momentum=initial_momentum,
+            output_final_state=output_final_state,
+            offsets=offsets,
+            head_first=head_first,
+            BT=BT
+        )
+        ctx.save_for_backward(q, k, v, w, b, theta, lb, lm, initial_state, initial_momentum)
+        ctx.eps = eps
+        ctx.BT = BT
+        ctx.offsets = offsets
+        ctx.indices = indices
+        ctx.head_first = head_first
+        return o.to(q.dtype), final_state, final_momentum
+
+    @staticmethod
+    @input_guard
+    @autocast_custom_bwd
+    def backward(ctx, do, dht, dst):
+        q, k, v, w, b, theta, lb, lm, initial_state, initial_momentum = ctx.saved_tensors
+        dq, dk, dv, dw, db, dtheta, dla, dle, dh0, ds0 = chunk_titans_linear_bwd(
+            q=q,
+            k=k,
+            v=v,
+            w=w,
+            b=b,
+            theta=theta,
+            lb=lb,
+            lm=lm,
+            eps=ctx.eps,
+            do=do,
+            dht=dht,
+            dst=dst,
+            initial_state=initial_state,
+            initial_momentum=initial_momentum,
+            offsets=ctx.offsets,
+            indices=ctx.indices,
+            head_first=ctx.head_first,
+            BT=ctx.BT
+        )
+        return (dq.to(q), dk.to(k), dv.to(v), dw.to(w), db.to(b), dtheta.to(theta), dla, dle,
+                None, None, dh0, ds0, None, None, None)
+
+
+def prepare_titans_linear_inputs(
+    q: torch.Tensor,
+    theta: torch.Tensor,
+    alpha: torch.Tensor,
+    eta: torch.Tensor,
+    initial_state: Optional[Union[torch.Tensor, Tuple[torch.Tensor, torch.Tensor]]] = None,
+    cu_seqlens: Optional[torch.LongTensor] = None,
+    head_first: bool = True
+) -> Tuple[torch.Tensor, ...]:
+    if cu_seqlens is not None:
+        if q.shape[0] != 1:
+            raise ValueError(f"The batch size is expected to be 1 rather than {q.shape[0]} when using `cu_seqlens`."
+                             f"Please flatten variable-length inputs before processing.")
+        if head_first:
+            raise RuntimeError("Sequences with variable lengths are not supported for head-first mode")
+    if isinstance(initial_state, torch.Tensor):
+        initial_state = (initial_state, None)
+    initial_state, initial_momentum = initial_state if initial_state is not None else (None, None)
+    if cu_seqlens is not None and initial_state is not None and initial_state.shape[0] != len(cu_seqlens) - 1:
+        raise ValueError(f"The number of initial states is expected to be equal to the number of input sequences, "
+                         f"i.e., {len(cu_seqlens) - 1} rather than {initial_state.shape[0]}.")
+    # `[B, H, T, 1]` -> `[B, H, T]`
+    theta, alpha, eta = (x.squeeze(-1) if x.dim() == 4 else x for x in (theta, alpha, eta))
+    # the decays are applied in log space, i.e., `log(1 - alpha)` to the memory and `log(eta)` to the momentum,
+    # where saturated gates, e.g., `alpha = 1` or `eta = 0` rounded from sigmoids, are clamped to keep the logs finite,
+    # as the differences of two infinite ones within a chunk are NaNs
+    la, le = torch.log1p(-alpha.float().clamp(max=1 - 1e-6)), torch.log(eta.float().clamp(min=1e-6))
+    return theta, la, le, initial_state, initial_momentum
+
+
+def chunk_titans_linear(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    w: torch.Tensor,
+    b: torch.Tensor,
+    theta: torch.Tensor,
+    alpha: torch.Tensor,
+    eta: torch.Tensor,
+    eps: float = 1e-6,
+    chunk_size: int = 16,
+    initial_state: Optional[Union[torch.Tensor, Tuple[torch.Tensor, torch.Tensor]]] = None,
+    output_final_state: bool = False,
+    cu_seqlens: Optional[torch.LongTensor] = None,
+    head_first: bool = True
+) -> Tuple[torch.Tensor, Optional[Tuple[torch.Tensor, torch.Tensor]]]:
+    r"""
+    Args:
+        q (torch.Tensor):
+            queries of shape `[B, H, T, D]` if `head_first=True` else `[B, T, H, D]`.
+        k (torch.Tensor):
+            keys of shape `[B, H, T, D]` if `head_first=True` else `[B, T, H, D]`.
+        v (torch.Tensor):
+            values of shape `[B, H, T, D]` if `head_first=True` else `[B, T, H, D]`.
+        w (torch.Tensor):
+            layer norm weight of shape `[H, D]`.
+        b (torch.Tensor):
+            layer norm bias of shape `[H, D]`.
+        theta (torch.Tensor):
+            learning rates of shape `[B, H, T, 1]` if `head_first=True` else `[B, T, H, 1]`.
+        alpha (torch.Tensor):
+            forgetting rates of the memory of shape `[B, H, T, 1]` if `head_first=True` else `[B, T, H, 1]`.
+        eta (torch.Tensor):
+            momentum decays of shape `[B, H, T, 1]` if `head_first=True` else `[B, T, H, 1]`.
+        eps (float):
+            The epsilon of the layer norms. Default: `1e-6`.
+        chunk_size (int):
+            The chunk size, over which the gradients of the memory are taken w.r.t. its state at the chunk start.
+            It is expected to be a power of 2 no smaller than 16. Default: `16`.
+        initial_state (Optional[Union[torch.Tensor, Tuple[torch.Tensor, torch.Tensor]]]):
+            Initial memory of shape `[N, H, D, D]` for `N` input sequences, optionally paired with its momentum
+            of the same shape, which defaults to zeros. Default: `None`.
+        output_final_state (Optional[bool]):
+            Whether to output the final memory and momentum. Default: `False`.
+        cu_seqlens (torch.LongTensor):
+            Cumulative sequence lengths of shape `[N+1]` used for variable-length training,
+            consistent with the FlashAttention API.
+        head_first (Optional[bool]):
+            Whether the inputs are in the head-first format, which is not supported for variable-length inputs.
+            Default: `True`.
+
+    Returns:
+        o (torch.Tensor):
+            Outputs of shape `[B, H, T, D]` if `head_first=True` else `[B, T, H, D]`.
+        final_state (Tuple[torch.Tensor, torch.Tensor]):
+            Final memory and momentum of shape `[N, H, D, D]` if `output_final_state=True` else `None`.
+    """
+    assert q.dtype == k.dtype == v.dtype
+    assert k.shape[-1] == v.shape[-1], "DK must equal to DV."
+    assert chunk_size >= 16 and chunk_size == triton.next_power_of_2(chunk_size), "chunk_size must be a power of 2 >= 16."
+    theta, la, le, initial_state, initial_momentum = prepare_titans_linear_inputs(
+        q, theta, alpha, eta, initial_state, cu_seqlens, head_first
+    )
+    o, final_state, final_momentum = ChunkTitansLinearFunction.apply(
+        q,
+        k,
+        v,
+        w,
+        b,
+        theta,
+        la,
+        le,
+        eps,
+        chunk_size,
+        initial_state,
+        initial_momentum,
+        output_final_state,
+        cu_seqlens,
+        head_first
+    )
+    o = norm_residual(o, w, b, eps, head_first)
+    return o, ((final_state, final_momentum) if output_final_state else None)
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023-2025, Songlin Yang, Yu Zhang
+
+from typing import Optional, Tuple, Union
+
+import torch
+import triton
+import triton.language as tl
+
+from fla.ops.common.utils import prepare_chunk_indices
+from fla.ops.titans.chunk import chunk_titans_linear_bwd, prepare_titans_linear_inputs
+from fla.ops.ttt.chunk import norm_residual
+from fla.ops.utils import chunk_local_cumsum
+from fla.utils import autocast_custom_bwd, autocast_custom_fwd, input_guard
+
+
+@triton.heuristics({
+    'USE_INITIAL_STATE': lambda args: args['h0'] is not None,
+    'USE_INITIAL_MOMENTUM': lambda args: args['s0'] is not None,
+    'STORE_FINAL_STATE': lambda args: args['ht'] is not None,
+    'USE_OFFSETS': lambda args: args['offsets'] is not None
+})
+@triton.autotune(
+    configs=[
+        triton.Config({}, num_warps=num_warps)
+        for num_warps in [1, 2, 4]
+    ],
+    key=['BD'],
+)
+@triton.jit(do_not_specialize=['T'])
+def fused_recurrent_titans_linear_fwd_kernel(
+    q,
+    k,
+    v,
+    w,
+    b,
+    theta,
+    la,
+    le,
+    o,
+    h0,
+    s0,
+    ht,
+    st,
+    offsets,
+    eps,
+    T,
+    H: tl.constexpr,
+    D: tl.constexpr,
+    BT: tl.constexpr,
+    BD: tl.constexpr,
+    USE_INITIAL_STATE: tl.constexpr,
+    USE_INITIAL_MOMENTUM: tl.constexpr,
+    STORE_FINAL_STATE: tl.constexpr,
+    USE_OFFSETS: tl.constexpr,
+    HEAD_FIRST: tl.constexpr
+):
+    i_nh = tl.program_id(0)
+    i_n, i_h = i_nh // H, i_nh % H
+    if USE_OFFSETS:
+        bos, eos = tl.load(offsets + i_n).to(tl.int32), tl.load(offsets + i_n + 1).to(tl.int32)
+        T = eos - bos
+    else:
+        bos, eos = i_n * T, i_n * T + T
+    if HEAD_FIRST:
+        o_x, s_x, o_g, s_g = i_nh * T*D, D, i_nh * T, 1
+    else:
+        o_x, s_x, o_g, s_g = (bos * H + i_h) * D, H*D, bos * H + i_h, H
+    p_q, p_k, p_v, p_o = q + o_x, k + o_x, v + o_x, o + o_x
+    p_theta, p_la, p_le = theta + o_g, la + o_g, le + o_g
+
+    o_d = tl.arange(0, BD)
+    m_d = o_d < D
+    m_h = m_d[:, None] & m_d[None, :]
+    b_w = tl.load(w + i_h * D + o_d, mask=m_d, other=0.).to(tl.float32)
+    b_b = tl.load(b + i_h * D + o_d, mask=m_d, other=0.).to(tl.float32)
+
+    # [BD, BD], the memory and its momentum
+    b_h = tl.zeros([BD, BD], dtype=tl.float32)
+    b_s = tl.zeros([BD, BD], dtype=tl.float32)
+    if USE_INITIAL_STATE:
+        b_h += tl.load(h0 + i_nh * D*D + o_d[:, None] * D + o_d[None, :], mask=m_h, other=0).to(tl.float32)
+    if USE_INITIAL_MOMENTUM:
+        b_s += tl.load(s0 + i_nh * D*D + o_d[:, None] * D + o_d[None, :], mask=m_h, other=0).to(tl.float32)
+    # the memory w.r.t. which the inner gradients are taken, refreshed at the start of every chunk
+    b_h0 = b_h
+
+    for i_t in range(0, T):
+        if i_t % BT == 0:
+            b_h0 = b_h
+        # [BD]
+        b_q = tl.load(p_q + o_d, mask=m_d, other=0).to(tl.float32)
+        b_k = tl.load(p_k + o_d, mask=m_d, other=0).to(tl.float32)
+        b_v = tl.load(p_v + o_d, mask=m_d, other=0).to(tl.float32)
+        b_theta = tl.load(p_theta).to(tl.float32)
+        b_a = tl.exp(tl.load(p_la).to(tl.float32))
+        b_eta = tl.exp(tl.load(p_le).to(tl.float32))
+
+        b_z = tl.sum(b_k[:, None] * b_h0, 0)
+        b_zc = tl.where(m_d, b_z - tl.sum(b_z) / D, 0.)
+        b_sigma = tl.sqrt(tl.sum(b_zc * b_zc) / D + eps)
+        b_zh = b_zc / b_sigma
+        b_g = tl.where(m_d, (b_w * b_zh + b_b - b_v + b_k) * b_w, 0.)
+        b_u = D * b_g - tl.sum(b_g) / (b_sigma * D) - b_zh * tl.sum(b_g * b_zh) / (b_sigma * D)
+        b_u = tl.where(m_d, b_u, 0.)
+
+        b_s = b_eta * b_s - 2 * b_theta * b_k[:, None] * b_u[None, :]
+        b_h = b_a * b_h + b_s
+        b_o = tl.sum(b_q[:, None] * b_h, 0)
+        tl.store(p_o + o_d, b_o.to(p_o.dtype.element_ty), mask=m_d)
+
+        p_q += s_x
+        p_k += s_x
+        p_v += s_x
+        p_o += s_x
+        p_theta += s_g
+        p_la += s_g
+        p_le += s_g
+
+    if STORE_FINAL_STATE:
+        tl.store(ht + i_nh * D*D + o_d[:, None] * D + o_d[None, :], b_h.to(ht.dtype.element_ty), mask=m_h)
+        tl.store(st + i_nh * D*D + o_d[:, None] * D + o_d[None, :], b_s.to(st.dtype.element_ty), mask=m_h)
+
+
+def fused_recurrent_titans_linear_fwd(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    w: torch.Tensor,
+    b: torch.Tensor,
+    theta: torch.Tensor,
+    la: torch.Tensor,
+    le: torch.Tensor,
+    eps: float,
+    initial_state: Optional[torch.Tensor] = None,
+    initial_momentum: Optional[torch.Tensor] = None,
+    output_final_state: bool = False,
+    offsets: Optional[torch.LongTensor] = None,
+    head_first: bool = True,
+    BT: int = 16
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    if head_first:
+        B, H, T, D = k.shape
+    else:
+        B, T, H, D = k.shape
+    N = B if offsets is None else len(offsets) - 1
+    BD = triton.next_power_of_2(D)
+    assert BD <= 128, "current kernel does not support head dimension larger than 128."
+
+    o = torch.empty_like(v, dtype=torch.float)
+    ht, st = None, None
+    if output_final_state:
+        ht, st = k.new_empty(N, H, D, D, dtype=torch.float), k.new_empty(N, H, D, D, dtype=torch.float)
+
+    grid = (N * H,)
+    fused_recurrent_titans_linear_fwd_kernel[grid](
+        q=q,
+        k=k,
+        v=v,
+        w=w,
+        b=b,
+        theta=theta,
+        la=la,
+        le=le,
+        o=o,
+        h0=initial_state,
+        s0=initial_momentum,
+        ht=ht,
+        st=st,
+        offsets=offsets,
+        eps=eps,
+        T=T,
+        H=H,
+        D=D,
+        BT=BT,
+        BD=BD,
+        HEAD_FIRST=head_first
+    )
+    return o, ht, st
+
+
+class FusedRecurrentTitansLinearFunction(torch.autograd.Function):
+
+    @staticmethod
+    @input_guard
+    @autocast_custom_fwd
+    def forward(ctx, q, k, v, w, b, theta, la, le, eps, BT, initial_state, initial_momentum,
+                output_final_state, offsets, head_first):
+        o, final_state, final_momentum = fused_recurrent_titans_linear_fwd(
+            q=q,
+            k=k,
+            v=v,
+            w=w,
+            b=b,
+            theta=theta,
+            la=la,
+            le=le,
+            eps=eps,
+            initial_state=initial_state,
+            initial_momentum=initial_momentum,
+            output_final_state=output_final_state,
+            offsets=offsets,
+            head_first=head_first,
+            BT=BT
+        )
+        ctx.save_for_backward(q, k, v, w, b, theta, la, le, initial_state, initial_momentum)
+        ctx.eps = eps
+        ctx.BT = BT
+        ctx.offsets = offsets
+        ctx.head_first = head_first
+        return o.to(q.dtype), final_state, final_momentum
+
+    @staticmethod
+    @input_guard
+    @autocast_custom_bwd
+    def backward(ctx, do, dht, dst):
+        q, k, v, w, b, theta, la, le, initial_state, initial_momentum = ctx.saved_tensors
+        BT, offsets, head_first = ctx.BT, ctx.offsets, ctx.head_first
+        if BT < 16 or BT != triton.next_power_of_2(BT):
+            raise NotImplementedError(
+                "Backward pass is computed chunkwise and requires chunk_size to be a power of 2 >= 16. "
+                "Please use `chunk_titans_linear` for training."
+            )
+        # the recurrence computes the same function as the chunked form, whose backward pass is reused here
+        indices = prepare_chunk_indices(offsets, BT) if offsets is not None else None
+        lb = chunk_local_cumsum(la, BT, offsets=offsets, indices=indices, head_first=head_first)
+        lm = chunk_local_cumsum(le, BT, offsets=offsets, indices=indices, head_first=head_first)
+        dq, dk, dv, dw, db, dtheta, dla, dle, dh0, ds0 = chunk_titans_linear_bwd(
+            q=q,
+            k=k,
+            v=v,
+            w=w,
+            b=b,
+            theta=theta,
+            lb=lb,
+            lm=lm,
+            eps=ctx.eps,
+            do=do,
+            dht=dht,
+            dst=dst,
+            initial_state=initial_state,
+            initial_momentum=initial_momentum,
+            offsets=offsets,
+            indices=indices,
+            head_first=head_first,
+            BT=BT
+        )
+        return (dq.to(q), dk.to(k), dv.to(v), dw.to(w), db.to(b), dtheta.to(theta), dla, dle,
+                None, None, dh0, ds0, None, None, None)
+
+
+def fused_recurrent_titans_linear(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    w: torch.Tensor,
+    b: torch.Tensor,
+    theta: torch.Tensor,
+    alpha: torch.Tensor,
+    eta: torch.Tensor,
+    eps: float = 1e-6,
+    chunk_size: int = 16,
+    initial_state: Optional[Union[torch.Tensor, Tuple[torch.Tensor, torch.Tensor]]] = None,
+    output_final_state: bool = False,
+    cu_seqlens: Optional[torch.LongTensor] = None,
+    head_first: bool = True
+) -> Tuple[torch.Tensor, Optional[Tuple[torch.Tensor, torch.Tensor]]]:
+    r"""
+    Args:
+        q (torch.Tensor):
+            queries of shape `[B, H, T, D]` if `head_first=True` else `[B, T, H, D]`.
+        k (torch.Tensor):
+            keys of shape `[B, H, T, D]` if `head_first=True` else `[B, T, H, D]`.
+        v (torch.Tensor):
+            values of shape `[B, H, T, D]` if `head_first=True` else `[B, T, H, D]`.
+        w (torch.Tensor):
+            layer norm weight of shape `[H, D]`.
+        b (torch.Tensor):
+            layer norm bias of shape `[H, D]`.
+        theta (torch.Tensor):
+            learning rates of shape `[B, H, T, 1]` if `head_first=True` else `[B, T, H, 1]`.
+        alpha (torch.Tensor):
+            forgetting rates of the memory of shape `[B, H, T, 1]` if `head_first=True` else `[B, T, H, 1]`.
+        eta (torch.Tensor):
+            momentum decays of shape `[B, H, T, 1]` if `head_first=True` else `[B, T, H, 1]`.
+        eps (float):
+            The epsilon of the layer norms. Default: `1e-6`.
+        chunk_size (int):
+            The number of steps after which the memory w.r.t. which the inner gradients are taken is refreshed.
+            The backward pass requires it to be a power of 2 no smaller than 16. Default: `16`.
+        initial_state (Optional[Union[torch.Tensor, Tuple[torch.Tensor, torch.Tensor]]]):
+            Initial memory of shape `[N, H, D, D]` for `N` input sequences, optionally paired with its momentum
+            of the same shape, which defaults to zeros. Default: `None`.
+        output_final_state (Optional[bool]):
+            Whether to output the final memory and momentum. Default: `False`.
+        cu_seqlens (torch.LongTensor):
+            Cumulative sequence lengths of shape `[N+1]` used for variable-length training,
+            consistent with the FlashAttention API.
+        head_first (Optional[bool]):
+            Whether the inputs are in the head-first format, which is not supported for variable-length inputs.
+            Default: `True`.
+
+    Returns:
+        o (torch.Tensor):
+            Outputs of shape `[B, H, T, D]` if `head_first=True` else `[B, T, H, D]`.
+        final_state (Tuple[torch.Tensor, torch.Tensor]):
+            Final memory and momentum of shape `[N, H, D, D]` if `output_final_state=True` else `None`.
+    """
+    assert q.dtype == k.dtype == v.dtype
+    assert k.shape[-1] == v.shape[-1], "DK must equal to DV."
+    theta, la, le, initial_state, initial_momentum = prepare_titans_linear_inputs(
+        q, theta, alpha, eta, initial_state, cu_seqlens, head_first
+    )
+    o, final_state, final_momentum = FusedRecurrentTitansLinearFunction.apply(
+        q,
+        k,
+        v,
+        w,
+        b,
+        theta,
+        la,
+        le,
+        eps,
+        chunk_size,
+        initial_state,
+        initial_momentum,
+        output_final_state,
+        cu_seqlens,
+        head_first
+    )
+    o = norm_residual(o, w, b, eps, head_first)
+    return o, ((final_state, final_momentum) if output_final_state else None)
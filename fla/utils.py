@@ -2,65 +2,171 @@
 
 import contextlib
 import functools
+import inspect
+import json
 import os
+import sys
+import warnings
+from collections import OrderedDict, namedtuple
 from functools import lru_cache
-from typing import Any, Callable, Dict, Literal, Optional, Tuple
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
 
 import torch
 import triton
 from packaging import version
 
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
 
 def tensor_cache(
-    fn: Callable[..., torch.Tensor]
+    fn: Optional[Callable[..., torch.Tensor]] = None,
+    *,
+    maxsize: int = 16
 ) -> Callable[..., torch.Tensor]:
     """
-    A decorator that caches the most recent result of a function with tensor inputs.
-
-    This decorator will store the output of the decorated function for the most recent set of input tensors.
-    If the function is called again with the same input tensors, it will return the cached result.
+    A decorator that caches the results of a function with tensor inputs in a bounded LRU cache.
 
+    Tensor arguments are keyed by their identity and version counter, so in-place updates invalidate the entries,
+    and the other arguments by their values.
+    Unlike a single-entry cache, interleaved calls with different arguments,
+    e.g., `prepare_chunk_indices(offsets, 64)` and `prepare_chunk_indices(offsets, 16)` from different layers,
+    are all served from the cache.
+    The cached inputs are kept alive by the cache, so `maxsize` should stay small.
 
     Args:
         fn (Callable[..., torch.Tensor]):
             The function to be decorated. It should take tensor inputs and return tensor outputs.
+        maxsize (int):
+            The maximum number of cached calls, with the least recently used ones evicted first. Default: 16.
 
     Returns:
         Callable[..., torch.Tensor]:
-            A wrapped version of the input function with single-entry caching.
+            A wrapped version of the input function with LRU caching,
+            which also exposes `cache_info()` for the hit/miss statistics and `cache_clear()`.
     """
-    last_args: Optional[Tuple] = None
-    last_kwargs: Optional[Dict] = None
-    last_result: Any = None
+    if fn is None:
+        return functools.partial(tensor_cache, maxsize=maxsize)
 
-    @functools.wraps(fn)
-    def wrapper(*args: Any, **kwargs: Any) -> Any:
-        nonlocal last_args, last_kwargs, last_result
+    cache: OrderedDict = OrderedDict()
+    hits = misses = 0
 
-        if last_args is not None and last_kwargs is not None:
-            if len(args) == len(last_args) and len(kwargs) == len(last_kwargs):
-                if all(a is b for a, b in zip(args, last_args)) and \
-                        all(k in last_kwargs and v is last_kwargs[k] for k, v in kwargs.items()):
-                    return last_result
+    def make_key(x: Any) -> Any:
+        if not isinstance(x, torch.Tensor):
+            return x
+        # inference tensors do not track their versions
+        return id(x), (0 if x.is_inference() else x._version)
 
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        nonlocal hits, misses
+        try:
+            key = (tuple(make_key(a) for a in args), tuple((k, make_key(v)) for k, v in kwargs.items()))
+            hash(key)
+        except TypeError:
+            misses += 1
+            return fn(*args, **kwargs)
+        if key in cache:
+            hits += 1
+            cache.move_to_end(key)
+            return cache[key][-1]
+        misses += 1
         result = fn(*args, **kwargs)
-        last_args, last_kwargs, last_result = args, kwargs, result
+        # the inputs are stored along with the result so that their ids can not be reused by other tensors
+        cache[key] = (args, kwargs, result)
+        if len(cache) > maxsize:
+            cache.popitem(last=False)
         return result
 
+    def cache_info() -> CacheInfo:
+        return CacheInfo(hits, misses, maxsize, len(cache))
+
+    def cache_clear():
+        nonlocal hits, misses
+        cache.clear()
+        hits = misses = 0
+
+    wrapper.cache_info = cache_info
+    wrapper.cache_clear = cache_clear
     return wrapper
 
 
+# the number and bytes of the tensors copied by `input_guard` and `require_version` to make them contiguous,
+# which helps to spot the activations that are silently duplicated on every op call
+_contiguous_copy_stats = {'tensors': 0, 'bytes': 0}
+
+
+def get_contiguous_copy_stats() -> Dict[str, int]:
+    """
+    Returns the number of tensors and bytes copied by `input_guard` so far to make the op inputs contiguous.
+    """
+    return dict(_contiguous_copy_stats)
+
+
+def reset_contiguous_copy_stats():
+    _contiguous_copy_stats.update(tensors=0, bytes=0)
+
+
+def _contiguous(x: torch.Tensor) -> torch.Tensor:
+    if x.is_contiguous():
+        return x
+    _contiguous_copy_stats['tensors'] += 1
+    _contiguous_copy_stats['bytes'] += x.numel() * x.element_size()
+    return x.contiguous()
+
+
+def is_strided(x: torch.Tensor) -> bool:
+    """
+    Whether a 4-D tensor can be addressed through the stride of its second dim alone,
+    i.e., the last two dims are packed and the first two dims are laid out with `x.stride(0) == x.shape[1] * x.stride(1)`.
+    This covers the `[B, T, H, D]` views split from fused projections along the last dim.
+    The strides of size-1 leading dims are arbitrary and not checked.
+    """
+    return (
+        x.dim() == 4 and
+        x.stride(-1) == 1 and
+        x.stride(-2) == x.shape[-1] and
+        (x.shape[0] == 1 or x.shape[1] == 1 or x.stride(0) == x.shape[1] * x.stride(1))
+    )
+
+
+def row_stride(x: torch.Tensor) -> int:
+    """
+    The stride of the second dim of a 4-D tensor passed to the kernels reading strided views.
+    Contiguous tensors report their packed stride, as the strides of size-1 dims can be arbitrary,
+    and so does the second dim of size 1, whose rows are only offset across the first dim.
+    """
+    if x.is_contiguous():
+        return x.shape[2] * x.shape[3]
+    return x.stride(0) if x.shape[1] == 1 else x.stride(1)
+
+
 def input_guard(
-    fn: Callable[..., torch.Tensor]
+    fn: Optional[Callable[..., torch.Tensor]] = None,
+    *,
+    strided: Tuple[str, ...] = ()
 ) -> Callable[..., torch.Tensor]:
     """
     A decorator to make sure all input tensors are contiguous and set the device based on input tensors.
+
+    Args:
+        strided (Tuple[str, ...]):
+            Names of the arguments the kernels read through explicit strides.
+            They are passed as they are if `is_strided` holds, and copied to be contiguous otherwise.
     """
+    if fn is None:
+        return functools.partial(input_guard, strided=strided)
+    params = list(inspect.signature(fn).parameters)
+    positions = {i for i, name in enumerate(params) if name in strided}
+
+    def guard(x, keep):
+        if not isinstance(x, torch.Tensor):
+            return x
+        return x if keep and is_strided(x) else _contiguous(x)
 
     @functools.wraps(fn)
     def wrapper(*args, **kwargs):
-        contiguous_args = (i if not isinstance(i, torch.Tensor) else i.contiguous() for i in args)
-        contiguous_kwargs = {k: (v if not isinstance(v, torch.Tensor) else v.contiguous()) for k, v in kwargs.items()}
+        contiguous_args = (guard(i, n in positions) for n, i in enumerate(args))
+        contiguous_kwargs = {k: guard(v, k in strided) for k, v in kwargs.items()}
 
         tensor = None
         for arg in args:
@@ -73,7 +179,7 @@ def input_guard(
                     tensor = value
                     break
 
-        if tensor is not None:
+        if tensor is not None and tensor.device.type != 'cpu':
             ctx = custom_device_ctx(tensor.device.index)
         else:
             ctx = contextlib.nullcontext()
@@ -97,8 +203,8 @@ def require_version(version, hint):
             from transformers.utils.versions import require_version
             require_version(version, hint)
             return fn(ctx,
-                      *(i if not isinstance(i, torch.Tensor) else i.contiguous() for i in args),
-                      **{k: (v if not isinstance(v, torch.Tensor) else v.contiguous()) for k, v in kwargs.items()})
+                      *(i if not isinstance(i, torch.Tensor) else _contiguous(i) for i in args),
+                      **{k: (v if not isinstance(v, torch.Tensor) else _contiguous(v)) for k, v in kwargs.items()})
         return wrapper
     return decorator
 
@@ -205,3 +311,206 @@ else:
 
     def custom_device_ctx(index: int):
         return torch.cuda.device(index)
+
+
+class AutotuneStore:
+    r"""
+    Configs selected by Triton autotuners, persisted to a JSON file so that new processes skip the benchmarking.
+
+    Entries are keyed by device name and library versions, then by kernel, then by the values of the autotuning keys,
+    so that a single file, e.g., a profile shipped along with a deployment, may serve several devices.
+
+    Args:
+        path (Optional[str]):
+            The JSON file to load from and persist to. If `None`, nothing is persisted.
+        profile (Optional[str]):
+            A read-only JSON file in the same format to pre-warm from, overridden by the entries of `path`.
+    """
+
+    def __init__(self, path: Optional[str] = None, profile: Optional[str] = None):
+        self.path = path
+        self.profile = profile
+        self.scope = '|'.join((get_device_name(), f'fla-{get_fla_version()}', f'triton-{triton.__version__}'))
+        self.entries: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for file in (profile, path):
+            if file is not None and os.path.exists(file):
+                self._merge(self._read(file))
+
+    @staticmethod
+    def _read(path: str) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _merge(self, entries: Dict[str, Dict[str, Dict[str, Any]]]):
+        for kernel, configs in entries.get(self.scope, {}).items():
+            self.entries.setdefault(kernel, {}).update(configs)
+
+    @staticmethod
+    def encode_key(key: Tuple) -> str:
+        return json.dumps([k if k is None or isinstance(k, (bool, int, float, str)) else str(k) for k in key])
+
+    @staticmethod
+    def encode_config(config: triton.Config) -> Dict[str, Any]:
+        return {k: v for k, v in config.all_kwargs().items() if v is None or isinstance(v, (bool, int, float, str))}
+
+    def lookup(self, kernel: str, key: Tuple, configs: List[triton.Config]) -> Optional[triton.Config]:
+        entry = self.entries.get(kernel, {}).get(self.encode_key(key), None)
+        if entry is None:
+            return None
+        # only configs still in the search space are accepted, in case the grid has changed since
+        return next((config for config in configs if self.encode_config(config) == entry), None)
+
+    def record(self, kernel: str, key: Tuple, config: triton.Config):
+        entry = self.encode_config(config)
+        self.entries.setdefault(kernel, {})[self.encode_key(key)] = entry
+        if self.path is None:
+            return
+        # merge with the entries persisted by other processes in the meantime, and replace the file atomically
+        entries = self._read(self.path)
+        entries.setdefault(self.scope, {}).setdefault(kernel, {})[self.encode_key(key)] = entry
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(entries, f, indent=2)
+            os.replace(tmp, self.path)
+        except OSError:
+            warnings.warn(f"Failed to persist the autotuning results to {self.path}.")
+
+    def save(self, path: str):
+        r"""
+        Dumps all entries of the current device and versions to `path`, e.g., to ship them as a profile.
+        """
+        entries = self._read(path) if os.path.exists(path) else {}
+        entries[self.scope] = self.entries
+        with open(path, 'w') as f:
+            json.dump(entries, f, indent=2)
+
+
+class AutotuneCache(dict):
+    r"""
+    A drop-in replacement for the in-memory cache of a Triton autotuner, falling back to an :class:`AutotuneStore`.
+    """
+
+    def __init__(self, autotuner: triton.runtime.Autotuner, kernel: str, store: AutotuneStore):
+        super().__init__(autotuner.cache)
+        self.autotuner = autotuner
+        self.kernel = kernel
+        self.store = store
+
+    def __contains__(self, key: Tuple) -> bool:
+        if super().__contains__(key):
+            return True
+        config = self.store.lookup(self.kernel, key, self.autotuner.configs)
+        if config is None:
+            return False
+        super().__setitem__(key, config)
+        return True
+
+    def __setitem__(self, key: Tuple, config: triton.Config):
+        super().__setitem__(key, config)
+        self.store.record(self.kernel, key, config)
+
+
+def get_device_name() -> str:
+    try:
+        return device_torch_lib.get_device_name()
+    except BaseException:
+        return device
+
+
+def get_fla_version() -> str:
+    import fla
+    return getattr(fla, '__version__', 'unknown')
+
+
+def _attach_autotune_cache(autotuner: triton.runtime.Autotuner, store: AutotuneStore):
+    if isinstance(autotuner.cache, AutotuneCache):
+        autotuner.cache.store = store
+    else:
+        fn = getattr(autotuner, 'base_fn', autotuner.fn)
+        autotuner.cache = AutotuneCache(autotuner, f'{fn.__module__}.{fn.__name__}', store)
+
+
+def _is_fla_kernel(fn: Any) -> bool:
+    # unwrap the kernel, e.g., from heuristics and jit, like `Autotuner.base_fn`
+    while not inspect.isfunction(fn) and hasattr(fn, 'fn'):
+        fn = fn.fn
+    module = getattr(fn, '__module__', None) or ''
+    return module == 'fla' or module.startswith('fla.')
+
+
+def _lazy_benchmarker(*args, **kwargs):
+    # the benchmarker of the active driver, looked up when a kernel is tuned for the first time rather than on creation
+    return triton.runtime.autotuner.driver.active.get_benchmarker()(*args, **kwargs)
+
+
+# the store backing the autotuners of `fla` kernels, including those created after `enable_autotune_cache` is called
+_autotune_store: Optional[AutotuneStore] = None
+# without any active driver, e.g., on CPU-only hosts, Triton autotuners fail to look up the benchmarker on creation,
+# so the lookup is deferred for `fla` kernels to allow importing them, as they are never launched by the CPU paths
+_lazy_do_bench = get_available_device() == 'cpu' and \
+    'do_bench' in inspect.signature(triton.runtime.Autotuner.__init__).parameters
+
+
+def _hook_autotuners():
+    autotuner_init = triton.runtime.Autotuner.__init__
+    if getattr(autotuner_init, '_fla_hooked', False):
+        return
+
+    @functools.wraps(autotuner_init)
+    def fla_autotuner_init(self, fn, *args, **kwargs):
+        # other autotuners in the process are left untouched
+        if not _is_fla_kernel(fn):
+            return autotuner_init(self, fn, *args, **kwargs)
+        if _lazy_do_bench and kwargs.get('do_bench', None) is None:
+            kwargs['do_bench'] = _lazy_benchmarker
+        autotuner_init(self, fn, *args, **kwargs)
+        if _autotune_store is not None:
+            _attach_autotune_cache(self, _autotune_store)
+    fla_autotuner_init._fla_hooked = True
+    triton.runtime.Autotuner.__init__ = fla_autotuner_init
+
+
+if _lazy_do_bench:
+    _hook_autotuners()
+
+
+def enable_autotune_cache(
+    path: Optional[str] = None,
+    profile: Optional[str] = None,
+    persist: bool = True
+) -> AutotuneStore:
+    r"""
+    Backs the autotuners of all `fla` kernels with an on-disk :class:`AutotuneStore`,
+    both those of the loaded modules and those of the modules imported afterwards, e.g., lazily by the op registry.
+
+    This is done automatically on import if `FLA_AUTOTUNE_CACHE=1` or `FLA_AUTOTUNE_PROFILE` is set.
+
+    Args:
+        path (Optional[str]):
+            The JSON file to persist to. Defaults to `autotune.json` under `$FLA_CACHE_DIR`, i.e., `~/.cache/fla`.
+        profile (Optional[str]):
+            A read-only JSON file to pre-warm from. Defaults to `$FLA_AUTOTUNE_PROFILE`.
+        persist (bool):
+            Whether to persist the configs selected by new autotuning runs. Default: `True`.
+    """
+    global _autotune_store
+    if path is None and persist:
+        path = os.path.join(os.environ.get('FLA_CACHE_DIR', os.path.expanduser('~/.cache/fla')), 'autotune.json')
+    store = AutotuneStore(path if persist else None, profile or os.environ.get('FLA_AUTOTUNE_PROFILE', None))
+    _autotune_store = store
+    _hook_autotuners()
+    for name, module in list(sys.modules.items()):
+        if module is None or not (name == 'fla' or name.startswith('fla.')):
+            continue
+        for obj in list(vars(module).values()):
+            # autotuners may be wrapped by heuristics
+            while isinstance(obj, triton.runtime.KernelInterface) and not isinstance(obj, triton.runtime.Autotuner):
+                obj = getattr(obj, 'fn', None)
+            if isinstance(obj, triton.runtime.Autotuner):
+                _attach_autotune_cache(obj, store)
+    return store
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import torch
+
+from fla.layers.abc import ABCAttention
+from fla.models.utils import Cache
+
+
+@pytest.mark.parametrize("B", [2])
+@pytest.mark.parametrize("T", [64])
+@pytest.mark.parametrize("H", [256])
+def test_abc_decoding(
+    B: int,
+    T: int,
+    H: int
+):
+    from fla.utils import device
+    torch.manual_seed(42)
+    model = ABCAttention(hidden_size=H, num_heads=4, layer_idx=0).to(device)
+    x = torch.randn(B, T, H).to(device)
+
+    with torch.no_grad():
+        ref, *_ = model(x)
+        # prefill the first half of the inputs, and then decode the rest token by token from the cached states
+        cache = Cache()
+        tri = [model(x[:, :T // 2], past_key_values=cache, use_cache=True)[0]]
+        for i in range(T // 2, T):
+            tri.append(model(x[:, i:i+1], past_key_values=cache, use_cache=True)[0])
+    torch.testing.assert_close(torch.cat(tri, 1), ref, rtol=1e-3, atol=1e-3)
+
+
+@pytest.mark.parametrize("T", [64])
+@pytest.mark.parametrize("H", [256])
+def test_abc_varlen(
+    T: int,
+    H: int
+):
+    from fla.utils import device
+    torch.manual_seed(42)
+    model = ABCAttention(hidden_size=H, num_heads=4, layer_idx=0).to(device)
+    x = torch.randn(1, T, H).to(device)
+    cu_seqlens = torch.tensor([0, T // 4, T], dtype=torch.long, device=device)
+
+    # the varlen inputs are only supported by the forward-only recurrent kernel
+    with pytest.raises(NotImplementedError):
+        model(x, cu_seqlens=cu_seqlens)
+    model.eval()
+    with torch.no_grad():
+        ref = torch.cat([model(x[:, bos:eos])[0] for bos, eos in zip(cu_seqlens[:-1], cu_seqlens[1:])], 1)
+        tri, *_ = model(x, cu_seqlens=cu_seqlens)
+    torch.testing.assert_close(tri, ref, rtol=1e-3, atol=1e-3)
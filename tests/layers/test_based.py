@@ -4,6 +4,8 @@ import pytest
 import torch
 
 from fla.layers.based import BasedLinearAttention
+from fla.layers.rebased import ReBasedLinearAttention
+from fla.models.utils import Cache
 
 
 @pytest.mark.parametrize("B", [4, 8])
@@ -20,10 +22,36 @@ def test_based(
     x = torch.randn(B, T, H).to(dtype).to(device).requires_grad_(True)
     dy = torch.randn(B, T, H).to(dtype).to(device)
     model = BasedLinearAttention(H, mode='chunk').to(dtype).to(device)
-    y = model(x)
+    y, *_ = model(x)
     y.backward(dy, retain_graph=True)
     x_grad, x.grad = x.grad, None
     y2 = model.forward_reference(x)
     y2.backward(dy)
     assert y.allclose(y2, 0, 1e-3), (y - y2).abs().max()
     assert x_grad.allclose(x.grad, 0, 1e-3), (x_grad - x.grad).abs().max()
+
+
+@pytest.mark.parametrize("layer_cls", [BasedLinearAttention, ReBasedLinearAttention])
+@pytest.mark.parametrize("B", [2])
+@pytest.mark.parametrize("T", [64])
+@pytest.mark.parametrize("H", [256])
+def test_based_decoding(
+    layer_cls: type,
+    B: int,
+    T: int,
+    H: int
+):
+    from fla.utils import device
+    torch.manual_seed(42)
+    model = layer_cls(H, num_heads=4, num_key_value_heads=4, mode='parallel', layer_idx=0).to(device)
+    x = torch.randn(B, T, H).to(device)
+
+    with torch.no_grad():
+        ref, *_ = model(x)
+        # prefill the first half of the inputs, and then decode the rest token by token from the cached states
+        cache = Cache()
+        tri = [model(x[:, :T // 2], past_key_values=cache, use_cache=True)[0]]
+        for i in range(T // 2, T):
+            tri.append(model(x[:, i:i+1], past_key_values=cache, use_cache=True)[0])
+    # the normalizers of the first few tokens can be as small as `eps`, which amplifies the rounding errors
+    torch.testing.assert_close(torch.cat(tri, 1), ref, rtol=1e-2, atol=1e-2)
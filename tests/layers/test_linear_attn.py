@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import torch
+
+from fla.layers.linear_attn import LinearAttention
+from fla.models.utils import Cache
+
+
+@pytest.mark.parametrize("mode", ['chunk', 'fused_chunk', 'fused_recurrent'])
+@pytest.mark.parametrize("feature_map", ['elementwise_product', 'elu'])
+@pytest.mark.parametrize("normalize", [False, True])
+@pytest.mark.parametrize("B", [2])
+@pytest.mark.parametrize("T", [64])
+@pytest.mark.parametrize("H", [256])
+def test_linear_attn_decoding(
+    mode: str,
+    feature_map: str,
+    normalize: bool,
+    B: int,
+    T: int,
+    H: int
+):
+    from fla.utils import device
+    torch.manual_seed(42)
+    model = LinearAttention(
+        mode=mode,
+        hidden_size=H,
+        num_heads=4,
+        feature_map=feature_map,
+        do_feature_map_norm=normalize,
+        layer_idx=0
+    ).to(device)
+    x = torch.randn(B, T, H).to(device)
+
+    with torch.no_grad():
+        ref, *_ = model(x)
+        # prefill the first half of the inputs, and then decode the rest token by token from the cached states
+        cache = Cache()
+        tri = [model(x[:, :T // 2], past_key_values=cache, use_cache=True)[0]]
+        for i in range(T // 2, T):
+            tri.append(model(x[:, i:i+1], past_key_values=cache, use_cache=True)[0])
+    torch.testing.assert_close(torch.cat(tri, 1), ref, rtol=1e-3, atol=1e-3)
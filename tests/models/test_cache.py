@@ -0,0 +1,475 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import torch
+
+from fla.models import GLAConfig, GLAForCausalLM
+from fla.models.utils import Cache, PrefixStateCache, QuantizedCache, StatePool
+from fla.utils import device
+
+
+@pytest.mark.parametrize("B", [2])
+@pytest.mark.parametrize("D", [64])
+@pytest.mark.parametrize("window_size", [1, 7, 64])
+@pytest.mark.parametrize("dtype", [torch.float])
+def test_cache_sliding_window(
+    B: int,
+    D: int,
+    window_size: int,
+    dtype: torch.dtype
+):
+    torch.manual_seed(42)
+    cache = Cache()
+    ref_k, ref_v = None, None
+    for input_size in [3, 1, 1, window_size + 5, 1, 2, 1, window_size, 1]:
+        k = torch.randn(B, input_size, D, dtype=dtype, device=device)
+        v = torch.randn(B, input_size, D, dtype=dtype, device=device)
+        ref_k = k if ref_k is None else torch.cat((ref_k, k), 1)
+        ref_v = v if ref_v is None else torch.cat((ref_v, v), 1)
+        cache.update(attn_state=(k, v), layer_idx=0, offset=input_size, cache_kwargs=dict(window_size=window_size))
+        tri_k, tri_v = cache[0]['attn_state']
+        assert cache[0]['attn_buffer'][0].shape == (B, 2 * window_size, D)
+        torch.testing.assert_close(tri_k, ref_k[:, -window_size:])
+        torch.testing.assert_close(tri_v, ref_v[:, -window_size:])
+
+
+@pytest.mark.parametrize("B", [4])
+@pytest.mark.parametrize("D", [64])
+@pytest.mark.parametrize("window_size", [7])
+@pytest.mark.parametrize("dtype", [torch.float])
+def test_cache_reorder(
+    B: int,
+    D: int,
+    window_size: int,
+    dtype: torch.dtype
+):
+    torch.manual_seed(42)
+    cache = Cache()
+    h = torch.randn(B, 2, D, D, dtype=dtype, device=device)
+    conv_state = torch.randn(B, D, 4, dtype=dtype, device=device)
+    k, v = torch.randn(2, B, window_size + 3, D, dtype=dtype, device=device)
+    cache.update(recurrent_state=h.clone(), conv_state=(conv_state.clone(), None), layer_idx=0, offset=window_size + 3)
+    cache.update(attn_state=(k, v), layer_idx=1, offset=window_size + 3, cache_kwargs=dict(window_size=window_size))
+
+    beam_idx = torch.tensor([2, 2, 0, 1], device=device)
+    cache.reorder_cache(beam_idx)
+    torch.testing.assert_close(cache[0]['recurrent_state'], h[beam_idx])
+    torch.testing.assert_close(cache[0]['conv_state'][0], conv_state[beam_idx])
+    torch.testing.assert_close(cache[1]['attn_state'][0], k[beam_idx, -window_size:])
+    torch.testing.assert_close(cache[1]['attn_state'][1], v[beam_idx, -window_size:])
+
+    cache.batch_repeat_interleave(2)
+    indices = torch.tensor([1, 4, 6], device=device)
+    cache.batch_select_indices(indices)
+    beam_idx = beam_idx.repeat_interleave(2)[indices]
+    torch.testing.assert_close(cache[0]['recurrent_state'], h[beam_idx])
+    torch.testing.assert_close(cache[1]['attn_state'][0], k[beam_idx, -window_size:])
+
+    with pytest.raises(ValueError):
+        cache.crop(-1)
+
+
+@pytest.mark.parametrize("B", [1])
+@pytest.mark.parametrize("H", [2])
+@pytest.mark.parametrize("D", [64])
+@pytest.mark.parametrize("dtype", [torch.float])
+def test_prefix_state_cache(
+    B: int,
+    H: int,
+    D: int,
+    dtype: torch.dtype
+):
+    torch.manual_seed(42)
+    cache = Cache()
+    h = torch.randn(B, H, D, D, dtype=dtype, device=device)
+    cache.update(recurrent_state=h, layer_idx=0, offset=16)
+    num_bytes = h.numel() * h.element_size()
+
+    prefix_cache = PrefixStateCache(max_bytes=2 * num_bytes)
+    prefix_cache.put(torch.arange(16, device=device), cache)
+    assert torch.arange(16, device=device) in prefix_cache
+
+    input_ids, restored = prefix_cache.restore(torch.arange(20, device=device)[None])
+    torch.testing.assert_close(input_ids, torch.arange(16, 20, device=device)[None])
+    assert restored.get_seq_length() == 16
+    torch.testing.assert_close(restored[0]['recurrent_state'], h)
+    assert restored[0]['recurrent_state'].data_ptr() != h.data_ptr()
+
+    # the last token is always left to be prefilled
+    input_ids, restored = prefix_cache.restore(torch.arange(16, device=device)[None])
+    assert restored is None and input_ids.shape[1] == 16
+
+    prefix_cache.put(torch.arange(8, device=device), cache)
+    prefix_cache.put(torch.arange(4, device=device), cache)
+    assert len(prefix_cache) == 2 and prefix_cache.num_bytes == 2 * num_bytes
+    assert torch.arange(16, device=device) not in prefix_cache
+    assert prefix_cache.get(torch.arange(12, device=device))[0] == 8
+
+
+@pytest.mark.parametrize("H", [2])
+@pytest.mark.parametrize("D", [64])
+@pytest.mark.parametrize("window_size", [7])
+@pytest.mark.parametrize("dtype", [torch.float])
+def test_state_pool(
+    H: int,
+    D: int,
+    window_size: int,
+    dtype: torch.dtype
+):
+    torch.manual_seed(42)
+    pool = StatePool(num_slots=4)
+    refs = {}
+    for request_id, input_size in [('a', 3), ('b', window_size + 2), ('c', 1)]:
+        cache = Cache()
+        h = torch.randn(1, H, D, D, dtype=dtype, device=device)
+        k, v = torch.randn(2, 1, input_size, D, dtype=dtype, device=device)
+        cache.update(recurrent_state=h, layer_idx=0, offset=input_size)
+        cache.update(attn_state=(k, v), layer_idx=1, offset=input_size, cache_kwargs=dict(window_size=window_size))
+        pool.allocate(request_id)
+        pool.scatter([request_id], cache, num_tokens=input_size)
+        refs[request_id] = (h, k)
+    pool.release('a')
+    assert pool.num_free_slots == 2 and 'a' not in pool
+
+    request_ids = ['c', 'b']
+    # the recurrent states are not marked as updatable in-place by their layers
+    with pytest.raises(ValueError, match='state_indices'):
+        pool.gather(request_ids, inplace=True)
+    cache, attention_mask = pool.gather(request_ids, num_tokens=1)
+    assert attention_mask.shape == (2, window_size + 3)
+    assert attention_mask.sum(-1).tolist() == [2, window_size + 3]
+    for i, request_id in enumerate(request_ids):
+        h, k = refs[request_id]
+        size = min(k.shape[1], window_size)
+        torch.testing.assert_close(cache[0]['recurrent_state'][i], h[0])
+        torch.testing.assert_close(cache[1]['attn_state'][0][i, -size:], k[0, -size:])
+
+    k_new = torch.randn(2, 1, D, dtype=dtype, device=device)
+    cache.update(recurrent_state=cache[0]['recurrent_state'] + 1, layer_idx=0, offset=1)
+    cache.update(attn_state=(k_new, k_new), layer_idx=1, offset=1, cache_kwargs=dict(window_size=window_size))
+    pool.scatter(request_ids, cache, num_tokens=1)
+
+    cache, _ = pool.gather(['b'])
+    h, k = refs['b']
+    torch.testing.assert_close(cache[0]['recurrent_state'][0], h[0] + 1)
+    torch.testing.assert_close(cache[1]['attn_state'][0][0], torch.cat((k[0], k_new[1]))[-window_size:])
+
+
+@pytest.mark.parametrize("T", [4])
+def test_state_pool_inplace(T: int):
+    torch.manual_seed(42)
+    config = GLAConfig(
+        hidden_size=256,
+        num_hidden_layers=2,
+        num_heads=4,
+        use_short_conv=True,
+        vocab_size=1000,
+        fuse_cross_entropy=False
+    )
+    model = GLAForCausalLM(config).to(device).eval()
+    ref_pool, tri_pool = StatePool(num_slots=4), StatePool(num_slots=4)
+    with torch.no_grad():
+        for request_id, prompt_len in [('a', 7), ('b', 3)]:
+            input_ids = torch.randint(0, config.vocab_size, (1, prompt_len), device=device)
+            outputs = model(input_ids=input_ids, use_cache=True)
+            for pool in (ref_pool, tri_pool):
+                pool.allocate(request_id)
+                pool.scatter([request_id], outputs.past_key_values, num_tokens=prompt_len)
+
+        # decode with the slots in a different order than they were allocated
+        request_ids = ['b', 'a']
+        next_ids = torch.randint(0, config.vocab_size, (len(request_ids), T), device=device)
+        for i in range(T):
+            ref_cache, _ = ref_pool.gather(request_ids)
+            ref = model(input_ids=next_ids[:, i:i+1], past_key_values=ref_cache, use_cache=True).logits
+            ref_pool.scatter(request_ids, ref_cache)
+
+            tri_cache, _ = tri_pool.gather(request_ids, inplace=True)
+            tri = model(input_ids=next_ids[:, i:i+1], past_key_values=tri_cache, use_cache=True).logits
+            # the pooled recurrent states are updated by the kernels without being copied out and back
+            for layer_idx, pooled in enumerate(tri_pool.states):
+                assert tri_cache[layer_idx]['recurrent_state'] is pooled['recurrent_state']
+            tri_pool.scatter(request_ids, tri_cache)
+            torch.testing.assert_close(tri, ref, rtol=1e-3, atol=1e-3)
+    for ref, tri in zip(ref_pool.states, tri_pool.states):
+        torch.testing.assert_close(tri['recurrent_state'], ref['recurrent_state'], rtol=1e-3, atol=1e-3)
+        for x, y in zip(tri['conv_state'], ref['conv_state']):
+            torch.testing.assert_close(x, y)
+
+
+@pytest.mark.parametrize("B", [2])
+@pytest.mark.parametrize("H", [4])
+@pytest.mark.parametrize("D", [64])
+@pytest.mark.parametrize("dtype", ['int8', 'float8_e4m3fn'])
+@pytest.mark.parametrize("granularity", ['head', 'row'])
+def test_quantized_cache(
+    B: int,
+    H: int,
+    D: int,
+    dtype: str,
+    granularity: str
+):
+    torch.manual_seed(42)
+    cache = QuantizedCache(dtype=dtype, granularity=granularity)
+    h = torch.randn(B, H, D, D, device=device)
+    conv_state = torch.randn(B, D, 4, device=device)
+    state = cache.update(recurrent_state=h, conv_state=(conv_state,), layer_idx=0)
+    assert cache.states[0]['recurrent_state'].data.dtype == getattr(torch, dtype)
+    assert cache.states[0]['conv_state'][0] is conv_state
+    for tri in (state['recurrent_state'], cache[0]['recurrent_state'], next(iter(cache))['recurrent_state']):
+        assert tri.dtype == torch.float
+        assert (tri - h).norm() / h.norm() < (0.01 if dtype == 'int8' else 0.05)
+
+    beam_idx = torch.tensor([1, 0], device=device)
+    ref = cache[0]['recurrent_state'][beam_idx]
+    cache.reorder_cache(beam_idx)
+    torch.testing.assert_close(cache[0]['recurrent_state'], ref)
+
+
+@pytest.mark.parametrize("B", [2])
+@pytest.mark.parametrize("H", [4])
+@pytest.mark.parametrize("D", [64])
+@pytest.mark.parametrize("window_size", [7])
+@pytest.mark.parametrize("quantized", [True, False])
+@pytest.mark.skipif(device == 'cpu', reason="Offloading requires an accelerator")
+def test_cache_offload(
+    tmp_path,
+    B: int,
+    H: int,
+    D: int,
+    window_size: int,
+    quantized: bool
+):
+    torch.manual_seed(42)
+    cache = QuantizedCache() if quantized else Cache()
+    h = [torch.randn(B, H, D, D, device=device) for _ in range(4)]
+    k = torch.randn(B, window_size + 3, D, device=device)
+    for layer_idx in range(4):
+        cache.update(recurrent_state=h[layer_idx].clone(), layer_idx=layer_idx, offset=window_size + 3)
+    cache.update(attn_state=(k, k), layer_idx=4, offset=window_size + 3, cache_kwargs=dict(window_size=window_size))
+
+    cache.offload()
+    assert all(state['recurrent_state'].device.type == 'cpu' for state in cache.states[:4])
+    assert cache.states[4]['attn_buffer'][0].is_pinned()
+    # the host reads the offloaded states only after the copies are done
+    assert len(cache._offload_events) == 5
+    cache.save(str(tmp_path / 'cache.safetensors'))
+    assert not cache._offload_events
+    loaded = type(cache).load(str(tmp_path / 'cache.safetensors'))
+    for layer_idx in range(4):
+        torch.testing.assert_close(loaded[layer_idx]['recurrent_state'], cache[layer_idx]['recurrent_state'])
+    cache.offload()
+
+    cache.prefetch(device)
+    atol = 5e-2 if quantized else None
+    for layer_idx, state in enumerate(cache):
+        if layer_idx < 4:
+            torch.testing.assert_close(state['recurrent_state'], h[layer_idx], atol=atol, rtol=atol)
+    cache.offload().prefetch(device)
+    for layer_idx in range(4):
+        torch.testing.assert_close(cache[layer_idx]['recurrent_state'], h[layer_idx], atol=atol, rtol=atol)
+    torch.testing.assert_close(cache[4]['attn_state'][0], k[:, -window_size:])
+
+
+@pytest.mark.parametrize("quantized", [True, False])
+def test_cache_iter_waits(quantized: bool):
+    cache = QuantizedCache() if quantized else Cache()
+    for layer_idx in range(3):
+        cache.update(recurrent_state=torch.randn(2, 4, 16, 16, device=device), layer_idx=layer_idx)
+
+    class Event:
+        def __init__(self, layer_idx):
+            self.layer_idx = layer_idx
+
+        def wait(self):
+            waited.append(self.layer_idx)
+
+    # iterating over the layers waits for the pending copies of each layer right before reading it
+    waited = []
+    cache._prefetch_events = {i: Event(i) for i in range(3)}
+    for layer_idx, _ in enumerate(cache):
+        assert waited == list(range(layer_idx + 1))
+    assert not cache._prefetch_events
+
+
+@pytest.mark.parametrize("quantized", [True, False])
+def test_cache_save_waits(tmp_path, quantized: bool):
+    cache = QuantizedCache() if quantized else Cache()
+    for layer_idx in range(3):
+        cache.update(recurrent_state=torch.randn(2, 4, 16, 16, device=device), layer_idx=layer_idx)
+
+    class Event:
+        def __init__(self, layer_idx):
+            self.layer_idx = layer_idx
+
+        def synchronize(self):
+            synchronized.append(self.layer_idx)
+
+    # the host waits for the pending offloading copies of all layers before reading the states
+    synchronized = []
+    cache._offload_events = {i: [Event(i)] for i in range(3)}
+    cache.save(str(tmp_path / 'cache.safetensors'))
+    assert synchronized == [0, 1, 2] and not cache._offload_events
+    cache._offload_events = {i: [Event(i)] for i in range(3)}
+    assert cache[1] is not None and synchronized == [0, 1, 2, 1]
+
+
+@pytest.mark.parametrize("B", [2])
+@pytest.mark.parametrize("H", [4])
+@pytest.mark.parametrize("D", [64])
+@pytest.mark.parametrize("window_size", [7])
+@pytest.mark.parametrize("mmap", [True, False])
+@pytest.mark.parametrize("quantized", [True, False])
+def test_cache_save_load(
+    B: int,
+    H: int,
+    D: int,
+    window_size: int,
+    mmap: bool,
+    quantized: bool,
+    tmp_path
+):
+    torch.manual_seed(42)
+    cache = QuantizedCache() if quantized else Cache()
+    h = torch.randn(B, H, D, D, device=device)
+    conv_state = torch.randn(B, D, 4, device=device)
+    k, v = torch.randn(2, B, window_size + 3, D, device=device)
+    cache.update(recurrent_state=h, conv_state=(conv_state, None), layer_idx=0, offset=window_size + 3)
+    cache.update(attn_state=(k, v), layer_idx=1, offset=window_size + 3, cache_kwargs=dict(window_size=window_size))
+    cache.save(tmp_path / 'cache.safetensors')
+
+    loaded = type(cache).load(tmp_path / 'cache.safetensors', mmap=mmap, device=device)
+    assert type(loaded) is type(cache)
+    assert loaded.get_seq_length() == window_size + 3
+    torch.testing.assert_close(loaded[0]['recurrent_state'], cache[0]['recurrent_state'])
+    torch.testing.assert_close(loaded[0]['conv_state'][0], conv_state)
+    assert loaded[0]['conv_state'][1] is None
+    torch.testing.assert_close(loaded[1]['attn_state'][0], k[:, -window_size:])
+    torch.testing.assert_close(loaded[1]['attn_state'][1], v[:, -window_size:])
+
+    k_new = torch.randn(B, 1, D, device=device)
+    state = loaded.update(attn_state=(k_new, k_new), layer_idx=1, offset=1, cache_kwargs=dict(window_size=window_size))
+    torch.testing.assert_close(state['attn_state'][0], torch.cat((k, k_new), 1)[:, -window_size:])
+
+
+@pytest.mark.parametrize("B", [2])
+@pytest.mark.parametrize("D", [64])
+@pytest.mark.parametrize("window_size", [7, 64])
+@pytest.mark.parametrize("chunk_len", [5, 32])
+def test_cache_sliding_window_chunked(
+    B: int,
+    D: int,
+    window_size: int,
+    chunk_len: int
+):
+    torch.manual_seed(42)
+    T = 100
+    k, v = torch.randn(2, B, T, D, device=device)
+    cache = Cache()
+    for i in range(0, T, chunk_len):
+        k_i, v_i = k[:, i:i+chunk_len], v[:, i:i+chunk_len]
+        k_out, v_out = cache.update(
+            attn_state=(k_i, v_i),
+            layer_idx=0,
+            offset=k_i.shape[1],
+            cache_kwargs=dict(window_size=window_size)
+        )['attn_state']
+        if i > 0:
+            # all the queries of the chunk should be able to attend to their full windows
+            torch.testing.assert_close(k_out, k[:, max(0, i - window_size):i+chunk_len])
+            torch.testing.assert_close(v_out, v[:, max(0, i - window_size):i+chunk_len])
+    torch.testing.assert_close(cache[0]['attn_state'][0], k[:, -window_size:])
+
+
+@pytest.mark.parametrize("B", [2])
+@pytest.mark.parametrize("D", [16])
+@pytest.mark.parametrize("window_size", [5])
+@pytest.mark.parametrize("num_rejected", [0, 1, 3, 4])
+@pytest.mark.parametrize("quantized", [False, True])
+def test_cache_rollback(
+    B: int,
+    D: int,
+    window_size: int,
+    num_rejected: int,
+    quantized: bool
+):
+    torch.manual_seed(42)
+
+    def forward(cache, x):
+        # layer 0 mimics a linear attention layer with short convolutions, layers 1 and 2 attention layers
+        state = cache[0] if len(cache) > 0 else None
+        h = state['recurrent_state'] if state is not None else x.new_zeros(B, 2, D, D)
+        conv_state = state['conv_state'][0] if state is not None else x.new_zeros(B, D, 4)
+        conv_state.copy_(torch.cat((conv_state, x.transpose(1, 2)), -1)[..., -conv_state.shape[-1]:])
+        hs = h[:, None] + x.cumsum(1)[:, :, None, :, None]
+        cache.update(
+            recurrent_state=hs if cache.checkpointing else hs[:, -1],
+            conv_state=(conv_state,),
+            layer_idx=0,
+            offset=x.shape[1],
+            cache_kwargs=dict(intermediate_states=cache.checkpointing)
+        )
+        cache.update(attn_state=(x, -x), layer_idx=1, offset=x.shape[1], cache_kwargs=dict(window_size=window_size))
+        cache.update(attn_state=(x, -x), layer_idx=2, offset=x.shape[1])
+
+    x = torch.randn(B, 20, D, device=device)
+    cache = QuantizedCache() if quantized else Cache()
+    forward(cache, x[:, :10])
+    cache.checkpoint(4)
+    forward(cache, x[:, 10:14])
+    cache.rollback(num_rejected)
+    assert not cache.checkpointing
+
+    ref = QuantizedCache() if quantized else Cache()
+    forward(ref, x[:, :10])
+    if num_rejected < 4:
+        forward(ref, x[:, 10:14-num_rejected])
+    for _ in range(2):
+        assert cache.get_seq_length() == ref.get_seq_length()
+        torch.testing.assert_close(cache[0]['recurrent_state'], ref[0]['recurrent_state'])
+        torch.testing.assert_close(cache[0]['conv_state'][0], ref[0]['conv_state'][0])
+        for i in (1, 2):
+            torch.testing.assert_close(cache[i]['attn_state'][0], ref[i]['attn_state'][0])
+            torch.testing.assert_close(cache[i]['attn_state'][1], ref[i]['attn_state'][1])
+        # decoding should continue seamlessly from the restored states
+        forward(cache, x[:, 14:15])
+        forward(ref, x[:, 14:15])
+
+    with pytest.raises(ValueError):
+        cache.rollback(1)
+
+
+@pytest.mark.parametrize("B", [1, 2])
+@pytest.mark.parametrize("D", [16])
+@pytest.mark.parametrize("window_size", [5])
+@pytest.mark.parametrize("num_copies", [3])
+def test_cache_fork(
+    B: int,
+    D: int,
+    window_size: int,
+    num_copies: int
+):
+    torch.manual_seed(42)
+    cache = Cache()
+    h, conv_state = torch.randn(B, 2, D, D, device=device), torch.randn(B, D, 4, device=device)
+    k, v = torch.randn(2, B, 7, D, device=device)
+    cache.update(recurrent_state=h, conv_state=(conv_state,), layer_idx=0, offset=7)
+    cache.update(attn_state=(k, v), layer_idx=1, offset=7, cache_kwargs=dict(window_size=window_size))
+
+    forked = cache.fork(num_copies)
+    assert forked.get_seq_length() == cache.get_seq_length()
+    torch.testing.assert_close(forked[0]['recurrent_state'], h.repeat_interleave(num_copies, 0))
+    torch.testing.assert_close(forked[0]['conv_state'][0], conv_state.repeat_interleave(num_copies, 0))
+    torch.testing.assert_close(forked[1]['attn_state'][0], k[:, -window_size:].repeat_interleave(num_copies, 0))
+    assert forked[0]['conv_state'][0].data_ptr() != conv_state.data_ptr()
+    if B == 1:
+        assert forked[1]['attn_buffer'][0].data_ptr() == cache[1]['attn_buffer'][0].data_ptr()
+
+    # the forked sequences diverge without affecting each other or the original cache
+    k_new = torch.randn(B * num_copies, 1, D, device=device)
+    state = forked.update(attn_state=(k_new, k_new), layer_idx=1, offset=1, cache_kwargs=dict(window_size=window_size))
+    ref = torch.cat((k.repeat_interleave(num_copies, 0), k_new), 1)[:, -window_size:]
+    torch.testing.assert_close(state['attn_state'][0], ref)
+    torch.testing.assert_close(cache[1]['attn_state'][0], k[:, -window_size:])
+    forked[0]['conv_state'][0].zero_()
+    torch.testing.assert_close(cache[0]['conv_state'][0], conv_state)
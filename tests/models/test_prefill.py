@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import torch
+
+from fla.models import GatedDeltaNetConfig, GatedDeltaNetForCausalLM, GLAConfig, GLAForCausalLM
+from fla.models.utils import PrefixStateCache
+from fla.utils import device
+
+
+@pytest.mark.parametrize("model_cls,config_cls", [
+    (GLAForCausalLM, GLAConfig),
+    (GatedDeltaNetForCausalLM, GatedDeltaNetConfig),
+])
+@pytest.mark.parametrize("B", [2])
+@pytest.mark.parametrize("T", [300])
+@pytest.mark.parametrize("chunk_len", [64, 100])
+def test_prefill(
+    model_cls,
+    config_cls,
+    B: int,
+    T: int,
+    chunk_len: int
+):
+    torch.manual_seed(42)
+    config = config_cls(
+        hidden_size=256,
+        num_hidden_layers=2,
+        num_heads=4,
+        use_short_conv=True,
+        vocab_size=1000,
+        fuse_cross_entropy=False
+    )
+    model = model_cls(config).to(device).eval()
+    input_ids = torch.randint(0, config.vocab_size, (B, T), device=device)
+
+    with torch.no_grad():
+        ref = model(input_ids=input_ids, use_cache=True)
+        ref_next = model(input_ids=input_ids[:, -1:], past_key_values=ref.past_key_values, use_cache=True).logits
+    outputs = model.prefill(input_ids, chunk_len=chunk_len)
+    assert outputs.logits.shape == (B, 1, config.vocab_size)
+    torch.testing.assert_close(outputs.logits, ref.logits[:, -1:], rtol=1e-3, atol=1e-3)
+    assert outputs.past_key_values.get_seq_length() == T
+
+    # generation should continue seamlessly from the chunked prefilled states
+    with torch.no_grad():
+        next_logits = model(input_ids=input_ids[:, -1:], past_key_values=outputs.past_key_values, use_cache=True).logits
+    torch.testing.assert_close(next_logits, ref_next, rtol=1e-3, atol=1e-3)
+
+
+@pytest.mark.parametrize("model_cls,config_cls", [
+    (GLAForCausalLM, GLAConfig),
+    (GatedDeltaNetForCausalLM, GatedDeltaNetConfig),
+])
+@pytest.mark.parametrize("T", [1, 100])
+@pytest.mark.parametrize("num_samples", [4])
+def test_parallel_generate(
+    model_cls,
+    config_cls,
+    T: int,
+    num_samples: int
+):
+    torch.manual_seed(42)
+    config = config_cls(
+        hidden_size=256,
+        num_hidden_layers=2,
+        num_heads=4,
+        use_short_conv=True,
+        vocab_size=1000,
+        fuse_cross_entropy=False
+    )
+    model = model_cls(config).to(device).eval()
+    # the first and last prompts are duplicates
+    input_ids = torch.randint(0, config.vocab_size, (3, T), device=device)
+    input_ids[-1] = input_ids[0]
+
+    kwargs = dict(max_new_tokens=8, do_sample=False, return_dict_in_generate=True, output_scores=True)
+    ref = model.generate(input_ids=input_ids.repeat_interleave(num_samples, 0), **kwargs)
+    tri = model.parallel_generate(input_ids, num_samples, **kwargs)
+    assert tri.sequences.shape == (3 * num_samples, T + 8)
+    torch.testing.assert_close(tri.scores[0], ref.scores[0], rtol=1e-3, atol=1e-3)
+
+
+@pytest.mark.parametrize("model_cls,config_cls", [
+    (GLAForCausalLM, GLAConfig),
+    (GatedDeltaNetForCausalLM, GatedDeltaNetConfig),
+])
+@pytest.mark.parametrize("P", [1, 64])
+@pytest.mark.parametrize("T", [100])
+def test_generate_prefix_cache(
+    model_cls,
+    config_cls,
+    P: int,
+    T: int
+):
+    torch.manual_seed(42)
+    config = config_cls(
+        hidden_size=256,
+        num_hidden_layers=2,
+        num_heads=4,
+        use_short_conv=True,
+        vocab_size=1000,
+        fuse_cross_entropy=False
+    )
+    model = model_cls(config).to(device).eval()
+    input_ids = torch.randint(0, config.vocab_size, (1, P + T), device=device)
+    prefix_cache = PrefixStateCache()
+    with torch.no_grad():
+        prefix_cache.put(input_ids[:, :P], model(input_ids=input_ids[:, :P], use_cache=True).past_key_values)
+
+    kwargs = dict(max_new_tokens=8, do_sample=False, return_dict_in_generate=True, output_scores=True)
+    ref = model.generate(input_ids=input_ids, **kwargs)
+    # only the tokens after the warm prefix are prefilled
+    tri = model.generate(input_ids=input_ids, prefix_cache=prefix_cache, **kwargs)
+    assert prefix_cache.hits == 1
+    assert torch.equal(tri.sequences, ref.sequences)
+    for ref_scores, tri_scores in zip(ref.scores, tri.scores):
+        torch.testing.assert_close(tri_scores, ref_scores, rtol=1e-3, atol=1e-3)
+
+
+@pytest.mark.parametrize("model_cls,config_cls", [
+    (GLAForCausalLM, GLAConfig),
+    (GatedDeltaNetForCausalLM, GatedDeltaNetConfig),
+])
+@pytest.mark.parametrize("B", [2])
+@pytest.mark.parametrize("T", [20])
+@pytest.mark.parametrize("num_beams", [3])
+def test_generate_beam_search(
+    model_cls,
+    config_cls,
+    B: int,
+    T: int,
+    num_beams: int
+):
+    torch.manual_seed(42)
+    config = config_cls(
+        hidden_size=256,
+        num_hidden_layers=2,
+        num_heads=4,
+        use_short_conv=True,
+        vocab_size=1000,
+        fuse_cross_entropy=False
+    )
+    model = model_cls(config).to(device).eval()
+    input_ids = torch.randint(0, config.vocab_size, (B, T), device=device)
+
+    kwargs = dict(max_new_tokens=8, num_beams=num_beams, do_sample=False, pad_token_id=0, return_dict_in_generate=True,
+                  output_scores=True)
+    # recomputing the whole sequence at each step needs no reordering of the cached states
+    ref = model.generate(input_ids=input_ids, use_cache=False, **kwargs)
+    tri = model.generate(input_ids=input_ids, use_cache=True, **kwargs)
+    assert torch.equal(tri.sequences, ref.sequences)
+    torch.testing.assert_close(tri.sequences_scores, ref.sequences_scores, rtol=1e-3, atol=1e-3)
+
+    # contrastive search crops the cached states, which is not possible for recurrent layers
+    with pytest.raises(ValueError, match="contrastive search"):
+        model.generate(input_ids=input_ids, max_new_tokens=8, penalty_alpha=0.6, top_k=4, pad_token_id=0)
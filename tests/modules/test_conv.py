@@ -2,8 +2,9 @@
 
 import pytest
 import torch
+import torch.nn.functional as F
 
-from fla.modules.convolution import ShortConvolution
+from fla.modules.convolution import ShortConvolution, causal_conv1d
 from fla.ops.common.utils import prepare_position_ids, prepare_sequence_ids
 from fla.utils import device
 
@@ -18,6 +19,21 @@ def get_err_ratio(x, y):
     return err / (base + 1e-10)
 
 
+def causal_conv1d_ref(x, weight, bias=None, initial_state=None, activation=None):
+    W = weight.shape[-1]
+    x = x.transpose(1, 2)
+    if initial_state is not None:
+        x = torch.cat((initial_state, x), -1)
+    else:
+        x = F.pad(x, (W - 1, 0))
+    y = F.conv1d(x, weight.unsqueeze(1), bias, groups=weight.shape[0])[..., -x.shape[-1] + W - 1:]
+    if initial_state is not None:
+        y = y[..., initial_state.shape[-1] - W + 1:]
+    if activation is not None:
+        y = F.silu(y)
+    return y.transpose(1, 2), x[..., -(initial_state.shape[-1] if initial_state is not None else W):]
+
+
 def assert_close(prefix, ref, tri, ratio, warning=False):
     msg = f"{prefix} diff: {get_abs_err(ref, tri):.6f} ratio: {get_err_ratio(ref, tri):.6f}"
     print(msg)
@@ -41,12 +57,52 @@ def test_shortconv(B: int, T: int, H: int, C: int):
     if conv_fast.bias is not None:
         conv_fast.bias.data.copy_(conv_slow.bias.data)
 
-    x = torch.randn(B, T, H).to(device)
+    x = torch.randn(B, T, H).to(device).requires_grad_(True)
     y_slow, _ = conv_slow(x)
     y_fast, _ = conv_fast(x)
     assert y_slow.shape == x.shape
     assert y_fast.shape == x.shape
-    assert torch.allclose(y_slow, y_fast), f"{y_slow}\n{y_fast}"
+    assert_close("  y", y_slow, y_fast, 1e-5)
+
+    do = torch.randn_like(x)
+    ref_dx, ref_dw = torch.autograd.grad(y_slow, (x, conv_slow.weight), do)
+    tri_dx, tri_dw = torch.autograd.grad(y_fast, (x, conv_fast.weight), do)
+    assert_close(" dx", ref_dx, tri_dx, 1e-5)
+    assert_close(" dw", ref_dw, tri_dw, 1e-5)
+
+
+@pytest.mark.parametrize("B", [2])
+@pytest.mark.parametrize("T", [1, 7, 100])
+@pytest.mark.parametrize("D", [50, 128])
+@pytest.mark.parametrize("W", [2, 4])
+@pytest.mark.parametrize("WC", [None, 4, 6])
+@pytest.mark.parametrize("activation", [None, 'silu'])
+def test_causal_conv1d(B: int, T: int, D: int, W: int, WC: int, activation: str):
+    torch.manual_seed(42)
+    x = torch.randn(B, T, D).to(device).requires_grad_(True)
+    weight = torch.randn(D, W).to(device).requires_grad_(True)
+    bias = torch.randn(D).to(device).requires_grad_(True)
+    h0 = torch.randn(B, D, WC).to(device).requires_grad_(True) if WC is not None else None
+    do = torch.randn_like(x)
+    # the gradients also flow back through the final states
+    dht = torch.randn(B, D, WC if WC is not None else W).to(device)
+
+    ref, ref_ht = causal_conv1d_ref(x, weight, bias, h0, activation)
+    torch.autograd.backward((ref, ref_ht), (do, dht))
+    ref_dx, ref_dw, ref_db = x.grad, weight.grad, bias.grad
+    x.grad, weight.grad, bias.grad = None, None, None
+    if h0 is not None:
+        ref_dh0, h0.grad = h0.grad, None
+
+    tri, tri_ht = causal_conv1d(x, weight, bias, h0, output_final_state=True, activation=activation)
+    torch.autograd.backward((tri, tri_ht), (do, dht))
+    assert_close("  y", ref, tri, 1e-5)
+    assert_close(" ht", ref_ht, tri_ht, 1e-5)
+    assert_close(" dx", ref_dx, x.grad, 1e-5)
+    assert_close(" dw", ref_dw, weight.grad, 1e-5)
+    assert_close(" db", ref_db, bias.grad, 1e-5)
+    if h0 is not None:
+        assert_close("dh0", ref_dh0, h0.grad, 1e-5)
 
 
 @pytest.mark.parametrize("N", [4])
@@ -69,6 +125,54 @@ def test_shortconv_varlen(N: int, T: int, H: int, C: int):
     tri, _ = conv(x, seq_idx=seq_idx)
     assert_close("y", ref, tri, 1e-5)
 
+    # continuing from and updating per-sequence caches
+    cache = torch.randn(N, H, C).to(device)
+    refs, ref_caches = [], []
+    for i, (bos, eos) in enumerate(zip(offsets[:-1], offsets[1:])):
+        ref, ref_cache = conv(x[:, bos:eos].contiguous(), cache=cache[i:i+1].clone(), output_final_state=True)
+        refs.append(ref)
+        ref_caches.append(ref_cache)
+    tri, tri_cache = conv(x, cache=cache.clone(), output_final_state=True, cu_seqlens=offsets)
+    assert_close("    y", torch.cat(refs, 1), tri, 1e-5)
+    assert_close("cache", torch.cat(ref_caches, 0), tri_cache, 1e-5)
+
+
+@pytest.mark.parametrize("N", [4])
+@pytest.mark.parametrize("T", [64, 300])
+@pytest.mark.parametrize("D", [100])
+@pytest.mark.parametrize("W", [4])
+def test_causal_conv1d_varlen(N: int, T: int, D: int, W: int):
+    torch.manual_seed(42)
+    # randomly split the sequence into N segments
+    offsets = torch.cat([
+        torch.tensor([0], dtype=torch.long),
+        torch.arange(1, T)[torch.randperm(T - 1)[:N-1]],
+        torch.tensor([T], dtype=torch.long)
+    ], 0).to(device).sort()[0]
+
+    x = torch.randn(1, T, D).to(device).requires_grad_(True)
+    weight = torch.randn(D, W).to(device).requires_grad_(True)
+    h0 = torch.randn(N, D, W).to(device).requires_grad_(True)
+    do, dht = torch.randn_like(x), torch.randn_like(h0)
+
+    refs, ref_hts = [], []
+    for i, (bos, eos) in enumerate(zip(offsets[:-1], offsets[1:])):
+        ref, ref_ht = causal_conv1d_ref(x[:, bos:eos], weight, None, h0[i:i+1], 'silu')
+        refs.append(ref)
+        ref_hts.append(ref_ht)
+    ref, ref_ht = torch.cat(refs, 1), torch.cat(ref_hts, 0)
+    torch.autograd.backward((ref, ref_ht), (do, dht))
+    ref_dx, ref_dw, ref_dh0 = x.grad, weight.grad, h0.grad
+    x.grad, weight.grad, h0.grad = None, None, None
+
+    tri, tri_ht = causal_conv1d(x, weight, None, h0, output_final_state=True, activation='silu', cu_seqlens=offsets)
+    torch.autograd.backward((tri, tri_ht), (do, dht))
+    assert_close("  y", ref, tri, 1e-5)
+    assert_close(" ht", ref_ht, tri_ht, 1e-5)
+    assert_close(" dx", ref_dx, x.grad, 1e-5)
+    assert_close(" dw", ref_dw, weight.grad, 1e-5)
+    assert_close("dh0", ref_dh0, h0.grad, 1e-5)
+
 
 @pytest.mark.parametrize("B", [4])
 @pytest.mark.parametrize("T", [100])
@@ -93,3 +197,31 @@ def test_shortconv_cache(B: int, T: int, H: int, C: int):
         assert_close(f" slow {i:2}", y_slow, y[:, i:i+1], 1e-5)
         assert_close(f" fast {i:2}", y_fast, y[:, i:i+1], 1e-5)
         assert_close(f"cache {i:2}", cache_slow, cache_fast, 1e-5)
+
+
+@pytest.mark.parametrize("B", [4])
+@pytest.mark.parametrize("T", [100])
+@pytest.mark.parametrize("H", [16])
+@pytest.mark.parametrize("C", [4])
+@pytest.mark.parametrize("S", [3])
+def test_shortconv_step(B: int, T: int, H: int, C: int, S: int):
+    torch.manual_seed(42)
+    conv_slow = ShortConvolution(H, C, bias=True, use_fast_conv1d=False).to(device)
+    conv_fast = ShortConvolution(H, C, bias=True, use_fast_conv1d=True).to(device)
+    conv_fast.weight.data.copy_(conv_slow.weight.data)
+    conv_fast.bias.data.copy_(conv_slow.bias.data)
+
+    x = torch.randn(B, T, H).to(device)
+    y, _ = conv_slow(x)
+    # prefill the first tokens and decode the rest several tokens at a time
+    y_slow, cache_slow = conv_slow(x[:, :S], output_final_state=True)
+    y_fast, cache_fast = conv_fast(x[:, :S], output_final_state=True)
+    ys_slow, ys_fast = [y_slow], [y_fast]
+    for i in range(S, T, S):
+        y_slow, cache_slow = conv_slow.step(x[:, i:i+S], cache_slow)
+        y_fast, cache_fast = conv_fast.step(x[:, i:i+S], cache_fast)
+        ys_slow.append(y_slow)
+        ys_fast.append(y_fast)
+        assert_close(f"cache {i:2}", cache_slow, cache_fast, 1e-5)
+    assert_close(" slow", y, torch.cat(ys_slow, 1), 1e-5)
+    assert_close(" fast", y, torch.cat(ys_fast, 1), 1e-5)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+from typing import Optional
+
+import pytest
+import torch
+import torch.nn.functional as F
+
+from fla.modules.token_shift import token_shift_lerp
+from fla.utils import device
+
+
+def token_shift_lerp_ref(
+    x: torch.Tensor,
+    mu: torch.Tensor,
+    initial_state: Optional[torch.Tensor] = None,
+    cu_seqlens: Optional[torch.LongTensor] = None
+) -> torch.Tensor:
+    shifted = F.pad(x, (0, 0, 1, -1))
+    starts = cu_seqlens[:-1] if cu_seqlens is not None else [0]
+    shifted[:, starts] = initial_state.view(x.shape[0], -1, x.shape[-1]) if initial_state is not None else 0
+    delta = shifted - x
+    if mu.dim() == 2:
+        return x + delta * mu[:, None, None]
+    return (x.unsqueeze(2) + delta.unsqueeze(2) * mu).permute(2, 0, 1, 3)
+
+
+@pytest.mark.parametrize("B", [1, 4])
+@pytest.mark.parametrize("T", [1, 50, 300])
+@pytest.mark.parametrize("D", [50, 64, 1000])
+@pytest.mark.parametrize("N", [1, 5])
+@pytest.mark.parametrize("data_dependent", [False, True])
+@pytest.mark.parametrize("use_initial_state", [False, True])
+def test_token_shift_lerp(B: int, T: int, D: int, N: int, data_dependent: bool, use_initial_state: bool):
+    torch.manual_seed(42)
+    x = torch.randn(B, T, D).to(device).requires_grad_(True)
+    mu = (torch.rand(B, T, N, D) if data_dependent else torch.rand(N, D)).to(device).requires_grad_(True)
+    h0 = torch.randn(B, D).to(device).requires_grad_(True) if use_initial_state else None
+    dy = torch.randn(N, B, T, D).to(device)
+
+    ref = token_shift_lerp_ref(x, mu, h0)
+    ref_dx, ref_dmu, *ref_dh0 = torch.autograd.grad(ref, (x, mu) + ((h0,) if use_initial_state else ()), dy)
+    tri = token_shift_lerp(x, mu, h0)
+    tri_dx, tri_dmu, *tri_dh0 = torch.autograd.grad(tri, (x, mu) + ((h0,) if use_initial_state else ()), dy)
+
+    torch.testing.assert_close(ref, tri, rtol=0, atol=1e-5)
+    torch.testing.assert_close(ref_dx, tri_dx, rtol=0, atol=1e-4)
+    torch.testing.assert_close(ref_dmu, tri_dmu, rtol=0, atol=1e-3)
+    if use_initial_state:
+        torch.testing.assert_close(ref_dh0[0], tri_dh0[0], rtol=0, atol=1e-4)
+
+
+@pytest.mark.parametrize("N", [4])
+@pytest.mark.parametrize("T", [64, 300])
+@pytest.mark.parametrize("D", [64, 100])
+@pytest.mark.parametrize("data_dependent", [False, True])
+def test_token_shift_lerp_varlen(N: int, T: int, D: int, data_dependent: bool):
+    torch.manual_seed(42)
+    # randomly split the sequence into N segments
+    cu_seqlens = torch.cat([
+        torch.tensor([0], dtype=torch.long),
+        torch.arange(16, T)[torch.randperm(T - 16)[:N-1]],
+        torch.tensor([T], dtype=torch.long)
+    ], 0).to(device).sort()[0]
+
+    x = torch.randn(1, T, D).to(device).requires_grad_(True)
+    mu = (torch.rand(1, T, 5, D) if data_dependent else torch.rand(5, D)).to(device).requires_grad_(True)
+    h0 = torch.randn(N, D).to(device).requires_grad_(True)
+    dy = torch.randn(5, 1, T, D).to(device)
+
+    ref = token_shift_lerp_ref(x, mu, h0, cu_seqlens)
+    ref_dx, ref_dmu, ref_dh0 = torch.autograd.grad(ref, (x, mu, h0), dy)
+    tri = token_shift_lerp(x, mu, h0, cu_seqlens)
+    tri_dx, tri_dmu, tri_dh0 = torch.autograd.grad(tri, (x, mu, h0), dy)
+
+    torch.testing.assert_close(ref, tri, rtol=0, atol=1e-5)
+    torch.testing.assert_close(ref_dx, tri_dx, rtol=0, atol=1e-4)
+    torch.testing.assert_close(ref_dmu, tri_dmu, rtol=0, atol=1e-3)
+    torch.testing.assert_close(ref_dh0, tri_dh0, rtol=0, atol=1e-4)
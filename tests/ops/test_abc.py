@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+import torch
+
+from fla.ops.abc import chunk_abc, fused_recurrent_abc
+from fla.ops.abc.naive import naive_recurrent_abc
+from fla.utils import device
+from utils import assert_close
+
+
+@pytest.mark.parametrize("B", [2])
+@pytest.mark.parametrize("T", [1, 7, 63, 300])
+@pytest.mark.parametrize("H", [2])
+@pytest.mark.parametrize("D", [50, 64])
+@pytest.mark.parametrize("M", [32, 50])
+@pytest.mark.parametrize("head_first", [True, False])
+def test_fused_recurrent(
+    B: int,
+    T: int,
+    H: int,
+    D: int,
+    M: int,
+    head_first: bool
+):
+    torch.manual_seed(42)
+    os.environ['TRITON_F32_DEFAULT'] = 'ieee'
+    q, k, v = (torch.randn(B, H, T, D, device=device) for _ in range(3))
+    s = torch.randn(B, H, T, M, device=device)
+
+    ref, (ref_hk, ref_hv) = naive_recurrent_abc(q, k, v, s, output_final_state=True)
+    ref_z = s.logsumexp(2)
+    if not head_first:
+        q, k, v, s = map(lambda x: x.transpose(1, 2).contiguous(), (q, k, v, s))
+    tri, (tri_hk, tri_hv, tri_z) = fused_recurrent_abc(q, k, v, s, output_final_state=True, head_first=head_first)
+    if not head_first:
+        tri = tri.transpose(1, 2)
+    assert_close("  o", ref, tri, 0.001)
+    assert_close(" hk", ref_hk, tri_hk, 0.001)
+    assert_close(" hv", ref_hv, tri_hv, 0.001)
+    assert_close("  z", ref_z, tri_z, 0.001)
+
+    # resuming from the states of the first half reproduces the outputs of the second half
+    t = T // 2
+    tri_a, state = fused_recurrent_abc(*(x[:, :t] if not head_first else x[:, :, :t] for x in (q, k, v, s)),
+                                       output_final_state=True, head_first=head_first)
+    tri_b, _ = fused_recurrent_abc(*(x[:, t:] if not head_first else x[:, :, t:] for x in (q, k, v, s)),
+                                   initial_state=state, head_first=head_first)
+    tri_ab = torch.cat((tri_a, tri_b), 1 if not head_first else 2)
+    if not head_first:
+        tri_ab = tri_ab.transpose(1, 2)
+    assert_close(" o2", ref, tri_ab, 0.001)
+
+
+@pytest.mark.parametrize("N", [4])
+@pytest.mark.parametrize("T", [64, 300])
+@pytest.mark.parametrize("H", [2])
+@pytest.mark.parametrize("D", [64])
+@pytest.mark.parametrize("M", [32])
+def test_fused_recurrent_varlen(
+    N: int,
+    T: int,
+    H: int,
+    D: int,
+    M: int
+):
+    torch.manual_seed(42)
+    os.environ['TRITON_F32_DEFAULT'] = 'ieee'
+    # randomly split the sequence into N segments
+    offsets = torch.cat([
+        torch.tensor([0], dtype=torch.long),
+        torch.arange(16, T)[torch.randperm(T - 16)[:N-1]],
+        torch.tensor([T], dtype=torch.long)
+    ], 0).to(device).sort()[0]
+
+    q, k, v = (torch.randn(1, T, H, D, device=device) for _ in range(3))
+    s = torch.randn(1, T, H, M, device=device)
+    h0 = (torch.randn(N, H, D, M, device=device), torch.randn(N, H, M, D, device=device), torch.randn(N, H, M, device=device))
+
+    refs, ref_hts = [], []
+    for i in range(N):
+        ref, ref_ht = fused_recurrent_abc(
+            *(x[:, offsets[i]:offsets[i+1]] for x in (q, k, v, s)),
+            initial_state=tuple(h[i:i+1] for h in h0),
+            output_final_state=True,
+            head_first=False
+        )
+        refs.append(ref)
+        ref_hts.append(ref_ht)
+    ref = torch.cat(refs, 1)
+
+    tri, tri_ht = fused_recurrent_abc(q, k, v, s,
+                                      initial_state=h0,
+                                      output_final_state=True,
+                                      cu_seqlens=offsets,
+                                      head_first=False)
+    assert_close("  o", ref, tri, 1e-5)
+    for name, i in zip((" hk", " hv", "  z"), range(3)):
+        assert_close(name, torch.cat([ht[i] for ht in ref_hts], 0), tri_ht[i], 1e-5)
+
+
+@pytest.mark.parametrize("B", [2])
+@pytest.mark.parametrize("T", [130])
+@pytest.mark.parametrize("H", [2])
+@pytest.mark.parametrize("D", [64])
+@pytest.mark.parametrize("M", [32])
+def test_chunk_prefill(
+    B: int,
+    T: int,
+    H: int,
+    D: int,
+    M: int
+):
+    torch.manual_seed(42)
+    os.environ['TRITON_F32_DEFAULT'] = 'ieee'
+    q, k, v = (torch.randn(B, T, H, D, device=device) for _ in range(3))
+    s = torch.randn(B, T, H, M, device=device)
+
+    ref, _ = fused_recurrent_abc(q, k, v, s, head_first=False)
+    # decoding from the states left by `chunk_abc` along with the normalizers of the slots
+    t = T // 2
+    tri_a, state = chunk_abc(q[:, :t], k[:, :t], v[:, :t], s[:, :t], output_final_state=True, head_first=False)
+    tri_b, _ = fused_recurrent_abc(q[:, t:], k[:, t:], v[:, t:], s[:, t:],
+                                   initial_state=(*state, s[:, :t].logsumexp(1)),
+                                   head_first=False)
+    assert_close("  o", ref, torch.cat((tri_a, tri_b), 1), 0.005)
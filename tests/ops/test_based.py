@@ -5,8 +5,10 @@ import os
 import pytest
 import torch
 
-from fla.ops.based import fused_chunk_based, parallel_based
+from fla.ops.based import fused_chunk_based, fused_recurrent_based, parallel_based
 from fla.ops.based.naive import naive_parallel_based
+from fla.ops.rebased import fused_recurrent_rebased
+from fla.ops.rebased.naive import naive_parallel_rebased
 from fla.utils import device
 
 compiled_mode = os.getenv("COMPILER_MODE") == "1"
@@ -71,3 +73,39 @@ def test_based(
         assert ref_dq.allclose(tri_dq, 0, 1e-4)
         assert ref_dk.allclose(tri_dk, 0, 1e-4)
         assert ref_dv.allclose(tri_dv, 0, 1e-4)
+
+
+@pytest.mark.parametrize("B", test_b_list)
+@pytest.mark.parametrize("H", test_h_list)
+@pytest.mark.parametrize("T", test_t_list)
+@pytest.mark.parametrize("D", test_d_list)
+@pytest.mark.parametrize("op", ['based', 'rebased'])
+def test_fused_recurrent(
+    B: int,
+    H: int,
+    T: int,
+    D: int,
+    op: str
+):
+    torch.manual_seed(42)
+    q = torch.randn((B, H, T, 16), device=device)
+    k = torch.randn((B, H, T, 16), device=device)
+    v = torch.randn((B, H, T, D), device=device)
+    if op == 'based':
+        ref = naive_parallel_based(q, k, v, use_norm=False)
+        fn = fused_recurrent_based
+        kwargs = dict(use_norm=False)
+    else:
+        ref = naive_parallel_rebased(q, k, v, use_norm=False)
+        fn = fused_recurrent_rebased
+        kwargs = dict(use_normalize=False)
+
+    tri, ht = fn(q, k, v, output_final_state=True, **kwargs)
+    assert ref.allclose(tri, 0, 1e-4)
+
+    # the states carried over from the first part of the sequences continue the second part
+    S = T // 2
+    tri1, h1 = fn(q[:, :, :S], k[:, :, :S], v[:, :, :S], output_final_state=True, **kwargs)
+    tri2, h2 = fn(q[:, :, S:], k[:, :, S:], v[:, :, S:], initial_state=h1, output_final_state=True, **kwargs)
+    assert ref.allclose(torch.cat((tri1, tri2), 2), 0, 1e-4)
+    assert ht.allclose(h2, 0, 1e-4)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.nn.functional as F
+
+from fla.ops.gated_delta_rule import chunk_gated_delta_rule
+from fla.ops.gla import chunk_gla
+from fla.ops.simple_gla import chunk_simple_gla
+from utils import assert_close
+
+
+def get_inputs(op: str, B: int, T: int, H: int, D: int):
+    torch.manual_seed(42)
+    q, k, v = (torch.randn(B, T, H, D) for _ in range(3))
+    if op == 'gla':
+        inputs = (q, k, v, F.logsigmoid(torch.randn(B, T, H, D)))
+    elif op == 'simple_gla':
+        inputs = (q, k, v, F.logsigmoid(torch.randn(B, T, H)))
+    else:
+        inputs = (q, F.normalize(k, p=2, dim=-1), v, F.logsigmoid(torch.randn(B, T, H)), torch.rand(B, T, H))
+    h0 = torch.randn(B, H, D, D)
+    do, dht = torch.randn(B, T, H, D), torch.randn(B, H, D, D)
+    return [x.requires_grad_() for x in inputs], h0.requires_grad_(), do, dht
+
+
+def run(rank: int, world_size: int, init_method: str, op: str, B: int, T: int, H: int, D: int):
+    dist.init_process_group('gloo', init_method=init_method, rank=rank, world_size=world_size)
+    fn = {'gla': chunk_gla, 'simple_gla': chunk_simple_gla, 'gated_delta_rule': chunk_gated_delta_rule}[op]
+
+    inputs, h0, do, dht = get_inputs(op, B, T, H, D)
+    ref, ref_ht = fn(*inputs, initial_state=h0, output_final_state=True, head_first=False)
+    ((ref * do).sum() + (ref_ht * dht).sum()).backward()
+    ref_grads = [x.grad for x in inputs]
+    ref_dh0 = h0.grad
+
+    # each rank holds a contiguous slice of the sequences
+    bounds = [T * i // world_size for i in range(world_size + 1)]
+    s = slice(bounds[rank], bounds[rank + 1])
+    local = [x[:, s].detach().requires_grad_() for x in inputs]
+    h0 = h0.detach().requires_grad_()
+    tri, tri_ht = fn(*local, initial_state=h0, output_final_state=True, head_first=False, cp_group=dist.group.WORLD)
+    loss = (tri * do[:, s]).sum()
+    if rank == world_size - 1:
+        loss = loss + (tri_ht * dht).sum()
+    loss.backward()
+
+    assert_close("  o", ref[:, s], tri, 1e-4)
+    if rank == world_size - 1:
+        assert_close(" ht", ref_ht, tri_ht, 1e-4)
+    for name, ref_grad, x in zip(('dq', 'dk', 'dv', 'dg', 'db'), ref_grads, local):
+        assert_close(name.rjust(3), ref_grad[:, s], x.grad, 1e-4)
+    if rank == 0:
+        assert_close("dh0", ref_dh0, h0.grad, 1e-4)
+    else:
+        assert h0.grad is None
+    dist.destroy_process_group()
+
+
+@pytest.mark.parametrize("op", ['gla', 'simple_gla', 'gated_delta_rule'])
+@pytest.mark.parametrize("world_size", [2, 3])
+@pytest.mark.parametrize("T", [63, 300])
+def test_context_parallel(tmp_path, op: str, world_size: int, T: int):
+    init_method = f"file://{tmp_path / 'store'}"
+    mp.spawn(run, args=(world_size, init_method, op, 2, T, 2, 32), nprocs=world_size)
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+import sys
+
+import pytest
+import torch
+import torch.nn.functional as F
+
+from fla.modules import ShortConvolution
+from fla.ops.delta_rule import chunk_delta_rule, fused_recurrent_delta_rule
+from fla.ops.delta_rule.naive import delta_rule_recurrence
+from fla.ops.gated_delta_rule import chunk_gated_delta_rule, fused_recurrent_gated_delta_rule
+from fla.ops.gla import chunk_gla, fused_recurrent_gla
+from fla.ops.gla.naive import naive_recurrent_gla
+from fla.ops.retention import chunk_retention, fused_recurrent_retention
+from fla.ops.simple_gla import chunk_simple_gla
+from fla.ops.simple_gla.fused_recurrent import fused_recurrent_simple_gla
+from fla.ops.simple_gla.naive import torch_simple_gla_recurrent
+from utils import assert_close
+
+test_b_list = [2]
+test_t_list = [1, 15, 63, 300]
+test_h_list = [2]
+test_d_list = [32, 100]
+
+
+@pytest.mark.parametrize("B", test_b_list)
+@pytest.mark.parametrize("T", test_t_list)
+@pytest.mark.parametrize("H", test_h_list)
+@pytest.mark.parametrize("D", test_d_list)
+def test_gla_cpu(B: int, T: int, H: int, D: int):
+    torch.manual_seed(42)
+    q, k, v = (torch.randn(B, H, T, D).requires_grad_() for _ in range(3))
+    g = F.logsigmoid(torch.randn(B, H, T, D)).requires_grad_()
+    h0 = torch.randn(B, H, D, D).requires_grad_()
+    do, dht = torch.randn_like(v), torch.randn(B, H, D, D)
+
+    ref, ref_ht = naive_recurrent_gla(q, k, v, g, initial_state=h0, output_final_state=True)
+    ((ref * do).sum() + (ref_ht * dht).sum()).backward()
+    ref_dq, ref_dk, ref_dv, ref_dg, ref_dh0 = q.grad, k.grad, v.grad, g.grad, h0.grad
+    q.grad = k.grad = v.grad = g.grad = h0.grad = None
+
+    tri, tri_ht = chunk_gla(q, k, v, g, initial_state=h0, output_final_state=True)
+    ((tri * do).sum() + (tri_ht * dht).sum()).backward()
+    assert_close("  o", ref, tri, 1e-4)
+    assert_close(" ht", ref_ht, tri_ht, 1e-4)
+    assert_close(" dq", ref_dq, q.grad, 1e-4)
+    assert_close(" dk", ref_dk, k.grad, 1e-4)
+    assert_close(" dv", ref_dv, v.grad, 1e-4)
+    assert_close(" dg", ref_dg, g.grad, 1e-4)
+    assert_close("dh0", ref_dh0, h0.grad, 1e-4)
+
+    tri, tri_ht = fused_recurrent_gla(q, k, v, g, initial_state=h0, output_final_state=True)
+    assert_close("  o", ref, tri, 1e-4)
+    assert_close(" ht", ref_ht, tri_ht, 1e-4)
+
+
+@pytest.mark.parametrize("B", test_b_list)
+@pytest.mark.parametrize("T", test_t_list)
+@pytest.mark.parametrize("H", test_h_list)
+@pytest.mark.parametrize("D", test_d_list)
+def test_simple_gla_cpu(B: int, T: int, H: int, D: int):
+    torch.manual_seed(42)
+    q, k, v = (torch.randn(B, T, H, D) for _ in range(3))
+    g = F.logsigmoid(torch.randn(B, T, H))
+    h0 = torch.randn(B, H, D, D)
+
+    ref, ref_ht = torch_simple_gla_recurrent(
+        *(x.transpose(1, 2) for x in (q, k, v, g)),
+        initial_state=h0,
+        output_final_state=True
+    )
+    ref = ref.transpose(1, 2)
+    for fn in (chunk_simple_gla, fused_recurrent_simple_gla):
+        tri, tri_ht = fn(q, k, v, g, initial_state=h0, output_final_state=True, head_first=False)
+        assert_close("  o", ref, tri, 1e-4)
+        assert_close(" ht", ref_ht, tri_ht, 1e-4)
+
+    # retention is simple GLA with fixed headwise decays
+    ref, ref_ht = chunk_retention(q, k, v, initial_state=h0, output_final_state=True, head_first=False)
+    tri, tri_ht = fused_recurrent_retention(q, k, v, initial_state=h0, output_final_state=True, head_first=False)
+    assert_close("  o", ref, tri, 1e-4)
+    assert_close(" ht", ref_ht, tri_ht, 1e-4)
+
+
+@pytest.mark.parametrize("B", test_b_list)
+@pytest.mark.parametrize("T", test_t_list)
+@pytest.mark.parametrize("H", test_h_list)
+@pytest.mark.parametrize("D", test_d_list)
+def test_delta_rule_cpu(B: int, T: int, H: int, D: int):
+    torch.manual_seed(42)
+    q, v = torch.randn(B, H, T, D), torch.randn(B, H, T, D)
+    k = F.normalize(torch.randn(B, H, T, D), p=2, dim=-1)
+    beta = torch.rand(B, H, T)
+    h0 = torch.randn(B, H, D, D)
+
+    ref, ref_ht = delta_rule_recurrence(q, k, v, beta, initial_state=h0)
+    for fn in (chunk_delta_rule, fused_recurrent_delta_rule):
+        tri, tri_ht = fn(q, k, v, beta, initial_state=h0, output_final_state=True, head_first=True)
+        assert_close("  o", ref, tri, 1e-4)
+        assert_close(" ht", ref_ht, tri_ht, 1e-4)
+
+
+@pytest.mark.parametrize("T", test_t_list)
+@pytest.mark.parametrize("H", test_h_list)
+@pytest.mark.parametrize("D", test_d_list)
+def test_gated_delta_rule_cpu_varlen(T: int, H: int, D: int):
+    torch.manual_seed(42)
+    cu_seqlens = torch.tensor([0, T, 2 * T + 5, 3 * T + 16], dtype=torch.long)
+    N, L = len(cu_seqlens) - 1, cu_seqlens[-1].item()
+    q, k, v = (torch.randn(1, L, H, D).requires_grad_() for _ in range(3))
+    g = F.logsigmoid(torch.randn(1, L, H)).requires_grad_()
+    beta = torch.rand(1, L, H).requires_grad_()
+    h0 = torch.randn(N, H, D, D)
+    do = torch.randn_like(v)
+
+    ref, ref_ht = fused_recurrent_gated_delta_rule(
+        q, k, v, g, beta,
+        initial_state=h0,
+        output_final_state=True,
+        cu_seqlens=cu_seqlens,
+        head_first=False,
+        use_qk_l2norm_in_kernel=True
+    )
+    (ref * do).sum().backward()
+    ref_dq, ref_dk, ref_dv, ref_dg, ref_db = q.grad, k.grad, v.grad, g.grad, beta.grad
+    q.grad = k.grad = v.grad = g.grad = beta.grad = None
+
+    tri, tri_ht = chunk_gated_delta_rule(
+        q, k, v, g, beta,
+        initial_state=h0,
+        output_final_state=True,
+        cu_seqlens=cu_seqlens,
+        head_first=False,
+        use_qk_l2norm_in_kernel=True
+    )
+    (tri * do).sum().backward()
+    assert_close("  o", ref, tri, 1e-4)
+    assert_close(" ht", ref_ht, tri_ht, 1e-4)
+    assert_close(" dq", ref_dq, q.grad, 1e-4)
+    assert_close(" dk", ref_dk, k.grad, 1e-4)
+    assert_close(" dv", ref_dv, v.grad, 1e-4)
+    assert_close(" dg", ref_dg, g.grad, 1e-4)
+    assert_close(" db", ref_db, beta.grad, 1e-4)
+
+
+@pytest.mark.parametrize("B", test_b_list)
+@pytest.mark.parametrize("T", [1, 15, 63])
+@pytest.mark.parametrize("D", [64])
+def test_shortconv_cpu(B: int, T: int, D: int):
+    torch.manual_seed(42)
+    conv = ShortConvolution(D, 4, activation='silu')
+    x = torch.randn(B, T, D)
+    ref = F.silu(F.conv1d(F.pad(x.transpose(1, 2), (3, 0)), conv.weight, groups=D)).transpose(1, 2)
+
+    tri, _ = conv(x)
+    assert_close("  y", ref, tri, 1e-5)
+    # prefill the first token and decode the rest from the cache
+    cache = None
+    tri = []
+    for i in range(T):
+        y, cache = conv(x[:, i:i+1], cache=cache, output_final_state=True)
+        tri.append(y)
+    assert_close("step", ref, torch.cat(tri, 1), 1e-5)
+
+
+def test_autotuners_without_driver(tmp_path):
+    env = dict(os.environ, CUDA_VISIBLE_DEVICES='', HIP_VISIBLE_DEVICES='')
+    env.pop('TRITON_INTERPRET', None)
+    script = """
+import pytest
+import triton
+import fla.utils
+from fla.modules.layernorm import layer_norm_fwd_kernel
+
+# only the autotuners of `fla` kernels defer looking up the benchmarker
+assert layer_norm_fwd_kernel.do_bench is fla.utils._lazy_benchmarker
+
+
+@triton.jit
+def kernel(x):
+    pass
+
+
+with pytest.raises(RuntimeError, match='active drivers'):
+    triton.autotune(configs=[triton.Config({})], key=[])(kernel)
+"""
+    # the source of the jitted kernel is read from the script file
+    path = tmp_path / 'autotuners.py'
+    path.write_text(script)
+    result = subprocess.run([sys.executable, str(path)], env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+@pytest.mark.parametrize("model", ['GLA', 'GatedDeltaNet'])
+def test_model_without_driver(model: str):
+    # hide all devices from Triton, so that no driver is active when `fla` is imported
+    env = dict(os.environ, CUDA_VISIBLE_DEVICES='', HIP_VISIBLE_DEVICES='')
+    env.pop('TRITON_INTERPRET', None)
+    script = f"""
+import torch
+from fla.models import {model}Config, {model}ForCausalLM
+
+torch.manual_seed(42)
+config = {model}Config(hidden_size=128, num_hidden_layers=2, num_heads=2, vocab_size=1000)
+model = {model}ForCausalLM(config)
+input_ids = torch.randint(0, config.vocab_size, (2, 10))
+outputs = model(input_ids=input_ids, labels=input_ids)
+outputs.loss.backward()
+assert outputs.loss.isfinite() and all(p.grad.isfinite().all() for p in model.parameters() if p.grad is not None)
+
+model.eval()
+outputs = model(input_ids=input_ids, labels=input_ids)
+assert outputs.loss.isfinite()
+ref = outputs.logits[:, -1].argmax(-1)
+tri = model.generate(input_ids=input_ids, max_new_tokens=4, do_sample=False)
+assert tri.shape == (2, 14) and torch.equal(tri[:, 10], ref)
+"""
+    result = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
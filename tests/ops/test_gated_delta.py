@@ -221,6 +221,52 @@ def test_recurrent_forward(
     assert_close(" ht", ref_ht, tri_ht, 0.002)
 
 
+@pytest.mark.parametrize("B", test_b_list)
+@pytest.mark.parametrize("T", [1, 7])
+@pytest.mark.parametrize("H", test_h_list)
+@pytest.mark.parametrize("D", test_d_list)
+@pytest.mark.parametrize("dtype", [torch.bfloat16])
+def test_recurrent_intermediate_states(
+    B: int,
+    T: int,
+    H: int,
+    D: int,
+    dtype: torch.dtype
+):
+    torch.manual_seed(42)
+    q = torch.randn(B, T, H, D, dtype=dtype, device=device)
+    k = F.normalize(torch.randn(B, T, H, D, dtype=torch.float32, device=device), p=2, dim=-1).to(dtype)
+    v = torch.randn(B, T, H, D, dtype=dtype, device=device)
+    beta = torch.rand(B, T, H, dtype=dtype, device=device).sigmoid()
+    g = F.logsigmoid(torch.rand(B, T, H, dtype=torch.float32, device=device))
+    h0 = torch.randn(B, H, D, D, dtype=torch.float32, device=device)
+
+    tri, tri_hs = fused_recurrent_gated_delta_rule(
+        q=q,
+        k=k,
+        v=v,
+        beta=beta,
+        g=g,
+        initial_state=h0,
+        head_first=False,
+        output_intermediate_states=True
+    )
+    assert tri_hs.shape == (B, T, H, D, D)
+    for i in range(T):
+        ref, ref_ht = fused_recurrent_gated_delta_rule(
+            q=q[:, :i+1],
+            k=k[:, :i+1],
+            v=v[:, :i+1],
+            beta=beta[:, :i+1],
+            g=g[:, :i+1],
+            initial_state=h0,
+            output_final_state=True,
+            head_first=False
+        )
+        assert_close(f"h{i}", ref_ht, tri_hs[:, i], 0.002)
+    assert_close("  o", ref, tri, 0.002)
+
+
 @pytest.mark.parametrize("B", test_b_list)
 @pytest.mark.parametrize("T", test_t_list)
 @pytest.mark.parametrize("H", test_h_list)
@@ -6,9 +6,9 @@ import pytest
 import torch
 import torch.nn.functional as F
 
-from fla.ops.gla import chunk_gla, fused_recurrent_gla
+from fla.ops.gla import chunk_gla, fused_chunk_gla, fused_recurrent_gla
 from fla.ops.gla.naive import naive_recurrent_gla
-from fla.utils import device
+from fla.utils import device, get_contiguous_copy_stats, reset_contiguous_copy_stats
 from utils import assert_close
 
 compiled_mode = os.getenv("COMPILER_MODE") == "1"
@@ -92,6 +92,85 @@ def test_fused_recurrent(
     assert_close("dh0", ref_dh0, tri_dh0, 0.005)
 
 
+@pytest.mark.parametrize("B", test_b_list)
+@pytest.mark.parametrize("T", [1, 7])
+@pytest.mark.parametrize("H", test_h_list)
+@pytest.mark.parametrize("D", test_d_list)
+@pytest.mark.parametrize("dtype", [torch.bfloat16])
+def test_fused_recurrent_state_indices(
+    B: int,
+    T: int,
+    H: int,
+    D: int,
+    dtype: torch.dtype
+):
+    torch.manual_seed(42)
+    S = 2 * B + 1
+    q = torch.randn((B, T, H, D), dtype=dtype, device=device)
+    k = torch.randn((B, T, H, D), dtype=dtype, device=device)
+    v = torch.randn((B, T, H, D), dtype=dtype, device=device)
+    g = F.logsigmoid(torch.randn((B, T, H, D), dtype=dtype, device=device))
+    pool = torch.randn(S, H, D, D, dtype=torch.float, device=device)
+    state_indices = torch.randperm(S, device=device)[:B]
+
+    ref, ref_ht = fused_recurrent_gla(
+        q=q,
+        k=k,
+        v=v,
+        gk=g,
+        initial_state=pool[state_indices].clone(),
+        output_final_state=True,
+        head_first=False
+    )
+    ref_pool = pool.clone()
+    ref_pool[state_indices] = ref_ht
+    tri, tri_pool = fused_recurrent_gla(
+        q=q,
+        k=k,
+        v=v,
+        gk=g,
+        initial_state=pool,
+        output_final_state=True,
+        head_first=False,
+        state_indices=state_indices
+    )
+    assert tri_pool.data_ptr() == pool.data_ptr()
+    assert_close("  o", ref, tri, 0.005)
+    assert_close(" ht", ref_pool, tri_pool, 0.005)
+
+
+@pytest.mark.parametrize("B", test_b_list)
+@pytest.mark.parametrize("T", [1, 7])
+@pytest.mark.parametrize("H", test_h_list)
+@pytest.mark.parametrize("D", test_d_list)
+@pytest.mark.parametrize("dtype", [torch.bfloat16])
+@pytest.mark.parametrize("head_first", [True, False])
+def test_fused_recurrent_intermediate_states(
+    B: int,
+    T: int,
+    H: int,
+    D: int,
+    dtype: torch.dtype,
+    head_first: bool
+):
+    torch.manual_seed(42)
+    shape = (B, H, T, D) if head_first else (B, T, H, D)
+    q, k, v = (torch.randn(shape, dtype=dtype, device=device) for _ in range(3))
+    g = F.logsigmoid(torch.randn(shape, dtype=dtype, device=device))
+    h0 = torch.randn(B, H, D, D, dtype=torch.float, device=device)
+
+    tri, tri_hs = fused_recurrent_gla(q, k, v, g, initial_state=h0, head_first=head_first, output_intermediate_states=True)
+    assert tri_hs.shape == (*shape, D)
+    ref, ht = h0, None
+    for i in range(T):
+        x = [x[:, :, i:i+1] if head_first else x[:, i:i+1] for x in (q, k, v, g)]
+        _, ht = fused_recurrent_gla(*x, initial_state=ht if ht is not None else h0, output_final_state=True,
+                                    head_first=head_first)
+        assert_close(f"h{i}", ht, tri_hs[:, :, i] if head_first else tri_hs[:, i], 0.005)
+    ref, _ = fused_recurrent_gla(q, k, v, g, initial_state=h0, head_first=head_first)
+    assert_close("  o", ref, tri, 0.005)
+
+
 @pytest.mark.parametrize("B", test_b_list)
 @pytest.mark.parametrize("T", test_t_list)
 @pytest.mark.parametrize("H", test_h_list)
@@ -233,3 +312,203 @@ def test_chunk_varlen(
     assert_close(" dv", ref_dv, tri_dv, 0.005)
     assert_close(" dg", ref_dg, tri_dg, 0.005)
     assert_close("dh0", ref_dh0, tri_dh0, 0.005)
+
+
+@pytest.mark.parametrize("B", test_b_list)
+@pytest.mark.parametrize("T", test_t_list)
+@pytest.mark.parametrize("H", test_h_list)
+@pytest.mark.parametrize("D", [64, 100])
+@pytest.mark.parametrize("G", [2, 4])
+@pytest.mark.parametrize("head_first", [True, False])
+def test_chunk_gqa(
+    B: int,
+    T: int,
+    H: int,
+    D: int,
+    G: int,
+    head_first: bool
+):
+    torch.manual_seed(42)
+    os.environ['TRITON_F32_DEFAULT'] = 'ieee'
+    shape = (lambda h: (B, h, T, D)) if head_first else (lambda h: (B, T, h, D))
+    # `G` query heads share the same key/value head
+    q = torch.randn(shape(H * G), dtype=torch.float, device=device).requires_grad_()
+    k = torch.randn(shape(H), dtype=torch.float, device=device).requires_grad_()
+    v = torch.randn(shape(H), dtype=torch.float, device=device).requires_grad_()
+    g = F.logsigmoid(torch.randn(shape(H), dtype=torch.float, device=device)).requires_grad_()
+    h0 = torch.randn((B, H, D, D), dtype=torch.float, device=device).requires_grad_()
+    do = torch.randn(shape(H * G), dtype=torch.float, device=device)
+
+    def repeat_heads(x):
+        return x.repeat_interleave(G, 1 if head_first else 2)
+    ref, ref_ht = chunk_gla(
+        q, *map(repeat_heads, (k, v, g)),
+        initial_state=h0.repeat_interleave(G, 1),
+        output_final_state=True,
+        head_first=head_first
+    )
+    (ref * do).sum().backward()
+    ref_dq, q.grad = q.grad.clone(), None
+    ref_dk, k.grad = k.grad.clone(), None
+    ref_dv, v.grad = v.grad.clone(), None
+    ref_dg, g.grad = g.grad.clone(), None
+    ref_dh0, h0.grad = h0.grad.clone(), None
+
+    for fn in (chunk_gla, fused_recurrent_gla):
+        tri, tri_ht = fn(q, k, v, g, initial_state=h0, output_final_state=True, head_first=head_first)
+        (tri * do).sum().backward()
+        assert_close("  o", ref, tri, 0.004)
+        assert_close(" ht", ref_ht[:, ::G], tri_ht, 0.005)
+        assert_close(" dq", ref_dq, q.grad, 0.005)
+        assert_close(" dk", ref_dk, k.grad, 0.005)
+        assert_close(" dv", ref_dv, v.grad, 0.005)
+        assert_close(" dg", ref_dg, g.grad, 0.005)
+        assert_close("dh0", ref_dh0, h0.grad, 0.005)
+        q.grad = k.grad = v.grad = g.grad = h0.grad = None
+
+
+@pytest.mark.parametrize("B", test_b_list)
+@pytest.mark.parametrize("T", test_t_list)
+@pytest.mark.parametrize("H", test_h_list)
+@pytest.mark.parametrize("D", [32, 64])
+def test_fused_recurrent_strided(
+    B: int,
+    T: int,
+    H: int,
+    D: int
+):
+    torch.manual_seed(42)
+    # q, k and v are views split from a fused projection
+    qkv = torch.randn((B, T, 3 * H * D), dtype=torch.float, device=device).requires_grad_()
+    g = F.logsigmoid(torch.randn((B, T, H, D), dtype=torch.float, device=device)).requires_grad_()
+    h0 = torch.randn((B, H, D, D), dtype=torch.float, device=device).requires_grad_()
+    do = torch.randn((B, T, H, D), dtype=torch.float, device=device)
+
+    q, k, v = (x.unflatten(-1, (H, D)) for x in qkv.split(H * D, -1))
+    ref, ref_ht = fused_recurrent_gla(
+        *(x.contiguous() for x in (q, k, v)), g,
+        initial_state=h0,
+        output_final_state=True,
+        head_first=False
+    )
+    (ref * do).sum().backward()
+    ref_dqkv, qkv.grad = qkv.grad.clone(), None
+    ref_dg, g.grad = g.grad.clone(), None
+    ref_dh0, h0.grad = h0.grad.clone(), None
+
+    reset_contiguous_copy_stats()
+    tri, tri_ht = fused_recurrent_gla(q, k, v, g, initial_state=h0, output_final_state=True, head_first=False)
+    assert get_contiguous_copy_stats()['bytes'] == 0
+    (tri * do).sum().backward()
+    assert_close("   o", ref, tri, 1e-5)
+    assert_close("  ht", ref_ht, tri_ht, 1e-5)
+    assert_close("dqkv", ref_dqkv, qkv.grad, 1e-5)
+    assert_close("  dg", ref_dg, g.grad, 1e-5)
+    assert_close(" dh0", ref_dh0, h0.grad, 1e-5)
+
+
+@pytest.mark.parametrize("N", test_b_list)
+@pytest.mark.parametrize("T", test_t_varlen_list)
+@pytest.mark.parametrize("H", test_h_list)
+@pytest.mark.parametrize("D", [32, 64])
+@pytest.mark.parametrize("dtype", [torch.float])
+def test_fused_chunk_varlen(
+    N: int,
+    T: int,
+    H: int,
+    D: int,
+    dtype: torch.dtype,
+):
+    torch.manual_seed(42)
+    # randomly split the sequence into N segments
+    offsets = torch.cat([
+        torch.tensor([0], dtype=torch.long),
+        torch.arange(1, T)[torch.randperm(T - 1)[:N-1]],
+        torch.tensor([T], dtype=torch.long)
+    ], 0).to(device).sort()[0]
+    N = len(offsets) - 1
+    # seq-first required for inputs with variable lengths
+    q = torch.randn((1, T, H, D), dtype=dtype, device=device).requires_grad_()
+    k = torch.randn((1, T, H, D), dtype=dtype, device=device).requires_grad_()
+    v = torch.randn((1, T, H, D), dtype=dtype, device=device).requires_grad_()
+    g = F.logsigmoid(torch.randn((1, T, H, D), dtype=dtype, device=device)).requires_grad_()
+    h0 = torch.randn((N, H, D, D), dtype=dtype, device=device)
+    do = torch.randn_like(v)
+
+    # each sequence is processed on its own as the reference
+    ref, ref_ht = zip(*[
+        fused_chunk_gla(
+            *(x[:, bos:eos] for x in (q, k, v, g)),
+            initial_state=h0[i:i+1],
+            output_final_state=True,
+            head_first=False
+        )
+        for i, (bos, eos) in enumerate(zip(offsets[:-1].tolist(), offsets[1:].tolist()))
+    ])
+    ref, ref_ht = torch.cat(ref, 1), torch.cat(ref_ht, 0)
+    ref.backward(do)
+    ref_dq, q.grad = q.grad.clone(), None
+    ref_dk, k.grad = k.grad.clone(), None
+    ref_dv, v.grad = v.grad.clone(), None
+    ref_dg, g.grad = g.grad.clone(), None
+
+    tri, tri_ht = fused_chunk_gla(
+        q, k, v, g,
+        initial_state=h0,
+        output_final_state=True,
+        cu_seqlens=offsets,
+        head_first=False
+    )
+    tri.backward(do)
+    tri_dq, q.grad = q.grad.clone(), None
+    tri_dk, k.grad = k.grad.clone(), None
+    tri_dv, v.grad = v.grad.clone(), None
+    tri_dg, g.grad = g.grad.clone(), None
+
+    assert_close("  o", ref, tri, 0.005)
+    assert_close(" ht", ref_ht, tri_ht, 0.005)
+    assert_close(" dq", ref_dq, tri_dq, 0.005)
+    assert_close(" dk", ref_dk, tri_dk, 0.005)
+    assert_close(" dv", ref_dv, tri_dv, 0.005)
+    assert_close(" dg", ref_dg, tri_dg, 0.005)
+
+
+@pytest.mark.parametrize("B", test_b_list)
+@pytest.mark.parametrize("T", test_t_list)
+@pytest.mark.parametrize("H", test_h_list)
+@pytest.mark.parametrize("D", [32, 64, 100])
+def test_chunk_strided(
+    B: int,
+    T: int,
+    H: int,
+    D: int
+):
+    torch.manual_seed(42)
+    # q, k and v are views split from a fused projection
+    qkv = torch.randn((B, T, 3 * H * D), dtype=torch.float, device=device).requires_grad_()
+    g = F.logsigmoid(torch.randn((B, T, H, D), dtype=torch.float, device=device)).requires_grad_()
+    h0 = torch.randn((B, H, D, D), dtype=torch.float, device=device).requires_grad_()
+    do = torch.randn((B, T, H, D), dtype=torch.float, device=device)
+    dht = torch.randn((B, H, D, D), dtype=torch.float, device=device)
+
+    q, k, v = (x.unflatten(-1, (H, D)) for x in qkv.split(H * D, -1))
+    ref, ref_ht = chunk_gla(
+        *(x.contiguous() for x in (q, k, v)), g,
+        initial_state=h0,
+        output_final_state=True,
+        head_first=False
+    )
+    ((ref * do).sum() + (ref_ht * dht).sum()).backward()
+    ref_dqkv, qkv.grad = qkv.grad.clone(), None
+    ref_dg, g.grad = g.grad.clone(), None
+    ref_dh0, h0.grad = h0.grad.clone(), None
+
+    reset_contiguous_copy_stats()
+    tri, tri_ht = chunk_gla(q, k, v, g, initial_state=h0, output_final_state=True, head_first=False)
+    assert get_contiguous_copy_stats()['bytes'] == 0
+    ((tri * do).sum() + (tri_ht * dht).sum()).backward()
+    assert_close("   o", ref, tri, 1e-5)
+    assert_close("  ht", ref_ht, tri_ht, 1e-5)
+    assert_close("dqkv", ref_dqkv, qkv.grad, 1e-5)
+    assert_close("  dg", ref_dg, g.grad, 1e-5)
+    assert_close(" dh0", ref_dh0, h0.grad, 1e-5)
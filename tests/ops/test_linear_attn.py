@@ -153,3 +153,67 @@ def test_fused_chunk(
     assert_close(" dq", ref_dq, tri_dq, 0.008)
     assert_close(" dk", ref_dk, tri_dk, 0.008)
     assert_close(" dv", ref_dv, tri_dv, 0.008)
+
+
+@pytest.mark.parametrize("N", test_b_list)
+@pytest.mark.parametrize("T", test_t_varlen_list)
+@pytest.mark.parametrize("H", test_h_list)
+@pytest.mark.parametrize("D", [32, 64])
+@pytest.mark.parametrize("dtype", [torch.float])
+def test_fused_chunk_varlen(
+    N: int,
+    T: int,
+    H: int,
+    D: int,
+    dtype: torch.dtype,
+):
+    torch.manual_seed(42)
+    # randomly split the sequence into N segments
+    offsets = torch.cat([
+        torch.tensor([0], dtype=torch.long),
+        torch.arange(1, T)[torch.randperm(T - 1)[:N-1]],
+        torch.tensor([T], dtype=torch.long)
+    ], 0).to(device).sort()[0]
+    N = len(offsets) - 1
+    # seq-first required for inputs with variable lengths
+    q = torch.randn((1, T, H, D), dtype=dtype, device=device).requires_grad_()
+    k = torch.randn((1, T, H, D), dtype=dtype, device=device).requires_grad_()
+    v = torch.randn((1, T, H, D), dtype=dtype, device=device).requires_grad_()
+    h0 = torch.randn((N, H, D, D), dtype=dtype, device=device)
+    do = torch.randn_like(v)
+
+    # each sequence is processed on its own as the reference
+    ref, ref_ht = zip(*[
+        fused_chunk_linear_attn(
+            *(x[:, bos:eos] for x in (q, k, v)),
+            initial_state=h0[i:i+1],
+            output_final_state=True,
+            normalize=False,
+            head_first=False
+        )
+        for i, (bos, eos) in enumerate(zip(offsets[:-1].tolist(), offsets[1:].tolist()))
+    ])
+    ref, ref_ht = torch.cat(ref, 1), torch.cat(ref_ht, 0)
+    ref.backward(do)
+    ref_dq, q.grad = q.grad.clone(), None
+    ref_dk, k.grad = k.grad.clone(), None
+    ref_dv, v.grad = v.grad.clone(), None
+
+    tri, tri_ht = fused_chunk_linear_attn(
+        q, k, v,
+        initial_state=h0,
+        output_final_state=True,
+        normalize=False,
+        cu_seqlens=offsets,
+        head_first=False
+    )
+    tri.backward(do)
+    tri_dq, q.grad = q.grad.clone(), None
+    tri_dk, k.grad = k.grad.clone(), None
+    tri_dv, v.grad = v.grad.clone(), None
+
+    assert_close("  o", ref, tri, 0.005)
+    assert_close(" ht", ref_ht, tri_ht, 0.005)
+    assert_close(" dq", ref_dq, tri_dq, 0.005)
+    assert_close(" dk", ref_dk, tri_dk, 0.005)
+    assert_close(" dv", ref_dv, tri_dv, 0.005)
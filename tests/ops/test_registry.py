@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import torch
+
+from fla.ops.gla import chunk_gla, fused_recurrent_gla
+from fla.ops.registry import ModeSelector, get_op, register_op, select_mode
+
+
+def test_get_op():
+    assert get_op('gla', 'chunk') is chunk_gla
+    assert get_op('gla', 'fused_recurrent') is fused_recurrent_gla
+    with pytest.raises(KeyError):
+        get_op('gla', 'parallel')
+
+
+@pytest.mark.parametrize("device", ['cuda', 'cpu'])
+def test_select_mode(device: str):
+    selector = ModeSelector()
+    modes = ('chunk', 'fused_recurrent')
+    # decoding always goes through the recurrent kernels, and long sequences through the chunked ones
+    assert selector.select('gla', modes, 1, 1, 4, 128, 128, device) == 'fused_recurrent'
+    assert selector.select('gla', modes, 1, 4096, 4, 128, 128, device) == 'chunk'
+    # the crossover moves earlier as the batch grows
+    crossovers = [
+        next(T for T in range(1, 4096) if selector.select('gla', modes, B, T, 4, 128, 128, device) == 'chunk')
+        for B in (1, 32)
+    ]
+    assert crossovers[0] >= crossovers[1]
+    # modes without backward support are skipped for training
+    assert selector.select('gated_delta_rule', modes, 1, 1, 4, 128, 128, device, requires_grad=True) == 'chunk'
+    # modes that are not priced for the device are never picked
+    assert selector.select('gla', ('fused_chunk', 'fused_recurrent'), 1, 4096, 4, 128, 128, 'cpu') == 'fused_recurrent'
+
+    x = torch.randn(2, 1, 16)
+    assert select_mode('gla', 'chunk', x, 4, 128, 128) == 'fused_recurrent'
+
+
+def test_calibrate(tmp_path):
+    def chunk(q, k, v, head_first):
+        q, k, v = (x.transpose(1, 2) for x in (q, k, v))
+        return ((q @ k.transpose(-1, -2)).tril() @ v).transpose(1, 2)
+
+    def fused_recurrent(q, k, v, head_first):
+        h = q.new_zeros(q.shape[0], q.shape[2], q.shape[3], v.shape[3])
+        o = []
+        for t in range(q.shape[1]):
+            h = h + k[:, t, :, :, None] * v[:, t, :, None, :]
+            o.append((q[:, t, :, :, None] * h).sum(-2))
+        return torch.stack(o, 1)
+
+    register_op('test', 'chunk', chunk, inputs=())
+    register_op('test', 'fused_recurrent', fused_recurrent)
+    selector = ModeSelector()
+    costs = selector.calibrate('test', [(1, T, 1, 16, 16) for T in (1, 16, 64, 256)], device='cpu', warmup=1, rep=2)
+    assert set(costs) == {'cpu/test/chunk', 'cpu/test/fused_recurrent'}
+    assert all(c >= 0 for coefficients in costs.values() for c in coefficients)
+
+    path = str(tmp_path / 'costs.json')
+    selector.save(path)
+    assert ModeSelector(path=path).costs['cpu/test/chunk'] == costs['cpu/test/chunk']
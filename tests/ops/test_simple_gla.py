@@ -11,7 +11,7 @@ from einops import rearrange
 from fla.ops.simple_gla import chunk_simple_gla
 from fla.ops.simple_gla.fused_recurrent import fused_recurrent_simple_gla
 from fla.ops.simple_gla.parallel import parallel_simple_gla
-from fla.utils import device
+from fla.utils import device, get_contiguous_copy_stats, reset_contiguous_copy_stats
 from utils import assert_close
 
 compiled_mode = os.getenv("COMPILER_MODE") == "1"
@@ -459,3 +459,53 @@ def test_simple_gla_to_mamba2(vary_A, dtype):
     assert y_rearrange.allclose(outputs_gla_fuse, 0, atol), f"y diff: {torch.abs(y_rearrange - outputs_gla_fuse).max()}"
     final_gla_fuse = final_gla_fuse.to(dtype)  # states hard-coded to float32 in FLA kernel
     assert final_rearrange.allclose(final_gla_fuse, 0, atol), f"final diff: {torch.abs(final_ssd - final_gla_fuse).max()}"
+
+
+@pytest.mark.parametrize("B", test_b_list)
+@pytest.mark.parametrize("T", test_t_list)
+@pytest.mark.parametrize("H", test_h_list)
+@pytest.mark.parametrize("D", [32, 64, 100])
+@pytest.mark.parametrize("state_checkpoint_interval", [None, 2])
+def test_chunk_strided(
+    B: int,
+    T: int,
+    H: int,
+    D: int,
+    state_checkpoint_interval: Optional[int]
+):
+    torch.manual_seed(42)
+    # q, k and v are views split from a fused projection
+    qkv = torch.randn((B, T, 3 * H * D), dtype=torch.float, device=device).requires_grad_()
+    g = F.logsigmoid(torch.randn((B, T, H), dtype=torch.float, device=device)).requires_grad_()
+    h0 = torch.randn((B, H, D, D), dtype=torch.float, device=device).requires_grad_()
+    do = torch.randn((B, T, H, D), dtype=torch.float, device=device)
+    dht = torch.randn((B, H, D, D), dtype=torch.float, device=device)
+
+    q, k, v = (x.unflatten(-1, (H, D)) for x in qkv.split(H * D, -1))
+    ref, ref_ht = chunk_simple_gla(
+        *(x.contiguous() for x in (q, k, v)), g,
+        initial_state=h0,
+        output_final_state=True,
+        head_first=False,
+        state_checkpoint_interval=state_checkpoint_interval
+    )
+    ((ref * do).sum() + (ref_ht * dht).sum()).backward()
+    ref_dqkv, qkv.grad = qkv.grad.clone(), None
+    ref_dg, g.grad = g.grad.clone(), None
+    ref_dh0, h0.grad = h0.grad.clone(), None
+
+    reset_contiguous_copy_stats()
+    tri, tri_ht = chunk_simple_gla(
+        q, k, v, g,
+        initial_state=h0,
+        output_final_state=True,
+        head_first=False,
+        state_checkpoint_interval=state_checkpoint_interval
+    )
+    assert get_contiguous_copy_stats()['bytes'] == 0
+    ((tri * do).sum() + (tri_ht * dht).sum()).backward()
+    assert_close("   o", ref, tri, 1e-5)
+    assert_close("  ht", ref_ht, tri_ht, 1e-5)
+    assert_close("dqkv", ref_dqkv, qkv.grad, 1e-5)
+    assert_close("  dg", ref_dg, g.grad, 1e-5)
+    assert_close(" dh0", ref_dh0, h0.grad, 1e-5)
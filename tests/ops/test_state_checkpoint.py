@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import torch
+import torch.nn.functional as F
+
+from fla.ops.delta_rule import chunk_delta_rule
+from fla.ops.gated_delta_rule import chunk_gated_delta_rule
+from fla.ops.gla import chunk_gla
+from fla.ops.simple_gla import chunk_simple_gla
+from fla.utils import device
+from utils import assert_close
+
+
+def get_inputs(op: str, shape, dtype: torch.dtype):
+    q, k, v = (torch.randn(shape, dtype=dtype, device=device) for _ in range(3))
+    if op == 'gla':
+        return q, k, v, F.logsigmoid(torch.randn(shape, dtype=dtype, device=device))
+    if op == 'simple_gla':
+        return q, k, v, F.logsigmoid(torch.randn(shape[:-1], dtype=dtype, device=device))
+    k = F.normalize(k, p=2, dim=-1)
+    beta = torch.rand(shape[:-1], dtype=dtype, device=device)
+    if op == 'delta_rule':
+        return q, k, v, beta
+    return q, k, v, F.logsigmoid(torch.randn(shape[:-1], dtype=dtype, device=device)), beta
+
+
+@pytest.mark.parametrize("op", ['gla', 'simple_gla', 'delta_rule', 'gated_delta_rule'])
+@pytest.mark.parametrize("T", [63, 300, 1000])
+@pytest.mark.parametrize("interval", [1, 2, 3])
+@pytest.mark.parametrize("varlen", [False, True])
+@pytest.mark.parametrize("dtype", [torch.bfloat16])
+def test_state_checkpoint(op: str, T: int, interval: int, varlen: bool, dtype: torch.dtype):
+    torch.manual_seed(42)
+    fn = {
+        'gla': chunk_gla,
+        'simple_gla': chunk_simple_gla,
+        'delta_rule': chunk_delta_rule,
+        'gated_delta_rule': chunk_gated_delta_rule
+    }[op]
+    B, H, D = 2, 2, 64
+    cu_seqlens = None
+    if varlen:
+        B, cu_seqlens = 1, torch.tensor([0, T // 3, T - 17, T], dtype=torch.long, device=device)
+    N = B if cu_seqlens is None else len(cu_seqlens) - 1
+    inputs = [x.requires_grad_() for x in get_inputs(op, (B, T, H, D), dtype)]
+    h0 = torch.randn(N, H, D, D, dtype=torch.float, device=device).requires_grad_()
+    do = torch.randn_like(inputs[2])
+    dht = torch.randn_like(h0)
+
+    def run(state_checkpoint_interval):
+        o, ht = fn(
+            *inputs,
+            initial_state=h0,
+            output_final_state=True,
+            cu_seqlens=cu_seqlens,
+            head_first=False,
+            state_checkpoint_interval=state_checkpoint_interval
+        )
+        ((o * do).sum() + (ht * dht).sum()).backward()
+        grads = [x.grad for x in (*inputs, h0)]
+        for x in (*inputs, h0):
+            x.grad = None
+        return o, ht, grads
+
+    ref, ref_ht, ref_grads = run(None)
+    tri, tri_ht, tri_grads = run(interval)
+    assert_close("  o", ref, tri, 0.005)
+    assert_close(" ht", ref_ht, tri_ht, 0.005)
+    for i, (ref_grad, tri_grad) in enumerate(zip(ref_grads, tri_grads)):
+        assert_close(f"d{i}", ref_grad, tri_grad, 0.005)
@@ -7,6 +7,7 @@ import torch
 import torch.nn.functional as F
 
 # from fla.ops.titans.fused_chunk import fused_chunk_titans_linear
+from fla.ops.titans import chunk_titans_linear, fused_recurrent_titans_linear
 from fla.ops.titans.naive import chunk_titans_linear_ref
 from fla.utils import device
 
@@ -154,6 +155,150 @@ def test_naive_chunk_fwd(
     assert_close("ht", ref_ht, ref_ht_naive, 0.005)
 
 
+@pytest.mark.parametrize("B", test_b_list)
+@pytest.mark.parametrize("T", test_t_list)
+@pytest.mark.parametrize("H", test_h_list)
+@pytest.mark.parametrize("D", [50, 64, 100])
+@pytest.mark.parametrize("BT", [16, 64])
+@pytest.mark.parametrize("head_first", [True, False])
+@pytest.mark.parametrize("fn", [chunk_titans_linear, fused_recurrent_titans_linear])
+def test_fwd_bwd(B: int, T: int, H: int, D: int, BT: int, head_first: bool, fn):
+    torch.manual_seed(1)
+    os.environ['TRITON_F32_DEFAULT'] = 'ieee'
+    theta, alpha, eta = (torch.rand(B, H, T, 1) for _ in range(3))
+    q = F.normalize(torch.randn(B, H, T, D), p=2, dim=-1)
+    k = F.normalize(torch.randn(B, H, T, D), p=2, dim=-1)
+    v = torch.randn(B, H, T, D)
+    w, b = torch.randn(H, D), torch.randn(H, D)
+    h0 = torch.randn(B, H, D, D)
+    if not head_first:
+        q, k, v, theta, alpha, eta = map(lambda x: x.transpose(1, 2).contiguous(), (q, k, v, theta, alpha, eta))
+    q, k, v, w, b, theta, alpha, eta, h0 = map(
+        lambda x: x.to(device).requires_grad_(True), (q, k, v, w, b, theta, alpha, eta, h0)
+    )
+    do = torch.randn_like(v)
+
+    ref, ref_ht = chunk_titans_linear_ref(
+        q, k, v, w, b, theta, alpha, eta,
+        chunk_size=BT,
+        initial_state=h0,
+        output_final_state=True,
+        head_first=head_first,
+        use_chunk=False
+    )
+    ((ref * do).sum()).backward()
+    ref_dq, q.grad = q.grad, None
+    ref_dk, k.grad = k.grad, None
+    ref_dv, v.grad = v.grad, None
+    ref_dw, w.grad = w.grad, None
+    ref_db, b.grad = b.grad, None
+    ref_dtheta, theta.grad = theta.grad, None
+    ref_dalpha, alpha.grad = alpha.grad, None
+    ref_deta, eta.grad = eta.grad, None
+    ref_dh0, h0.grad = h0.grad, None
+
+    tri, (tri_ht, _) = fn(
+        q, k, v, w, b, theta, alpha, eta,
+        chunk_size=BT,
+        initial_state=h0,
+        output_final_state=True,
+        head_first=head_first
+    )
+    ((tri * do).sum()).backward()
+    assert_close("  o", ref, tri, 1e-4)
+    # the reference pads the inputs to a multiple of the chunk size, which also updates its final state
+    if T % BT == 0:
+        assert_close(" ht", ref_ht, tri_ht, 1e-4)
+    assert_close(" dq", ref_dq, q.grad, 1e-4)
+    assert_close(" dk", ref_dk, k.grad, 1e-4)
+    assert_close(" dv", ref_dv, v.grad, 1e-4)
+    assert_close(" dw", ref_dw, w.grad, 1e-4)
+    assert_close(" db", ref_db, b.grad, 1e-4)
+    assert_close("dtheta", ref_dtheta, theta.grad, 1e-4)
+    assert_close("dalpha", ref_dalpha, alpha.grad, 1e-3)
+    assert_close(" deta", ref_deta, eta.grad, 1e-3)
+    assert_close("dh0", ref_dh0, h0.grad, 1e-4)
+
+    # resuming from the memory and momentum of the first half reproduces the outputs of the second half
+    t = T // 2
+    if head_first:
+        x1, x2 = ([x[:, :, :t] for x in (q, k, v, theta, alpha, eta)], [x[:, :, t:] for x in (q, k, v, theta, alpha, eta)])
+    else:
+        x1, x2 = ([x[:, :t] for x in (q, k, v, theta, alpha, eta)], [x[:, t:] for x in (q, k, v, theta, alpha, eta)])
+    tri_a, state = fn(*x1[:3], w, b, *x1[3:], chunk_size=BT, initial_state=h0, output_final_state=True, head_first=head_first)
+    tri_b, _ = fn(*x2[:3], w, b, *x2[3:], chunk_size=BT, initial_state=state, head_first=head_first)
+    # the memory w.r.t. which the inner gradients are taken is refreshed at the split point as well
+    if t % BT == 0:
+        assert_close(" o2", ref, torch.cat((tri_a, tri_b), 2 if head_first else 1), 1e-4)
+
+
+@pytest.mark.parametrize("N", [4])
+@pytest.mark.parametrize("T", [64, 300])
+@pytest.mark.parametrize("H", test_h_list)
+@pytest.mark.parametrize("D", [64, 100])
+@pytest.mark.parametrize("fn", [chunk_titans_linear, fused_recurrent_titans_linear])
+def test_varlen(N: int, T: int, H: int, D: int, fn):
+    torch.manual_seed(42)
+    os.environ['TRITON_F32_DEFAULT'] = 'ieee'
+    # randomly split the sequence into N segments
+    offsets = torch.cat([
+        torch.tensor([0], dtype=torch.long),
+        torch.arange(16, T)[torch.randperm(T - 16)[:N-1]],
+        torch.tensor([T], dtype=torch.long)
+    ], 0).to(device).sort()[0]
+
+    theta, alpha, eta = (torch.rand(1, T, H, 1) for _ in range(3))
+    q = F.normalize(torch.randn(1, T, H, D), p=2, dim=-1)
+    k = F.normalize(torch.randn(1, T, H, D), p=2, dim=-1)
+    v = torch.randn(1, T, H, D)
+    w, b = torch.randn(H, D), torch.randn(H, D)
+    h0 = torch.randn(N, H, D, D)
+    q, k, v, w, b, theta, alpha, eta, h0 = map(
+        lambda x: x.to(device).requires_grad_(True), (q, k, v, w, b, theta, alpha, eta, h0)
+    )
+    do = torch.randn_like(v)
+
+    refs, ref_hts = [], []
+    for i in range(N):
+        ref, (ref_ht, _) = chunk_titans_linear(
+            *(x[:, offsets[i]:offsets[i+1]] for x in (q, k, v)),
+            w, b,
+            *(x[:, offsets[i]:offsets[i+1]] for x in (theta, alpha, eta)),
+            initial_state=h0[i:i+1],
+            output_final_state=True,
+            head_first=False
+        )
+        refs.append(ref)
+        ref_hts.append(ref_ht)
+    ref, ref_ht = torch.cat(refs, 1), torch.cat(ref_hts, 0)
+    ((ref * do).sum()).backward()
+    ref_dq, q.grad = q.grad, None
+    ref_dk, k.grad = k.grad, None
+    ref_dv, v.grad = v.grad, None
+    ref_dtheta, theta.grad = theta.grad, None
+    ref_dalpha, alpha.grad = alpha.grad, None
+    ref_deta, eta.grad = eta.grad, None
+    ref_dh0, h0.grad = h0.grad, None
+
+    tri, (tri_ht, _) = fn(
+        q, k, v, w, b, theta, alpha, eta,
+        initial_state=h0,
+        output_final_state=True,
+        cu_seqlens=offsets,
+        head_first=False
+    )
+    ((tri * do).sum()).backward()
+    assert_close("  o", ref, tri, 1e-4)
+    assert_close(" ht", ref_ht, tri_ht, 1e-4)
+    assert_close(" dq", ref_dq, q.grad, 1e-4)
+    assert_close(" dk", ref_dk, k.grad, 1e-4)
+    assert_close(" dv", ref_dv, v.grad, 1e-4)
+    assert_close("dtheta", ref_dtheta, theta.grad, 1e-4)
+    assert_close("dalpha", ref_dalpha, alpha.grad, 1e-4)
+    assert_close(" deta", ref_deta, eta.grad, 1e-4)
+    assert_close("dh0", ref_dh0, h0.grad, 1e-4)
+
+
 # @pytest.mark.parametrize("B", test_b_list)
 # @pytest.mark.parametrize("T", test_t_list)
 # @pytest.mark.parametrize("H", test_h_list)
@@ -240,3 +385,48 @@ def test_naive_chunk_fwd(
 
 #     # assert_close(" o", ref, ref_naive, 0.006)
 #     assert_close("ht", ref_ht, ref_ht_naive, 0.005)
+
+
+@pytest.mark.parametrize("B", [2])
+@pytest.mark.parametrize("T", [63])
+@pytest.mark.parametrize("H", test_h_list)
+@pytest.mark.parametrize("D", [64])
+@pytest.mark.parametrize("fn", [chunk_titans_linear, fused_recurrent_titans_linear])
+def test_saturated_gates(B: int, T: int, H: int, D: int, fn):
+    torch.manual_seed(42)
+    os.environ['TRITON_F32_DEFAULT'] = 'ieee'
+    theta, alpha, eta = (torch.rand(B, T, H, 1) for _ in range(3))
+    # full forgetting and no momentum at some positions, e.g., sigmoid gates rounded to 1 or 0 in low precision
+    alpha[:, 5::9], eta[:, 3::7] = 1., 0.
+    q = F.normalize(torch.randn(B, T, H, D), p=2, dim=-1)
+    k = F.normalize(torch.randn(B, T, H, D), p=2, dim=-1)
+    v = torch.randn(B, T, H, D)
+    w, b = torch.randn(H, D), torch.randn(H, D)
+    h0 = torch.randn(B, H, D, D)
+    q, k, v, w, b, theta, alpha, eta, h0 = map(
+        lambda x: x.to(device).requires_grad_(True), (q, k, v, w, b, theta, alpha, eta, h0)
+    )
+    do = torch.randn_like(v)
+
+    ref, _ = chunk_titans_linear_ref(
+        q, k, v, w, b, theta, alpha, eta,
+        chunk_size=16,
+        initial_state=h0,
+        head_first=False,
+        use_chunk=False
+    )
+    ((ref * do).sum()).backward()
+    ref_grads = [x.grad for x in (q, k, v, theta, h0, alpha, eta)]
+    for x in (q, k, v, w, b, theta, alpha, eta, h0):
+        x.grad = None
+
+    tri, _ = fn(q, k, v, w, b, theta, alpha, eta, chunk_size=16, initial_state=h0, head_first=False)
+    ((tri * do).sum()).backward()
+    assert_close("  o", ref, tri, 1e-4)
+    for name, ref_grad, x in zip((" dq", " dk", " dv", "dtheta", "dh0"), ref_grads, (q, k, v, theta, h0)):
+        assert not x.grad.isnan().any(), name
+        assert_close(name, ref_grad, x.grad, 1e-4)
+    # the saturated gates are clamped, through which no gradients are passed
+    for name, ref_grad, x, m in zip(("dalpha", " deta"), ref_grads[5:], (alpha, eta), (alpha.ne(1), eta.ne(0))):
+        assert not x.grad.isnan().any(), name
+        assert_close(name, ref_grad[m], x.grad[m], 1e-3)
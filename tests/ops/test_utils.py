@@ -5,6 +5,7 @@ import os
 import pytest
 import torch
 
+from fla.ops.common.utils import prepare_chunk_indices, prepare_position_ids, prepare_token_indices
 from fla.ops.utils import chunk_global_cumsum, chunk_local_cumsum, mean_pooling
 from fla.utils import device
 
@@ -310,3 +311,26 @@ def test_mean_pooling_varlen(
 
     torch.testing.assert_close(ref, tri.to(ref.dtype))
     torch.testing.assert_close(ref_dx, tri_dx.to(ref_dx.dtype))
+
+
+@pytest.mark.parametrize("N", [1, 4, 1000])
+@pytest.mark.parametrize("chunk_size", [16, 64])
+def test_prepare_indices(N: int, chunk_size: int):
+    torch.manual_seed(42)
+    lens = torch.randint(1, 100, (N,))
+    offsets = torch.cat([lens.new_tensor([0]), lens.cumsum(0)]).to(device)
+
+    position_ids = torch.cat([torch.arange(n) for n in lens.tolist()]).to(offsets)
+    sequence_ids = torch.cat([torch.full((n,), i) for i, n in enumerate(lens.tolist())]).to(offsets)
+    torch.testing.assert_close(position_ids, prepare_position_ids(offsets))
+    torch.testing.assert_close(torch.stack([sequence_ids, position_ids], 1), prepare_token_indices(offsets))
+    # the same indices without reading the total length back from the offsets
+    T = lens.sum().item()
+    torch.testing.assert_close(position_ids, prepare_position_ids(offsets, T))
+    torch.testing.assert_close(torch.stack([sequence_ids, position_ids], 1), prepare_token_indices(offsets, T))
+
+    chunk_lens = ((lens + chunk_size - 1) // chunk_size).tolist()
+    chunk_indices = torch.cat([
+        torch.stack([torch.full((n,), i), torch.arange(n)], 1) for i, n in enumerate(chunk_lens)
+    ]).to(offsets)
+    torch.testing.assert_close(chunk_indices, prepare_chunk_indices(offsets, chunk_size))
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import subprocess
+import sys
+
+import torch
+import triton
+import triton.language as tl
+
+import fla.utils
+from fla.utils import AutotuneCache, AutotuneStore, device, enable_autotune_cache
+
+
+@triton.autotune(
+    configs=[
+        triton.Config({'BS': BS}, num_warps=num_warps)
+        for BS in [32, 64]
+        for num_warps in [1, 2]
+    ],
+    key=['N']
+)
+@triton.jit
+def add_one_kernel(x, y, N, BS: tl.constexpr):
+    o = tl.program_id(0) * BS + tl.arange(0, BS)
+    tl.store(y + o, tl.load(x + o, mask=o < N) + 1, mask=o < N)
+
+
+@triton.jit
+def add_two_kernel(x, y, N, BS: tl.constexpr):
+    o = tl.program_id(0) * BS + tl.arange(0, BS)
+    tl.store(y + o, tl.load(x + o, mask=o < N) + 2, mask=o < N)
+
+
+def add_one(x: torch.Tensor) -> torch.Tensor:
+    y = torch.empty_like(x)
+    add_one_kernel[lambda meta: (triton.cdiv(x.numel(), meta['BS']),)](x, y, x.numel())
+    return y
+
+
+def test_autotune_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / 'autotune.json')
+    x = torch.randn(1000, device=device)
+
+    add_one_kernel.cache = {}
+    store = AutotuneStore(path)
+    add_one_kernel.cache = AutotuneCache(add_one_kernel, 'add_one_kernel', store)
+    assert torch.equal(add_one(x), x + 1)
+    best_config = add_one_kernel.best_config
+    with open(path) as f:
+        entries = json.load(f)
+    assert len(entries[store.scope]['add_one_kernel']) == 1
+
+    # a new process reloads the selected config instead of benchmarking again
+    def bench(*args, **kwargs):
+        raise AssertionError("the kernel should not be benchmarked again")
+    monkeypatch.setattr(add_one_kernel, '_bench', bench)
+    for store in (AutotuneStore(path), AutotuneStore(profile=path)):
+        add_one_kernel.cache = {}
+        add_one_kernel.cache = AutotuneCache(add_one_kernel, 'add_one_kernel', store)
+        assert torch.equal(add_one(x), x + 1)
+        assert add_one_kernel.best_config.all_kwargs() == best_config.all_kwargs()
+
+    # shipped profiles can be dumped from the entries of the current device
+    profile = str(tmp_path / 'profile.json')
+    store.save(profile)
+    assert AutotuneStore(profile=profile).entries == store.entries
+
+
+def test_enable_autotune_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / 'autotune.json')
+    monkeypatch.setattr(fla.utils, '_autotune_store', None)
+    store = enable_autotune_cache(path)
+
+    # the autotuners of kernels defined after enabling the cache, e.g., in lazily imported modules, are backed as well
+    monkeypatch.setattr(add_two_kernel.fn, '__module__', 'fla.ops.lazy')
+    kernel = triton.autotune(configs=[triton.Config({'BS': BS}) for BS in [32, 64]], key=['N'])(add_two_kernel)
+    assert isinstance(kernel.cache, AutotuneCache) and kernel.cache.store is store
+    x = torch.randn(1000, device=device)
+    y = torch.empty_like(x)
+    kernel[lambda meta: (triton.cdiv(x.numel(), meta['BS']),)](x, y, x.numel())
+    assert torch.equal(y, x + 2)
+    with open(path) as f:
+        assert len(json.load(f)[store.scope]['fla.ops.lazy.add_two_kernel']) == 1
+
+    # kernels out of `fla` are left untouched
+    monkeypatch.setattr(add_two_kernel.fn, '__module__', __name__)
+    kernel = triton.autotune(configs=[triton.Config({'BS': BS}) for BS in [32, 64]], key=['N'])(add_two_kernel)
+    assert not isinstance(kernel.cache, AutotuneCache)
+
+
+def test_autotune_cache_env(tmp_path):
+    env = dict(os.environ, FLA_AUTOTUNE_CACHE='1', FLA_CACHE_DIR=str(tmp_path))
+    # both the kernels loaded by `import fla` and those of the modules imported afterwards are backed by the store
+    script = """
+import sys
+import triton
+import fla
+from fla.ops.gla.chunk import chunk_gla_fwd_kernel_o
+from fla.utils import AutotuneCache
+assert 'fla.ops.common.chunk_h_split' not in sys.modules
+from fla.ops.common.chunk_h_split import chunk_fwd_kernel_h_split
+for kernel in (chunk_gla_fwd_kernel_o, chunk_fwd_kernel_h_split):
+    # autotuners may be wrapped by heuristics
+    while not isinstance(kernel, triton.runtime.Autotuner):
+        kernel = kernel.fn
+    assert isinstance(kernel.cache, AutotuneCache), kernel
+    assert kernel.cache.store.path == sys.argv[1], kernel.cache.store.path
+"""
+    result = subprocess.run([sys.executable, '-c', script, str(tmp_path / 'autotune.json')],
+                            env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
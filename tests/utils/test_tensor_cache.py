@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+import torch
+
+from fla.utils import tensor_cache
+
+
+def test_tensor_cache():
+    calls = []
+
+    @tensor_cache(maxsize=2)
+    def prepare(x: torch.Tensor, n: int) -> torch.Tensor:
+        calls.append(n)
+        return x * n
+
+    x, y = torch.arange(4), torch.arange(4)
+    # interleaved calls with different arguments hit the cache
+    for _ in range(3):
+        assert torch.equal(prepare(x, 2), x * 2)
+        assert torch.equal(prepare(x, 3), x * 3)
+    assert calls == [2, 3]
+    assert prepare.cache_info() == (4, 2, 2, 2)
+
+    # tensors are keyed by identity rather than values
+    prepare(y, 2)
+    assert calls == [2, 3, 2]
+    # the least recently used entry `(x, 2)` is evicted
+    prepare(x, 2)
+    assert calls == [2, 3, 2, 2]
+
+    # in-place updates invalidate the cached results
+    x.add_(1)
+    assert torch.equal(prepare(x, 2), x * 2)
+    assert calls == [2, 3, 2, 2, 2]
+
+    with torch.inference_mode():
+        z = torch.arange(4)
+    prepare(z, 2)
+    prepare(z, 2)
+    assert calls == [2, 3, 2, 2, 2, 2]
+
+    prepare.cache_clear()
+    assert prepare.cache_info() == (0, 0, 2, 0)